@@ -0,0 +1,210 @@
+# analytics_fitness.py
+"""
+Training analytics for one user, computed with NumPy/pandas array operations.
+
+A user's whole history comes back in one round trip as a handful of
+PostgreSQL arrays (one per column), so there is no per-row Python work
+between the database and NumPy. Dates travel as day numbers since
+1970-01-01, weights and reps as float8, which keeps the decoding cheap.
+
+From those columns:
+- streaks: current and longest run of consecutive training days
+- daily load: minutes per day with rolling 7-day (acute) and 28-day (chronic)
+  sums and their ratio
+- weekly summary: workouts, minutes and volume per ISO week, with the
+  week-over-week change
+- personal records per exercise: heaviest weight and biggest single-entry
+  volume, with the dates they were set
+- volume = sets x reps x weight (missing values count as zero)
+
+training_summary() is memoized per user and day in the backend read cache
+under the user's ("workouts", uid) and ("insights", uid) tags, which every
+write to the user's workouts or exercises invalidates.
+"""
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+import backend_fitness as db
+
+EPOCH = np.datetime64("1970-01-01", "D")
+ACUTE_DAYS = 7
+CHRONIC_DAYS = 28
+
+# ----------------- FETCH -----------------
+ANALYTICS_WORKOUTS_SQL = """
+    SELECT array_agg(workout_id ORDER BY workout_date, workout_id),
+           array_agg(workout_date - DATE '1970-01-01' ORDER BY workout_date, workout_id),
+           array_agg(duration_minutes ORDER BY workout_date, workout_id)
+    FROM workouts
+    WHERE user_id = %s;
+"""
+ANALYTICS_EXERCISES_SQL = """
+    SELECT array_agg(e.workout_date - DATE '1970-01-01' ORDER BY e.workout_date, e.exercise_id),
+           array_agg(c.display_name ORDER BY e.workout_date, e.exercise_id),
+           array_agg(e.reps::float8 ORDER BY e.workout_date, e.exercise_id),
+           array_agg(e.sets::float8 ORDER BY e.workout_date, e.exercise_id),
+           array_agg(e.weight_lifted::float8 ORDER BY e.workout_date, e.exercise_id)
+    FROM exercises e
+    JOIN exercise_catalog c ON c.exercise_type_id = e.exercise_type_id
+    WHERE e.user_id = %s;
+"""
+db.register_statements(ANALYTICS_WORKOUTS_SQL, ANALYTICS_EXERCISES_SQL)
+
+def _column(values, dtype):
+    return np.array(values if values is not None else [], dtype=dtype)
+
+def fetch_history(user_id: int):
+    """
+    The user's workouts and exercises as dicts of NumPy arrays, ordered by date:
+    workouts {workout_id, day, minutes}; exercises {day, name, reps, sets, weight}.
+    `day` is days since 1970-01-01; missing reps/sets/weight are NaN.
+    """
+    with db.get_connection() as cur:
+        cur.execute(ANALYTICS_WORKOUTS_SQL, (user_id,))
+        workout_ids, workout_days, minutes = cur.fetchone()
+        cur.execute(ANALYTICS_EXERCISES_SQL, (user_id,))
+        exercise_days, names, reps, sets, weights = cur.fetchone()
+    workouts = {
+        "workout_id": _column(workout_ids, np.int64),
+        "day": _column(workout_days, np.int64),
+        "minutes": _column(minutes, np.float64),
+    }
+    exercises = {
+        "day": _column(exercise_days, np.int64),
+        "name": _column(names, object),
+        "reps": _column(reps, np.float64),
+        "sets": _column(sets, np.float64),
+        "weight": _column(weights, np.float64),
+    }
+    return workouts, exercises
+
+# ----------------- METRICS -----------------
+def _to_dates(days):
+    return EPOCH + np.asarray(days, dtype="timedelta64[D]")
+
+def _day_number(d: date):
+    return int((np.datetime64(d, "D") - EPOCH).astype(np.int64))
+
+def streaks(days, today: int):
+    """Current and longest runs of consecutive training days; `days` and `today` are day numbers."""
+    unique = np.unique(days)
+    if unique.size == 0:
+        return {"current": 0, "longest": 0, "active_days": 0}
+    breaks = np.flatnonzero(np.diff(unique) != 1)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [unique.size - 1]))
+    lengths = ends - starts + 1
+    # a streak is still current if the last session was today or yesterday
+    current = int(lengths[-1]) if unique[-1] >= today - 1 else 0
+    return {"current": current, "longest": int(lengths.max()), "active_days": int(unique.size)}
+
+def _rolling_sum(values, window: int):
+    totals = np.concatenate(([0.0], np.cumsum(values)))
+    idx = np.arange(1, values.size + 1)
+    return totals[idx] - totals[np.maximum(idx - window, 0)]
+
+def daily_load(days, minutes, first: int, last: int):
+    """Minutes per day from `first` to `last` (day numbers) with rolling acute/chronic load."""
+    span = last - first + 1
+    per_day = np.bincount(days - first, weights=minutes, minlength=span)[:span].astype(np.float64)
+    acute = _rolling_sum(per_day, ACUTE_DAYS)
+    chronic = _rolling_sum(per_day, CHRONIC_DAYS)
+    weekly_chronic = chronic / (CHRONIC_DAYS / ACUTE_DAYS)
+    ratio = np.divide(acute, weekly_chronic, out=np.full(span, np.nan), where=weekly_chronic > 0)
+    return pd.DataFrame(
+        {"minutes": per_day, "acute_7d": acute, "chronic_28d": chronic, "acute_chronic_ratio": ratio},
+        index=pd.DatetimeIndex(_to_dates(np.arange(first, first + span)), name="date"),
+    )
+
+def _week_index(days):
+    # 1970-01-01 was a Thursday; shifting by 3 makes weeks start on Monday
+    return (np.asarray(days) + 3) // 7
+
+def volume(reps, sets, weight):
+    return np.nan_to_num(sets) * np.nan_to_num(reps) * np.nan_to_num(weight)
+
+def weekly_summary(workout_days, minutes, exercise_days, exercise_volume, last: int):
+    """Workouts, minutes and volume per ISO week (Monday start) with week-over-week change."""
+    if workout_days.size == 0:
+        return pd.DataFrame(columns=["workouts", "minutes", "volume", "minutes_change_pct", "volume_change_pct"])
+    first_week = int(_week_index(workout_days).min())
+    weeks = int(_week_index(last)) - first_week + 1
+    w_idx = _week_index(workout_days) - first_week
+    e_idx = _week_index(exercise_days) - first_week
+    counts = np.bincount(w_idx, minlength=weeks)[:weeks]
+    week_minutes = np.bincount(w_idx, weights=minutes, minlength=weeks)[:weeks]
+    week_volume = np.bincount(e_idx, weights=exercise_volume, minlength=weeks)[:weeks]
+
+    def change(series):
+        prev = np.concatenate(([np.nan], series[:-1]))
+        return np.divide(series - prev, prev, out=np.full(series.size, np.nan), where=prev > 0) * 100
+
+    starts = (np.arange(first_week, first_week + weeks) * 7) - 3
+    return pd.DataFrame(
+        {
+            "workouts": counts,
+            "minutes": week_minutes,
+            "volume": week_volume,
+            "minutes_change_pct": change(week_minutes),
+            "volume_change_pct": change(week_volume),
+        },
+        index=pd.DatetimeIndex(_to_dates(starts), name="week_start"),
+    )
+
+def personal_records(exercises, exercise_volume):
+    """Per exercise: heaviest weight, biggest single-entry volume (with dates), total volume, entries."""
+    columns = ["exercise", "best_weight", "best_weight_date", "best_volume", "best_volume_date",
+               "total_volume", "entries"]
+    if exercises["name"].size == 0:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame({
+        "exercise": exercises["name"],
+        "date": _to_dates(exercises["day"]),
+        "weight": exercises["weight"],
+        "volume": exercise_volume,
+    })
+    grouped = df.groupby("exercise", sort=True)
+    totals = grouped.agg(total_volume=("volume", "sum"), entries=("volume", "size"))
+    # first row per exercise after a descending sort = the record (earliest date wins ties)
+    best_weight = (
+        df.dropna(subset=["weight"])
+        .sort_values(["weight", "date"], ascending=[False, True], kind="stable")
+        .drop_duplicates("exercise")
+        .set_index("exercise")[["weight", "date"]]
+        .rename(columns={"weight": "best_weight", "date": "best_weight_date"})
+    )
+    best_volume = (
+        df.sort_values(["volume", "date"], ascending=[False, True], kind="stable")
+        .drop_duplicates("exercise")
+        .set_index("exercise")[["volume", "date"]]
+        .rename(columns={"volume": "best_volume", "date": "best_volume_date"})
+    )
+    return totals.join(best_weight).join(best_volume).reset_index()[columns]
+
+# ----------------- SUMMARY -----------------
+@db._instrumented
+def training_summary(user_id: int, today: date | None = None):
+    """
+    All analytics for `user_id` as of `today` (default: the current date):
+    {streaks, daily (DataFrame), weekly (DataFrame), records (DataFrame), total_volume}.
+    """
+    # resolved here so the date is part of the cache key: yesterday's summary isn't served after midnight
+    return _training_summary(user_id, today or date.today())
+
+@db._cached(lambda summary, user_id, today: [("workouts", user_id), ("insights", user_id)])
+@db._replica_read
+def _training_summary(user_id: int, today: date):
+    today_n = _day_number(today)
+    workouts, exercises = fetch_history(user_id)
+    exercise_volume = volume(exercises["reps"], exercises["sets"], exercises["weight"])
+    first = int(workouts["day"][0]) if workouts["day"].size else today_n
+    last = max(today_n, int(workouts["day"][-1]) if workouts["day"].size else today_n)
+    return {
+        "streaks": streaks(workouts["day"], today_n),
+        "daily": daily_load(workouts["day"], workouts["minutes"], first, last),
+        "weekly": weekly_summary(workouts["day"], workouts["minutes"], exercises["day"], exercise_volume, last),
+        "records": personal_records(exercises, exercise_volume),
+        "total_volume": float(exercise_volume.sum()),
+    }
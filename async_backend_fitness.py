@@ -0,0 +1,410 @@
+# async_backend_fitness.py
+"""
+asyncio counterpart of backend_fitness: the same CRUD, leaderboard and
+insights functions as coroutines over a psycopg 3 AsyncConnectionPool, so
+independent reads can run concurrently:
+
+    friends, workouts, goals, stats = await asyncio.gather(
+        adb.list_friends(uid), adb.list_workouts(uid), adb.list_goals(uid), adb.overall_insights(uid)
+    )
+
+SQL is shared with backend_fitness. Reads here are not cached; writes still
+invalidate backend_fitness's read cache so sync callers in the same process
+never see stale data, and the list functions merge the sync module's queued
+write-behind rows the same way its own list functions do.
+
+Each event loop gets its own pool (see get_pool); await close_pool() before
+the loop ends.
+
+    python async_backend_fitness.py parity --user-id N
+"""
+import argparse
+import asyncio
+import sys
+import weakref
+from contextlib import asynccontextmanager
+from datetime import date
+
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+
+import backend_fitness as db
+
+# ----------------- DB CONNECTION -----------------
+ASYNC_POOL_MIN_SIZE = 1
+ASYNC_POOL_MAX_SIZE = 20
+ASYNC_POOL_MAX_IDLE_SECONDS = 300
+ASYNC_POOL_CHECKOUT_TIMEOUT = 30
+
+# One pool per event loop: a pool and its lock belong to the loop that opened
+# them, and every asyncio.run() (a CLI call, a Streamlit rerun) starts a new one.
+# Entries go away with their loop.
+_pools = weakref.WeakKeyDictionary()       # loop -> AsyncConnectionPool
+_pool_locks = weakref.WeakKeyDictionary()  # loop -> asyncio.Lock
+
+
+def _conninfo():
+    return make_conninfo(host=db.DB_HOST, dbname=db.DB_NAME, user=db.DB_USER, password=db.DB_PASSWORD)
+
+
+async def get_pool():
+    """The running event loop's pool, opened on first use."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        async with _pool_locks.setdefault(loop, asyncio.Lock()):
+            pool = _pools.get(loop)
+            if pool is None:
+                pool = AsyncConnectionPool(
+                    _conninfo(),
+                    min_size=ASYNC_POOL_MIN_SIZE,
+                    max_size=ASYNC_POOL_MAX_SIZE,
+                    max_idle=ASYNC_POOL_MAX_IDLE_SECONDS,
+                    timeout=ASYNC_POOL_CHECKOUT_TIMEOUT,
+                    check=AsyncConnectionPool.check_connection,
+                    open=False,
+                )
+                await pool.open()
+                _pools[loop] = pool
+    return pool
+
+
+async def close_pool():
+    """Close the running event loop's pool; call it before the loop ends (asyncio.run returns)."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def pool_stats():
+    """Stats of the running event loop's pool, or None outside a loop or before first use."""
+    try:
+        pool = _pools.get(asyncio.get_running_loop())
+    except RuntimeError:
+        return None
+    return pool.get_stats() if pool is not None else None
+
+
+@asynccontextmanager
+async def get_connection():
+    # pool.connection() commits on success and rolls back on error, like db.get_connection()
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            yield cur
+
+
+async def _fetchone(sql, params=None):
+    async with get_connection() as cur:
+        await cur.execute(sql, params)
+        return await cur.fetchone()
+
+
+async def _fetchall(sql, params=None):
+    async with get_connection() as cur:
+        await cur.execute(sql, params)
+        return await cur.fetchall()
+
+
+async def _execute(sql, params=None):
+    async with get_connection() as cur:
+        await cur.execute(sql, params)
+
+
+async def _wb_barrier():
+    # like the sync deletes: let queued write-behind rows reach the database first
+    if db._wb_queue:
+        await asyncio.to_thread(db._wb_barrier)
+
+# ----------------- CRUD: USERS -----------------
+async def create_user(name: str, email: str, weight: float | None):
+    user_id = (await _fetchone(db.CREATE_USER_SQL, (name, email, weight)))[0]
+    db._invalidate(("users",))
+    return user_id
+
+async def get_user_by_email(email: str):
+    return await _fetchone(db.GET_USER_BY_EMAIL_SQL, (email,))
+
+async def get_user_by_id(user_id: int):
+    return await _fetchone(db.GET_USER_BY_ID_SQL, (user_id,))
+
+async def update_user(user_id: int, name: str, email: str, weight: float | None):
+    await _execute(db.UPDATE_USER_SQL, (name, email, weight, user_id))
+    db._invalidate(("user", user_id), ("users",))
+
+async def list_users():
+    return await _fetchall(db.LIST_USERS_SQL)
+
+async def list_users_page(after: tuple | None = None, limit: int = 50):
+    if after is None:
+        rows = await _fetchall(db.LIST_USERS_FIRST_PAGE_SQL, (limit + 1,))
+    else:
+        rows = await _fetchall(db.LIST_USERS_PAGE_SQL, (after[0], after[1], limit + 1))
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1][1], rows[-1][0])
+    return rows, None
+
+async def search_users(query: str, limit: int = 20):
+    if not query.strip():
+        return []
+    return await _fetchall(db.search_users_sql(query), db._search_params(query, limit))
+
+# ----------------- CRUD: FRIENDS -----------------
+async def add_friendship(user_id: int, friend_id: int):
+    if user_id == friend_id:
+        raise ValueError("You cannot add yourself as a friend.")
+    a, b = sorted([user_id, friend_id])
+    await _execute(db.ADD_FRIENDSHIP_SQL, (a, b))
+    db._invalidate(("friends", user_id), ("friends", friend_id))
+
+async def remove_friendship(user_id: int, friend_id: int):
+    a, b = sorted([user_id, friend_id])
+    await _execute(db.REMOVE_FRIENDSHIP_SQL, (a, b))
+    db._invalidate(("friends", user_id), ("friends", friend_id))
+
+async def list_friends(user_id: int):
+    return await _fetchall(db.LIST_FRIENDS_SQL, (user_id,))
+
+async def suggest_friends(user_id: int, limit: int = 10):
+    return await _fetchall(db.SUGGEST_FRIENDS_SQL, (user_id, user_id, user_id, limit))
+
+# ----------------- CRUD: WORKOUTS -----------------
+async def log_workout(user_id: int, workout_date: date, duration_minutes: int):
+    workout_id = (await _fetchone(db.LOG_WORKOUT_SQL, (user_id, workout_date, duration_minutes)))[0]
+    db._invalidate(("workouts", user_id), ("insights", user_id))
+    return workout_id
+
+async def log_workout_with_exercises(user_id: int, workout_date: date, duration_minutes: int, exercises):
+    rows = list(exercises)
+    workout_id, exercise_ids = await _fetchone(
+        db.LOG_WORKOUT_WITH_EXERCISES_SQL,
+        (user_id, workout_date, duration_minutes, *db.exercise_columns(rows)),
+    )
+    db._invalidate(("workouts", user_id), ("insights", user_id), ("exercises", workout_id))
+    return workout_id, list(exercise_ids)
+
+async def delete_workout(workout_id: int, workout_date: date, user_id: int):
+    await _wb_barrier()
+    await _execute(db.DELETE_WORKOUT_SQL, (workout_id, workout_date, user_id))
+    db._invalidate(("workouts", user_id), ("insights", user_id), ("exercises", workout_id))
+
+async def list_workouts(user_id: int, start_date: date | None = None, end_date: date | None = None):
+    pending = list(db._wb_pending(db._wb_workouts, user_id).values())
+    if start_date and end_date:
+        rows = await _fetchall(db.LIST_WORKOUTS_RANGE_SQL, (user_id, start_date, end_date))
+        pending = [p for p in pending if start_date <= p[1] <= end_date]
+    else:
+        rows = await _fetchall(db.LIST_WORKOUTS_SQL, (user_id,))
+    return db._wb_merge(rows, pending, key=lambda r: (r[1], r[0]), reverse=True)
+
+async def list_workouts_page(user_id: int, after: tuple | None = None, limit: int = 50):
+    pending = list(db._wb_pending(db._wb_workouts, user_id).values())
+    if after is None:
+        rows = await _fetchall(db.LIST_WORKOUTS_FIRST_PAGE_SQL, (user_id, limit + 1))
+    else:
+        rows = await _fetchall(db.LIST_WORKOUTS_PAGE_SQL, (user_id, after[0], after[1], limit + 1))
+        pending = [p for p in pending if (p[1], p[0]) < tuple(after)]
+    rows = db._wb_merge(rows, pending, key=lambda r: (r[1], r[0]), reverse=True)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1][1], rows[-1][0])
+    return rows, None
+
+# ----------------- CRUD: EXERCISES -----------------
+async def add_exercise(workout_id: int, workout_date: date, exercise_name: str, reps: int | None,
+                       sets: int | None, weight_lifted: float | None):
+    exercise_id, owner_id = await _fetchone(
+        db.ADD_EXERCISE_SQL, (exercise_name, reps, sets, weight_lifted, workout_id, workout_date)
+    )
+    db._invalidate(("exercises", workout_id), ("insights", owner_id))
+    return exercise_id
+
+async def list_exercises(workout_id: int, workout_date: date):
+    pending = list(db._wb_pending(db._wb_exercises, workout_id).values())
+    rows = await _fetchall(db.LIST_EXERCISES_SQL, (workout_id, workout_date))
+    return db._wb_merge(rows, pending, key=lambda r: r[0])
+
+async def delete_exercise(exercise_id: int, workout_id: int, workout_date: date):
+    await _wb_barrier()
+    row = await _fetchone(db.DELETE_EXERCISE_SQL, (exercise_id, workout_id, workout_date))
+    db._invalidate(("exercises", workout_id), *([("insights", row[0])] if row else []))
+
+async def personal_records(user_id: int):
+    return await _fetchall(db.PERSONAL_RECORDS_SQL, (user_id,))
+
+async def exercise_history(user_id: int, exercise_name: str, limit: int = 50):
+    return await _fetchall(db.EXERCISE_HISTORY_SQL, (user_id, exercise_name, limit))
+
+# ----------------- CRUD: GOALS -----------------
+async def create_goal(user_id: int, description: str, start_date: date, end_date: date,
+                      target_type: str | None = None, target_value: float | None = None,
+                      target_exercise: str | None = None):
+    target = db._goal_target(target_type, target_value, target_exercise)
+    goal_id = (await _fetchone(db.CREATE_GOAL_SQL, (user_id, description, start_date, end_date, *target)))[0]
+    db._invalidate(("goals", user_id))
+    return goal_id
+
+async def list_goals(user_id: int):
+    pending = db._wb_pending(db._wb_goals, user_id)
+    return db._wb_merge_goals(await _fetchall(db.LIST_GOALS_SQL, {"user_id": user_id}), pending)
+
+async def set_goal_completed(goal_id: int, user_id: int, completed: bool):
+    await _execute(db.SET_GOAL_COMPLETED_SQL, (completed, goal_id, user_id))
+    db._invalidate(("goals", user_id))
+
+async def delete_goal(goal_id: int, user_id: int):
+    await _wb_barrier()
+    await _execute(db.DELETE_GOAL_SQL, (goal_id, user_id))
+    db._invalidate(("goals", user_id))
+
+# ----------------- ANALYTICS & LEADERBOARD -----------------
+week_bounds = db.week_bounds
+
+async def leaderboard_for_week(user_id: int, metric: str, week_start: date, week_end: date):
+    if db.is_full_week(week_start, week_end):
+        return await _fetchall(db.leaderboard_sql(metric), (user_id, user_id, week_start))
+    return await _fetchall(
+        db.leaderboard_sql(metric, full_week=False),
+        (user_id, user_id, week_start, week_end),
+    )
+
+async def global_leaderboard_page(metric: str, week_start: date, after: tuple | None = None, limit: int = 50):
+    params = db._global_params(metric, week_start, limit=limit + 1)
+    if after is not None:
+        params.update(after_value=after[0], after_user_id=after[1])
+    rows = await _fetchall(db.global_leaderboard_sql(metric, after=after is not None), params)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1][3], rows[-1][1])
+    return rows, None
+
+async def global_rank(user_id: int, metric: str, week_start: date):
+    value, above, ranked = await _fetchone(
+        db.global_leaderboard_sql(metric, "rank"), db._global_params(metric, week_start, user_id=user_id)
+    )
+    if value is None:
+        return {"value": 0, "rank": ranked + 1, "ranked_users": ranked, "percentile": 0.0}
+    return {
+        "value": value,
+        "rank": above + 1,
+        "ranked_users": ranked,
+        "percentile": round(100 * (ranked - above) / ranked, 1),
+    }
+
+async def global_leaderboard_neighbors(user_id: int, metric: str, week_start: date, radius: int = 5):
+    return await _fetchall(
+        db.global_leaderboard_sql(metric, "neighbors"),
+        db._global_params(metric, week_start, user_id=user_id, radius=radius),
+    )
+
+async def overall_insights(user_id: int):
+    row = await _fetchone(db.INSIGHTS_SQL, (user_id,))
+    workout_count, total_minutes, min_duration, max_duration, exercise_count = row or (0, 0, None, None, 0)
+    return {
+        "total_workouts": workout_count,
+        "total_minutes": total_minutes,
+        "avg_duration": round(total_minutes / workout_count, 2) if workout_count else 0.0,
+        "min_duration": min_duration or 0,
+        "max_duration": max_duration or 0,
+        "total_exercises": exercise_count,
+    }
+
+async def user_overview(user_id: int):
+    """Everything the dashboard pages need for one user, fetched concurrently."""
+    today = date.today()
+    week_start, week_end = week_bounds(today)
+    user, friends, workouts, goals, insights, leaderboard = await asyncio.gather(
+        get_user_by_id(user_id),
+        list_friends(user_id),
+        list_workouts_page(user_id),
+        list_goals(user_id),
+        overall_insights(user_id),
+        leaderboard_for_week(user_id, "minutes", week_start, week_end),
+    )
+    return {
+        "user": user,
+        "friends": friends,
+        "workouts": workouts,
+        "goals": goals,
+        "insights": insights,
+        "leaderboard": leaderboard,
+    }
+
+# ----------------- PARITY CHECK -----------------
+def _parity_calls(user_id: int):
+    """(function, args) for every read function, with arguments taken from `user_id`'s own data."""
+    _, name, email, _ = db.get_user_by_id(user_id)
+    workouts = db.list_workouts(user_id)
+    week_start, week_end = week_bounds(workouts[0][1] if workouts else date.today())
+    _, users_after = db.list_users_page(limit=1)
+    _, workouts_after = db.list_workouts_page(user_id, limit=1)
+    records = db.personal_records(user_id)
+    calls = [
+        ("get_user_by_id", (user_id,)),
+        ("get_user_by_email", (email,)),
+        ("list_users", ()),
+        ("list_users_page", ()),
+        ("list_users_page", (users_after,)),
+        ("search_users", (name[:2],)),
+        ("search_users", (name,)),
+        ("list_friends", (user_id,)),
+        ("suggest_friends", (user_id,)),
+        ("list_workouts", (user_id,)),
+        ("list_workouts", (user_id, week_start, week_end)),
+        ("list_workouts_page", (user_id,)),
+        ("list_workouts_page", (user_id, workouts_after)),
+        ("list_goals", (user_id,)),
+        ("leaderboard_for_week", (user_id, "workouts", week_start, week_end)),
+        ("leaderboard_for_week", (user_id, "minutes", week_start, week_end)),
+        ("leaderboard_for_week", (user_id, "minutes", week_start, week_start)),
+        ("global_leaderboard_page", ("minutes", week_start)),
+        ("global_leaderboard_page", ("workouts", week_start, None, 1)),
+        ("global_rank", (user_id, "workouts", week_start)),
+        ("global_leaderboard_neighbors", (user_id, "minutes", week_start)),
+        ("overall_insights", (user_id,)),
+        ("personal_records", (user_id,)),
+        ("exercise_history", (user_id, records[0][0] if records else "Squat")),
+    ]
+    calls += [("list_exercises", (w[0], w[1])) for w in workouts[:3]]
+    return calls
+
+async def check_parity(user_id: int):
+    """
+    Call every read function through both modules for `user_id` and return
+    [(function, args, sync_result, async_result)] for each disagreement.
+    The sync read cache is cleared first so both sides hit the database.
+    """
+    calls = _parity_calls(user_id)
+    db.clear_cache()
+    mismatches = []
+    try:
+        for name, args in calls:
+            sync_result = getattr(db, name)(*args)
+            async_result = await globals()[name](*args)
+            if sync_result != async_result:
+                mismatches.append((name, args, sync_result, async_result))
+    finally:
+        await close_pool()
+    return mismatches
+
+# ----------------- CLI -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Async backend utilities")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_parity = sub.add_parser("parity", help="compare sync and async read results for a user")
+    p_parity.add_argument("--user-id", type=int, required=True)
+    args = parser.parse_args(argv)
+
+    if args.command == "parity":
+        mismatches = asyncio.run(check_parity(args.user_id))
+        for name, call_args, sync_result, async_result in mismatches:
+            print(f"MISMATCH {name}{call_args}:\n  sync:  {sync_result!r}\n  async: {async_result!r}")
+        if mismatches:
+            return 1
+        print("Sync and async backends agree.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,25 @@
 # backend_fitness.py
+import atexit
+import contextvars
+import functools
+import itertools
+import json
+import logging
+import math
+import re
+import select
+import threading
+import time
+import weakref
 import psycopg2
+from collections import deque
 from contextlib import contextmanager
 from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import metrics_fitness as metrics
+from cache_fitness import QueryCache
+from journal_fitness import WriteJournal
 
 # ----------------- DB CONNECTION -----------------
 DB_HOST = "localhost"
@@ -9,237 +27,2258 @@ DB_NAME = "Fitness_Tracker"
 DB_USER = "postgres"
 DB_PASSWORD = "@rSHUCHI16"
 
+# Connection pool. Off by default so every call still gets a fresh connection;
+# turn it on with configure_pool() (or POOL_ENABLED = True before first use).
+POOL_ENABLED = False
+POOL_MIN_SIZE = 1
+POOL_MAX_SIZE = 10
+POOL_MAX_IDLE_SECONDS = 300      # idle connections above POOL_MIN_SIZE are closed after this
+POOL_PING_AFTER_SECONDS = 5      # connections idle longer than this get a SELECT 1 on checkout
+POOL_CHECKOUT_TIMEOUT = 30       # seconds to wait for a free connection before giving up
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _connect():
+    return psycopg2.connect(
+        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+        connection_factory=_FitnessConnection,
+    )
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections.
+    - keeps between min_size and max_size connections open
+    - checkout blocks (up to timeout) when all max_size connections are in use
+    - connections idle longer than ping_after are checked with SELECT 1 before reuse
+    - connections idle longer than max_idle are closed (down to min_size)
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, max_idle=300.0, ping_after=5.0, timeout=30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1.")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.timeout = timeout
+        self._idle = deque()  # (conn, last_used); most recently used on the right
+        self._size = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time": 0.0,
+            "timeouts": 0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "failed_pings": 0,
+        }
+        for _ in range(min_size):
+            conn = self._open()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+
+    def _open(self):
+        conn = self._connect()
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        self._stats["connections_closed"] += 1
+
+    def _reap_idle(self, now):
+        # Oldest idle connections sit on the left; close them while we are above min_size.
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            self._close(conn)
+
+    def _is_alive(self, conn, idle_for):
+        if conn.closed:
+            return False
+        if idle_for <= self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed.")
+                now = time.monotonic()
+                self._reap_idle(now)
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, now
+                    break
+                remaining = self.timeout - (now - start)
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No connection available within {self.timeout}s.")
+                waited = True
+                self._cond.wait(remaining)
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+                self._stats["wait_time"] += time.monotonic() - start
+
+        try:
+            if conn is not None and not self._is_alive(conn, time.monotonic() - last_used):
+                with self._cond:
+                    self._stats["failed_pings"] += 1
+                    self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        with self._cond:
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.popleft()
+                self._size -= 1
+                self._close(conn)
+            self._cond.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    if not POOL_ENABLED:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    _connect,
+                    min_size=POOL_MIN_SIZE,
+                    max_size=POOL_MAX_SIZE,
+                    max_idle=POOL_MAX_IDLE_SECONDS,
+                    ping_after=POOL_PING_AFTER_SECONDS,
+                    timeout=POOL_CHECKOUT_TIMEOUT,
+                )
+    return _pool
+
+
+def configure_pool(enabled: bool = True, min_size: int | None = None, max_size: int | None = None,
+                   max_idle_seconds: float | None = None, ping_after_seconds: float | None = None,
+                   checkout_timeout: float | None = None):
+    """Turn pooling on/off and (re)size it. Any existing pool is closed and rebuilt lazily."""
+    global POOL_ENABLED, POOL_MIN_SIZE, POOL_MAX_SIZE, POOL_MAX_IDLE_SECONDS
+    global POOL_PING_AFTER_SECONDS, POOL_CHECKOUT_TIMEOUT
+    close_pool()
+    POOL_ENABLED = enabled
+    if min_size is not None:
+        POOL_MIN_SIZE = min_size
+    if max_size is not None:
+        POOL_MAX_SIZE = max_size
+    if max_idle_seconds is not None:
+        POOL_MAX_IDLE_SECONDS = max_idle_seconds
+    if ping_after_seconds is not None:
+        POOL_PING_AFTER_SECONDS = ping_after_seconds
+    if checkout_timeout is not None:
+        POOL_CHECKOUT_TIMEOUT = checkout_timeout
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+    _close_replicas()
+
+
+def pool_stats():
+    """Counters for the active pool (checkouts, waits, wait_time, sizes, ...) or None if pooling is off."""
+    pool = _pool
+    return pool.stats() if pool is not None else None
+
+
+# ----------------- READ REPLICAS -----------------
+# Functions decorated with @_replica_read run on a streaming replica when any
+# are configured; writes and everything else use the primary (DB_HOST).
+# - load balancing: the replica with the fewest reads in flight, round-robin on ties
+# - failover: a replica that fails to connect or errors mid-read is skipped for
+#   REPLICA_RETRY_AFTER_SECONDS and the read is retried elsewhere, finally on
+#   the primary
+# - lag: replica replay position/lag is refreshed every
+#   REPLICA_CHECK_INTERVAL_SECONDS; replicas over REPLICA_MAX_LAG_SECONDS are skipped
+# - read-your-own-writes: after a primary transaction that wrote (a statement
+#   whose command tag isn't in READ_ONLY_COMMAND_TAGS) the primary's WAL
+#   position is recorded in the caller's WriteSession, and a replica only
+#   serves that session's reads once it has replayed up to it (checked on the
+#   replica connection when the cached status is behind). Bind one
+#   WriteSession per user session with bind_write_session(); calls outside
+#   any binding (scripts, the CLI) share a default one. The write-behind
+#   flusher has its own, which every session waits for.
+# - the read cache is per process: a replica read is only cached when the
+#   replica had also replayed the latest write of any session, so one
+#   session's lagging read can't put stale data in front of another.
+# - if the position can't be read after a commit, the write still succeeds;
+#   that session reads from the primary (and nothing read from a replica is
+#   cached) until the next status check reads the primary's position instead.
+# Replica counters and routing state are guarded by _replicas_lock.
+REPLICA_HOSTS = []                    # "host" or "host:port"; empty = primary only
+REPLICA_MAX_LAG_SECONDS = 5.0
+REPLICA_CHECK_INTERVAL_SECONDS = 2.0
+REPLICA_RETRY_AFTER_SECONDS = 30.0
+REPLICA_CONNECT_TIMEOUT = 3
+
+replica_logger = logging.getLogger("fitness.replicas")
+
+REPLICA_STATUS_SQL = """
+    SELECT pg_last_wal_replay_lsn()::text,
+           CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+           END;
+"""
+REPLICA_REPLAY_LSN_SQL = "SELECT pg_last_wal_replay_lsn()::text;"
+PRIMARY_LSN_SQL = "SELECT pg_current_wal_lsn()::text;"
+
+
+def _lsn(text):
+    """pg_lsn text ('16/B374D848') -> int, so positions compare numerically."""
+    if text is None:
+        return None
+    high, _, low = text.partition("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class Replica:
+    def __init__(self, address: str):
+        self.address = address
+        host, _, port = address.partition(":")
+        self.host = host
+        self.port = int(port) if port else None
+        self.pool = None
+        self.down_until = 0.0
+        self.replay_lsn = None
+        self.lag_seconds = None
+        self.lag_bytes = None
+        self.checked_at = None
+        self.in_flight = 0
+        self.reads = 0
+        self.failures = 0
+        self.last_error = None
+
+    def connect(self):
+        return psycopg2.connect(
+            host=self.host, port=self.port, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD,
+            connect_timeout=REPLICA_CONNECT_TIMEOUT, connection_factory=_FitnessConnection,
+        )
+
+    def getconn(self):
+        if POOL_ENABLED and self.pool is None:
+            self.pool = ConnectionPool(
+                self.connect,
+                min_size=0,
+                max_size=POOL_MAX_SIZE,
+                max_idle=POOL_MAX_IDLE_SECONDS,
+                ping_after=POOL_PING_AFTER_SECONDS,
+                timeout=POOL_CHECKOUT_TIMEOUT,
+            )
+        return self.pool.getconn() if self.pool is not None else self.connect()
+
+    def putconn(self, conn, discard=False):
+        if self.pool is not None:
+            self.pool.putconn(conn, discard=discard)
+        else:
+            conn.close()
+
+    def mark_down(self, error):
+        with _replicas_lock:
+            self.failures += 1
+            self.last_error = str(error).strip()
+            self.down_until = time.monotonic() + REPLICA_RETRY_AFTER_SECONDS
+
+    def begin_read(self):
+        with _replicas_lock:
+            self.in_flight += 1
+            self.reads += 1
+
+    def end_read(self):
+        with _replicas_lock:
+            self.in_flight -= 1
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+
+class _ReadRoute:
+    """Per-call routing state for a @_replica_read function."""
+
+    def __init__(self):
+        self.replica = None      # replica that served the current attempt
+        self.excluded = set()    # replicas that already failed during this call
+        self.primary_only = False
+        self.cacheable = True    # False when the replica is behind another session's write
+
+
+class WriteSession:
+    """Where one user session's reads must start on a replica: the position of its last write."""
+
+    def __init__(self):
+        self.lsn = None
+        self.unknown_since = None  # _write_failures when a commit's position couldn't be read
+
+
+_replicas = []
+_replicas_lock = threading.Lock()
+_replica_turn = itertools.count()
+_replica_checked_at = 0.0
+_last_write_lsn = None       # latest position written by any session of this process
+_write_lsn_unknown = False   # a commit's position couldn't be read: nothing read from a replica is cached
+_write_failures = 0          # commits whose position couldn't be read, so far
+_write_recovered = (0, None)  # (_write_failures before, primary position) of the last recovery
+_default_write_session = WriteSession()
+_wb_write_session = WriteSession()
+_write_session = contextvars.ContextVar("fitness_write_session", default=None)
+_read_route = contextvars.ContextVar("fitness_read_route", default=None)
+
+
+def bind_write_session(session: WriteSession | None):
+    """Track this context's writes in `session` and wait for them on replicas (None: the default session)."""
+    _write_session.set(session)
+
+
+def configure_replicas(hosts=(), max_lag_seconds: float | None = None, check_interval_seconds: float | None = None,
+                       retry_after_seconds: float | None = None):
+    """Route @_replica_read functions to `hosts` (empty: primary only). Existing replica pools are closed."""
+    global REPLICA_HOSTS, REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_INTERVAL_SECONDS, REPLICA_RETRY_AFTER_SECONDS
+    global _replicas, _replica_checked_at
+    with _replicas_lock:
+        for replica in _replicas:
+            replica.close()
+        REPLICA_HOSTS = list(hosts)
+        _replicas = [Replica(h) for h in REPLICA_HOSTS]
+        _replica_checked_at = 0.0
+    if max_lag_seconds is not None:
+        REPLICA_MAX_LAG_SECONDS = max_lag_seconds
+    if check_interval_seconds is not None:
+        REPLICA_CHECK_INTERVAL_SECONDS = check_interval_seconds
+    if retry_after_seconds is not None:
+        REPLICA_RETRY_AFTER_SECONDS = retry_after_seconds
+
+
+def _close_replicas():
+    with _replicas_lock:
+        for replica in _replicas:
+            replica.close()
+
+
+def _current_replicas():
+    # REPLICA_HOSTS can also be assigned directly, like the other module settings
+    global _replicas
+    if [r.address for r in _replicas] != list(REPLICA_HOSTS):
+        configure_replicas(REPLICA_HOSTS)
+    return _replicas
+
+
+def _refresh_replica_status(now: float):
+    """Poll every replica's replay position and lag (at most once per check interval)."""
+    global _replica_checked_at
+    with _replicas_lock:
+        if now - _replica_checked_at < REPLICA_CHECK_INTERVAL_SECONDS:
+            return
+        _replica_checked_at = now
+        replicas = list(_replicas)
+    if _write_lsn_unknown:
+        _recover_write_position()
+    primary_lsn = _last_write_lsn
+    for replica in replicas:
+        if replica.down_until > now:
+            continue
+        try:
+            conn = replica.getconn()
+        except psycopg2.Error as e:
+            replica.mark_down(e)
+            continue
+        try:
+            with conn.cursor() as cur:
+                cur.execute(REPLICA_STATUS_SQL)
+                replay, lag = cur.fetchone()
+            conn.rollback()
+        except psycopg2.Error as e:
+            replica.putconn(conn, discard=True)
+            replica.mark_down(e)
+            continue
+        replica.putconn(conn)
+        replica.replay_lsn = _lsn(replay)
+        replica.lag_seconds = float(lag) if lag is not None else None
+        if primary_lsn is not None and replica.replay_lsn is not None:
+            replica.lag_bytes = max(primary_lsn - replica.replay_lsn, 0)
+        replica.checked_at = time.time()
+
+
+def _replica_candidates(route: _ReadRoute):
+    now = time.monotonic()
+    replicas = _current_replicas()
+    if not replicas:
+        return []
+    _refresh_replica_status(now)
+    usable = [
+        r for r in replicas
+        if r not in route.excluded and r.down_until <= now
+        and (r.lag_seconds is None or r.lag_seconds <= REPLICA_MAX_LAG_SECONDS)
+    ]
+    if _session_position()[1]:
+        return []
+    with _replicas_lock:
+        turn = next(_replica_turn)
+        return sorted(usable, key=lambda r: (r.in_flight, (replicas.index(r) - turn) % len(replicas)))
+
+
+def _session_position():
+    """(position this session's reads need, unknown?), including the write-behind flusher's writes."""
+    with _replicas_lock:
+        positions = []
+        for session in (_write_session.get() or _default_write_session, _wb_write_session):
+            if session.unknown_since is not None:
+                recovered_after, lsn = _write_recovered
+                if recovered_after < session.unknown_since:
+                    return None, True
+                session.lsn = lsn if session.lsn is None else max(session.lsn, lsn)
+                session.unknown_since = None
+            if session.lsn is not None:
+                positions.append(session.lsn)
+        return max(positions, default=None), False
+
+
+def _caught_up(replica: Replica, conn, wanted):
+    """True if `replica` has replayed up to `wanted` (asking it if the cached status is behind)."""
+    if wanted is None or (replica.replay_lsn is not None and replica.replay_lsn >= wanted):
+        return True
+    with conn.cursor() as cur:
+        cur.execute(REPLICA_REPLAY_LSN_SQL)
+        replica.replay_lsn = _lsn(cur.fetchone()[0])
+    conn.rollback()
+    return replica.replay_lsn is not None and replica.replay_lsn >= wanted
+
+
+def _replica_connection(route: _ReadRoute):
+    """A connection on a usable, caught-up replica, or (None, None) to use the primary."""
+    for replica in _replica_candidates(route):
+        try:
+            conn = replica.getconn()
+        except psycopg2.Error as e:
+            replica.mark_down(e)
+            route.excluded.add(replica)
+            continue
+        try:
+            if _caught_up(replica, conn, _session_position()[0]):
+                route.cacheable = (route.cacheable and not _write_lsn_unknown
+                                   and _caught_up(replica, conn, _last_write_lsn))
+                return replica, conn
+        except psycopg2.Error as e:
+            replica.putconn(conn, discard=True)
+            replica.mark_down(e)
+            route.excluded.add(replica)
+            continue
+        replica.putconn(conn)
+    return None, None
+
+
+def _record_write_position(conn):
+    """
+    Remember the primary's WAL position after a commit on `conn` in the
+    caller's WriteSession. Never raises: the write has committed, and an error
+    here must not make it look failed.
+    """
+    global _last_write_lsn, _write_lsn_unknown, _write_failures
+    session = _write_session.get() or _default_write_session
+    try:
+        with conn.cursor() as cur:
+            cur.execute(PRIMARY_LSN_SQL)
+            lsn = _lsn(cur.fetchone()[0])
+        conn.rollback()
+    except psycopg2.Error as e:
+        with _replicas_lock:
+            _write_failures += 1
+            _write_lsn_unknown = True
+            session.unknown_since = _write_failures
+        replica_logger.warning("could not read the WAL position after a write, reading from the primary: %s",
+                               str(e).strip())
+        return
+    with _replicas_lock:
+        if _last_write_lsn is None or lsn > _last_write_lsn:
+            _last_write_lsn = lsn
+        if session.lsn is None or lsn > session.lsn:
+            session.lsn = lsn
+        session.unknown_since = None  # this commit is past the one whose position was lost
+
+
+def _recover_write_position():
+    # the primary's current position is at or past every commit made before it is read
+    global _last_write_lsn, _write_lsn_unknown, _write_recovered
+    with _replicas_lock:
+        failures = _write_failures
+    pool = _get_pool()
+    try:
+        conn = pool.getconn() if pool is not None else _connect()
+    except (psycopg2.Error, PoolTimeout) as e:
+        replica_logger.warning("could not read the primary's WAL position: %s", str(e).strip())
+        return
+    discard = False
+    try:
+        with conn.cursor() as cur:
+            cur.execute(PRIMARY_LSN_SQL)
+            lsn = _lsn(cur.fetchone()[0])
+        conn.rollback()
+    except psycopg2.Error as e:
+        discard = True
+        replica_logger.warning("could not read the primary's WAL position: %s", str(e).strip())
+        return
+    finally:
+        if pool is not None:
+            pool.putconn(conn, discard=discard)
+        else:
+            conn.close()
+    with _replicas_lock:
+        if _last_write_lsn is None or lsn > _last_write_lsn:
+            _last_write_lsn = lsn
+        _write_recovered = (failures, lsn)
+        _write_lsn_unknown = _write_failures > failures
+
+
+def replica_status():
+    """One dict per configured replica: address, up, replay_lsn, lag_seconds, lag_bytes, reads, failures, ..."""
+    now = time.monotonic()
+    return [
+        {
+            "replica": r.address,
+            "up": r.down_until <= now,
+            "replay_lsn": r.replay_lsn,
+            "lag_seconds": round(r.lag_seconds, 3) if r.lag_seconds is not None else None,
+            "lag_bytes": r.lag_bytes,
+            "checked_at": r.checked_at,
+            "in_flight": r.in_flight,
+            "reads": r.reads,
+            "failures": r.failures,
+            "last_error": r.last_error,
+        }
+        for r in _current_replicas()
+    ]
+
+
+# ----------------- PREPARED STATEMENTS -----------------
+# The fixed backend queries (register_statements, bottom of this module) are
+# PREPAREd once per connection and run with EXECUTE, so PostgreSQL parses them
+# once per connection and can switch to a cached generic plan instead of
+# planning every call (see plan_cache_mode). Each connection remembers what it
+# has prepared; a new connection (pool refill, reconnect, replica failover)
+# prepares again on first use. If the server no longer knows a statement
+# (DISCARD ALL / DEALLOCATE from outside), the connection forgets everything
+# and the call is retried when that statement opened its transaction. A
+# statement prepared behind our back is deallocated and prepared again.
+# A query PostgreSQL can't prepare (e.g. untyped parameters) runs unprepared
+# on that connection; other errors from PREPARE are raised as usual.
+# Only pooled connections use this: preparing on a connection that is closed
+# after one call just adds a round trip. Set PREPARED_STATEMENTS = False
+# behind a transaction-pooling pgbouncer.
+PREPARED_STATEMENTS = True
+
+_statements = {}           # SQL text -> (statement name, $n body, parameter keys or None)
+_placeholder = re.compile(r"%\((\w+)\)s|%s|%%")
+# PREPARE errors that mean "run this one unprepared": parameters whose type the
+# server can't infer without the values, or text that isn't a single statement.
+_UNPREPARABLE = {"42P18", "42P08", "42601"}  # indeterminate/ambiguous parameter, syntax_error
+
+
+class _FitnessConnection(psycopg2.extensions.connection):
+    """Connection that remembers which registered statements it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.unpreparable = set()   # SQL texts PREPARE rejected on this connection
+        self.wrote = False          # a statement in this transaction changed data (see _InstrumentedCursor)
+
+
+def _to_prepared(sql: str):
+    """psycopg2 placeholders -> $n; returns (body, keys) with keys None for positional params."""
+    keys = []
+    positions = {}
+
+    def number(match):
+        if match.group(0) == "%%":
+            return "%"
+        if match.group(1) is None:
+            keys.append(None)
+            return f"${len(keys)}"
+        key = match.group(1)
+        if key not in positions:
+            keys.append(key)
+            positions[key] = len(keys)
+        return f"${positions[key]}"
+
+    body = _placeholder.sub(number, sql).strip().rstrip(";")
+    return body, (keys if keys and keys[0] is not None else None)
+
+
+def register_statements(*sqls):
+    """Run these exact query texts as server-side prepared statements."""
+    for sql in sqls:
+        if sql not in _statements:
+            body, keys = _to_prepared(sql)
+            _statements[sql] = (f"fitness_{len(_statements) + 1}", body, keys)
+
+
+def prepared_statements():
+    """{statement name: SQL text} of everything registered."""
+    return {name: sql for sql, (name, _, _) in _statements.items()}
+
+
+# Command tags of statements that change no data; anything else marks the
+# connection's transaction as a write (see READ REPLICAS). A SELECT of a
+# function that writes counts as a read: call those from maintenance code only.
+READ_ONLY_COMMAND_TAGS = frozenset({
+    "SELECT", "SHOW", "SET", "RESET", "BEGIN", "START TRANSACTION", "SAVEPOINT", "RELEASE", "ROLLBACK",
+    "PREPARE", "DEALLOCATE", "DEALLOCATE ALL", "DISCARD ALL", "DECLARE CURSOR", "FETCH", "MOVE",
+    "CLOSE CURSOR", "EXPLAIN", "LOCK TABLE", "LISTEN", "UNLISTEN", "NOTIFY",
+})
+
+
+class _InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor that reports every statement's time and row count to metrics_fitness."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            statement = _statements.get(query) if PREPARED_STATEMENTS and isinstance(query, str) else None
+            if (statement is None or not POOL_ENABLED or not isinstance(self.connection, _FitnessConnection)
+                    or query in self.connection.unpreparable):
+                return super().execute(query, vars)
+            return self._execute_prepared(query, statement, vars)
+        finally:
+            self._note_write()
+            metrics.record_query(query, vars, time.perf_counter() - started, self.rowcount)
+
+    def _note_write(self):
+        tag = (self.statusmessage or "").rstrip("0123456789 ")
+        if tag and tag not in READ_ONLY_COMMAND_TAGS and isinstance(self.connection, _FitnessConnection):
+            self.connection.wrote = True
+
+    def _execute_prepared(self, query, statement, vars, retry: bool = True):
+        name, body, keys = statement
+        conn = self.connection
+        opens_transaction = conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        if name not in conn.prepared:
+            if not self._prepare(name, body):
+                conn.unpreparable.add(query)
+                return super().execute(query, vars)
+            conn.prepared.add(name)
+        if vars is None:
+            args = ()
+        else:
+            args = tuple(vars) if keys is None else tuple(vars[k] for k in keys)
+        try:
+            if not args:
+                return super().execute(f"EXECUTE {name};")
+            return super().execute(f"EXECUTE {name} ({', '.join(['%s'] * len(args))});", args)
+        except psycopg2.Error as e:
+            if e.pgcode != "26000":  # invalid_sql_statement_name
+                raise
+            conn.prepared.clear()
+            if not (retry and opens_transaction):
+                raise
+            conn.rollback()
+            return self._execute_prepared(query, statement, vars, retry=False)
+
+    def _prepare(self, name, body):
+        """PREPARE inside a savepoint; False if PostgreSQL can't prepare this query."""
+        prepare = f"SAVEPOINT fitness_prepare; PREPARE {name} AS {body}; RELEASE SAVEPOINT fitness_prepare;"
+        try:
+            super().execute(prepare)
+            return True
+        except psycopg2.Error as e:
+            code = e.pgcode
+            super().execute("ROLLBACK TO SAVEPOINT fitness_prepare; RELEASE SAVEPOINT fitness_prepare;")
+            if code in _UNPREPARABLE:
+                return False
+            if code != "42P05":  # duplicate_prepared_statement: prepared behind our back
+                raise
+        super().execute(f"DEALLOCATE {name}; {prepare}")
+        return True
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            if "FROM STDIN" in sql.upper() and isinstance(self.connection, _FitnessConnection):
+                self.connection.wrote = True
+            metrics.record_query(sql, None, time.perf_counter() - started, self.rowcount)
+
+
 @contextmanager
 def get_connection():
-    conn = psycopg2.connect(
-        host=DB_HOST, dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD
-    )
-    cur = conn.cursor()
+    route = _read_route.get()
+    started = time.perf_counter()
+    replica, conn = (None, None)
+    if route is not None and not route.primary_only:
+        replica, conn = _replica_connection(route)
+    pool = _get_pool() if replica is None else None
+    if replica is None:
+        conn = pool.getconn() if pool is not None else _connect()
+    else:
+        route.replica = replica
+        replica.begin_read()
+    metrics.record_acquire(time.perf_counter() - started)
+    conn.wrote = False
+    cur = conn.cursor(cursor_factory=_InstrumentedCursor)
+    broken = False
     try:
         yield cur
         conn.commit()
     except Exception as e:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
         raise e
+    else:
+        if replica is None and route is None and REPLICA_HOSTS and conn.wrote:
+            _record_write_position(conn)
     finally:
         cur.close()
-        conn.close()
+        if replica is not None:
+            replica.end_read()
+            replica.putconn(conn, discard=broken or conn.closed != 0)
+        elif pool is not None:
+            pool.putconn(conn)
+        else:
+            conn.close()
+
+# ----------------- INSTRUMENTATION -----------------
+# Every public backend function is wrapped so metrics_fitness sees its call
+# count, wall time, rows returned, statements issued and connection acquire
+# time (see metrics_fitness for the slow-query log and per-rerun budgets).
+def _instrumented(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        call, token = metrics.start_call(fn.__name__)
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            metrics.finish_call(call, token, started, error=True)
+            raise
+        metrics.finish_call(call, token, started, result)
+        return result
+    return wrapper
+
+def _replica_read(fn):
+    """
+    Run `fn` on a read replica when replicas are configured. If the replica
+    fails mid-call the call is retried on the next one, and finally on the primary.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not REPLICA_HOSTS or _read_route.get() is not None:
+            return fn(*args, **kwargs)
+        route = _ReadRoute()
+        token = _read_route.set(route)
+        try:
+            while True:
+                route.replica = None
+                route.cacheable = True
+                try:
+                    result = fn(*args, **kwargs)
+                except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                    if route.replica is None:
+                        raise
+                    route.replica.mark_down(e)
+                    route.excluded.add(route.replica)
+                    route.primary_only = len(route.excluded) >= len(REPLICA_HOSTS)
+                    continue
+                load = _cache_load.get()
+                if load is not None and not route.cacheable:
+                    load["cacheable"] = False
+                return result
+        finally:
+            _read_route.reset(token)
+    return wrapper
+
+# ----------------- READ CACHE -----------------
+# Read functions are cached per process, keyed by arguments, and tagged with the
+# data they depend on; every write invalidates the tags it touched once its
+# transaction has committed. The TTL bounds staleness from writes made by other
+# processes. A read served by a replica that is behind this process's latest
+# write is returned but not cached (see READ REPLICAS).
+CACHE_ENABLED = True
+CACHE_TTL_SECONDS = 30
+CACHE_MAX_ENTRIES = 2048
+
+_cache = QueryCache(max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS)
+_cache_load = contextvars.ContextVar("fitness_cache_load", default=None)  # {"cacheable"} of the load running
+
+
+def _cached(tags):
+    """tags(result, *args, **kwargs) -> iterable of tags the result depends on."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return fn(*args, **kwargs)
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            load = {"cacheable": True}
+
+            def loader():
+                token = _cache_load.set(load)
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    _cache_load.reset(token)
+
+            return _cache.get_or_load(
+                key,
+                loader,
+                lambda result: tags(result, *args, **kwargs) if load["cacheable"] else None,
+            )
+        return wrapper
+    return decorator
+
+
+def _invalidate(*tags):
+    _cache.invalidate(*tags)
+
+
+def configure_cache(enabled: bool = True, ttl_seconds: float | None = None, max_entries: int | None = None):
+    global CACHE_ENABLED, CACHE_TTL_SECONDS, CACHE_MAX_ENTRIES, _cache
+    CACHE_ENABLED = enabled
+    if ttl_seconds is not None:
+        CACHE_TTL_SECONDS = ttl_seconds
+    if max_entries is not None:
+        CACHE_MAX_ENTRIES = max_entries
+    _cache = QueryCache(max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS)
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def cache_stats():
+    """Hit/miss/eviction counters for the read cache."""
+    return _cache.stats()
+
+# ----------------- WRITE-BEHIND -----------------
+# Optional (configure_write_behind): log_workout, log_workout_with_exercises,
+# add_exercise and set_goal_completed append to a durable local journal
+# (journal_fitness) and return at once. A background thread commits the queue
+# in batches of up to WRITE_BEHIND_BATCH_SIZE entries, one transaction and a
+# few multi-row statements per batch, so a burst of submissions costs the
+# database a handful of commits instead of one connect-insert-commit each.
+# - ids come from blocks reserved ahead of time with nextval(), so queued rows
+#   already carry their final workout/exercise ids; the flusher reserves the
+#   next block when one runs low, so writers only reach for the database when
+#   a block runs out
+# - entries not yet committed are replayed from the journal on startup; the
+#   flush statements are idempotent, so replaying an entry that did commit is harmless
+# - list_workouts, list_workouts_page, list_exercises and list_goals merge the
+#   queued entries, so users see their own entries immediately; aggregates
+#   (insights, leaderboards, goal progress) catch up when the batch commits
+# - deletes and goal evaluation drain the queue first, so an older queued
+#   write can't land after them
+# - with WRITE_BEHIND_MAX_PENDING entries queued, writers block (backpressure)
+#   and give up with RuntimeError after WRITE_BEHIND_ENQUEUE_TIMEOUT
+# Writes are checked before they are queued (the user or workout exists,
+# numbers fit their columns) and raise ValueError like the direct path would
+# raise a database error. The existence checks are skipped while the database
+# is unreachable; an entry it then rejects at flush time is logged to
+# fitness.write_behind and moved to the journal's dead-letter file
+# (WRITE_BEHIND_JOURNAL + ".dead").
+WRITE_BEHIND_ENABLED = False
+WRITE_BEHIND_JOURNAL = "fitness_writes.journal"
+WRITE_BEHIND_FSYNC = True
+WRITE_BEHIND_BATCH_SIZE = 500
+WRITE_BEHIND_LINGER_SECONDS = 0.05     # after the first queued write, wait this long for more
+WRITE_BEHIND_MAX_PENDING = 10_000
+WRITE_BEHIND_ENQUEUE_TIMEOUT = 10.0
+WRITE_BEHIND_ID_BLOCK = 200
+WRITE_BEHIND_ID_LOW_WATER = 100        # reserve the next block when fewer ids than this are left
+WRITE_BEHIND_MAX_BACKOFF_SECONDS = 30.0
+INT4_MIN, INT4_MAX = -2**31, 2**31 - 1  # PostgreSQL INT
+
+wb_logger = logging.getLogger("fitness.write_behind")
+
+RESERVE_IDS_SQL = "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s);"
+WB_USER_EXISTS_SQL = "SELECT 1 FROM users WHERE user_id = %s;"
+WB_WORKOUT_EXISTS_SQL = "SELECT 1 FROM workouts WHERE workout_id = %s AND workout_date = %s;"
+FLUSH_WORKOUTS_SQL = """
+    INSERT INTO workouts (workout_id, user_id, workout_date, duration_minutes)
+    SELECT * FROM unnest(%s::int[], %s::int[], %s::date[], %s::int[])
+    ON CONFLICT (workout_id, workout_date) DO NOTHING;
+"""
+# Exercises whose workout has been deleted meanwhile are skipped (by the join)
+# instead of failing the batch. Returns the (user_id, workout_id) pairs that gained exercises.
+FLUSH_EXERCISES_SQL = """
+    WITH ins AS (
+        INSERT INTO exercises (exercise_id, workout_id, workout_date, user_id, exercise_type_id,
+                               reps, sets, weight_lifted)
+        SELECT v.exercise_id, v.workout_id, w.workout_date, w.user_id, v.exercise_type_id,
+               v.reps, v.sets, v.weight_lifted
+        FROM unnest(%s::int[], %s::int[], %s::date[], exercise_type_ids(%s::text[]), %s::int[], %s::int[],
+                    %s::numeric[])
+             AS v(exercise_id, workout_id, workout_date, exercise_type_id, reps, sets, weight_lifted)
+        JOIN workouts w ON w.workout_id = v.workout_id AND w.workout_date = v.workout_date
+        ON CONFLICT (exercise_id, workout_date) DO NOTHING
+        RETURNING user_id, workout_id
+    )
+    SELECT DISTINCT user_id, workout_id FROM ins;
+"""
+FLUSH_GOALS_SQL = """
+    UPDATE goals g
+    SET is_completed = v.completed
+    FROM unnest(%s::int[], %s::int[], %s::bool[]) AS v(goal_id, user_id, completed)
+    WHERE g.goal_id = v.goal_id AND g.user_id = v.user_id;
+"""
+_WB_SEQUENCES = {"workouts": "workout_id", "exercises": "exercise_id"}
+
+_wb_cond = threading.Condition()
+_wb_queue = deque()         # journal entries not committed yet, oldest first
+_wb_workouts = {}           # user_id -> {workout_id: (workout_id, workout_date, duration_minutes)}
+_wb_exercises = {}          # workout_id -> {exercise_id: (exercise_id, name, reps, sets, weight)}
+_wb_goals = {}              # user_id -> {goal_id: (seq, completed)}
+_wb_journal = None
+_wb_thread = None
+_wb_stop = False
+_wb_urgent = False          # someone is waiting in flush_writes(): skip the linger
+_wb_ids_lock = threading.Lock()
+_wb_ids = {"workouts": deque(), "exercises": deque()}
+_wb_refill = set()          # tables whose id block is running low, for the flusher to top up
+_wb_known_users = set()     # user ids already checked to exist
+_wb_stats = {"queued": 0, "flushed": 0, "batches": 0, "failures": 0, "dead_letters": 0, "blocked": 0,
+             "last_batch_ms": None, "last_error": None}
+
+
+def _wb_index(entry, add: bool = True):
+    """Add `entry` to (or remove it from) the per-user views the list functions merge. Needs _wb_cond."""
+    op, a = entry["op"], entry["args"]
+    if op == "workout":
+        index, key, item = _wb_workouts, a["user_id"], a["workout_id"]
+        value = (a["workout_id"], date.fromisoformat(a["workout_date"]), a["duration_minutes"])
+    elif op == "exercise":
+        index, key, item = _wb_exercises, a["workout_id"], a["exercise_id"]
+        weight = Decimal(str(a["weight_lifted"])) if a["weight_lifted"] is not None else None
+        value = (a["exercise_id"], a["exercise_name"], a["reps"], a["sets"], weight)
+    else:
+        index, key, item = _wb_goals, a["user_id"], a["goal_id"]
+        value = (entry["seq"], a["completed"])
+    if add:
+        index.setdefault(key, {})[item] = value
+        return
+    items = index.get(key, {})
+    # a later update of the same goal stays queued
+    if item in items and (op != "goal_completed" or items[item][0] == entry["seq"]):
+        del items[item]
+        if not items:
+            del index[key]
+
+
+def _wb_reserve_ids(table: str, count: int):
+    with get_connection() as cur:
+        cur.execute(RESERVE_IDS_SQL, (table, _WB_SEQUENCES[table], count))
+        reserved = [r[0] for r in cur.fetchall()]
+    with _wb_ids_lock:
+        _wb_ids[table].extend(reserved)
+
+
+def _wb_take_ids(table: str, count: int):
+    """
+    `count` ids for `table` from the reserved block. Asks the flusher for the
+    next block when it runs low; reserves one here only if it ran out.
+    """
+    while True:
+        with _wb_ids_lock:
+            ids = _wb_ids[table]
+            if len(ids) >= count:
+                taken = [ids.popleft() for _ in range(count)]
+                low = len(ids) < WRITE_BEHIND_ID_LOW_WATER
+                break
+        _wb_reserve_ids(table, max(count, WRITE_BEHIND_ID_BLOCK))
+    if low:
+        with _wb_cond:
+            _wb_refill.add(table)
+            _wb_cond.notify_all()
+    return taken
+
+
+def _wb_check_int(field: str, value, nullable: bool = False):
+    if value is None and nullable:
+        return
+    if isinstance(value, bool) or not isinstance(value, int) or not INT4_MIN <= value <= INT4_MAX:
+        raise ValueError(f"{field} must be a whole number between {INT4_MIN} and {INT4_MAX}.")
+
+
+def _wb_check_exists(sql: str, *key):
+    """False if the row is missing; True if it exists or the database can't be asked right now."""
+    try:
+        with get_connection() as cur:
+            cur.execute(sql, key)
+            return cur.fetchone() is not None
+    except (psycopg2.OperationalError, PoolTimeout) as e:
+        wb_logger.warning("queueing without checking %s: %s", key, str(e).strip())
+        return True
+
+
+def _wb_check_workout(user_id: int, workout_date: date, duration_minutes: int, exercises):
+    _wb_check_int("user_id", user_id)
+    _wb_check_int("duration_minutes", duration_minutes)
+    if not isinstance(workout_date, date):
+        raise ValueError("workout_date must be a date.")
+    for row in exercises:
+        _wb_check_exercise_values(*row)
+    if user_id not in _wb_known_users:
+        if not _wb_check_exists(WB_USER_EXISTS_SQL, user_id):
+            raise ValueError(f"User {user_id} does not exist.")
+        _wb_known_users.add(user_id)
+
+
+def _wb_check_exercise_values(exercise_name, reps, sets, weight_lifted):
+    name = " ".join(exercise_name.split()) if isinstance(exercise_name, str) else ""
+    if not 0 < len(name) <= 255:
+        raise ValueError("exercise_name must be 1 to 255 characters.")
+    _wb_check_int("reps", reps, nullable=True)
+    _wb_check_int("sets", sets, nullable=True)
+    if weight_lifted is not None and (isinstance(weight_lifted, bool) or not isinstance(weight_lifted, (int, float))
+                                      or not math.isfinite(weight_lifted)):
+        raise ValueError("weight_lifted must be a finite number.")
+
+
+def _wb_check_exercise(workout_id: int, workout_date: date, *values):
+    _wb_check_int("workout_id", workout_id)
+    if not isinstance(workout_date, date):
+        raise ValueError("workout_date must be a date.")
+    _wb_check_exercise_values(*values)
+    with _wb_cond:
+        if any(queued.get(workout_id, (None, None))[1] == workout_date for queued in _wb_workouts.values()):
+            return
+    if not _wb_check_exists(WB_WORKOUT_EXISTS_SQL, workout_id, workout_date):
+        raise ValueError(f"Workout {workout_id} on {workout_date} does not exist.")
+
+
+def _wb_enqueue(*writes):
+    """Journal and queue (op, args) writes, blocking while the queue is full."""
+    with _wb_cond:
+        deadline = time.monotonic() + WRITE_BEHIND_ENQUEUE_TIMEOUT
+        while len(_wb_queue) >= WRITE_BEHIND_MAX_PENDING:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise RuntimeError("Too many writes are waiting for the database; try again shortly.")
+            _wb_stats["blocked"] += 1
+            _wb_cond.wait(remaining)
+        journal = _wb_journal
+        for op, args in writes:
+            # appended in queue order, so an ack of seq N covers exactly the entries queued before it
+            entry = {"seq": journal.append(op, args, sync=False), "op": op, "args": args}
+            _wb_queue.append(entry)
+            _wb_index(entry)
+        _wb_stats["queued"] += len(writes)
+        _wb_cond.notify_all()
+    # fsync outside _wb_cond: other writers queue meanwhile, and one fsync covers them all
+    journal.sync(entry["seq"])
+
+
+def _wb_exercise(exercise_id: int, workout_id: int, workout_date: date, exercise_name: str, reps, sets,
+                 weight_lifted):
+    return ("exercise", {"exercise_id": exercise_id, "workout_id": workout_id,
+                         "workout_date": workout_date.isoformat(), "exercise_name": exercise_name,
+                         "reps": reps, "sets": sets, "weight_lifted": weight_lifted})
+
+
+def _wb_log_workout(user_id: int, workout_date: date, duration_minutes: int, exercises):
+    _wb_check_workout(user_id, workout_date, duration_minutes, exercises)
+    workout_id = _wb_take_ids("workouts", 1)[0]
+    exercise_ids = _wb_take_ids("exercises", len(exercises)) if exercises else []
+    _wb_enqueue(
+        ("workout", {"workout_id": workout_id, "user_id": user_id, "workout_date": workout_date.isoformat(),
+                     "duration_minutes": duration_minutes}),
+        *[_wb_exercise(eid, workout_id, workout_date, *row) for eid, row in zip(exercise_ids, exercises)],
+    )
+    _invalidate(("workouts", user_id), ("exercises", workout_id))
+    return workout_id, exercise_ids
+
+
+def _wb_apply(batch):
+    """Commit `batch` in one transaction and invalidate what it touched."""
+    workouts = [e["args"] for e in batch if e["op"] == "workout"]
+    exercises = [e["args"] for e in batch if e["op"] == "exercise"]
+    goals = {e["args"]["goal_id"]: e["args"] for e in batch if e["op"] == "goal_completed"}  # latest wins
+    tags = []
+    with get_connection() as cur:
+        if workouts:
+            cur.execute(FLUSH_WORKOUTS_SQL, (
+                [a["workout_id"] for a in workouts], [a["user_id"] for a in workouts],
+                [date.fromisoformat(a["workout_date"]) for a in workouts],
+                [a["duration_minutes"] for a in workouts],
+            ))
+            for a in workouts:
+                tags += [("workouts", a["user_id"]), ("insights", a["user_id"])]
+        if exercises:
+            cur.execute(FLUSH_EXERCISES_SQL, (
+                [a["exercise_id"] for a in exercises], [a["workout_id"] for a in exercises],
+                [date.fromisoformat(a["workout_date"]) for a in exercises],
+                *([a[k] for a in exercises] for k in ("exercise_name", "reps", "sets", "weight_lifted")),
+            ))
+            for owner_id, workout_id in cur.fetchall():
+                tags += [("exercises", workout_id), ("insights", owner_id)]
+        if goals:
+            cur.execute(FLUSH_GOALS_SQL, tuple(
+                [a[k] for a in goals.values()] for k in ("goal_id", "user_id", "completed")
+            ))
+            tags += [("goals", a["user_id"]) for a in goals.values()]
+    _invalidate(*set(tags))
+
+
+def _wb_dead_letter(entry, error: str):
+    _wb_journal.dead_letter(entry, error)
+    entry["dead"] = True  # a retry of the batch (after a connection error) skips it
+    _wb_stats["dead_letters"] += 1
+    wb_logger.error("queued %s %s rejected (%s); moved to %s", entry["op"], entry["args"], error,
+                    _wb_journal.dead_letter_path)
+
+
+def _wb_flush(batch):
+    batch = [entry for entry in batch if not entry.get("dead")]
+    try:
+        _wb_apply(batch)
+    except (psycopg2.IntegrityError, psycopg2.DataError):
+        # one bad entry (e.g. a workout for a user deleted meanwhile) must not wedge the queue;
+        # its caller was told it was saved, so it is set aside rather than dropped
+        rejected_workouts = set()
+        for entry in batch:
+            if entry["op"] == "exercise" and entry["args"]["workout_id"] in rejected_workouts:
+                _wb_dead_letter(entry, "its workout was rejected")
+                continue
+            try:
+                _wb_apply([entry])
+            except (psycopg2.IntegrityError, psycopg2.DataError) as e:
+                if entry["op"] == "workout":
+                    rejected_workouts.add(entry["args"]["workout_id"])
+                _wb_dead_letter(entry, str(e).strip())
+
+
+def _wb_run():
+    global _wb_urgent
+    bind_write_session(_wb_write_session)  # every session waits for flushed writes on replicas
+    backoff = 0.0
+    while True:
+        with _wb_cond:
+            while not _wb_queue and not _wb_stop and not _wb_refill:
+                _wb_cond.wait()
+            refill = set(_wb_refill)
+            _wb_refill.clear()
+        for table in refill:
+            try:
+                _wb_reserve_ids(table, WRITE_BEHIND_ID_BLOCK)
+            except Exception as e:  # writers reserve for themselves if the block runs out
+                wb_logger.warning("could not reserve %s ids: %s", table, str(e).strip())
+        with _wb_cond:
+            if not _wb_queue and not _wb_stop:
+                continue
+            if not _wb_queue or (_wb_stop and backoff):
+                return
+            # every enqueue notifies: keep lingering until the batch fills or the time is up
+            linger_until = time.monotonic() + WRITE_BEHIND_LINGER_SECONDS
+            while len(_wb_queue) < WRITE_BEHIND_BATCH_SIZE and not _wb_urgent and not _wb_stop:
+                remaining = linger_until - time.monotonic()
+                if remaining <= 0:
+                    break
+                _wb_cond.wait(remaining)
+            batch = list(itertools.islice(_wb_queue, WRITE_BEHIND_BATCH_SIZE))
+        started = time.perf_counter()
+        try:
+            _wb_flush(batch)
+        except Exception as e:
+            _wb_stats["failures"] += 1
+            _wb_stats["last_error"] = str(e).strip()
+            wb_logger.warning("flush of %d queued writes failed: %s", len(batch), _wb_stats["last_error"])
+            backoff = min(max(backoff * 2, 0.5), WRITE_BEHIND_MAX_BACKOFF_SECONDS)
+            with _wb_cond:
+                _wb_cond.wait(backoff)
+            continue
+        backoff = 0.0
+        with _wb_cond:
+            if _wb_journal is None:  # shut down while this batch was in flight
+                return
+            for _ in batch:
+                _wb_index(_wb_queue.popleft(), add=False)
+            _wb_journal.ack(batch[-1]["seq"], drained=not _wb_queue)
+            _wb_urgent = _wb_urgent and bool(_wb_queue)
+            _wb_stats["flushed"] += len(batch)
+            _wb_stats["batches"] += 1
+            _wb_stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 3)
+            _wb_cond.notify_all()
+
+
+def flush_writes(timeout: float | None = None):
+    """Wait until every queued write is committed. Returns False if `timeout` ran out first."""
+    global _wb_urgent
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with _wb_cond:
+        while _wb_queue:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            _wb_urgent = True
+            _wb_cond.notify_all()
+            _wb_cond.wait(remaining)
+    return True
+
+
+def _wb_barrier():
+    if _wb_queue and not flush_writes(WRITE_BEHIND_ENQUEUE_TIMEOUT):
+        raise RuntimeError("Queued writes could not be saved yet; try again shortly.")
+
+
+def _wb_shutdown(timeout: float = 10.0):
+    """Drain the queue (up to `timeout`) and stop the flusher; anything left stays in the journal."""
+    global _wb_stop, _wb_thread, _wb_journal
+    if _wb_thread is None:
+        return
+    flush_writes(timeout)
+    with _wb_cond:
+        _wb_stop = True
+        _wb_cond.notify_all()
+    _wb_thread.join(timeout)
+    _wb_thread = None
+    with _wb_cond:
+        _wb_journal.close()
+        _wb_journal = None
+        _wb_queue.clear()
+        _wb_workouts.clear()
+        _wb_exercises.clear()
+        _wb_goals.clear()
+        _wb_refill.clear()
+        _wb_known_users.clear()
+
+
+def configure_write_behind(enabled: bool = True, journal_path: str | None = None, fsync: bool | None = None,
+                           batch_size: int | None = None, max_pending: int | None = None):
+    """
+    Turn write-behind on (replaying whatever the journal still holds) or off
+    (after draining the queue).
+    """
+    global WRITE_BEHIND_ENABLED, WRITE_BEHIND_JOURNAL, WRITE_BEHIND_FSYNC, WRITE_BEHIND_BATCH_SIZE
+    global WRITE_BEHIND_MAX_PENDING, _wb_journal, _wb_thread, _wb_stop, _wb_urgent
+    WRITE_BEHIND_ENABLED = False
+    _wb_shutdown()
+    if journal_path is not None:
+        WRITE_BEHIND_JOURNAL = journal_path
+    if fsync is not None:
+        WRITE_BEHIND_FSYNC = fsync
+    if batch_size is not None:
+        WRITE_BEHIND_BATCH_SIZE = batch_size
+    if max_pending is not None:
+        WRITE_BEHIND_MAX_PENDING = max_pending
+    if not enabled:
+        return
+    with _wb_cond:
+        _wb_journal = WriteJournal(WRITE_BEHIND_JOURNAL, fsync=WRITE_BEHIND_FSYNC)
+        for entry in _wb_journal.pending():
+            _wb_queue.append(entry)
+            _wb_index(entry)
+        if _wb_queue:
+            wb_logger.info("replaying %d queued writes from %s", len(_wb_queue), WRITE_BEHIND_JOURNAL)
+        _wb_stop = False
+        _wb_urgent = False
+        _wb_refill.update(_wb_ids)  # have the first blocks ready before the first write
+    _wb_thread = threading.Thread(target=_wb_run, name="fitness-write-behind", daemon=True)
+    _wb_thread.start()
+    WRITE_BEHIND_ENABLED = True
+
+
+def write_behind_stats():
+    """Queue depth and flusher counters."""
+    with _wb_cond:
+        return {"enabled": WRITE_BEHIND_ENABLED, "pending": len(_wb_queue), "journal": WRITE_BEHIND_JOURNAL,
+                "dead_letter_file": WRITE_BEHIND_JOURNAL + ".dead", **_wb_stats}
+
+
+def _wb_merge(rows, pending, key, reverse: bool = False):
+    """DB rows plus queued rows not in them (by id, in column 0), re-sorted by `key`."""
+    if not pending:
+        return rows
+    seen = {r[0] for r in rows}
+    return sorted(list(rows) + [p for p in pending if p[0] not in seen], key=key, reverse=reverse)
+
+
+def _wb_merge_goals(rows, pending):
+    """list_goals rows with queued is_completed updates applied, in the query's order."""
+    if not pending:
+        return rows
+    rows = [r[:4] + (pending[r[0]][1],) + r[5:] if r[0] in pending else r for r in rows]
+    # same order as the query: is_completed (false, true, null), then end_date
+    return sorted(rows, key=lambda r: (2 if r[4] is None else int(r[4]), r[3]))
+
+
+def _wb_pending(index, key):
+    """Copy of index[key]. Taken before the DB read, so a flush in between can't hide an entry."""
+    if not index:
+        return {}
+    with _wb_cond:
+        return dict(index.get(key, {}))
+
+
+atexit.register(_wb_shutdown)
+
+# ----------------- STREAMING -----------------
+_cursor_ids = itertools.count(1)
+
+def _iter_named(name: str, sql: str, params, batch_size: int):
+    """
+    Run `sql` on a named (server-side) cursor and yield rows batch_size at a time.
+    metrics_fitness sees each batch as one call of `name` with one query (the
+    first batch also covers the checkout); time the caller spends between
+    batches is not counted.
+    """
+    in_call = True
+    call, token = metrics.start_call(name)
+    started = fetch_started = time.perf_counter()
+    try:
+        with get_connection() as cur:
+            named = cur.connection.cursor(name=f"fitness_stream_{next(_cursor_ids)}")
+            try:
+                named.execute(sql, params)
+                while True:
+                    if not in_call:
+                        in_call = True
+                        call, token = metrics.start_call(name)
+                        started = fetch_started = time.perf_counter()
+                    rows = named.fetchmany(batch_size)
+                    metrics.record_query(sql, params, time.perf_counter() - fetch_started, len(rows))
+                    in_call = False
+                    metrics.finish_call(call, token, started, rows)
+                    yield from rows
+                    if len(rows) < batch_size:
+                        return
+            finally:
+                named.close()
+    except Exception:
+        if in_call:
+            metrics.finish_call(call, token, started, error=True)
+        raise
 
 # ----------------- CRUD: USERS -----------------
+# Queries live in module-level constants so migrate_fitness.check_plans() can
+# EXPLAIN exactly the SQL the app runs and async_backend_fitness can share it.
+GET_USER_BY_EMAIL_SQL = "SELECT user_id, name, email, weight FROM users WHERE email = %s;"
+GET_USER_BY_ID_SQL = "SELECT user_id, name, email, weight FROM users WHERE user_id = %s;"
+LIST_USERS_SQL = "SELECT user_id, name, email, weight FROM users ORDER BY name, user_id;"
+LIST_USERS_FIRST_PAGE_SQL = """
+    SELECT user_id, name, email, weight FROM users
+    ORDER BY name, user_id
+    LIMIT %s;
+"""
+LIST_USERS_PAGE_SQL = """
+    SELECT user_id, name, email, weight FROM users
+    WHERE (name, user_id) > (%s, %s)
+    ORDER BY name, user_id
+    LIMIT %s;
+"""
+# Typeahead search over name and email (migrations/0010), ranked name prefix,
+# email prefix, then substring matches by name similarity. Not registered as
+# prepared statements: the LIKE index conditions need the pattern at plan time.
+SEARCH_USERS_MIN_SUBSTRING = 3
+SEARCH_USERS_SQL = """
+    SELECT user_id, name, email, weight
+    FROM users
+    WHERE lower(name) LIKE %(pattern)s OR lower(email) LIKE %(pattern)s
+    ORDER BY CASE WHEN lower(name) LIKE %(prefix)s THEN 0
+                  WHEN lower(email) LIKE %(prefix)s THEN 1
+                  ELSE 2 END,
+             similarity(lower(name), %(query)s) DESC, name, user_id
+    LIMIT %(limit)s;
+"""
+# Too short for trigrams: prefix matches only, each side an ordered index range read up to the limit.
+SEARCH_USERS_PREFIX_SQL = """
+    SELECT user_id, name, email, weight
+    FROM (
+        SELECT DISTINCT ON (user_id) rank, user_id, name, email, weight
+        FROM (
+            (SELECT 0 AS rank, user_id, name, email, weight FROM users
+             WHERE lower(name) LIKE %(prefix)s ORDER BY lower(name) LIMIT %(limit)s)
+            UNION ALL
+            (SELECT 1, user_id, name, email, weight FROM users
+             WHERE lower(email) LIKE %(prefix)s ORDER BY lower(email) LIMIT %(limit)s)
+        ) matches
+        ORDER BY user_id, rank
+    ) best
+    ORDER BY rank, name, user_id
+    LIMIT %(limit)s;
+"""
+CREATE_USER_SQL = """INSERT INTO users (name, email, weight)
+               VALUES (%s, %s, %s) RETURNING user_id;"""
+UPDATE_USER_SQL = """UPDATE users
+               SET name = %s, email = %s, weight = %s
+               WHERE user_id = %s;"""
+
+@_instrumented
 def create_user(name: str, email: str, weight: float | None):
     with get_connection() as cur:
-        cur.execute(
-            """INSERT INTO users (name, email, weight)
-               VALUES (%s, %s, %s) RETURNING user_id;""",
-            (name, email, weight),
-        )
-        return cur.fetchone()[0]
+        cur.execute(CREATE_USER_SQL, (name, email, weight))
+        user_id = cur.fetchone()[0]
+    _invalidate(("users",))
+    return user_id
 
+@_instrumented
+@_cached(lambda row, email: [("users",)] + ([("user", row[0])] if row else []))
+@_replica_read
 def get_user_by_email(email: str):
     with get_connection() as cur:
-        cur.execute(
-            "SELECT user_id, name, email, weight FROM users WHERE email = %s;",
-            (email,),
-        )
+        cur.execute(GET_USER_BY_EMAIL_SQL, (email,))
         return cur.fetchone()
 
+@_instrumented
+@_cached(lambda row, user_id: [("user", user_id)])
+@_replica_read
 def get_user_by_id(user_id: int):
     with get_connection() as cur:
-        cur.execute(
-            "SELECT user_id, name, email, weight FROM users WHERE user_id = %s;",
-            (user_id,),
-        )
+        cur.execute(GET_USER_BY_ID_SQL, (user_id,))
         return cur.fetchone()
 
+@_instrumented
 def update_user(user_id: int, name: str, email: str, weight: float | None):
     with get_connection() as cur:
-        cur.execute(
-            """UPDATE users
-               SET name = %s, email = %s, weight = %s
-               WHERE user_id = %s;""",
-            (name, email, weight, user_id),
-        )
+        cur.execute(UPDATE_USER_SQL, (name, email, weight, user_id))
+    _invalidate(("user", user_id), ("users",))
 
+@_instrumented
+@_cached(lambda rows: [("users",)])
+@_replica_read
 def list_users():
     with get_connection() as cur:
-        cur.execute("SELECT user_id, name, email, weight FROM users ORDER BY name;")
+        cur.execute(LIST_USERS_SQL)
         return cur.fetchall()
 
+@_instrumented
+@_cached(lambda page, after=None, limit=50: [("users",)])
+@_replica_read
+def list_users_page(after: tuple | None = None, limit: int = 50):
+    """
+    One page of users ordered by (name, user_id).
+    `after` is the (name, user_id) of the last row of the previous page.
+    Returns (rows, next_after); next_after is None on the last page.
+    """
+    with get_connection() as cur:
+        if after is None:
+            cur.execute(LIST_USERS_FIRST_PAGE_SQL, (limit + 1,))
+        else:
+            cur.execute(LIST_USERS_PAGE_SQL, (after[0], after[1], limit + 1))
+        rows = cur.fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1][1], rows[-1][0])
+    return rows, None
+
+def search_users_sql(query: str):
+    return SEARCH_USERS_SQL if len(query.strip()) >= SEARCH_USERS_MIN_SUBSTRING else SEARCH_USERS_PREFIX_SQL
+
+def _like_escape(text: str):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _search_params(query: str, limit: int):
+    query = query.strip().lower()
+    return {"query": query, "prefix": _like_escape(query) + "%", "pattern": "%" + _like_escape(query) + "%",
+            "limit": limit}
+
+@_instrumented
+@_cached(lambda rows, query, limit=20: [("users",)])
+@_replica_read
+def search_users(query: str, limit: int = 20):
+    """
+    Up to `limit` users whose name or email contains `query` (case-insensitive),
+    best matches first. Queries shorter than SEARCH_USERS_MIN_SUBSTRING only
+    match prefixes. Index-backed, so the cost follows the matches, not the user count.
+    """
+    if not query.strip():
+        return []
+    with get_connection() as cur:
+        cur.execute(search_users_sql(query), _search_params(query, limit))
+        return cur.fetchall()
+
+def iter_users(batch_size: int = 2000):
+    """Stream every user (ordered by name) through a server-side cursor."""
+    yield from _iter_named("iter_users", LIST_USERS_SQL, None, batch_size)
+
 # ----------------- CRUD: FRIENDS -----------------
+# Reads go through friend_edges (both directions of every friendship, kept by
+# triggers on friends — see migrations/0005): one-hop lookups are a single
+# primary-key range scan whichever side of the canonical row the user is on.
+LIST_FRIENDS_SQL = """
+    SELECT u.user_id, u.name, u.email, u.weight
+    FROM friend_edges f
+    JOIN users u ON u.user_id = f.friend_id
+    WHERE f.user_id = %s
+    ORDER BY u.name;
+"""
+# Friends-of-friends ranked by how many friends they share with the user.
+# Each friend's edges are one index-only range scan; the aggregate is a hash
+# over sum(degree of my friends) rows and only the top `limit` survive the sort.
+SUGGEST_FRIENDS_SQL = """
+    WITH candidates AS (
+        SELECT fof.friend_id AS uid, COUNT(*) AS mutual
+        FROM friend_edges mine
+        JOIN friend_edges fof ON fof.user_id = mine.friend_id
+        WHERE mine.user_id = %s
+          AND fof.friend_id <> %s
+          AND NOT EXISTS (
+              SELECT 1 FROM friend_edges x WHERE x.user_id = %s AND x.friend_id = fof.friend_id
+          )
+        GROUP BY fof.friend_id
+        ORDER BY mutual DESC, fof.friend_id
+        LIMIT %s
+    )
+    SELECT u.user_id, u.name, u.email, c.mutual
+    FROM candidates c
+    JOIN users u ON u.user_id = c.uid
+    ORDER BY c.mutual DESC, u.name;
+"""
+# Our schema has (user_id, friend_id) unique; we always insert in canonical order (a,b)
+ADD_FRIENDSHIP_SQL = """INSERT INTO friends (user_id, friend_id)
+               VALUES (%s, %s)
+               ON CONFLICT (user_id, friend_id) DO NOTHING;"""
+REMOVE_FRIENDSHIP_SQL = "DELETE FROM friends WHERE user_id = %s AND friend_id = %s;"
+
+@_instrumented
 def add_friendship(user_id: int, friend_id: int):
     if user_id == friend_id:
         raise ValueError("You cannot add yourself as a friend.")
     with get_connection() as cur:
         # store single row per friendship in canonical order (smaller id first)
         a, b = sorted([user_id, friend_id])
-        # Use INSERT … ON CONFLICT with a unique constraint alternative
-        # Our schema has (user_id, friend_id) unique; ensure we always insert (a,b)
-        cur.execute(
-            """INSERT INTO friends (user_id, friend_id)
-               VALUES (%s, %s)
-               ON CONFLICT (user_id, friend_id) DO NOTHING;""",
-            (a, b),
-        )
+        cur.execute(ADD_FRIENDSHIP_SQL, (a, b))
+    _invalidate(("friends", user_id), ("friends", friend_id))
 
+@_instrumented
 def remove_friendship(user_id: int, friend_id: int):
     a, b = sorted([user_id, friend_id])
     with get_connection() as cur:
-        cur.execute(
-            "DELETE FROM friends WHERE user_id = %s AND friend_id = %s;",
-            (a, b),
-        )
+        cur.execute(REMOVE_FRIENDSHIP_SQL, (a, b))
+    _invalidate(("friends", user_id), ("friends", friend_id))
 
+@_instrumented
+@_cached(lambda rows, user_id: [("friends", user_id)] + [("user", r[0]) for r in rows])
+@_replica_read
 def list_friends(user_id: int):
     # Return the other user in each friendship where current user participates
     with get_connection() as cur:
-        cur.execute(
-            """
-            SELECT u.user_id, u.name, u.email, u.weight
-            FROM friends f
-            JOIN users u ON (u.user_id = CASE WHEN f.user_id = %s THEN f.friend_id ELSE f.user_id END)
-            WHERE f.user_id = %s OR f.friend_id = %s
-            ORDER BY u.name;
-            """,
-            (user_id, user_id, user_id),
-        )
+        cur.execute(LIST_FRIENDS_SQL, (user_id,))
+        return cur.fetchall()
+
+# A new friend-of-friend only invalidates the mutual friend's tag, not ours, so
+# suggestions may lag by up to CACHE_TTL_SECONDS; that's fine for this page.
+@_instrumented
+@_cached(lambda rows, user_id, limit=10: [("friends", user_id)] + [("friends", r[0]) for r in rows])
+@_replica_read
+def suggest_friends(user_id: int, limit: int = 10):
+    """
+    "People you may know": up to `limit` friends-of-friends who aren't already
+    friends, as (user_id, name, email, mutual_friends), most mutual friends first.
+    """
+    with get_connection() as cur:
+        cur.execute(SUGGEST_FRIENDS_SQL, (user_id, user_id, user_id, limit))
         return cur.fetchall()
 
 # ----------------- CRUD: WORKOUTS -----------------
+LIST_WORKOUTS_RANGE_SQL = """
+    SELECT workout_id, workout_date, duration_minutes
+    FROM workouts
+    WHERE user_id = %s AND workout_date BETWEEN %s AND %s
+    ORDER BY workout_date DESC, workout_id DESC;
+"""
+LIST_WORKOUTS_SQL = """
+    SELECT workout_id, workout_date, duration_minutes
+    FROM workouts
+    WHERE user_id = %s
+    ORDER BY workout_date DESC, workout_id DESC;
+"""
+LIST_WORKOUTS_FIRST_PAGE_SQL = """
+    SELECT workout_id, workout_date, duration_minutes
+    FROM workouts
+    WHERE user_id = %s
+    ORDER BY workout_date DESC, workout_id DESC
+    LIMIT %s;
+"""
+LIST_WORKOUTS_PAGE_SQL = """
+    SELECT workout_id, workout_date, duration_minutes
+    FROM workouts
+    WHERE user_id = %s AND (workout_date, workout_id) < (%s, %s)
+    ORDER BY workout_date DESC, workout_id DESC
+    LIMIT %s;
+"""
+ITER_USER_WORKOUTS_SQL = """
+    SELECT workout_id, user_id, workout_date, duration_minutes
+    FROM workouts
+    WHERE user_id = %s
+    ORDER BY workout_date, workout_id;
+"""
+ITER_ALL_WORKOUTS_SQL = """
+    SELECT workout_id, user_id, workout_date, duration_minutes
+    FROM workouts
+    ORDER BY workout_id;
+"""
+LOG_WORKOUT_SQL = """INSERT INTO workouts (user_id, workout_date, duration_minutes)
+               VALUES (%s, %s, %s) RETURNING workout_id;"""
+DELETE_WORKOUT_SQL = "DELETE FROM workouts WHERE workout_id = %s AND workout_date = %s AND user_id = %s;"
+# One round trip: the workout row plus all exercises as a single multi-row insert
+# fed from parallel arrays (see exercise_columns).
+LOG_WORKOUT_WITH_EXERCISES_SQL = """
+    WITH w AS (
+        INSERT INTO workouts (user_id, workout_date, duration_minutes)
+        VALUES (%s, %s, %s) RETURNING workout_id, workout_date, user_id
+    ), e AS (
+        INSERT INTO exercises (workout_id, workout_date, user_id, exercise_type_id, reps, sets, weight_lifted)
+        SELECT w.workout_id, w.workout_date, w.user_id, v.exercise_type_id, v.reps, v.sets, v.weight_lifted
+        FROM w, unnest(exercise_type_ids(%s::text[]), %s::int[], %s::int[], %s::numeric[]) WITH ORDINALITY
+             AS v(exercise_type_id, reps, sets, weight_lifted, ord)
+        ORDER BY v.ord
+        RETURNING exercise_id
+    )
+    SELECT (SELECT workout_id FROM w), ARRAY(SELECT exercise_id FROM e ORDER BY exercise_id);
+"""
+
+def exercise_columns(rows):
+    """[(name, reps, sets, weight), ...] -> ([names], [reps], [sets], [weights])."""
+    return tuple(list(col) for col in zip(*rows)) if rows else ([], [], [], [])
+
+@_instrumented
 def log_workout(user_id: int, workout_date: date, duration_minutes: int):
+    if WRITE_BEHIND_ENABLED:
+        return _wb_log_workout(user_id, workout_date, duration_minutes, [])[0]
     with get_connection() as cur:
-        cur.execute(
-            """INSERT INTO workouts (user_id, workout_date, duration_minutes)
-               VALUES (%s, %s, %s) RETURNING workout_id;""",
-            (user_id, workout_date, duration_minutes),
-        )
-        return cur.fetchone()[0]
+        cur.execute(LOG_WORKOUT_SQL, (user_id, workout_date, duration_minutes))
+        workout_id = cur.fetchone()[0]
+    _invalidate(("workouts", user_id), ("insights", user_id))
+    return workout_id
 
-def delete_workout(workout_id: int, user_id: int):
+@_instrumented
+def log_workout_with_exercises(user_id: int, workout_date: date, duration_minutes: int, exercises):
+    """
+    Record a workout and all of its exercises in one statement / transaction.
+    exercises: iterable of (exercise_name, reps, sets, weight_lifted).
+    Returns (workout_id, [exercise_id, ...]) with exercise ids in input order.
+    """
+    rows = list(exercises)
+    if WRITE_BEHIND_ENABLED:
+        return _wb_log_workout(user_id, workout_date, duration_minutes, rows)
     with get_connection() as cur:
         cur.execute(
-            "DELETE FROM workouts WHERE workout_id = %s AND user_id = %s;",
-            (workout_id, user_id),
+            LOG_WORKOUT_WITH_EXERCISES_SQL,
+            (user_id, workout_date, duration_minutes, *exercise_columns(rows)),
         )
+        workout_id, exercise_ids = cur.fetchone()
+    _invalidate(("workouts", user_id), ("insights", user_id), ("exercises", workout_id))
+    return workout_id, list(exercise_ids)
+
+@_instrumented
+def delete_workout(workout_id: int, workout_date: date, user_id: int):
+    _wb_barrier()
+    with get_connection() as cur:
+        cur.execute(DELETE_WORKOUT_SQL, (workout_id, workout_date, user_id))
+    _invalidate(("workouts", user_id), ("insights", user_id), ("exercises", workout_id))
+
+@_instrumented
+@_cached(lambda page, user_id, after=None, limit=50: [("workouts", user_id)])
+@_replica_read
+def list_workouts_page(user_id: int, after: tuple | None = None, limit: int = 50):
+    """
+    One page of a user's workouts, newest first, ordered by (workout_date, workout_id).
+    `after` is the (workout_date, workout_id) of the last row of the previous page.
+    Returns (rows, next_after); next_after is None on the last page.
+    """
+    pending = list(_wb_pending(_wb_workouts, user_id).values())
+    with get_connection() as cur:
+        if after is None:
+            cur.execute(LIST_WORKOUTS_FIRST_PAGE_SQL, (user_id, limit + 1))
+        else:
+            cur.execute(LIST_WORKOUTS_PAGE_SQL, (user_id, after[0], after[1], limit + 1))
+        rows = cur.fetchall()
+    if after is not None:
+        pending = [p for p in pending if (p[1], p[0]) < tuple(after)]
+    rows = _wb_merge(rows, pending, key=lambda r: (r[1], r[0]), reverse=True)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1][1], rows[-1][0])
+    return rows, None
+
+def iter_workouts(user_id: int | None = None, batch_size: int = 2000):
+    """
+    Stream workouts (one user's, or everyone's) through a server-side cursor,
+    yielding (workout_id, user_id, workout_date, duration_minutes). The
+    connection stays checked out until the generator is exhausted or closed.
+    """
+    if user_id is None:
+        yield from _iter_named("iter_workouts", ITER_ALL_WORKOUTS_SQL, None, batch_size)
+    else:
+        yield from _iter_named("iter_workouts", ITER_USER_WORKOUTS_SQL, (user_id,), batch_size)
 
+@_instrumented
+@_cached(lambda rows, user_id, start_date=None, end_date=None: [("workouts", user_id)])
+@_replica_read
 def list_workouts(user_id: int, start_date: date | None = None, end_date: date | None = None):
+    pending = list(_wb_pending(_wb_workouts, user_id).values())
     with get_connection() as cur:
         if start_date and end_date:
-            cur.execute(
-                """SELECT workout_id, workout_date, duration_minutes
-                   FROM workouts
-                   WHERE user_id = %s AND workout_date BETWEEN %s AND %s
-                   ORDER BY workout_date DESC;""",
-                (user_id, start_date, end_date),
-            )
+            cur.execute(LIST_WORKOUTS_RANGE_SQL, (user_id, start_date, end_date))
+            pending = [p for p in pending if start_date <= p[1] <= end_date]
         else:
-            cur.execute(
-                """SELECT workout_id, workout_date, duration_minutes
-                   FROM workouts
-                   WHERE user_id = %s
-                   ORDER BY workout_date DESC;""",
-                (user_id,),
-            )
-        return cur.fetchall()
+            cur.execute(LIST_WORKOUTS_SQL, (user_id,))
+        rows = cur.fetchall()
+    return _wb_merge(rows, pending, key=lambda r: (r[1], r[0]), reverse=True)
 
 # ----------------- CRUD: EXERCISES -----------------
-def add_exercise(workout_id: int, exercise_name: str, reps: int | None, sets: int | None, weight_lifted: float | None):
+# Names are interned in exercise_catalog (migrations/0011); exercises store the id.
+# Workouts and exercises are partitioned by workout_date (migrations/0009), so
+# every by-id lookup also takes the workout's date and reads one partition.
+LIST_EXERCISES_SQL = """
+    SELECT e.exercise_id, c.display_name, e.reps, e.sets, e.weight_lifted
+    FROM exercises e
+    JOIN exercise_catalog c ON c.exercise_type_id = e.exercise_type_id
+    WHERE e.workout_id = %s AND e.workout_date = %s
+    ORDER BY e.exercise_id;
+"""
+# Both exercise writes also return the owning user so the caller can invalidate its caches.
+# workout_date and user_id are copied from the workout; an unknown workout_id
+# leaves them NULL and fails the insert like the foreign key would.
+ADD_EXERCISE_SQL = """
+    INSERT INTO exercises (workout_id, workout_date, user_id, exercise_type_id, reps, sets, weight_lifted)
+    SELECT w.workout_id, w.workout_date, w.user_id, exercise_type_id(%s), %s, %s, %s
+    FROM (SELECT %s::int AS workout_id, %s::date AS workout_date) v
+    LEFT JOIN workouts w ON w.workout_id = v.workout_id AND w.workout_date = v.workout_date
+    RETURNING exercise_id, user_id;
+"""
+DELETE_EXERCISE_SQL = """
+    DELETE FROM exercises WHERE exercise_id = %s AND workout_id = %s AND workout_date = %s RETURNING user_id;
+"""
+
+@_instrumented
+def add_exercise(workout_id: int, workout_date: date, exercise_name: str, reps: int | None, sets: int | None,
+                 weight_lifted: float | None):
+    if WRITE_BEHIND_ENABLED:
+        _wb_check_exercise(workout_id, workout_date, exercise_name, reps, sets, weight_lifted)
+        exercise_id = _wb_take_ids("exercises", 1)[0]
+        _wb_enqueue(_wb_exercise(exercise_id, workout_id, workout_date, exercise_name, reps, sets, weight_lifted))
+        _invalidate(("exercises", workout_id))
+        return exercise_id
     with get_connection() as cur:
-        cur.execute(
-            """INSERT INTO exercises (workout_id, exercise_name, reps, sets, weight_lifted)
-               VALUES (%s, %s, %s, %s, %s) RETURNING exercise_id;""",
-            (workout_id, exercise_name, reps, sets, weight_lifted),
-        )
-        return cur.fetchone()[0]
+        cur.execute(ADD_EXERCISE_SQL, (exercise_name, reps, sets, weight_lifted, workout_id, workout_date))
+        exercise_id, owner_id = cur.fetchone()
+    _invalidate(("exercises", workout_id), ("insights", owner_id))
+    return exercise_id
 
-def list_exercises(workout_id: int):
+@_instrumented
+@_cached(lambda rows, workout_id, workout_date: [("exercises", workout_id)])
+@_replica_read
+def list_exercises(workout_id: int, workout_date: date):
+    pending = list(_wb_pending(_wb_exercises, workout_id).values())
     with get_connection() as cur:
-        cur.execute(
-            """SELECT exercise_id, exercise_name, reps, sets, weight_lifted
-               FROM exercises
-               WHERE workout_id = %s
-               ORDER BY exercise_id;""",
-            (workout_id,),
-        )
+        cur.execute(LIST_EXERCISES_SQL, (workout_id, workout_date))
+        rows = cur.fetchall()
+    return _wb_merge(rows, pending, key=lambda r: r[0])
+
+@_instrumented
+def delete_exercise(exercise_id: int, workout_id: int, workout_date: date):
+    _wb_barrier()
+    with get_connection() as cur:
+        cur.execute(DELETE_EXERCISE_SQL, (exercise_id, workout_id, workout_date))
+        row = cur.fetchone()
+    _invalidate(("exercises", workout_id), *([("insights", row[0])] if row else []))
+
+# Personal records and one exercise's history come from exercise_records and
+# idx_exercises_user_type_date (migrations/0011): one index range each.
+PERSONAL_RECORDS_SQL = """
+    SELECT c.display_name, r.best_weight, r.best_volume, r.last_performed
+    FROM exercise_records r
+    JOIN exercise_catalog c ON c.exercise_type_id = r.exercise_type_id
+    WHERE r.user_id = %s
+    ORDER BY r.last_performed DESC, c.display_name;
+"""
+EXERCISE_HISTORY_SQL = """
+    SELECT e.workout_date, e.workout_id, e.exercise_id, e.reps, e.sets, e.weight_lifted
+    FROM exercise_catalog c
+    JOIN exercises e ON e.user_id = %s AND e.exercise_type_id = c.exercise_type_id
+    WHERE c.canonical_name = canonical_exercise_name(%s)
+    ORDER BY e.workout_date DESC, e.exercise_id DESC
+    LIMIT %s;
+"""
+
+@_instrumented
+@_cached(lambda rows, user_id: [("insights", user_id)])
+@_replica_read
+def personal_records(user_id: int):
+    """[(exercise, best_weight, best_volume, last_performed)], most recently performed first."""
+    with get_connection() as cur:
+        cur.execute(PERSONAL_RECORDS_SQL, (user_id,))
         return cur.fetchall()
 
-def delete_exercise(exercise_id: int, workout_id: int):
+@_instrumented
+@_cached(lambda rows, user_id, exercise_name, limit=50: [("insights", user_id)])
+@_replica_read
+def exercise_history(user_id: int, exercise_name: str, limit: int = 50):
+    """
+    The user's latest `limit` entries of one exercise (name matched like the
+    catalog does: case and extra spaces ignored), newest first:
+    [(workout_date, workout_id, exercise_id, reps, sets, weight_lifted)].
+    """
     with get_connection() as cur:
-        cur.execute(
-            "DELETE FROM exercises WHERE exercise_id = %s AND workout_id = %s;",
-            (exercise_id, workout_id),
-        )
+        cur.execute(EXERCISE_HISTORY_SQL, (user_id, exercise_name, limit))
+        return cur.fetchall()
 
 # ----------------- CRUD: GOALS -----------------
-def create_goal(user_id: int, description: str, start_date: date, end_date: date):
+# Structured goals (see migrations/0007) are measured from workouts in their
+# date range. GOAL_PROGRESS_CTE computes progress for every goal in a `scope`
+# CTE with two grouped joins, so list_goals (scope = one user's goals) and
+# evaluate_goals (scope = every open goal) share one set-based definition.
+GOAL_TARGET_TYPES = ("workouts", "minutes", "exercise_weight")
+GOAL_TARGET_MAX = 99_999_999.99  # goals.target_value is NUMERIC(10, 2)
+GOAL_PROGRESS_CTE = """
+    progress AS (
+        SELECT s.goal_id,
+               CASE s.target_type
+                   WHEN 'workouts' THEN COALESCE(wt.workouts, 0)
+                   WHEN 'minutes' THEN COALESCE(wt.minutes, 0)
+                   ELSE COALESCE(et.best_weight, 0)
+               END AS progress
+        FROM scope s
+        LEFT JOIN (
+            SELECT s.goal_id, COUNT(*) AS workouts, SUM(w.duration_minutes) AS minutes
+            FROM scope s
+            JOIN workouts w
+              ON w.user_id = s.user_id AND w.workout_date BETWEEN s.start_date AND s.end_date
+            WHERE s.target_type IN ('workouts', 'minutes')
+            GROUP BY s.goal_id
+        ) wt ON wt.goal_id = s.goal_id
+        LEFT JOIN (
+            SELECT s.goal_id, MAX(e.weight_lifted) AS best_weight
+            FROM scope s
+            JOIN exercise_catalog c ON c.canonical_name = canonical_exercise_name(s.target_exercise)
+            JOIN exercises e
+              ON e.user_id = s.user_id AND e.exercise_type_id = c.exercise_type_id
+             AND e.workout_date BETWEEN s.start_date AND s.end_date
+            WHERE s.target_type = 'exercise_weight'
+            GROUP BY s.goal_id
+        ) et ON et.goal_id = s.goal_id
+    )"""
+LIST_GOALS_SQL = """
+    WITH scope AS (
+        SELECT goal_id, user_id, target_type, target_exercise, start_date, end_date
+        FROM goals
+        WHERE user_id = %(user_id)s AND target_type IS NOT NULL
+    ),""" + GOAL_PROGRESS_CTE + """
+    SELECT g.goal_id, g.goal_description, g.start_date, g.end_date, g.is_completed,
+           g.target_type, g.target_value, g.target_exercise, p.progress
+    FROM goals g
+    LEFT JOIN progress p ON p.goal_id = g.goal_id
+    WHERE g.user_id = %(user_id)s
+    ORDER BY g.is_completed, g.end_date;
+"""
+CREATE_GOAL_SQL = """INSERT INTO goals (user_id, goal_description, start_date, end_date, is_completed,
+                                   target_type, target_value, target_exercise)
+               VALUES (%s, %s, %s, %s, FALSE, %s, %s, %s) RETURNING goal_id;"""
+SET_GOAL_COMPLETED_SQL = "UPDATE goals SET is_completed = %s WHERE goal_id = %s AND user_id = %s;"
+DELETE_GOAL_SQL = "DELETE FROM goals WHERE goal_id = %s AND user_id = %s;"
+# Every open structured goal that has started gets its progress stored and is
+# completed once it reaches its target. A goal is evaluated one last time on the
+# first run after its end_date and then left alone. Returns the counts and the
+# users with a goal completed in this pass (their cached goal lists go stale).
+EVALUATE_GOALS_SQL = """
+    WITH scope AS (
+        SELECT goal_id, user_id, target_type, target_exercise, start_date, end_date
+        FROM goals
+        WHERE target_type IS NOT NULL AND is_completed IS NOT TRUE
+          AND start_date <= %(today)s
+          AND (evaluated_at IS NULL OR evaluated_at::date <= end_date)
+    ),""" + GOAL_PROGRESS_CTE + """,
+    updated AS (
+        UPDATE goals g
+        SET progress = p.progress,
+            is_completed = p.progress >= g.target_value,
+            evaluated_at = %(now)s
+        FROM progress p
+        WHERE g.goal_id = p.goal_id
+        RETURNING g.user_id, g.is_completed
+    )
+    SELECT COUNT(*),
+           COUNT(*) FILTER (WHERE is_completed),
+           COALESCE(array_agg(DISTINCT user_id) FILTER (WHERE is_completed), '{}')
+    FROM updated;
+"""
+
+def _goal_target(target_type: str | None, target_value, target_exercise: str | None):
+    if target_type is None:
+        return None, None, None
+    if target_type not in GOAL_TARGET_TYPES:
+        raise ValueError(f"Unknown goal target type: {target_type}")
+    if target_value is None or isinstance(target_value, bool) or target_value <= 0:
+        raise ValueError("A goal target must be greater than zero.")
+    if not math.isfinite(target_value):
+        raise ValueError("A goal target must be a finite number.")
+    if target_value > GOAL_TARGET_MAX:
+        raise ValueError(f"A goal target must be at most {GOAL_TARGET_MAX}.")
+    if target_type == "exercise_weight":
+        if not target_exercise:
+            raise ValueError("An exercise weight goal needs an exercise name.")
+    else:
+        target_exercise = None
+    return target_type, target_value, target_exercise
+
+@_instrumented
+def create_goal(user_id: int, description: str, start_date: date, end_date: date,
+                target_type: str | None = None, target_value: float | None = None,
+                target_exercise: str | None = None):
+    """
+    target_type: None (free text, completed by hand), 'workouts', 'minutes'
+    or 'exercise_weight' (with target_exercise).
+    """
+    target = _goal_target(target_type, target_value, target_exercise)
     with get_connection() as cur:
-        cur.execute(
-            """INSERT INTO goals (user_id, goal_description, start_date, end_date, is_completed)
-               VALUES (%s, %s, %s, %s, FALSE) RETURNING goal_id;""",
-            (user_id, description, start_date, end_date),
-        )
-        return cur.fetchone()[0]
+        cur.execute(CREATE_GOAL_SQL, (user_id, description, start_date, end_date, *target))
+        goal_id = cur.fetchone()[0]
+    _invalidate(("goals", user_id))
+    return goal_id
 
+# Live progress depends on the user's workouts and exercises too.
+@_instrumented
+@_cached(lambda rows, user_id: [("goals", user_id), ("workouts", user_id), ("insights", user_id)])
+@_replica_read
 def list_goals(user_id: int):
+    """
+    (goal_id, description, start_date, end_date, is_completed,
+     target_type, target_value, target_exercise, progress) per goal;
+    target/progress columns are None for free-text goals.
+    """
+    pending = _wb_pending(_wb_goals, user_id)
     with get_connection() as cur:
-        cur.execute(
-            """SELECT goal_id, goal_description, start_date, end_date, is_completed
-               FROM goals WHERE user_id = %s
-               ORDER BY is_completed, end_date;""",
-            (user_id,),
-        )
-        return cur.fetchall()
+        cur.execute(LIST_GOALS_SQL, {"user_id": user_id})
+        rows = cur.fetchall()
+    return _wb_merge_goals(rows, pending)
 
+@_instrumented
 def set_goal_completed(goal_id: int, user_id: int, completed: bool):
+    if WRITE_BEHIND_ENABLED:
+        _wb_check_int("goal_id", goal_id)
+        _wb_check_int("user_id", user_id)
+        _wb_enqueue(("goal_completed", {"goal_id": goal_id, "user_id": user_id, "completed": bool(completed)}))
+        _invalidate(("goals", user_id))
+        return
     with get_connection() as cur:
-        cur.execute(
-            "UPDATE goals SET is_completed = %s WHERE goal_id = %s AND user_id = %s;",
-            (completed, goal_id, user_id),
-        )
+        cur.execute(SET_GOAL_COMPLETED_SQL, (completed, goal_id, user_id))
+    _invalidate(("goals", user_id))
 
+@_instrumented
 def delete_goal(goal_id: int, user_id: int):
+    _wb_barrier()
     with get_connection() as cur:
-        cur.execute(
-            "DELETE FROM goals WHERE goal_id = %s AND user_id = %s;",
-            (goal_id, user_id),
-        )
+        cur.execute(DELETE_GOAL_SQL, (goal_id, user_id))
+    _invalidate(("goals", user_id))
+
+@_instrumented
+def evaluate_goals(today: date | None = None):
+    """
+    Batch job: store progress for every open structured goal of every user and
+    mark the ones that reached their target completed, in one statement.
+    Returns {"evaluated", "completed", "users_completed"}. Passing `today`
+    runs the job as of that day: evaluated_at is stamped with it too, so a
+    goal's last evaluation is still decided by the day of the run.
+    """
+    now = datetime.now()
+    if today is not None:
+        now = datetime.combine(today, now.time())
+    _wb_barrier()
+    with get_connection() as cur:
+        cur.execute(EVALUATE_GOALS_SQL, {"today": now.date(), "now": now})
+        evaluated, completed, completed_users = cur.fetchone()
+    _invalidate(*[("goals", uid) for uid in completed_users])
+    return {"evaluated": evaluated, "completed": completed, "users_completed": len(completed_users)}
 
 # ----------------- ANALYTICS & LEADERBOARD -----------------
+# leaderboard_for_week reads the weekly_activity rollup (one row per user per ISO
+# week, kept current by triggers on workouts — see migrations/0002) when asked
+# for a whole Monday..Sunday week, and falls back to aggregating raw workouts
+# for any other date range.
+LEADERBOARD_METRICS = {
+    "workouts": "COALESCE(wa.workout_count, 0)",
+    "minutes": "COALESCE(wa.total_minutes, 0)",
+}
+LEADERBOARD_RANGE_METRICS = {
+    "workouts": "COUNT(w.workout_id)",
+    "minutes": "COALESCE(SUM(w.duration_minutes),0)",
+}
+LEADERBOARD_CIRCLE_CTE = """
+    WITH circle AS (
+        SELECT %s AS uid
+        UNION ALL
+        SELECT friend_id FROM friend_edges WHERE user_id = %s
+    )
+"""
+LEADERBOARD_SQL = LEADERBOARD_CIRCLE_CTE + """
+    SELECT u.user_id, u.name,
+           {metric} AS value
+    FROM circle c
+    JOIN users u ON u.user_id = c.uid
+    LEFT JOIN weekly_activity wa
+      ON wa.user_id = u.user_id
+     AND wa.week_start = %s
+    ORDER BY value DESC, u.name ASC;
+"""
+LEADERBOARD_RANGE_SQL = LEADERBOARD_CIRCLE_CTE + """
+    SELECT u.user_id, u.name,
+           {metric} AS value
+    FROM circle c
+    JOIN users u ON u.user_id = c.uid
+    LEFT JOIN workouts w
+      ON w.user_id = u.user_id
+     AND w.workout_date BETWEEN %s AND %s
+    GROUP BY u.user_id, u.name
+    ORDER BY value DESC, u.name ASC;
+"""
+# Global (all users) weekly leaderboards read weekly_activity in score order
+# and take ranks from weekly_rank_buckets, a per-week histogram of scores kept
+# by triggers (see migrations/0006): rank = 1 + users in higher buckets, so a
+# lookup touches one row per distinct score above the user, never every user.
+# Ties share a rank (1, 2, 2, 4); pages order ties by user_id DESC so they can
+# be keyset-paginated with a row comparison on the
+# (week_start, <metric>, user_id) index.
+GLOBAL_RANK_COLUMNS = {
+    "workouts": "workout_count",
+    "minutes": "total_minutes",
+}
+GLOBAL_RANKS_CTE = """
+    ranks AS (
+        SELECT value, SUM(user_count) OVER (ORDER BY value DESC) - user_count + 1 AS rank
+        FROM weekly_rank_buckets
+        WHERE week_start = %(week_start)s AND metric = %(metric)s
+          AND value >= (SELECT MIN(value) FROM page)
+    )
+    SELECT r.rank, p.user_id, u.name, p.value
+    FROM page p
+    JOIN ranks r ON r.value = p.value
+    JOIN users u ON u.user_id = p.user_id
+    ORDER BY p.value DESC, p.user_id DESC;
+"""
+GLOBAL_LEADERBOARD_PAGE_SQL = """
+    WITH page AS (
+        SELECT wa.user_id, wa.{column} AS value
+        FROM weekly_activity wa
+        WHERE wa.week_start = %(week_start)s{after}
+        ORDER BY wa.{column} DESC, wa.user_id DESC
+        LIMIT %(limit)s
+    ),""" + GLOBAL_RANKS_CTE
+GLOBAL_LEADERBOARD_AFTER = "\n          AND (wa.{column}, wa.user_id) < (%(after_value)s, %(after_user_id)s)"
+GLOBAL_NEIGHBORS_SQL = """
+    WITH me AS (
+        SELECT user_id, {column} AS value
+        FROM weekly_activity
+        WHERE user_id = %(user_id)s AND week_start = %(week_start)s
+    ),
+    page AS (
+        SELECT user_id, value FROM me
+        UNION ALL
+        (SELECT wa.user_id, wa.{column}
+         FROM weekly_activity wa, me
+         WHERE wa.week_start = %(week_start)s AND (wa.{column}, wa.user_id) > (me.value, me.user_id)
+         ORDER BY wa.{column}, wa.user_id
+         LIMIT %(radius)s)
+        UNION ALL
+        (SELECT wa.user_id, wa.{column}
+         FROM weekly_activity wa, me
+         WHERE wa.week_start = %(week_start)s AND (wa.{column}, wa.user_id) < (me.value, me.user_id)
+         ORDER BY wa.{column} DESC, wa.user_id DESC
+         LIMIT %(radius)s)
+    ),""" + GLOBAL_RANKS_CTE
+GLOBAL_RANK_SQL = """
+    WITH me AS (
+        SELECT {column} AS value
+        FROM weekly_activity
+        WHERE user_id = %(user_id)s AND week_start = %(week_start)s
+    )
+    SELECT (SELECT value FROM me),
+           COALESCE(SUM(b.user_count) FILTER (WHERE b.value > (SELECT value FROM me)), 0),
+           COALESCE(SUM(b.user_count), 0)
+    FROM weekly_rank_buckets b
+    WHERE b.week_start = %(week_start)s AND b.metric = %(metric)s;
+"""
+
+# overall_insights answers from user_stats (running per-user aggregates kept by
+# triggers on workouts/exercises — see migrations/0004): one primary-key lookup.
+INSIGHTS_SQL = """
+    SELECT workout_count, total_minutes, min_duration, max_duration, exercise_count
+    FROM user_stats
+    WHERE user_id = %s;
+"""
+
 def week_bounds(today: date):
     # Week: Monday..Sunday (ISO) — adjust as needed
     start = today - timedelta(days=today.weekday())
     end = start + timedelta(days=6)
     return start, end
 
+def is_full_week(week_start: date, week_end: date):
+    return week_start.weekday() == 0 and week_end == week_start + timedelta(days=6)
+
+def leaderboard_sql(metric: str, full_week: bool = True):
+    if full_week:
+        return LEADERBOARD_SQL.format(metric=LEADERBOARD_METRICS.get(metric, LEADERBOARD_METRICS["minutes"]))
+    return LEADERBOARD_RANGE_SQL.format(
+        metric=LEADERBOARD_RANGE_METRICS.get(metric, LEADERBOARD_RANGE_METRICS["minutes"])
+    )
+
+@_instrumented
+@_cached(lambda rows, user_id, metric, week_start, week_end: (
+    [("friends", user_id)] + [("workouts", r[0]) for r in rows] + [("user", r[0]) for r in rows]
+))
+@_replica_read
 def leaderboard_for_week(user_id: int, metric: str, week_start: date, week_end: date):
     """
     metric: 'workouts' or 'minutes'
     Includes the user + all friends.
     """
-    metric_sql = "COUNT(w.workout_id)" if metric == "workouts" else "COALESCE(SUM(w.duration_minutes),0)"
     with get_connection() as cur:
-        cur.execute(
-            """
-            WITH circle AS (
-                SELECT %s AS uid
-                UNION
-                SELECT CASE WHEN f.user_id = %s THEN f.friend_id ELSE f.user_id END AS uid
-                FROM friends f
-                WHERE f.user_id = %s OR f.friend_id = %s
+        if is_full_week(week_start, week_end):
+            cur.execute(leaderboard_sql(metric), (user_id, user_id, week_start))
+        else:
+            cur.execute(
+                leaderboard_sql(metric, full_week=False),
+                (user_id, user_id, week_start, week_end),
             )
-            SELECT u.user_id, u.name,
-                   {metric} AS value
-            FROM circle c
-            JOIN users u ON u.user_id = c.uid
-            LEFT JOIN workouts w
-              ON w.user_id = u.user_id
-             AND w.workout_date BETWEEN %s AND %s
-            GROUP BY u.user_id, u.name
-            ORDER BY value DESC, u.name ASC;
-            """.format(metric=metric_sql),
-            (user_id, user_id, user_id, user_id, week_start, week_end),
-        )
         return cur.fetchall()
 
+def global_leaderboard_sql(metric: str, kind: str = "page", after: bool = False):
+    """SQL for kind 'page', 'neighbors' or 'rank' over `metric` ('workouts' or 'minutes')."""
+    column = GLOBAL_RANK_COLUMNS.get(metric, GLOBAL_RANK_COLUMNS["minutes"])
+    if kind == "rank":
+        return GLOBAL_RANK_SQL.format(column=column)
+    if kind == "neighbors":
+        return GLOBAL_NEIGHBORS_SQL.format(column=column)
+    return GLOBAL_LEADERBOARD_PAGE_SQL.format(
+        column=column, after=GLOBAL_LEADERBOARD_AFTER.format(column=column) if after else ""
+    )
+
+def _global_params(metric: str, week_start: date, **extra):
+    metric = metric if metric in GLOBAL_RANK_COLUMNS else "minutes"
+    return {"metric": metric, "week_start": week_bounds(week_start)[0], **extra}
+
+# The global boards change with every user's workouts, which no cache tag
+# tracks; they are cheap enough (bounded by page size and distinct scores)
+# to read uncached.
+@_instrumented
+@_replica_read
+def global_leaderboard_page(metric: str, week_start: date, after: tuple | None = None, limit: int = 50):
+    """
+    One page of the all-users leaderboard for the week containing `week_start`:
+    ([(rank, user_id, name, value)], next_after); pass next_after back as
+    `after` for the following page (None when there are no more).
+    """
+    params = _global_params(metric, week_start, limit=limit + 1)
+    if after is not None:
+        params.update(after_value=after[0], after_user_id=after[1])
+    with get_connection() as cur:
+        cur.execute(global_leaderboard_sql(metric, after=after is not None), params)
+        rows = cur.fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, (rows[-1][3], rows[-1][1])
+    return rows, None
+
+@_instrumented
+@_replica_read
+def global_rank(user_id: int, metric: str, week_start: date):
+    """
+    The user's standing among everyone active in the week containing
+    `week_start`: {value, rank, ranked_users, percentile}. percentile is the
+    share of ranked users at or below the user's score; users with no
+    activity that week rank after everyone else with percentile 0.
+    """
+    with get_connection() as cur:
+        cur.execute(global_leaderboard_sql(metric, "rank"), _global_params(metric, week_start, user_id=user_id))
+        value, above, ranked = cur.fetchone()
+    if value is None:
+        return {"value": 0, "rank": ranked + 1, "ranked_users": ranked, "percentile": 0.0}
+    return {
+        "value": value,
+        "rank": above + 1,
+        "ranked_users": ranked,
+        "percentile": round(100 * (ranked - above) / ranked, 1),
+    }
+
+@_instrumented
+@_replica_read
+def global_leaderboard_neighbors(user_id: int, metric: str, week_start: date, radius: int = 5):
+    """
+    The user and up to `radius` users directly above and below them on the
+    global board, as [(rank, user_id, name, value)]; [] if the user has no
+    activity that week.
+    """
+    params = _global_params(metric, week_start, user_id=user_id, radius=radius)
+    with get_connection() as cur:
+        cur.execute(global_leaderboard_sql(metric, "neighbors"), params)
+        return cur.fetchall()
+
+@_instrumented
+@_cached(lambda stats, user_id: [("insights", user_id)])
+@_replica_read
 def overall_insights(user_id: int):
     """
     Simple business-style insights for the user:
@@ -248,37 +2287,238 @@ def overall_insights(user_id: int):
     - total exercises logged
     """
     with get_connection() as cur:
-        cur.execute(
-            """
-            SELECT
-                COUNT(w.workout_id) AS total_workouts,
-                COALESCE(SUM(w.duration_minutes),0) AS total_minutes,
-                COALESCE(AVG(w.duration_minutes),0) AS avg_duration,
-                COALESCE(MIN(w.duration_minutes),0) AS min_duration,
-                COALESCE(MAX(w.duration_minutes),0) AS max_duration
-            FROM workouts w
-            WHERE w.user_id = %s;
-            """,
-            (user_id,),
-        )
-        workouts_stats = cur.fetchone()
+        cur.execute(INSIGHTS_SQL, (user_id,))
+        row = cur.fetchone()
 
-        cur.execute(
-            """
-            SELECT COUNT(e.exercise_id) AS total_exercises
-            FROM workouts w
-            JOIN exercises e ON e.workout_id = w.workout_id
-            WHERE w.user_id = %s;
-            """,
-            (user_id,),
-        )
-        ex_stats = cur.fetchone()
+    workout_count, total_minutes, min_duration, max_duration, exercise_count = row or (0, 0, None, None, 0)
+    return {
+        "total_workouts": workout_count,
+        "total_minutes": total_minutes,
+        "avg_duration": round(total_minutes / workout_count, 2) if workout_count else 0.0,
+        "min_duration": min_duration or 0,
+        "max_duration": max_duration or 0,
+        "total_exercises": exercise_count,
+    }
+
+# ----------------- LIVE UPDATES -----------------
+# Triggers on weekly_activity (migrations/0012) publish every change on the
+# ACTIVITY_CHANNEL notification channel. One listener thread per process
+# holds a single LISTEN connection to the primary and fans the events out to
+# in-process subscriptions, each watching a set of user ids (a session's
+# leaderboard circle), so a session hears about a friend's workout without
+# querying for it.
+# - an event is (user_id, week_start, workouts, minutes): that user's new
+#   totals for the week. A subscription keeps only the latest event per
+#   (user, week), so a slow reader never falls behind by more than that, and
+#   can be limited to one week. has_pending() is a cheap check for readers
+#   that only want to redraw when something arrived.
+# - every event also invalidates the user's ("workouts", ...) and
+#   ("insights", ...) cache tags, so this process's read cache notices
+#   writes made by other processes
+# - after the listener (re)connects, events may have been missed; the same
+#   goes for a {"resync"} notification from a bulk statement. The read cache
+#   is cleared and every subscription is marked stale; its owner re-reads.
+# - subscriptions are weakly referenced: one dropped with its session stops
+#   receiving events without an explicit close()
+ACTIVITY_CHANNEL = "weekly_activity"
+LIVE_POLL_SECONDS = 1.0            # how often the listener checks for shutdown
+LIVE_PING_AFTER_SECONDS = 30.0     # an idle LISTEN connection gets a SELECT 1 to notice it died
+LIVE_CONNECT_TIMEOUT = 2.0         # subscribe waits this long for the listener to be listening
+LIVE_MAX_BACKOFF_SECONDS = 30.0
+
+live_logger = logging.getLogger("fitness.live")
+
+
+class ActivitySubscription:
+    """Live weekly_activity totals for a set of users; see subscribe_activity()."""
+
+    def __init__(self):
+        self.user_ids = frozenset()
+        self.week_start = None
+        self._pending = {}
+        self._stale = False
+
+    def watch(self, user_ids, week_start: date | None = None):
+        """Receive events for exactly these users from now on; only for one week if `week_start` is given."""
+        with _live_lock:
+            for uid in self.user_ids:
+                watchers = _live_watchers.get(uid)
+                if watchers is not None:
+                    watchers.discard(self)
+                    if not watchers:
+                        del _live_watchers[uid]
+            self.user_ids = frozenset(user_ids)
+            for uid in self.user_ids:
+                _live_watchers.setdefault(uid, weakref.WeakSet()).add(self)
+            self.week_start = week_start
+            for key in [k for k in self._pending
+                        if k[0] not in self.user_ids or week_start not in (None, k[1])]:
+                del self._pending[key]
+
+    def has_pending(self):
+        """True if poll() would return events or None; no lock, so it may lag an event by a moment."""
+        return self._stale or bool(self._pending)
 
+    def poll(self):
+        """
+        Events received since the last poll, oldest first, or None when some
+        may have been missed (re-read everything this subscription watches).
+        """
+        with _live_lock:
+            events = None if self._stale else list(self._pending.values())
+            self._pending.clear()
+            self._stale = False
+        return events
+
+    def close(self):
+        self.watch(())
+        with _live_lock:
+            _live_subscriptions.discard(self)
+
+
+_live_lock = threading.Lock()
+_live_watchers = {}                     # user_id -> WeakSet of subscriptions
+_live_subscriptions = weakref.WeakSet()
+_live_thread = None
+_live_stop = threading.Event()
+_live_listening = threading.Event()
+_live_stats = {"events": 0, "delivered": 0, "resyncs": 0, "failures": 0, "last_error": None}
+
+
+def _live_mark_stale():
+    with _live_lock:
+        for sub in _live_subscriptions:
+            sub._stale = True
+            sub._pending.clear()
+    clear_cache()
+
+
+def _live_dispatch(payload: str):
+    """Hand one notification to the subscriptions; a malformed payload raises before anything changes."""
+    event = json.loads(payload)
+    if event.get("resync"):
+        _live_stats["resyncs"] += 1
+        _live_mark_stale()
+        return
+    uid = event["user_id"]
+    week_start = date.fromisoformat(event["week_start"])
+    row = (uid, week_start, event["workouts"], event["minutes"])
+    _invalidate(("workouts", uid), ("insights", uid))
+    with _live_lock:
+        _live_stats["events"] += 1
+        watchers = _live_watchers.get(uid)
+        if watchers is not None and not watchers:  # its subscriptions were garbage collected
+            del _live_watchers[uid]
+        for sub in watchers or ():
+            if sub.week_start is not None and sub.week_start != week_start:
+                continue
+            sub._pending.pop((uid, week_start), None)  # re-insert so the dict stays in arrival order
+            sub._pending[(uid, week_start)] = row
+            _live_stats["delivered"] += 1
+
+
+def _live_listen(conn):
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(f"LISTEN {ACTIVITY_CHANNEL};")
+    _live_mark_stale()
+    _live_listening.set()
+    idle_since = time.monotonic()
+    while not _live_stop.is_set():
+        if select.select([conn], [], [], LIVE_POLL_SECONDS) == ([], [], []):
+            if time.monotonic() - idle_since >= LIVE_PING_AFTER_SECONDS:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1;")
+                idle_since = time.monotonic()
+            continue
+        conn.poll()
+        idle_since = time.monotonic()
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                _live_dispatch(notify.payload)
+            except (ValueError, KeyError, TypeError) as e:
+                live_logger.error("ignoring malformed %s notification %r: %s", ACTIVITY_CHANNEL, notify.payload, e)
+
+
+def _live_run():
+    backoff = 0.0
+    while not _live_stop.is_set():
+        conn = None
+        try:
+            conn = _connect()
+            _live_listen(conn)
+        except (psycopg2.Error, OSError) as e:
+            if _live_listening.is_set():  # was up until now: retry quickly
+                backoff = 0.0
+            _live_stats["failures"] += 1
+            _live_stats["last_error"] = str(e).strip()
+            backoff = min(max(backoff * 2, 0.5), LIVE_MAX_BACKOFF_SECONDS)
+            live_logger.warning("activity listener failed (%s); reconnecting in %.1fs",
+                                _live_stats["last_error"], backoff)
+        finally:
+            _live_listening.clear()
+            if conn is not None:
+                conn.close()
+        _live_stop.wait(backoff)
+
+
+def subscribe_activity(user_ids=(), week_start: date | None = None):
+    """
+    A new ActivitySubscription watching `user_ids` (see watch()), starting the listener
+    thread on first use. Subscribe before reading what it should keep
+    current, so no event can fall in between.
+    """
+    global _live_thread
+    with _live_lock:
+        if _live_thread is None:
+            _live_stop.clear()
+            _live_thread = threading.Thread(target=_live_run, name="fitness-live-updates", daemon=True)
+            _live_thread.start()
+    _live_listening.wait(LIVE_CONNECT_TIMEOUT)
+    sub = ActivitySubscription()
+    with _live_lock:
+        # if the listener isn't up yet, connecting marks this subscription stale
+        _live_subscriptions.add(sub)
+    sub.watch(user_ids, week_start)
+    return sub
+
+
+def _live_shutdown(timeout: float = 5.0):
+    global _live_thread
+    if _live_thread is None:
+        return
+    _live_stop.set()
+    _live_thread.join(timeout)
+    _live_thread = None
+
+
+def live_updates_stats():
+    """Listener state and event counters."""
+    with _live_lock:
         return {
-            "total_workouts": workouts_stats[0],
-            "total_minutes": workouts_stats[1],
-            "avg_duration": round(float(workouts_stats[2]), 2) if workouts_stats[2] is not None else 0.0,
-            "min_duration": workouts_stats[3],
-            "max_duration": workouts_stats[4],
-            "total_exercises": ex_stats[0],
+            "running": _live_thread is not None,
+            "listening": _live_listening.is_set(),
+            "subscriptions": len(_live_subscriptions),
+            "watched_users": sum(1 for subs in _live_watchers.values() if subs),
+            **_live_stats,
         }
+
+
+atexit.register(_live_shutdown)
+
+# ----------------- STATEMENT REGISTRY -----------------
+register_statements(
+    GET_USER_BY_EMAIL_SQL, GET_USER_BY_ID_SQL, LIST_USERS_SQL, LIST_USERS_FIRST_PAGE_SQL, LIST_USERS_PAGE_SQL,
+    CREATE_USER_SQL, UPDATE_USER_SQL,
+    LIST_FRIENDS_SQL, SUGGEST_FRIENDS_SQL, ADD_FRIENDSHIP_SQL, REMOVE_FRIENDSHIP_SQL,
+    LIST_WORKOUTS_RANGE_SQL, LIST_WORKOUTS_SQL, LIST_WORKOUTS_FIRST_PAGE_SQL, LIST_WORKOUTS_PAGE_SQL,
+    LOG_WORKOUT_SQL, DELETE_WORKOUT_SQL, LOG_WORKOUT_WITH_EXERCISES_SQL,
+    LIST_EXERCISES_SQL, ADD_EXERCISE_SQL, DELETE_EXERCISE_SQL, PERSONAL_RECORDS_SQL, EXERCISE_HISTORY_SQL,
+    LIST_GOALS_SQL, CREATE_GOAL_SQL, SET_GOAL_COMPLETED_SQL, DELETE_GOAL_SQL,
+    FLUSH_WORKOUTS_SQL, FLUSH_EXERCISES_SQL, FLUSH_GOALS_SQL,
+    INSIGHTS_SQL,
+    *(leaderboard_sql(metric, full_week) for metric in LEADERBOARD_METRICS for full_week in (True, False)),
+    *(global_leaderboard_sql(metric, kind, after) for metric in GLOBAL_RANK_COLUMNS
+      for kind, after in (("page", False), ("page", True), ("neighbors", False), ("rank", False))),
+)
@@ -0,0 +1,10 @@
+"""
+Benchmarks for backend_fitness.
+
+    python -m bench generate --scale small          # build the fitness_bench_small database
+    python -m bench run --scales small --concurrency 1,8,32 --out results.json
+    python -m bench compare baseline.json results.json
+
+See bench.datagen for the synthetic data model and bench.runner for how
+latencies are measured.
+"""
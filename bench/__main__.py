@@ -0,0 +1,67 @@
+# bench/__main__.py
+import argparse
+import sys
+
+from bench import datagen, runner
+
+
+def _csv(value, cast=str):
+    return tuple(cast(v) for v in value.split(",") if v)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Fitness Tracker backend benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_gen = sub.add_parser("generate", help="build a benchmark database with synthetic data")
+    p_gen.add_argument("--scale", choices=sorted(datagen.SCALES), default="tiny")
+    p_gen.add_argument("--seed", type=int, default=42)
+
+    p_run = sub.add_parser("run", help="measure backend latency/throughput")
+    p_run.add_argument("--scales", type=_csv, default=("tiny",), help="comma separated, e.g. tiny,small")
+    p_run.add_argument("--functions", type=_csv, default=runner.DEFAULT_FUNCTIONS)
+    p_run.add_argument("--concurrency", type=lambda v: _csv(v, int), default=(1, 8))
+    p_run.add_argument("--duration", type=float, default=10.0, help="seconds per measurement")
+    p_run.add_argument("--warmup", type=float, default=1.0)
+    p_run.add_argument("--seed", type=int, default=42)
+    p_run.add_argument("--out", default="bench_results.json")
+
+    p_plan = sub.add_parser("planning", help="planning time saved per call by prepared statements")
+    p_plan.add_argument("--scale", choices=sorted(datagen.SCALES), default="tiny")
+    p_plan.add_argument("--functions", type=_csv, default=runner.DEFAULT_FUNCTIONS)
+    p_plan.add_argument("--calls", type=int, default=200)
+    p_plan.add_argument("--seed", type=int, default=42)
+    p_plan.add_argument("--out", default="bench_planning.json")
+
+    p_cmp = sub.add_parser("compare", help="flag regressions between two result files")
+    p_cmp.add_argument("baseline")
+    p_cmp.add_argument("current")
+    p_cmp.add_argument("--metric", default="p95_ms")
+    p_cmp.add_argument("--threshold", type=float, default=0.20, help="relative slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        datagen.generate(args.scale, args.seed)
+    elif args.command == "run":
+        result = runner.run(args.scales, args.functions, args.concurrency, args.duration, args.warmup, args.seed)
+        runner.save(result, args.out)
+        print(f"Results written to {args.out}")
+    elif args.command == "planning":
+        result = runner.planning(args.scale, args.functions, args.calls, seed=args.seed)
+        runner.save(result, args.out)
+        print(f"Results written to {args.out}")
+    elif args.command == "compare":
+        rows = runner.compare(runner.load(args.baseline), runner.load(args.current), args.metric, args.threshold)
+        regressions = 0
+        for (scale, function, concurrency), old, new, change, regressed in rows:
+            flag = "REGRESSION" if regressed else ""
+            regressions += regressed
+            print(f"{scale:>7} {function:<22} c={concurrency:<3} {old:>9.3f} -> {new:>9.3f} ({change:+.1%}) {flag}")
+        if regressions:
+            print(f"{regressions} regression(s) over {args.threshold:.0%} in {args.metric}.")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+# bench/datagen.py
+"""
+Deterministic synthetic data for benchmarking.
+
+The same (scale, seed) always produces the same rows:
+- users with ids 1..N
+- a power-law friend graph (a few very connected users, a long tail of
+  users with one or two friends); partners are drawn with a bias towards
+  low ids so popular users accumulate friends, as in preferential attachment
+- workouts spread over `years` of history, with per-user activity drawn
+  from a log-normal so some users log daily and most log occasionally
+- 0-8 exercises per workout from a fixed catalogue, and a few goals per user
+  (mostly with workout-count or minutes targets)
+
+Everything is streamed into PostgreSQL with COPY in chunks, so generating
+10M workouts never holds more than one chunk in memory. The triggers that
+maintain derived tables (weekly rollups, user stats, ...) fire once per
+COPY chunk, set-wise.
+"""
+import io
+import math
+import random
+from datetime import date, timedelta
+
+import psycopg2
+
+import backend_fitness as db
+import migrate_fitness
+
+SCALES = {
+    # name: users, mean workouts per user, years of history, mean friends per user
+    "tiny": {"users": 1_000, "workouts_per_user": 40, "years": 2, "friends_per_user": 8},
+    "small": {"users": 10_000, "workouts_per_user": 100, "years": 3, "friends_per_user": 12},
+    "medium": {"users": 100_000, "workouts_per_user": 100, "years": 5, "friends_per_user": 15},
+}
+COPY_CHUNK_ROWS = 200_000
+EXERCISE_NAMES = (
+    "Bench Press", "Squat", "Deadlift", "Overhead Press", "Barbell Row", "Pull Up", "Push Up",
+    "Lunge", "Leg Press", "Bicep Curl", "Tricep Dip", "Plank", "Lat Pulldown", "Hip Thrust",
+    "Running", "Cycling", "Rowing", "Burpee", "Kettlebell Swing", "Calf Raise",
+)
+
+
+def bench_db_name(scale: str):
+    return f"fitness_bench_{scale}"
+
+# ----------------- COPY STREAMING -----------------
+class _LineStream(io.TextIOBase):
+    """Read-only file object over an iterator of text lines, for copy_expert."""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self._buf = ""
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buf) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buf += line
+        if size < 0:
+            out, self._buf = self._buf, ""
+        else:
+            out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def _tsv(values):
+    return "\t".join("\\N" if v is None else str(v) for v in values) + "\n"
+
+
+def _copy(table: str, columns, rows, chunk_rows: int = COPY_CHUNK_ROWS):
+    """COPY `rows` into `table` one chunk (and one transaction) at a time. Returns the row count."""
+    total = 0
+    rows = iter(rows)
+    while True:
+        count = 0
+
+        def chunk():
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield _tsv(row)
+                if count >= chunk_rows:
+                    return
+
+        with db.get_connection() as cur:
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", _LineStream(chunk()))
+        total += count
+        if count < chunk_rows:
+            return total
+
+# ----------------- GENERATORS -----------------
+def _users(n: int, seed: int):
+    rng = random.Random(f"{seed}-users")
+    for uid in range(1, n + 1):
+        yield uid, f"Bench User {uid:07d}", f"bench{uid}@example.invalid", round(rng.uniform(45, 120), 1)
+
+
+def _friend_pairs(n: int, mean_friends: int, seed: int):
+    rng = random.Random(f"{seed}-friends")
+    # Pareto(alpha=2) has mean 2*xm; scale so the average initiated degree is mean_friends / 2
+    # (every edge is counted for both endpoints).
+    xm = max(mean_friends / 4, 0.5)
+    for uid in range(1, n + 1):
+        degree = min(int(rng.paretovariate(2.0) * xm), n - 1)
+        for _ in range(degree):
+            # u**3 concentrates partners on low ids -> heavy-tailed in-degree
+            other = 1 + int((n - 1) * rng.random() ** 3)
+            if other != uid:
+                yield min(uid, other), max(uid, other)
+
+
+def _workouts_and_exercises(n: int, mean_workouts: int, years: int, seed: int, end: date):
+    """Yield ("w", row) and ("e", row) tuples; workout ids are assigned 1..M in order."""
+    rng = random.Random(f"{seed}-workouts")
+    span_days = 365 * years
+    start = end - timedelta(days=span_days)
+    sigma = 1.0
+    mu = math.log(mean_workouts) - sigma ** 2 / 2  # log-normal with the requested mean
+    workout_id = 0
+    exercise_id = 0
+    for uid in range(1, n + 1):
+        count = min(int(rng.lognormvariate(mu, sigma)), span_days * 2)
+        base_minutes = rng.randint(20, 70)
+        favourites = rng.sample(EXERCISE_NAMES, 6)
+        for day in sorted(rng.randrange(span_days) for _ in range(count)):
+            workout_id += 1
+            workout_date = start + timedelta(days=day)
+            yield "w", (workout_id, uid, workout_date, max(5, int(rng.gauss(base_minutes, 15))))
+            for _ in range(rng.randint(0, 8)):
+                exercise_id += 1
+                exercise_type_id = EXERCISE_NAMES.index(rng.choice(favourites)) + 1
+                yield "e", (
+                    exercise_id, workout_id, workout_date, uid, exercise_type_id, rng.randint(5, 15), rng.randint(2, 5),
+                    round(rng.uniform(5, 140), 1) if rng.random() < 0.8 else None,
+                )
+
+
+def _goals(n: int, seed: int, today: date):
+    rng = random.Random(f"{seed}-goals")
+    for uid in range(1, n + 1):
+        for _ in range(rng.randint(0, 3)):
+            start = today - timedelta(days=rng.randint(0, 120))
+            days = rng.choice((7, 30, 90))
+            per_week = rng.randint(2, 6)
+            # two thirds structured (count or minutes target), the rest free text
+            target_type = rng.choice(("workouts", "minutes", None))
+            target_value = {"workouts": per_week * days // 7, "minutes": per_week * days // 7 * 45}.get(target_type)
+            yield (uid, f"Work out {per_week} times a week", start, start + timedelta(days=days), rng.random() < 0.3,
+                   target_type, target_value)
+
+# ----------------- LOADING -----------------
+def ensure_database(name: str):
+    """Create database `name` (via the maintenance DB) if it doesn't exist."""
+    conn = psycopg2.connect(host=db.DB_HOST, dbname="postgres", user=db.DB_USER, password=db.DB_PASSWORD)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (name,))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{name}";')
+    finally:
+        conn.close()
+
+
+def use_database(name: str):
+    """Point backend_fitness (and its pool/cache) at database `name`."""
+    db.close_pool()
+    db.clear_cache()
+    db.DB_NAME = name
+
+
+def _reset():
+    with db.get_connection() as cur:
+        cur.execute("TRUNCATE users, workouts, exercises, goals, friends, exercise_catalog RESTART IDENTITY CASCADE;")
+
+
+def _sync_sequences():
+    with db.get_connection() as cur:
+        for table, column in (("users", "user_id"), ("workouts", "workout_id"), ("exercises", "exercise_id"),
+                              ("exercise_catalog", "exercise_type_id")):
+            cur.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), "
+                f"COALESCE((SELECT MAX({column}) FROM {table}), 0) + 1, false);"
+            )
+
+
+def generate(scale: str = "tiny", seed: int = 42, database: str | None = None, today: date | None = None,
+             progress=print):
+    """
+    (Re)build the benchmark database for `scale` and return row counts.
+    `today` anchors the generated history; it defaults to a fixed date so
+    reruns are byte-for-byte identical.
+    """
+    params = SCALES[scale]
+    today = today or date(2025, 1, 1)
+    database = database or bench_db_name(scale)
+    ensure_database(database)
+    use_database(database)
+    migrate_fitness.init()
+    _reset()
+
+    n = params["users"]
+    counts = {}
+    progress(f"[{scale}] users")
+    counts["users"] = _copy("users", ("user_id", "name", "email", "weight"), _users(n, seed))
+
+    progress(f"[{scale}] friends")
+    with db.get_connection() as cur:
+        cur.execute("CREATE UNLOGGED TABLE IF NOT EXISTS bench_friend_pairs (user_id INT, friend_id INT);")
+        cur.execute("TRUNCATE bench_friend_pairs;")
+    _copy("bench_friend_pairs", ("user_id", "friend_id"), _friend_pairs(n, params["friends_per_user"], seed))
+    with db.get_connection() as cur:
+        cur.execute(
+            """INSERT INTO friends (user_id, friend_id)
+               SELECT DISTINCT user_id, friend_id FROM bench_friend_pairs
+               ORDER BY user_id, friend_id
+               ON CONFLICT (user_id, friend_id) DO NOTHING;"""
+        )
+        counts["friends"] = cur.rowcount
+        cur.execute("DROP TABLE bench_friend_pairs;")
+
+    progress(f"[{scale}] workouts + exercises")
+    # exercise_type_id i + 1 is EXERCISE_NAMES[i]
+    _copy("exercise_catalog", ("exercise_type_id", "canonical_name", "display_name"),
+          ((i + 1, name.lower(), name) for i, name in enumerate(EXERCISE_NAMES)))
+    with db.get_connection() as cur:
+        cur.execute("SELECT create_month_partitions(%s, %s);",
+                    (today - timedelta(days=365 * params["years"]), today + timedelta(days=90)))
+    # Workouts and exercises come out of one interleaved generator; split them into two
+    # COPY passes by regenerating (deterministic, so both passes see identical data).
+    counts["workouts"] = _copy(
+        "workouts", ("workout_id", "user_id", "workout_date", "duration_minutes"),
+        (row for kind, row in _workouts_and_exercises(n, params["workouts_per_user"], params["years"], seed, today)
+         if kind == "w"),
+    )
+    counts["exercises"] = _copy(
+        "exercises",
+        ("exercise_id", "workout_id", "workout_date", "user_id", "exercise_type_id", "reps", "sets", "weight_lifted"),
+        (row for kind, row in _workouts_and_exercises(n, params["workouts_per_user"], params["years"], seed, today)
+         if kind == "e"),
+    )
+
+    progress(f"[{scale}] goals")
+    counts["goals"] = _copy(
+        "goals",
+        ("user_id", "goal_description", "start_date", "end_date", "is_completed", "target_type", "target_value"),
+        _goals(n, seed, today),
+    )
+    _sync_sequences()
+    with db.get_connection() as cur:
+        cur.connection.autocommit = True
+        cur.execute("VACUUM ANALYZE;")
+        cur.connection.autocommit = False
+    progress(f"[{scale}] done: {counts}")
+    return counts
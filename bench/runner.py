@@ -0,0 +1,299 @@
+# bench/runner.py
+"""
+Latency / throughput benchmark of backend_fitness functions.
+
+For every (scale, function, concurrency) combination the runner starts
+`concurrency` threads that call the function back to back with arguments
+drawn from a seeded sampler, for a fixed duration (after a short warm-up).
+It records per-call wall time and reports p50/p95/p99, mean and max latency
+plus calls per second. The read cache is switched off and the connection
+pool is sized to the concurrency level, so the numbers reflect the database
+work behind each call.
+
+Results are plain JSON so two runs can be diffed with compare().
+"""
+import json
+import platform
+import random
+import statistics
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import analytics_fitness as analytics
+import backend_fitness as db
+import metrics_fitness as metrics
+from bench import datagen
+
+DEFAULT_FUNCTIONS = (
+    "get_user_by_id",
+    "list_friends",
+    "suggest_friends",
+    "list_workouts",
+    "list_workouts_page",
+    "list_exercises",
+    "leaderboard_for_week",
+    "global_leaderboard_page",
+    "global_rank",
+    "overall_insights",
+    "training_summary",
+)
+
+
+def _sampler(name: str, max_user_id: int, workouts, rng: random.Random, today: date):
+    """
+    Return a zero-arg callable producing an argument tuple for `name`.
+    `workouts` is a sample of existing (workout_id, workout_date) pairs.
+    """
+    week_start, week_end = db.week_bounds(today)
+
+    def user():
+        return rng.randint(1, max_user_id)
+
+    samplers = {
+        "get_user_by_id": lambda: (user(),),
+        "list_friends": lambda: (user(),),
+        "suggest_friends": lambda: (user(),),
+        "list_workouts": lambda: (user(), today - timedelta(days=30), today),
+        "list_workouts_page": lambda: (user(),),
+        "list_exercises": lambda: tuple(rng.choice(workouts)),
+        "leaderboard_for_week": lambda: (user(), rng.choice(("workouts", "minutes")), week_start, week_end),
+        "global_leaderboard_page": lambda: (rng.choice(("workouts", "minutes")), week_start),
+        "global_rank": lambda: (user(), rng.choice(("workouts", "minutes")), week_start),
+        "global_leaderboard_neighbors": lambda: (user(), rng.choice(("workouts", "minutes")), week_start),
+        "overall_insights": lambda: (user(),),
+        "personal_records": lambda: (user(),),
+        "training_summary": lambda: (user(), today),
+    }
+    return samplers[name]
+
+
+def percentile(sorted_values, pct: float):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def measure(fn, make_args, concurrency: int, duration: float, warmup: float = 1.0, seed: int = 0):
+    """Call fn(*make_args()) from `concurrency` threads for `duration` seconds."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_gate = threading.Barrier(concurrency + 1)
+    stop_at = [0.0]
+    record_from = [0.0]
+
+    def worker():
+        local, local_errors = [], 0
+        start_gate.wait()
+        while True:
+            args = make_args()
+            t0 = time.perf_counter()
+            if t0 >= stop_at[0]:
+                break
+            try:
+                fn(*args)
+            except Exception:
+                local_errors += 1
+                continue
+            if t0 >= record_from[0]:
+                local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    now = time.perf_counter()
+    record_from[0] = now + warmup
+    stop_at[0] = now + warmup + duration
+    start_gate.wait()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        "calls": len(ms),
+        "errors": errors[0],
+        "throughput_per_s": round(len(ms) / duration, 1),
+        "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "max_ms": round(ms[-1], 3) if ms else 0.0,
+    }
+
+
+def _function(name: str):
+    return getattr(analytics, name) if hasattr(analytics, name) else getattr(db, name)
+
+
+WORKOUT_SAMPLE_SIZE = 5000
+WORKOUT_SAMPLE_SQL = """
+    SELECT workout_id, workout_date FROM workouts TABLESAMPLE BERNOULLI (%s) REPEATABLE (0)
+    ORDER BY workout_id LIMIT %s;
+"""
+
+
+def _id_ranges():
+    with db.get_connection() as cur:
+        cur.execute("SELECT COALESCE(MAX(user_id), 0) FROM users;")
+        max_user = cur.fetchone()[0]
+        cur.execute("SELECT COALESCE(MAX(workout_id), 0) FROM workouts;")
+        max_workout = cur.fetchone()[0]
+        # by-id lookups need the workout's date too (partitioning, migrations/0009)
+        cur.execute(WORKOUT_SAMPLE_SQL, (min(100.0, 100.0 * WORKOUT_SAMPLE_SIZE / max(max_workout, 1)),
+                                         WORKOUT_SAMPLE_SIZE))
+        workouts = cur.fetchall()
+        cur.execute("SELECT MAX(workout_date) FROM workouts;")
+        last_day = cur.fetchone()[0] or date.today()
+    return max_user, workouts, last_day
+
+
+def run(scales=("tiny",), functions=DEFAULT_FUNCTIONS, concurrency_levels=(1, 8), duration: float = 10.0,
+        warmup: float = 1.0, seed: int = 42, progress=print):
+    """Benchmark each function at each scale and concurrency level; returns the JSON-able result dict."""
+    results = []
+    for scale in scales:
+        datagen.use_database(datagen.bench_db_name(scale))
+        max_user, workouts, last_day = _id_ranges()
+        if not max_user:
+            raise RuntimeError(f"Benchmark database for scale '{scale}' is empty; run 'python -m bench generate'.")
+        for concurrency in concurrency_levels:
+            db.configure_cache(enabled=False)
+            db.configure_pool(enabled=True, min_size=concurrency, max_size=concurrency)
+            for name in functions:
+                rng = random.Random(f"{seed}-{scale}-{name}-{concurrency}")
+                lock = threading.Lock()
+                sample = _sampler(name, max_user, workouts, rng, last_day)
+
+                def make_args(sample=sample, lock=lock):
+                    with lock:
+                        return sample()
+
+                stats = measure(_function(name), make_args, concurrency, duration, warmup)
+                row = {"scale": scale, "function": name, "concurrency": concurrency, **stats}
+                results.append(row)
+                progress(
+                    f"{scale:>7} {name:<22} c={concurrency:<3} p50={stats['p50_ms']:.2f}ms "
+                    f"p95={stats['p95_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms {stats['throughput_per_s']}/s"
+                )
+            db.close_pool()
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "seed": seed,
+            "duration_s": duration,
+            "warmup_s": warmup,
+            "python": platform.python_version(),
+            "host": platform.node(),
+        },
+        "results": results,
+    }
+
+
+def _planning_ms(sql, params):
+    """PostgreSQL's planning time for one statement (EXPLAIN without ANALYZE, so nothing runs)."""
+    with db.get_connection() as cur:
+        cur.execute("EXPLAIN (SUMMARY) " + sql, params)
+        lines = [r[0] for r in cur.fetchall()]
+    return sum(float(line.split(":")[1].split()[0]) for line in lines if line.startswith("Planning Time"))
+
+
+def planning(scale: str = "tiny", functions=DEFAULT_FUNCTIONS, calls: int = 200, rounds: int = 3, seed: int = 42,
+             progress=print):
+    """
+    What server-side prepared statements save per call, for each function:
+    planning_ms is PostgreSQL's planning time for the statements one call
+    issues; unprepared_ms / prepared_ms are the best-of-`rounds` mean wall
+    time per call on one pooled connection with PREPARED_STATEMENTS off / on.
+    """
+    datagen.use_database(datagen.bench_db_name(scale))
+    max_user, workouts, last_day = _id_ranges()
+    if not max_user:
+        raise RuntimeError(f"Benchmark database for scale '{scale}' is empty; run 'python -m bench generate'.")
+    prepared_setting = db.PREPARED_STATEMENTS
+    db.configure_cache(enabled=False)
+    db.configure_pool(enabled=True, min_size=1, max_size=1)
+    results = []
+    try:
+        for name in functions:
+            fn = _function(name)
+            sample = _sampler(name, max_user, workouts, random.Random(f"{seed}-{name}"), last_day)
+            args_list = [sample() for _ in range(calls)]
+
+            scope = metrics.start_scope(f"planning:{name}", keep_statements=True)
+            fn(*args_list[0])
+            metrics.finish_scope(scope)
+            planning_ms = sum(_planning_ms(sql, params) for sql, params in scope.statements)
+
+            best = {False: float("inf"), True: float("inf")}
+            for _ in range(rounds):
+                for prepared in (False, True):
+                    db.PREPARED_STATEMENTS = prepared
+                    fn(*args_list[0])  # prepares on the pooled connection
+                    started = time.perf_counter()
+                    for args in args_list:
+                        fn(*args)
+                    best[prepared] = min(best[prepared], (time.perf_counter() - started) * 1000 / calls)
+            row = {
+                "scale": scale,
+                "function": name,
+                "statements": len(scope.statements),
+                "planning_ms": round(planning_ms, 3),
+                "unprepared_ms": round(best[False], 3),
+                "prepared_ms": round(best[True], 3),
+                "saved_ms": round(best[False] - best[True], 3),
+            }
+            results.append(row)
+            progress(
+                f"{scale:>7} {name:<28} planning={row['planning_ms']:.3f}ms "
+                f"unprepared={row['unprepared_ms']:.3f}ms prepared={row['prepared_ms']:.3f}ms "
+                f"saved={row['saved_ms']:+.3f}ms/call"
+            )
+    finally:
+        db.PREPARED_STATEMENTS = prepared_setting
+        db.close_pool()
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "seed": seed,
+            "calls": calls,
+            "rounds": rounds,
+            "python": platform.python_version(),
+            "host": platform.node(),
+        },
+        "results": results,
+    }
+
+
+def save(result: dict, path: str):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+
+def load(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, current: dict, metric: str = "p95_ms", threshold: float = 0.20):
+    """
+    Match rows on (scale, function, concurrency) and return a list of
+    (key, baseline_value, current_value, relative_change, regressed) tuples;
+    `regressed` is True when `metric` got worse by more than `threshold`.
+    """
+    base = {(r["scale"], r["function"], r["concurrency"]): r for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        key = (r["scale"], r["function"], r["concurrency"])
+        if key not in base:
+            continue
+        old, new = base[key][metric], r[metric]
+        change = (new - old) / old if old else 0.0
+        rows.append((key, old, new, round(change, 4), change > threshold))
+    return rows
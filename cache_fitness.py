@@ -0,0 +1,140 @@
+# cache_fitness.py
+"""
+In-process read-through cache for backend_fitness read functions.
+
+Entries are keyed by function name + arguments, expire after a TTL, and are
+evicted least-recently-used once the cache is full. Each entry carries tags
+such as ("workouts", user_id); write functions invalidate by tag, which drops
+exactly the entries whose data they touched.
+
+Callers get their own copy of every value (see _detached), so changing a
+returned page or DataFrame never changes what the next caller sees.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, time as time_of_day, timedelta
+from decimal import Decimal
+
+_IMMUTABLE = (type(None), bool, int, float, str, bytes, Decimal, date, datetime, time_of_day, timedelta,
+              frozenset)
+
+
+def _detached(value):
+    """
+    A copy of `value` that shares nothing mutable with it: lists, dicts and
+    tuples are rebuilt all the way down (a tuple of immutable values is reused
+    as is), immutable leaves are shared, anything else is deep-copied.
+    """
+    if isinstance(value, _IMMUTABLE):
+        return value
+    if type(value) is list:
+        return [_detached(v) for v in value]
+    if type(value) is tuple:
+        items = tuple(_detached(v) for v in value)
+        return value if all(a is b for a, b in zip(items, value)) else items
+    if type(value) is dict:
+        return {k: _detached(v) for k, v in value.items()}
+    return copy.deepcopy(value)
+
+
+class QueryCache:
+    # How many recently invalidated tags to remember for the load/invalidate race check.
+    TAG_HISTORY = 100_000
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._by_tag = {}              # tag -> set(keys)
+        self._invalidated = OrderedDict()  # tag -> epoch of its latest invalidation
+        self._epoch = 0
+        self._floor_epoch = 0          # invalidations older than this were forgotten
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_tag[tag]
+
+    def get_or_load(self, key, loader, tags_for):
+        """
+        Return the cached value for `key`, or call loader(), tag the result with
+        tags_for(result) and cache it. A load that overlaps an invalidation of
+        any of its tags is returned but not cached, so it can't reinstate stale data;
+        so is one whose tags_for returns None.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+            else:
+                if entry is not None:
+                    self._drop(key)
+                    self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                started_at = self._epoch
+                entry = None
+        if entry is not None:
+            # cached values are never changed in place, so copying outside the lock is safe
+            return _detached(entry[1])
+
+        value = loader()
+        tags = tags_for(value)
+        if tags is None:
+            return value
+        tags = frozenset(tags)
+        cached = _detached(value)  # the caller keeps the loaded value
+
+        with self._lock:
+            stale = started_at < self._floor_epoch or any(
+                self._invalidated.get(tag, 0) > started_at for tag in tags
+            )
+            if not stale and self.max_entries > 0:
+                if key in self._entries:
+                    self._drop(key)
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, cached, tags)
+                for tag in tags:
+                    self._by_tag.setdefault(tag, set()).add(key)
+                while len(self._entries) > self.max_entries:
+                    self._drop(next(iter(self._entries)))
+                    self._stats["evictions"] += 1
+        return value
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._epoch += 1
+            for tag in tags:
+                for key in list(self._by_tag.get(tag, ())):
+                    self._drop(key)
+                    self._stats["invalidations"] += 1
+                self._invalidated[tag] = self._epoch
+                self._invalidated.move_to_end(tag)
+            while len(self._invalidated) > self.TAG_HISTORY:
+                _, epoch = self._invalidated.popitem(last=False)
+                self._floor_epoch = max(self._floor_epoch, epoch)
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._floor_epoch = self._epoch
+            self._entries.clear()
+            self._by_tag.clear()
+            self._invalidated.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
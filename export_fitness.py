@@ -0,0 +1,244 @@
+# export_fitness.py
+"""
+Columnar export of workouts, exercises and goals to Parquet or Arrow IPC files.
+
+Each table is streamed out of PostgreSQL with COPY ... TO STDOUT (CSV) into a
+pipe, and pyarrow's streaming CSV reader turns it into record batches of
+about `chunk_bytes` that go straight to the file writer. No Python object is
+built per row and memory stays at a few chunks whatever the table size.
+
+All tables of one export come from a single REPEATABLE READ snapshot. The
+export's watermark is the oldest transaction still running at that snapshot.
+Passing it back as `since` exports only rows inserted or updated from then on
+(see migrations/0008). Deletes are not tracked, and a row can appear in two
+consecutive increments; keep the latest per primary key.
+
+    python export_fitness.py OUT_DIR [--user-id N] [--format parquet|arrow] [--incremental]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+import backend_fitness as db
+
+EXPORT_FORMATS = ("parquet", "arrow")
+DEFAULT_CHUNK_BYTES = 8 << 20
+MANIFEST_FILE = "manifest.json"
+
+# ----------------- TABLES -----------------
+# table: (SELECT list, FROM clause, user filter column, change column, Arrow schema)
+EXPORT_TABLES = {
+    "workouts": (
+        "w.workout_id, w.user_id, w.workout_date, w.duration_minutes",
+        "workouts w",
+        "w.user_id",
+        "w.change_txid",
+        pa.schema([
+            ("workout_id", pa.int32()),
+            ("user_id", pa.int32()),
+            ("workout_date", pa.date32()),
+            ("duration_minutes", pa.int32()),
+        ]),
+    ),
+    "exercises": (
+        "e.exercise_id, e.workout_id, e.user_id, c.display_name, e.reps, e.sets, e.weight_lifted::float8",
+        "exercises e JOIN exercise_catalog c ON c.exercise_type_id = e.exercise_type_id",
+        "e.user_id",
+        "e.change_txid",
+        pa.schema([
+            ("exercise_id", pa.int32()),
+            ("workout_id", pa.int32()),
+            ("user_id", pa.int32()),
+            ("exercise_name", pa.string()),
+            ("reps", pa.int32()),
+            ("sets", pa.int32()),
+            ("weight_lifted", pa.float64()),
+        ]),
+    ),
+    "goals": (
+        "g.goal_id, g.user_id, g.goal_description, g.start_date, g.end_date, g.is_completed, "
+        "g.target_type, g.target_value::float8, g.target_exercise, g.progress::float8",
+        "goals g",
+        "g.user_id",
+        "g.change_txid",
+        pa.schema([
+            ("goal_id", pa.int32()),
+            ("user_id", pa.int32()),
+            ("goal_description", pa.string()),
+            ("start_date", pa.date32()),
+            ("end_date", pa.date32()),
+            ("is_completed", pa.bool_()),
+            ("target_type", pa.string()),
+            ("target_value", pa.float64()),
+            ("target_exercise", pa.string()),
+            ("progress", pa.float64()),
+        ]),
+    ),
+}
+WATERMARK_SQL = "SELECT txid_snapshot_xmin(txid_current_snapshot());"
+
+def export_sql(table: str, user_id: int | None = None, since: int | None = None):
+    """The SELECT behind one table's export, with %(user_id)s / %(since)s placeholders."""
+    columns, source, user_column, change_column, _ = EXPORT_TABLES[table]
+    where = []
+    if user_id is not None:
+        where.append(f"{user_column} = %(user_id)s")
+    if since is not None:
+        where.append(f"{change_column} >= %(since)s")
+    return f"SELECT {columns} FROM {source}" + (" WHERE " + " AND ".join(where) if where else "")
+
+# ----------------- STREAMING -----------------
+def _open_writer(sink, schema, fmt: str):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    if fmt == "arrow":
+        return ipc.new_file(sink, schema)
+    raise ValueError(f"Unknown export format: {fmt}")
+
+def _copy_table(cur, sql: str, schema, writer, chunk_bytes: int):
+    """COPY `sql` out through a pipe into `writer`, one record batch per CSV block. Returns the row count."""
+    read_fd, write_fd = os.pipe()
+    failure = []
+
+    def produce():
+        try:
+            with os.fdopen(write_fd, "wb") as out:
+                cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", out)
+        except BaseException as e:  # surfaced in the caller's thread below
+            failure.append(e)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    rows = 0
+    try:
+        with os.fdopen(read_fd, "rb") as stream:
+            if stream.peek(1):
+                reader = pacsv.open_csv(
+                    stream,
+                    read_options=pacsv.ReadOptions(column_names=schema.names, block_size=chunk_bytes),
+                    parse_options=pacsv.ParseOptions(newlines_in_values=True),
+                    convert_options=pacsv.ConvertOptions(
+                        column_types=schema,
+                        strings_can_be_null=True,        # unquoted empty field = SQL NULL
+                        quoted_strings_can_be_null=False,  # "" = empty string
+                        true_values=["t"],
+                        false_values=["f"],
+                    ),
+                )
+                for batch in reader:
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+    finally:
+        # closing the read end (above) unblocks a producer stuck on a full pipe
+        producer.join()
+    if failure:
+        raise failure[0]
+    return rows
+
+def export_table(table: str, sink, user_id: int | None = None, since: int | None = None,
+                 fmt: str = "parquet", chunk_bytes: int = DEFAULT_CHUNK_BYTES):
+    """
+    Export one table to `sink` (a path or a binary file object, e.g. BytesIO).
+    Returns (rows, watermark).
+    """
+    report = export_history(None, user_id, since, fmt, chunk_bytes, tables=(table,), sinks={table: sink})
+    return report["rows"][table], report["watermark"]
+
+def export_history(dest_dir, user_id: int | None = None, since: int | None = None, fmt: str = "parquet",
+                   chunk_bytes: int = DEFAULT_CHUNK_BYTES, tables=tuple(EXPORT_TABLES), sinks=None, progress=None):
+    """
+    Export `tables` for one user (or everyone) to `dest_dir`, one file per table
+    named <table>.<since or "full">-<watermark>.<fmt>, plus manifest.json.
+    `sinks` ({table: path or file object}) overrides the file names.
+    progress(table, rows) is called after each table. Returns the report dict:
+    files, rows, watermark, since, user_id, seconds, rows_per_second.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    started = time.perf_counter()
+    report = {"files": {}, "rows": {}, "watermark": None, "since": since, "user_id": user_id,
+              "seconds": 0.0, "rows_per_second": 0.0}
+    params = {"user_id": user_id, "since": since}
+
+    with db.get_connection() as cur:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+        cur.execute(WATERMARK_SQL)
+        report["watermark"] = watermark = cur.fetchone()[0]
+        for table in tables:
+            schema = EXPORT_TABLES[table][4]
+            if sinks and table in sinks:
+                sink = sinks[table]
+            else:
+                sink = str(Path(dest_dir) / f"{table}.{since if since is not None else 'full'}-{watermark}.{fmt}")
+            sql = cur.mogrify(export_sql(table, user_id, since), params).decode()
+            writer = _open_writer(sink, schema, fmt)
+            try:
+                rows = _copy_table(cur, sql, schema, writer, chunk_bytes)
+            finally:
+                writer.close()
+            report["files"][table] = sink if isinstance(sink, str) else None
+            report["rows"][table] = rows
+            if progress is not None:
+                progress(table, rows)
+
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    total = sum(report["rows"].values())
+    report["rows_per_second"] = round(total / report["seconds"], 1) if report["seconds"] else 0.0
+    if dest_dir is not None:
+        manifest = {**report, "format": fmt, "created_at": datetime.now().isoformat(timespec="seconds")}
+        (Path(dest_dir) / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    return report
+
+def last_watermark(dest_dir):
+    """Watermark of the previous export into `dest_dir`, or None if there is none."""
+    path = Path(dest_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))["watermark"]
+
+# ----------------- CLI -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export workouts, exercises and goals to Parquet/Arrow")
+    parser.add_argument("out_dir", help="directory for the exported files (created if missing)")
+    parser.add_argument("--user-id", type=int, default=None, help="export one user instead of everyone")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="parquet")
+    parser.add_argument("--since", type=int, default=None, help="watermark of a previous export")
+    parser.add_argument("--incremental", action="store_true",
+                        help="continue from the watermark in OUT_DIR/manifest.json")
+    parser.add_argument("--tables", default=",".join(EXPORT_TABLES), help="comma separated")
+    parser.add_argument("--chunk-bytes", type=int, default=DEFAULT_CHUNK_BYTES)
+    args = parser.parse_args(argv)
+
+    Path(args.out_dir).mkdir(parents=True, exist_ok=True)
+    since = args.since
+    if args.incremental and since is None:
+        since = last_watermark(args.out_dir)
+    tables = tuple(t for t in args.tables.split(",") if t)
+    unknown = set(tables) - set(EXPORT_TABLES)
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(sorted(unknown))}")
+
+    def progress(table, rows):
+        print(f"  {table}: {rows} rows", file=sys.stderr)
+
+    report = export_history(args.out_dir, args.user_id, since, args.format, args.chunk_bytes, tables,
+                            progress=progress)
+    print(
+        f"Exported {sum(report['rows'].values())} rows in {report['seconds']}s "
+        f"({report['rows_per_second']} rows/s); watermark {report['watermark']}."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,37 @@
 # frontend_fitness.py
+import io
 import streamlit as st
 import pandas as pd
 from datetime import date, timedelta
+import analytics_fitness as analytics
 import backend_fitness as db
+import export_fitness
+import import_fitness
+import metrics_fitness
 
 st.set_page_config(page_title="Personal Fitness Tracker", layout="wide")
 
+# ---------- DB POOL ----------
+# The backend module is imported once per process, so this only runs on the first rerun.
+if not db.POOL_ENABLED:
+    db.configure_pool(min_size=1, max_size=10)
+
+# Queue workout/exercise/goal writes in a local journal and commit them in the
+# background (backend_fitness WRITE-BEHIND); absorbs bursts of form submissions.
+WRITE_BEHIND = False
+if WRITE_BEHIND and not db.WRITE_BEHIND_ENABLED:
+    db.configure_write_behind()
+
 # ---------- PROJECT SIGNATURE ----------
 PROJECT_SIGNATURE = "Shuchi Iyer_30189"
 
 # ---------- SESSION STATE ----------
 if "current_user_id" not in st.session_state:
     st.session_state.current_user_id = None
+# Replica reads wait for this session's own writes only (backend_fitness READ REPLICAS).
+if "write_session" not in st.session_state:
+    st.session_state.write_session = db.WriteSession()
+db.bind_write_session(st.session_state.write_session)
 
 # ---------- SIDEBAR NAV ----------
 st.sidebar.title("Navigation")
@@ -23,24 +43,103 @@ menu = [
     "Goals",
     "Leaderboard",
     "Insights",
+    "Admin: Performance",
 ]
 choice = st.sidebar.radio("Go to", menu, index=0)
 
+# ---------- QUERY BUDGET ----------
+# Every backend statement issued during this rerun is counted against a scope.
+# Pages can end early (st.stop), so the previous rerun's scope is closed and
+# checked against the budget at the start of the next one.
+QUERY_BUDGET_PER_RERUN = 10
+if "query_scope" in st.session_state:
+    metrics_fitness.finish_scope(st.session_state.query_scope, QUERY_BUDGET_PER_RERUN)
+st.session_state.last_rerun = st.session_state.query_scope.summary() if "query_scope" in st.session_state else None
+st.session_state.query_scope = metrics_fitness.start_scope(choice)
+
 # ---------- HELPERS ----------
 def ensure_user_selected():
     if st.session_state.current_user_id is None:
         st.warning("Select or create your user profile first.")
         st.stop()
 
-def user_picker():
-    users = db.list_users()
+def keyset_pager(state_key, fetch_page, prev_label="◀ Previous", next_label="Next ▶"):
+    """
+    Show one page from fetch_page(after) -> (rows, next_after) with prev/next buttons.
+    The 'after' cursor of every visited page is kept in session state.
+    """
+    stack = st.session_state.setdefault(state_key, [None])
+    rows, next_after = fetch_page(stack[-1])
+    c_prev, c_next, c_info = st.columns([1, 1, 4])
+    if c_prev.button(prev_label, key=f"{state_key}_prev", disabled=len(stack) == 1):
+        stack.pop()
+        st.rerun()
+    if c_next.button(next_label, key=f"{state_key}_next", disabled=next_after is None):
+        stack.append(next_after)
+        st.rerun()
+    c_info.caption(f"Page {len(stack)}")
+    return rows
+
+USER_SEARCH_LIMIT = 20
+
+def user_picker(label="Select your profile", key="user", exclude=None):
+    """
+    Pick a user by typing part of their name or email (the best
+    USER_SEARCH_LIMIT matches from db.search_users); with an empty search box,
+    page through everyone instead. `exclude` hides one user_id.
+    Returns (user_id or None, {user_id: row}).
+    """
+    query = st.text_input("Search by name or email", key=f"{key}_search")
+    if query.strip():
+        users = db.search_users(query, limit=USER_SEARCH_LIMIT)
+    else:
+        users = keyset_pager(f"{key}_pages", lambda after: db.list_users_page(after, limit=50))
+    users = [u for u in users if u[0] != exclude]
     if not users:
+        st.caption("No matching users." if query.strip() else "No users found.")
         return None, {}
-    options = [f"{u[1]} ({u[2]})" for u in users]
     mapping = {f"{u[1]} ({u[2]})": u[0] for u in users}
-    selection = st.selectbox("Select your profile", options)
+    selection = st.selectbox(label, list(mapping), key=f"{key}_select")
     return mapping[selection], {u[0]: u for u in users}
 
+# Friends leaderboards follow backend_fitness LIVE UPDATES: the board is read
+# once and kept in the session. Every LIVE_REFRESH_SECONDS a tiny fragment
+# checks the session's subscription in memory (no query, nothing drawn); only
+# when events for the board's users and week arrived does it rerun the page,
+# which applies them to the kept board without querying.
+LIVE_REFRESH_SECONDS = 2
+
+def activity_subscription():
+    """This session's live activity subscription (dropped along with the session)."""
+    if "activity_subscription" not in st.session_state:
+        st.session_state.activity_subscription = db.subscribe_activity()
+    return st.session_state.activity_subscription
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def live_refresh_trigger():
+    if activity_subscription().has_pending():
+        st.rerun()
+
+def live_friends_board(user_id, circle, key, label, week_start, week_end):
+    events = activity_subscription().poll()
+    board = st.session_state.get("friends_board")
+    board_key = (user_id, circle, key, week_start)
+    if events is None or board is None or board["key"] != board_key:
+        rows = db.leaderboard_for_week(user_id, key, week_start, week_end)
+        board = {"key": board_key, "rows": {uid: [name, value] for uid, name, value in rows}}
+        st.session_state.friends_board = board
+    else:
+        for uid, _, workouts, minutes in events:
+            if uid in board["rows"]:
+                board["rows"][uid][1] = workouts if key == "workouts" else minutes
+    if board["rows"]:
+        rows = sorted(board["rows"].values(), key=lambda r: (-r[1], r[0]))
+        df = pd.DataFrame(rows, columns=["name", label])
+        df.index = df.index + 1
+        st.dataframe(df, use_container_width=True)
+    else:
+        st.caption("No activity yet this week for you or your friends.")
+
 # ---------- USER PROFILE ----------
 if choice == "User Profile":
     st.header("Manage User Profile")
@@ -86,19 +185,15 @@ elif choice == "Friends":
     col_a, col_b = st.columns(2)
     with col_a:
         st.subheader("Add Friend")
-        # list all users except self
-        users = [u for u in db.list_users() if u[0] != st.session_state.current_user_id]
-        if users:
-            friend_map = {f"{u[1]} ({u[2]})": u[0] for u in users}
-            friend_label = st.selectbox("Choose a user to add", list(friend_map.keys()))
+        friend_id, _ = user_picker("Choose a user to add", key="friend_user",
+                                   exclude=st.session_state.current_user_id)
+        if friend_id:
             if st.button("Add Friend"):
                 try:
-                    db.add_friendship(st.session_state.current_user_id, friend_map[friend_label])
+                    db.add_friendship(st.session_state.current_user_id, friend_id)
                     st.success("Friend added.")
                 except Exception as e:
                     st.error(f"Could not add friend: {e}")
-        else:
-            st.caption("No other users found. Create another user in 'User Profile' to test friendships.")
 
     with col_b:
         st.subheader("Your Friends")
@@ -117,6 +212,24 @@ elif choice == "Friends":
         else:
             st.caption("No friends yet.")
 
+    st.subheader("People You May Know")
+    suggestions = db.suggest_friends(st.session_state.current_user_id, limit=10)
+    if suggestions:
+        st.dataframe(
+            pd.DataFrame(suggestions, columns=["user_id", "name", "email", "mutual_friends"]),
+            use_container_width=True,
+        )
+        suggestion_map = {f"{r[1]} ({r[2]}) - {r[3]} mutual": r[0] for r in suggestions}
+        suggestion_label = st.selectbox("Suggested friend", list(suggestion_map.keys()))
+        if st.button("Add Suggested Friend"):
+            try:
+                db.add_friendship(st.session_state.current_user_id, suggestion_map[suggestion_label])
+                st.success("Friend added.")
+            except Exception as e:
+                st.error(f"Could not add friend: {e}")
+    else:
+        st.caption("No suggestions yet; suggestions come from your friends' friends.")
+
 # ---------- LOG WORKOUT ----------
 elif choice == "Log Workout":
     st.header("Log a Workout")
@@ -126,30 +239,62 @@ elif choice == "Log Workout":
     with st.form("workout_form"):
         w_date = st.date_input("Workout date", value=date.today())
         duration = st.number_input("Duration (minutes)", min_value=1, step=1)
-        submitted = st.form_submit_button("Create Workout")
+        st.caption("Exercises in this session (add as many rows as you need)")
+        ex_rows = st.data_editor(
+            pd.DataFrame(
+                {
+                    "exercise": pd.Series(dtype="str"),
+                    "sets": pd.Series(dtype="Int64"),
+                    "reps": pd.Series(dtype="Int64"),
+                    "weight_kg": pd.Series(dtype="float"),
+                }
+            ),
+            num_rows="dynamic",
+            use_container_width=True,
+            key="session_exercises",
+        )
+        submitted = st.form_submit_button("Log Workout")
         if submitted:
+            exercises = [
+                (
+                    str(r.exercise).strip(),
+                    int(r.reps) if pd.notna(r.reps) and r.reps > 0 else None,
+                    int(r.sets) if pd.notna(r.sets) and r.sets > 0 else None,
+                    float(r.weight_kg) if pd.notna(r.weight_kg) and r.weight_kg > 0 else None,
+                )
+                for r in ex_rows.itertuples(index=False)
+                if pd.notna(r.exercise) and str(r.exercise).strip()
+            ]
             try:
-                wid = db.log_workout(st.session_state.current_user_id, w_date, int(duration))
-                st.success(f"Workout created (ID {wid}). Now add exercises below.")
+                wid, ex_ids = db.log_workout_with_exercises(
+                    st.session_state.current_user_id, w_date, int(duration), exercises
+                )
+                st.success(f"Workout created (ID {wid}) with {len(ex_ids)} exercise(s).")
                 st.session_state["last_workout_id"] = wid
+                st.session_state.pop("workout_pages", None)  # jump back to the newest page
             except Exception as e:
                 st.error(f"Error creating workout: {e}")
 
     # Add exercises to the most recent or selected workout
     st.subheader("Add Exercises")
-    # Allow selecting a workout
-    workouts = db.list_workouts(st.session_state.current_user_id)
+    # Allow selecting a workout (newest first, one page at a time)
+    workouts = keyset_pager(
+        "workout_pages",
+        lambda after: db.list_workouts_page(st.session_state.current_user_id, after, limit=25),
+        prev_label="◀ Newer",
+        next_label="Older ▶",
+    )
     if workouts:
-        wmap = {f"{w[1]} (ID {w[0]}) — {w[2]} min": w[0] for w in workouts}
+        wmap = {f"{w[1]} (ID {w[0]}) — {w[2]} min": (w[0], w[1]) for w in workouts}  # (id, date)
         default_index = 0
         if "last_workout_id" in st.session_state:
             # try to set default to last created
             try:
-                default_index = list(wmap.values()).index(st.session_state["last_workout_id"])
+                default_index = [v[0] for v in wmap.values()].index(st.session_state["last_workout_id"])
             except ValueError:
                 default_index = 0
         selected_label = st.selectbox("Select workout", list(wmap.keys()), index=default_index)
-        selected_workout_id = wmap[selected_label]
+        selected_workout_id, selected_workout_date = wmap[selected_label]
 
         with st.form("exercise_form"):
             ex_name = st.text_input("Exercise name (e.g., Bench Press)")
@@ -161,6 +306,7 @@ elif choice == "Log Workout":
                 try:
                     ex_id = db.add_exercise(
                         selected_workout_id,
+                        selected_workout_date,
                         ex_name,
                         int(ex_reps) if ex_reps > 0 else None,
                         int(ex_sets) if ex_sets > 0 else None,
@@ -171,7 +317,7 @@ elif choice == "Log Workout":
                     st.error(f"Error adding exercise: {e}")
 
         st.subheader("Exercises in Selected Workout")
-        ex = db.list_exercises(selected_workout_id)
+        ex = db.list_exercises(selected_workout_id, selected_workout_date)
         if ex:
             ex_df = pd.DataFrame(ex, columns=["exercise_id", "name", "reps", "sets", "weight_kg"])
             st.dataframe(ex_df, use_container_width=True)
@@ -198,25 +344,81 @@ elif choice == "Workout History":
         st.dataframe(df, use_container_width=True)
         st.bar_chart(df.set_index("date")["duration_min"])
         # Delete option
-        to_del = st.selectbox("Delete workout (optional)", [f"ID {r[0]} — {r[1]} ({r[2]} min)" for r in data])
+        dmap = {f"ID {r[0]} — {r[1]} ({r[2]} min)": r for r in data}
+        to_del = st.selectbox("Delete workout (optional)", list(dmap.keys()))
         if st.button("Delete selected workout"):
-            wid = int(to_del.split()[1])
+            wid, wdate = dmap[to_del][:2]
             try:
-                db.delete_workout(wid, st.session_state.current_user_id)
+                db.delete_workout(wid, wdate, st.session_state.current_user_id)
                 st.success("Workout deleted.")
             except Exception as e:
                 st.error(f"Could not delete workout: {e}")
     else:
         st.caption("No workouts found in this period.")
 
+    with st.expander("Import history from another tracker"):
+        st.caption(
+            "CSV (with header) or JSON Lines, one row per exercise: workout_ref, workout_date, "
+            "duration_minutes, exercise_name, reps, sets, weight_lifted. Rows with the same "
+            "workout_ref become one workout."
+        )
+        upload = st.file_uploader("History file", type=["csv", "jsonl", "ndjson"])
+        if upload is not None and st.button("Import"):
+            try:
+                report = import_fitness.import_history(
+                    io.TextIOWrapper(upload, encoding="utf-8", newline=""),
+                    import_fitness.detect_format(upload.name),
+                    user_id=st.session_state.current_user_id,
+                )
+                st.success(
+                    f"Imported {report['workouts']} workouts and {report['exercises']} exercises "
+                    f"({report['rows_per_second']} rows/s)."
+                )
+                if report["rejected_count"]:
+                    st.warning(f"{report['rejected_count']} rows rejected.")
+                    st.dataframe(
+                        pd.DataFrame(report["rejected"], columns=["line", "reason"]),
+                        use_container_width=True,
+                    )
+            except Exception as e:
+                st.error(f"Import failed: {e}")
+
+    with st.expander("Export my history"):
+        st.caption("Parquet or Arrow IPC files, readable by pandas, Polars, DuckDB, Spark and friends.")
+        c_table, c_fmt = st.columns(2)
+        export_table = c_table.selectbox("Data", list(export_fitness.EXPORT_TABLES))
+        export_fmt = c_fmt.selectbox("Format", export_fitness.EXPORT_FORMATS)
+        if st.button("Prepare export"):
+            buffer = io.BytesIO()
+            try:
+                rows, _ = export_fitness.export_table(
+                    export_table, buffer, user_id=st.session_state.current_user_id, fmt=export_fmt
+                )
+                st.session_state.history_export = (f"{export_table}.{export_fmt}", buffer.getvalue(), rows)
+            except Exception as e:
+                st.error(f"Export failed: {e}")
+        if "history_export" in st.session_state:
+            file_name, payload, rows = st.session_state.history_export
+            st.download_button(f"Download {file_name} ({rows} rows)", payload, file_name=file_name,
+                               mime="application/octet-stream")
+
 # ---------- GOALS ----------
 elif choice == "Goals":
     st.header("Goals")
     st.markdown(f"**{PROJECT_SIGNATURE}**")
     ensure_user_selected()
 
+    goal_kinds = {
+        "Free text (complete by hand)": None,
+        "Number of workouts": "workouts",
+        "Total minutes": "minutes",
+        "Lift a weight on an exercise": "exercise_weight",
+    }
     with st.form("goal_form"):
         desc = st.text_area("Goal description (e.g., 'Workout 5 times a week')")
+        kind = st.selectbox("Target", list(goal_kinds.keys()))
+        target_value = st.number_input("Target value (workouts, minutes or kg)", min_value=0.0, step=1.0)
+        target_exercise = st.text_input("Exercise (for weight goals)")
         start_d = st.date_input("Start date", value=date.today())
         end_d = st.date_input("End date", value=date.today() + timedelta(days=7))
         submitted = st.form_submit_button("Create Goal")
@@ -225,7 +427,12 @@ elif choice == "Goals":
                 st.error("End date must be after start date.")
             else:
                 try:
-                    gid = db.create_goal(st.session_state.current_user_id, desc, start_d, end_d)
+                    gid = db.create_goal(
+                        st.session_state.current_user_id, desc, start_d, end_d,
+                        target_type=goal_kinds[kind],
+                        target_value=target_value or None,
+                        target_exercise=target_exercise.strip() or None,
+                    )
                     st.success(f"Goal created (ID {gid}).")
                 except Exception as e:
                     st.error(f"Error creating goal: {e}")
@@ -234,9 +441,18 @@ elif choice == "Goals":
     goals = db.list_goals(st.session_state.current_user_id)
     if goals:
         gdf = pd.DataFrame(
-            goals, columns=["goal_id", "description", "start", "end", "completed"]
+            goals,
+            columns=["goal_id", "description", "start", "end", "completed",
+                     "target", "target_value", "exercise", "progress"],
+        )
+        # progress is computed live from workouts in the goal's date range (empty for free-text goals)
+        gdf["progress_pct"] = (
+            gdf["progress"].astype(float) / gdf["target_value"].astype(float) * 100
+        ).clip(upper=100).round(0)
+        st.dataframe(
+            gdf, use_container_width=True,
+            column_config={"progress_pct": st.column_config.ProgressColumn("Progress", min_value=0, max_value=100)},
         )
-        st.dataframe(gdf, use_container_width=True)
         # Toggle completion
         target = st.selectbox("Select goal", [f"ID {g[0]} — {g[1][:40]}" for g in goals])
         gid = int(target.split()[1])
@@ -272,16 +488,43 @@ elif choice == "Leaderboard":
     metric = st.selectbox("Rank by", ["Total workouts", "Total minutes"])
     key = "workouts" if metric == "Total workouts" else "minutes"
 
-    data = db.leaderboard_for_week(
-        st.session_state.current_user_id, key, monday, sunday
-    )
-    if data:
-        df = pd.DataFrame(data, columns=["user_id", "name", "value"]).reset_index(drop=True)
-        df.index = df.index + 1
-        df.rename(columns={"value": metric}, inplace=True)
-        st.dataframe(df[["name", metric]], use_container_width=True)
-    else:
-        st.caption("No activity yet this week for you or your friends.")
+    tab_friends, tab_global = st.tabs(["Friends", "Everyone"])
+
+    with tab_friends:
+        # The board is re-read when the circle, metric or week changes; watch
+        # the circle before reading so no event falls in between.
+        user_id = st.session_state.current_user_id
+        circle = tuple(sorted({user_id, *(f[0] for f in db.list_friends(user_id))}))
+        activity_subscription().watch(circle, week_start=monday)
+        live_friends_board(user_id, circle, key, metric, monday, sunday)
+        live_refresh_trigger()
+
+    with tab_global:
+        standing = db.global_rank(st.session_state.current_user_id, key, monday)
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Your rank", f"{standing['rank']} / {standing['ranked_users']}")
+        c2.metric("Percentile", f"{standing['percentile']}%")
+        c3.metric(metric, standing["value"])
+
+        def board_frame(rows):
+            df = pd.DataFrame(rows, columns=["rank", "user_id", "name", "value"]).set_index("rank")
+            return df.rename(columns={"value": metric})[["name", metric]]
+
+        st.subheader("Around you")
+        around = db.global_leaderboard_neighbors(st.session_state.current_user_id, key, monday)
+        if around:
+            st.dataframe(board_frame(around), use_container_width=True)
+        else:
+            st.caption("Log a workout this week to appear on the global board.")
+
+        st.subheader("Top")
+        # cursors depend on the metric, so each metric keeps its own page stack
+        top = keyset_pager(f"global_board_pages_{key}",
+                           lambda after: db.global_leaderboard_page(key, monday, after, limit=25))
+        if top:
+            st.dataframe(board_frame(top), use_container_width=True)
+        else:
+            st.caption("No activity yet this week.")
 
 # ---------- INSIGHTS ----------
 elif choice == "Insights":
@@ -298,14 +541,117 @@ elif choice == "Insights":
     c5.metric("Max duration", f"{stats['max_duration']} min")
     c6.metric("Total exercises", stats["total_exercises"])
 
+    summary = analytics.training_summary(st.session_state.current_user_id)
+    streak = summary["streaks"]
+    s1, s2, s3, s4 = st.columns(4)
+    s1.metric("Current streak", f"{streak['current']} days")
+    s2.metric("Longest streak", f"{streak['longest']} days")
+    s3.metric("Active days", streak["active_days"])
+    s4.metric("Total volume", f"{summary['total_volume']:,.0f} kg")
+
     # Trend: minutes per day (last 30 days)
     st.subheader("Last 30 days — Minutes per day")
-    from datetime import timedelta
-    last30_start = date.today() - timedelta(days=30)
-    workouts = db.list_workouts(st.session_state.current_user_id, last30_start, date.today())
-    if workouts:
-        df = pd.DataFrame(workouts, columns=["workout_id", "date", "minutes"])
-        agg = df.groupby("date", as_index=True)["minutes"].sum()
-        st.line_chart(agg)
+    daily = summary["daily"]
+    last30 = daily[daily.index >= pd.Timestamp(date.today() - timedelta(days=30))]
+    if last30["minutes"].any():
+        st.line_chart(last30["minutes"])
     else:
         st.caption("No workouts in the last 30 days.")
+
+    st.subheader("Training load — rolling 7 vs 28 days")
+    st.line_chart(daily[["acute_7d", "chronic_28d"]].tail(120))
+
+    st.subheader("Weekly totals")
+    weekly = summary["weekly"]
+    if not weekly.empty:
+        recent = weekly.tail(12)
+        st.bar_chart(recent["minutes"])
+        st.dataframe(recent.round(1), use_container_width=True)
+    else:
+        st.caption("No weekly history yet.")
+
+    st.subheader("Personal records")
+    records = summary["records"]
+    if not records.empty:
+        st.dataframe(records, use_container_width=True, hide_index=True)
+    else:
+        st.caption("Log exercises to start tracking personal records.")
+
+    st.subheader("Exercise history")
+    bests = db.personal_records(st.session_state.current_user_id)
+    if bests:
+        exercise = st.selectbox("Exercise", [name for name, _, _, _ in bests], key="history_exercise")
+        _, best_weight, best_volume, last_performed = next(r for r in bests if r[0] == exercise)
+        h1, h2, h3 = st.columns(3)
+        h1.metric("Best weight", f"{best_weight} kg" if best_weight is not None else "—")
+        h2.metric("Best volume", f"{best_volume:,.0f} kg")
+        h3.metric("Last performed", str(last_performed))
+        history = db.exercise_history(st.session_state.current_user_id, exercise)
+        st.dataframe(
+            pd.DataFrame(history, columns=["Date", "Workout ID", "Exercise ID", "Reps", "Sets", "Weight"]),
+            use_container_width=True, hide_index=True,
+        )
+    else:
+        st.caption("No exercises logged yet.")
+
+# ---------- ADMIN: PERFORMANCE ----------
+elif choice == "Admin: Performance":
+    st.header("Backend Performance")
+    st.markdown(f"**{PROJECT_SIGNATURE}**")
+
+    stats = metrics_fitness.function_stats()
+    if stats:
+        fdf = pd.DataFrame.from_dict(stats, orient="index").drop(columns=["histogram"])
+        fdf = fdf.sort_values("calls", ascending=False)
+        st.subheader("Per-function latency")
+        st.dataframe(fdf, use_container_width=True)
+
+        fn = st.selectbox("Latency histogram for", list(fdf.index))
+        hist = stats[fn]["histogram"]
+        labels = [f"≤{b} ms" for b in hist["buckets_ms"]] + [f">{hist['buckets_ms'][-1]} ms"]
+        st.bar_chart(pd.DataFrame({"calls": hist["counts"]}, index=labels))
+    else:
+        st.caption("No backend calls recorded yet in this process.")
+
+    st.subheader("Queries per rerun")
+    st.caption(f"Budget: {QUERY_BUDGET_PER_RERUN} queries per rerun")
+    if st.session_state.last_rerun:
+        st.write(st.session_state.last_rerun)
+    reruns = metrics_fitness.rerun_stats()
+    if reruns:
+        st.dataframe(pd.DataFrame.from_dict(reruns, orient="index"), use_container_width=True)
+
+    st.subheader(f"Slow queries (≥ {metrics_fitness.SLOW_QUERY_MS:.0f} ms)")
+    slow = metrics_fitness.slow_queries()
+    if slow:
+        st.dataframe(pd.DataFrame(slow[::-1]), use_container_width=True)
+    else:
+        st.caption("None recorded.")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.subheader("Connection pool")
+        st.write(db.pool_stats() or "Pooling is off.")
+    with c2:
+        st.subheader("Read cache")
+        st.write(db.cache_stats())
+
+    st.subheader("Read replicas")
+    replicas = db.replica_status()
+    if replicas:
+        st.dataframe(pd.DataFrame(replicas), use_container_width=True)
+    else:
+        st.info("No read replicas configured; all reads go to the primary.")
+
+    st.subheader("Write-behind queue")
+    st.write(db.write_behind_stats())
+
+    st.subheader("Live updates")
+    st.write(db.live_updates_stats())
+
+    st.download_button(
+        "Download Prometheus metrics",
+        metrics_fitness.render_prometheus(),
+        file_name="fitness_metrics.prom",
+        mime="text/plain",
+    )
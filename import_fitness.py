@@ -0,0 +1,305 @@
+# import_fitness.py
+"""
+Bulk import of workout history (e.g. from another tracker) via PostgreSQL COPY.
+
+Input is CSV (with a header row) or JSON Lines, one record per exercise:
+
+    user_id, workout_ref, workout_date, duration_minutes, exercise_name, reps, sets, weight_lifted
+
+Records sharing (user_id, workout_ref) belong to the same workout; a blank
+workout_ref falls back to "<workout_date>/<duration_minutes>". A record with
+no exercise_name creates (or joins) the workout without adding an exercise.
+
+The file is read and COPY'd in chunks so memory stays flat; workouts get
+their ids set-wise from the workouts sequence and the whole import commits
+as one transaction.
+
+    python import_fitness.py history.csv [--user-id N] [--chunk-rows N]
+"""
+import argparse
+import csv
+import io
+import json
+import math
+import sys
+import time
+from datetime import date
+from itertools import islice
+from pathlib import Path
+
+import backend_fitness as db
+
+IMPORT_COLUMNS = (
+    "user_id", "workout_ref", "workout_date", "duration_minutes",
+    "exercise_name", "reps", "sets", "weight_lifted",
+)
+DEFAULT_CHUNK_ROWS = 10_000
+MAX_REPORTED_REJECTS = 1000
+EXERCISE_NAME_MAX_LENGTH = 255  # exercise_catalog.canonical_name / display_name
+
+# ----------------- READING & VALIDATION -----------------
+def detect_format(name: str):
+    return "jsonl" if name.lower().endswith((".jsonl", ".ndjson")) else "csv"
+
+def read_records(stream, fmt: str):
+    """Yield (line_no, dict) from an open text stream; malformed JSON yields (line_no, None)."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            yield line_no, record if isinstance(record, dict) else None
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+# A value COPY would reject fails the whole import, so anything that doesn't
+# fit its column is rejected here, row by row.
+def _int(value, field):
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{field} must be a whole number")
+    number = int(value)
+    if not db.INT4_MIN <= number <= db.INT4_MAX:
+        raise ValueError(f"{field} is out of range")
+    return number
+
+def _opt_int(value, field):
+    if _blank(value):
+        return None
+    number = _int(value, field)
+    if number < 0:
+        raise ValueError(f"{field} must not be negative")
+    return number
+
+def _opt_float(value, field):
+    if _blank(value):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{field} must be a number")
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"{field} must be a finite number")
+    if number < 0:
+        raise ValueError(f"{field} must not be negative")
+    return number
+
+def validate(record, user_id: int | None = None):
+    """Return a tuple in IMPORT_COLUMNS order, or raise ValueError with the reason."""
+    if record is None:
+        raise ValueError("not a JSON object")
+    uid = user_id if user_id is not None else record.get("user_id")
+    if _blank(uid):
+        raise ValueError("user_id is required")
+    uid = _int(uid, "user_id")
+    if _blank(record.get("workout_date")):
+        raise ValueError("workout_date is required")
+    workout_date = date.fromisoformat(str(record["workout_date"]).strip()[:10])
+    if _blank(record.get("duration_minutes")):
+        raise ValueError("duration_minutes is required")
+    duration = _int(record["duration_minutes"], "duration_minutes")
+    if duration <= 0:
+        raise ValueError("duration_minutes must be positive")
+    workout_ref = record.get("workout_ref")
+    workout_ref = f"{workout_date}/{duration}" if _blank(workout_ref) else str(workout_ref).strip()
+    name = record.get("exercise_name")
+    name = None if _blank(name) else str(name).strip()
+    if name is not None and len(name) > EXERCISE_NAME_MAX_LENGTH:
+        raise ValueError("exercise_name is too long")
+    return (
+        uid, workout_ref, workout_date, duration, name,
+        _opt_int(record.get("reps"), "reps"),
+        _opt_int(record.get("sets"), "sets"),
+        _opt_float(record.get("weight_lifted"), "weight_lifted"),
+    )
+
+def _chunks(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+# ----------------- STAGING & MERGE -----------------
+def _create_staging(cur):
+    cur.execute(
+        """CREATE TEMP TABLE import_rows (
+               line_no INT NOT NULL,
+               user_id INT NOT NULL,
+               workout_ref TEXT NOT NULL,
+               workout_date DATE NOT NULL,
+               duration_minutes INT NOT NULL,
+               exercise_name VARCHAR(255),
+               reps INT,
+               sets INT,
+               weight_lifted DECIMAL
+           ) ON COMMIT DROP;
+           CREATE TEMP TABLE import_workouts (
+               user_id INT NOT NULL,
+               workout_ref TEXT NOT NULL,
+               workout_id INT NOT NULL,
+               workout_date DATE NOT NULL,
+               PRIMARY KEY (user_id, workout_ref)
+           ) ON COMMIT DROP;"""
+    )
+
+def _copy_rows(cur, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for line_no, values in rows:
+        writer.writerow((line_no, *values))
+    buf.seek(0)
+    cur.copy_expert(
+        "COPY import_rows (line_no, " + ", ".join(IMPORT_COLUMNS) + ") FROM STDIN WITH (FORMAT csv)",
+        buf,
+    )
+
+def _merge_chunk(cur):
+    """Move the staged chunk into workouts/exercises. Returns (rejected, workouts, exercises)."""
+    cur.execute(
+        """DELETE FROM import_rows r
+           WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = r.user_id)
+           RETURNING line_no, user_id;"""
+    )
+    rejected = [(line_no, f"unknown user_id {uid}") for line_no, uid in cur.fetchall()]
+    # Months without a partition would land in workouts_default (migrations/0009).
+    cur.execute("SELECT create_month_partitions(MIN(workout_date), MAX(workout_date)) FROM import_rows;")
+
+    # New workouts get ids straight from the workouts sequence, so exercises can be
+    # joined to them set-wise (and across chunks) through import_workouts.
+    cur.execute(
+        """WITH new_keys AS (
+               SELECT DISTINCT ON (r.user_id, r.workout_ref)
+                      r.user_id, r.workout_ref, r.workout_date, r.duration_minutes
+               FROM import_rows r
+               WHERE NOT EXISTS (
+                   SELECT 1 FROM import_workouts k
+                   WHERE k.user_id = r.user_id AND k.workout_ref = r.workout_ref
+               )
+               ORDER BY r.user_id, r.workout_ref, r.line_no
+           ), keyed AS (
+               INSERT INTO import_workouts (user_id, workout_ref, workout_id, workout_date)
+               SELECT user_id, workout_ref, nextval(pg_get_serial_sequence('workouts', 'workout_id')), workout_date
+               FROM new_keys
+               RETURNING user_id, workout_ref, workout_id
+           )
+           INSERT INTO workouts (workout_id, user_id, workout_date, duration_minutes)
+           SELECT k.workout_id, n.user_id, n.workout_date, n.duration_minutes
+           FROM keyed k
+           JOIN new_keys n ON n.user_id = k.user_id AND n.workout_ref = k.workout_ref;"""
+    )
+    workouts = cur.rowcount
+
+    # Intern the chunk's exercise names once, then join the catalog (migrations/0011).
+    cur.execute(
+        """SELECT exercise_type_ids(array_agg(DISTINCT exercise_name))
+           FROM import_rows WHERE exercise_name IS NOT NULL;"""
+    )
+    cur.execute(
+        """INSERT INTO exercises (workout_id, workout_date, user_id, exercise_type_id, reps, sets, weight_lifted)
+           SELECT k.workout_id, k.workout_date, k.user_id, c.exercise_type_id, r.reps, r.sets, r.weight_lifted
+           FROM import_rows r
+           JOIN import_workouts k ON k.user_id = r.user_id AND k.workout_ref = r.workout_ref
+           JOIN exercise_catalog c ON c.canonical_name = canonical_exercise_name(r.exercise_name)
+           WHERE r.exercise_name IS NOT NULL
+           ORDER BY r.line_no;"""
+    )
+    exercises = cur.rowcount
+    cur.execute("TRUNCATE import_rows;")
+    return rejected, workouts, exercises
+
+# ----------------- PIPELINE -----------------
+def import_history(source, fmt: str | None = None, user_id: int | None = None,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS, progress=None):
+    """
+    Import workouts/exercises from `source` (a path or an open text stream).
+    user_id, if given, overrides the user_id column (front-end uploads).
+    progress(report) is called after each chunk. Returns the report dict:
+    rows_read, rows_loaded, workouts, exercises, rejected_count,
+    rejected [(line_no, reason)] (first MAX_REPORTED_REJECTS), seconds, rows_per_second.
+    """
+    if isinstance(source, (str, Path)):
+        with open(source, newline="", encoding="utf-8") as stream:
+            return import_history(stream, fmt or detect_format(str(source)), user_id, chunk_rows, progress)
+    fmt = fmt or "csv"
+
+    report = {
+        "rows_read": 0, "rows_loaded": 0, "workouts": 0, "exercises": 0,
+        "rejected_count": 0, "rejected": [], "seconds": 0.0, "rows_per_second": 0.0,
+    }
+    touched_users = set()
+    started = time.perf_counter()
+
+    def reject(line_no, reason):
+        report["rejected_count"] += 1
+        if len(report["rejected"]) < MAX_REPORTED_REJECTS:
+            report["rejected"].append((line_no, reason))
+
+    with db.get_connection() as cur:
+        _create_staging(cur)
+        for chunk in _chunks(read_records(source, fmt), chunk_rows):
+            valid = []
+            for line_no, record in chunk:
+                try:
+                    valid.append((line_no, validate(record, user_id)))
+                except (ValueError, TypeError) as e:
+                    reject(line_no, str(e))
+            report["rows_read"] += len(chunk)
+            if not valid:
+                continue
+            _copy_rows(cur, valid)
+            rejected, workouts, exercises = _merge_chunk(cur)
+            for line_no, reason in rejected:
+                reject(line_no, reason)
+            report["rows_loaded"] += len(valid) - len(rejected)
+            report["workouts"] += workouts
+            report["exercises"] += exercises
+            touched_users.update(values[0] for _, values in valid)
+            report["seconds"] = time.perf_counter() - started
+            report["rows_per_second"] = round(report["rows_read"] / report["seconds"], 1) if report["seconds"] else 0.0
+            if progress is not None:
+                progress(report)
+
+    for uid in touched_users:
+        db._invalidate(("workouts", uid), ("insights", uid))
+    report["seconds"] = round(time.perf_counter() - started, 3)
+    report["rows_per_second"] = round(report["rows_read"] / report["seconds"], 1) if report["seconds"] else 0.0
+    return report
+
+# ----------------- CLI -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-import workout history via COPY")
+    parser.add_argument("path", help="CSV or JSON Lines file")
+    parser.add_argument("--format", choices=("csv", "jsonl"), default=None, help="default: from file extension")
+    parser.add_argument("--user-id", type=int, default=None, help="import every row for this user")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    def progress(report):
+        print(f"  {report['rows_read']} rows read, {report['rows_per_second']} rows/s", file=sys.stderr)
+
+    report = import_history(args.path, args.format, args.user_id, args.chunk_rows, progress)
+    print(
+        f"Imported {report['workouts']} workouts and {report['exercises']} exercises "
+        f"from {report['rows_loaded']}/{report['rows_read']} rows "
+        f"in {report['seconds']}s ({report['rows_per_second']} rows/s)."
+    )
+    if report["rejected_count"]:
+        print(f"{report['rejected_count']} rows rejected:")
+        for line_no, reason in report["rejected"]:
+            print(f"  line {line_no}: {reason}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
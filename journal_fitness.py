@@ -0,0 +1,151 @@
+# journal_fitness.py
+"""
+Durable append-only journal for backend_fitness write-behind mode.
+
+Every queued write is appended as one JSON line {"seq", "op", "args"} and
+(by default) fsynced before the caller gets control back. When the flusher has
+committed entries to PostgreSQL it appends {"ack": seq}, meaning everything up
+to seq is in the database. Reopening the journal after a crash yields the
+entries after the last ack, which are replayed; the database side is
+idempotent, so an entry committed just before the crash can safely be replayed.
+A torn last line (crash mid-append) is ignored. Once nothing is pending the
+file is truncated.
+
+One journal file belongs to one process: opening it takes an exclusive lock
+on PATH.lock and raises JournalLocked while another process holds it.
+Entries the database rejected at flush time, after the caller was already
+told they were saved, are appended to PATH.dead with the error, for someone
+to look at; they are never retried automatically.
+"""
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class JournalLocked(RuntimeError):
+    pass
+
+
+def _lock_file(path: str):
+    """Open `path` and take an exclusive, non-blocking lock on it (released when the file is closed)."""
+    f = open(path, "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        f.close()
+        raise JournalLocked(f"{path} is held by another process; give each process its own journal.") from None
+    return f
+
+
+class WriteJournal:
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.dead_letter_path = path + ".dead"
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        # the journal itself is replaced by _rewrite, so lock a file that stays put
+        self._lock_file = _lock_file(path + ".lock")
+        self._pending = self._load()
+        self._seq = self._pending[-1]["seq"] if self._pending else 0
+        self._synced = self._seq
+        self._rewrite(self._pending)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _load(self):
+        entries, acked = [], 0
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn write at the tail
+                if "ack" in record:
+                    acked = max(acked, record["ack"])
+                else:
+                    entries.append(record)
+        return [e for e in entries if e["seq"] > acked]
+
+    def _rewrite(self, entries):
+        # drops acked entries and any torn tail, so new appends start on a clean line
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _write(self, record, sync: bool = True):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self._file.flush()
+        if self.fsync and sync:
+            os.fsync(self._file.fileno())
+
+    def pending(self):
+        """Entries that were never acknowledged, oldest first (read once, at startup)."""
+        return list(self._pending)
+
+    def append(self, op: str, args: dict, sync: bool = True):
+        """
+        Record one write; returns its sequence number. With sync=False the
+        entry is only handed to the OS: call sync(seq) before relying on it.
+        """
+        with self._lock:
+            self._seq += 1
+            self._write({"seq": self._seq, "op": op, "args": args}, sync=sync)
+            return self._seq
+
+    def sync(self, seq: int):
+        """
+        Make every entry up to `seq` durable. One fsync covers all appends made
+        before it, so concurrent callers mostly find their entry already synced.
+        """
+        if not self.fsync:
+            return
+        with self._sync_lock:
+            if self._synced >= seq or self._file.closed:  # close() syncs
+                return
+            with self._lock:
+                target = self._seq
+            os.fsync(self._file.fileno())
+            self._synced = target
+
+    def ack(self, seq: int, drained: bool = False):
+        """Everything up to `seq` is committed. `drained`: nothing newer is pending, so truncate."""
+        with self._lock:
+            if drained and seq == self._seq:
+                self._file.truncate(0)
+                self._file.seek(0)
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            else:
+                self._write({"ack": seq})
+            self._pending = []
+
+    def dead_letter(self, entry: dict, error: str):
+        """Durably set aside an entry the database rejected."""
+        record = {**entry, "error": error, "rejected_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with self._lock, open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        with self._sync_lock, self._lock:
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._file.close()
+            self._lock_file.close()
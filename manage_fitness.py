@@ -0,0 +1,486 @@
+# manage_fitness.py
+"""
+Maintenance commands for derived tables and scheduled jobs.
+
+    python manage_fitness.py rebuild-weekly-activity [--user-id N]
+    python manage_fitness.py check-user-stats [--user-id N] [--repair]
+    python manage_fitness.py rebuild-exercise-records [--user-id N]
+    python manage_fitness.py evaluate-goals [--today YYYY-MM-DD]
+    python manage_fitness.py flush-writes [--journal PATH]
+    python manage_fitness.py partitions
+    python manage_fitness.py partition-workouts [--batch-rows N]
+    python manage_fitness.py ensure-partitions [--months-ahead N]
+    python manage_fitness.py split-default-partition
+    python manage_fitness.py archive-partitions --before YYYY-MM [--drop]
+"""
+import argparse
+import re
+import sys
+from datetime import date
+
+import backend_fitness as db
+import migrate_fitness
+from journal_fitness import JournalLocked
+
+# ----------------- WEEKLY ACTIVITY ROLLUP -----------------
+def rebuild_weekly_activity(user_id: int | None = None):
+    """
+    Recompute weekly_activity from workouts (for one user or everyone).
+    Writes to workouts are blocked for the duration so the rebuilt rows cannot
+    miss a concurrent insert; reads carry on. Returns the number of rollup rows.
+    """
+    with db.get_connection() as cur:
+        cur.execute("LOCK TABLE workouts IN SHARE MODE;")
+        if user_id is None:
+            cur.execute("DELETE FROM weekly_activity;")
+        else:
+            cur.execute("DELETE FROM weekly_activity WHERE user_id = %s;", (user_id,))
+        cur.execute(
+            """INSERT INTO weekly_activity (user_id, week_start, workout_count, total_minutes)
+               SELECT user_id, date_trunc('week', workout_date)::date, COUNT(*), SUM(duration_minutes)
+               FROM workouts
+               WHERE %s IS NULL OR user_id = %s
+               GROUP BY 1, 2;""",
+            (user_id, user_id),
+        )
+        return cur.rowcount
+
+# ----------------- USER STATS -----------------
+USER_STATS_COLUMNS = ("workout_count", "total_minutes", "min_duration", "max_duration", "exercise_count")
+# user_stats as it should be, recomputed from the source tables.
+EXPECTED_USER_STATS_SQL = """
+    SELECT u.user_id,
+           COALESCE(w.workout_count, 0) AS workout_count,
+           COALESCE(w.total_minutes, 0) AS total_minutes,
+           w.min_duration, w.max_duration,
+           COALESCE(e.exercise_count, 0) AS exercise_count
+    FROM users u
+    LEFT JOIN (
+        SELECT user_id, COUNT(*) AS workout_count, SUM(duration_minutes) AS total_minutes,
+               MIN(duration_minutes) AS min_duration, MAX(duration_minutes) AS max_duration
+        FROM workouts GROUP BY user_id
+    ) w ON w.user_id = u.user_id
+    LEFT JOIN (
+        SELECT w.user_id, COUNT(*) AS exercise_count
+        FROM exercises e JOIN workouts w ON w.workout_id = e.workout_id AND w.workout_date = e.workout_date
+        GROUP BY w.user_id
+    ) e ON e.user_id = u.user_id
+    WHERE (%(user_id)s IS NULL OR u.user_id = %(user_id)s)
+      AND (w.user_id IS NOT NULL OR e.user_id IS NOT NULL)
+"""
+
+def check_user_stats(user_id: int | None = None, repair: bool = False):
+    """
+    Compare user_stats with a full recomputation and return
+    [(user_id, stored_row or None, expected_row or None)] for every mismatch.
+    With repair=True the mismatching rows are rewritten (writes to workouts
+    and exercises are blocked meanwhile so the repair can't race a trigger).
+    """
+    with db.get_connection() as cur:
+        if repair:
+            cur.execute("LOCK TABLE workouts, exercises IN SHARE MODE;")
+        cur.execute(
+            """WITH expected AS ({expected})
+               SELECT COALESCE(x.user_id, s.user_id),
+                      CASE WHEN s.user_id IS NULL THEN NULL
+                           ELSE ARRAY[s.workout_count, s.total_minutes, s.min_duration, s.max_duration, s.exercise_count]
+                      END,
+                      CASE WHEN x.user_id IS NULL THEN NULL
+                           ELSE ARRAY[x.workout_count, x.total_minutes, x.min_duration, x.max_duration, x.exercise_count]
+                      END
+               FROM expected x
+               FULL JOIN (SELECT * FROM user_stats WHERE %(user_id)s IS NULL OR user_id = %(user_id)s) s
+                 ON s.user_id = x.user_id
+               WHERE (x.workout_count, x.total_minutes, x.min_duration, x.max_duration, x.exercise_count)
+                     IS DISTINCT FROM
+                     (s.workout_count, s.total_minutes, s.min_duration, s.max_duration, s.exercise_count)
+                 -- an all-zero stored row for a user with no history is fine
+                 AND NOT (x.user_id IS NULL AND s.workout_count = 0 AND s.exercise_count = 0)
+               ORDER BY 1;""".format(expected=EXPECTED_USER_STATS_SQL),
+            {"user_id": user_id},
+        )
+        mismatches = cur.fetchall()
+        if repair and mismatches:
+            ids = [m[0] for m in mismatches]
+            cur.execute("DELETE FROM user_stats WHERE user_id = ANY(%s);", (ids,))
+            cur.execute(
+                """INSERT INTO user_stats (user_id, {columns})
+                   SELECT user_id, {columns} FROM ({expected}) x
+                   WHERE x.user_id = ANY(%(ids)s);""".format(
+                    columns=", ".join(USER_STATS_COLUMNS), expected=EXPECTED_USER_STATS_SQL
+                ),
+                {"user_id": user_id, "ids": ids},
+            )
+    if repair:
+        for uid, _, _ in mismatches:
+            db._invalidate(("insights", uid))
+    return mismatches
+
+# ----------------- EXERCISE RECORDS -----------------
+# exercise_records as it should be (migrations/0011), for the users in %(user_ids)s (NULL: everyone).
+EXPECTED_EXERCISE_RECORDS_SQL = """
+    SELECT user_id, exercise_type_id, MAX(weight_lifted),
+           MAX(COALESCE(sets, 0) * COALESCE(reps, 0) * COALESCE(weight_lifted, 0)), MAX(workout_date)
+    FROM exercises
+    WHERE %(user_ids)s::int[] IS NULL OR user_id = ANY(%(user_ids)s)
+    GROUP BY user_id, exercise_type_id
+"""
+
+def _rebuild_exercise_records(cur, user_ids):
+    cur.execute(
+        "DELETE FROM exercise_records WHERE %(user_ids)s::int[] IS NULL OR user_id = ANY(%(user_ids)s);",
+        {"user_ids": user_ids},
+    )
+    cur.execute(
+        "INSERT INTO exercise_records (user_id, exercise_type_id, best_weight, best_volume, last_performed) "
+        + EXPECTED_EXERCISE_RECORDS_SQL + ";",
+        {"user_ids": user_ids},
+    )
+    return cur.rowcount
+
+def rebuild_exercise_records(user_id: int | None = None):
+    """
+    Recompute exercise_records from exercises (for one user or everyone),
+    blocking writes to exercises meanwhile like rebuild_weekly_activity.
+    Returns the number of record rows.
+    """
+    with db.get_connection() as cur:
+        cur.execute("LOCK TABLE exercises IN SHARE MODE;")
+        rows = _rebuild_exercise_records(cur, None if user_id is None else [user_id])
+    if user_id is None:
+        db.clear_cache()
+    else:
+        db._invalidate(("insights", user_id))
+    return rows
+
+# ----------------- PARTITIONS -----------------
+# workouts and exercises are partitioned by month of workout_date (migrations/0009).
+ARCHIVE_SCHEMA = "archive"
+MONTH_PARTITION_RE = re.compile(r"^workouts_p(\d{4})_(\d{2})$")
+PARTITION_MIGRATION = 9
+PARTITION_PHASE_SETTING = "fitness.partition_phase"
+
+def partition_workouts(batch_rows: int = 10000, progress=None):
+    """
+    Apply migrations/0009 (monthly partitions) to tables that already hold
+    data, without blocking writes for the length of the copy: prepare the new
+    tables and the mirror triggers, copy the rows over `batch_rows` ids per
+    transaction, then swap under a short exclusive lock. Migrations before
+    0009 are applied first; later ones are left to migrate_fitness.py apply.
+    Safe to run again after an interruption. Calls progress(table, copied,
+    last_id) after each batch. Returns (workouts, exercises) copied, or None
+    if 0009 was already applied.
+    """
+    migrate_fitness.apply(target=PARTITION_MIGRATION - 1)
+    up_path = next(m[2] for m in migrate_fitness.discover() if m[0] == PARTITION_MIGRATION)
+    with db.get_connection() as cur:
+        cur.execute("SELECT pg_advisory_xact_lock(%s);", (migrate_fitness.MIGRATION_LOCK_KEY,))
+        if PARTITION_MIGRATION in migrate_fitness._applied(cur):
+            return None
+        cur.execute("SELECT set_config(%s, 'prepare', true);", (PARTITION_PHASE_SETTING,))
+        cur.execute(up_path.read_text())
+    copied = []
+    # every row written from here on is mirrored, so copying up to today's
+    # highest id covers the rest
+    for table, key in (("workouts", "workout_id"), ("exercises", "exercise_id")):
+        with db.get_connection() as cur:
+            cur.execute(f"SELECT MIN({key}), MAX({key}) FROM {table};")
+            first, last = cur.fetchone()
+        total = 0
+        for start in range(first, last + 1, batch_rows) if first is not None else ():
+            with db.get_connection() as cur:
+                cur.execute(f"SELECT workouts_part_copy_{table}(%s, %s);", (start, start + batch_rows - 1))
+                total += cur.fetchone()[0]
+            if progress:
+                progress(table, total, min(start + batch_rows - 1, last))
+        copied.append(total)
+    migrate_fitness.apply(target=PARTITION_MIGRATION, settings={PARTITION_PHASE_SETTING: "swap"})
+    return tuple(copied)
+
+def list_partitions():
+    """[(partition, bounds, estimated_rows, bytes)] for workouts and exercises, in name order."""
+    with db.get_connection() as cur:
+        cur.execute(
+            """SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, pg_total_relation_size(c.oid)
+               FROM pg_inherits i
+               JOIN pg_class c ON c.oid = i.inhrelid
+               WHERE i.inhparent IN ('workouts'::regclass, 'exercises'::regclass)
+               ORDER BY c.relname;"""
+        )
+        return cur.fetchall()
+
+def ensure_partitions(months_ahead: int = 3, today: date | None = None):
+    """
+    Create the monthly partitions from this month through `months_ahead`
+    months from now. Run it from cron well before a month starts; rows for a
+    month without a partition go to the default partition, and that month is
+    skipped until split_default_partition() moves them out. Returns how many
+    months were created.
+    """
+    today = today or date.today()
+    first = today.replace(day=1)
+    year, month = divmod(first.month - 1 + months_ahead, 12)
+    last = first.replace(year=first.year + year, month=month + 1)
+    with db.get_connection() as cur:
+        cur.execute("SELECT create_month_partitions(%s, %s);", (first, last))
+        return cur.fetchone()[0]
+
+def _drop_foreign_keys(cur, table: str):
+    # a foreign key into a partitioned table has one row per referenced
+    # partition under the top-level one; dropping that drops them all
+    cur.execute(
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f' AND conparentid = 0;",
+        (table,),
+    )
+    for (constraint,) in cur.fetchall():
+        cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{constraint}";')
+
+def split_default_partition():
+    """
+    Give every month with rows in workouts_default/exercises_default its own
+    partitions and move those rows there, in one transaction: the defaults are
+    detached, the month tables are created and filled from them, everything is
+    attached again. Detached tables have no triggers, so the derived tables
+    are left alone. Workouts and exercises are locked while it runs.
+    Returns [(partition, workouts, exercises)].
+    """
+    moved = []
+    with db.get_connection() as cur:
+        cur.execute(
+            """SELECT date_trunc('month', workout_date)::date FROM workouts_default
+               UNION
+               SELECT date_trunc('month', workout_date)::date FROM exercises_default
+               ORDER BY 1;"""
+        )
+        months = [r[0] for r in cur.fetchall()]
+        if not months:
+            return moved
+        # as in archive_partitions: exercises first, without its foreign keys
+        cur.execute("ALTER TABLE exercises DETACH PARTITION exercises_default;")
+        _drop_foreign_keys(cur, "exercises_default")
+        cur.execute("ALTER TABLE workouts DETACH PARTITION workouts_default;")
+        columns = {}
+        for parent in ("workouts", "exercises"):
+            cur.execute(
+                """SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) FROM pg_attribute
+                   WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped;""",
+                (parent,),
+            )
+            columns[parent] = cur.fetchone()[0]
+        bounds = []
+        for month in months:
+            year, index = divmod(month.month, 12)
+            next_month = month.replace(year=month.year + year, month=index + 1)
+            suffix = month.strftime("p%Y_%m")
+            counts = []
+            for parent in ("workouts", "exercises"):
+                table = f"{parent}_{suffix}"
+                cur.execute(f"CREATE TABLE {table} (LIKE {parent} INCLUDING DEFAULTS);")
+                cur.execute(
+                    f"""WITH moved AS (
+                            DELETE FROM {parent}_default
+                            WHERE workout_date >= %s AND workout_date < %s
+                            RETURNING {columns[parent]}
+                        )
+                        INSERT INTO {table} ({columns[parent]}) SELECT * FROM moved;""",
+                    (month, next_month),
+                )
+                counts.append(cur.rowcount)
+            bounds.append((suffix, month, next_month))
+            moved.append((suffix, *counts))
+        # the month partitions go in before the defaults, whose attach checks
+        # that no row belongs to another partition
+        for parent in ("workouts", "exercises"):
+            for suffix, month, next_month in bounds:
+                cur.execute(
+                    f"ALTER TABLE {parent} ATTACH PARTITION {parent}_{suffix} FOR VALUES FROM (%s) TO (%s);",
+                    (month, next_month),
+                )
+            cur.execute(f"ALTER TABLE {parent} ATTACH PARTITION {parent}_default DEFAULT;")
+    return moved
+
+def archive_partitions(before: date, drop: bool = False):
+    """
+    Detach every monthly workouts/exercises partition that ends on or before
+    `before` and move it to the archive schema (or drop it with drop=True).
+    The archived rows stop counting in weekly_activity, user_stats and
+    exercise_records, exactly as if they had been deleted, all in one
+    transaction. Rows in the default
+    partitions are not archived. Returns [(partition, workouts, exercises)].
+    """
+    archived = []
+    users = set()
+    with db.get_connection() as cur:
+        cur.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'workouts'::regclass ORDER BY c.relname;"
+        )
+        months = []
+        for (name,) in cur.fetchall():
+            m = MONTH_PARTITION_RE.match(name)
+            if m and date(int(m.group(1)), int(m.group(2)), 1) < before.replace(day=1):
+                months.append(name[len("workouts_"):])
+        if not months:
+            return archived
+        if not drop:
+            cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA};")
+        for suffix in months:
+            workouts, exercises = f"workouts_{suffix}", f"exercises_{suffix}"
+            # The exercises partition goes first and loses its foreign key, or
+            # detaching the workouts rows it references would fail.
+            cur.execute(f"ALTER TABLE exercises DETACH PARTITION {exercises};")
+            _drop_foreign_keys(cur, exercises)
+            cur.execute(f"ALTER TABLE workouts DETACH PARTITION {workouts};")
+
+            cur.execute(
+                f"""UPDATE weekly_activity wa
+                    SET workout_count = wa.workout_count - d.workout_count,
+                        total_minutes = wa.total_minutes - d.total_minutes
+                    FROM (
+                        SELECT user_id, date_trunc('week', workout_date)::date AS week_start,
+                               COUNT(*) AS workout_count, SUM(duration_minutes) AS total_minutes
+                        FROM {workouts}
+                        GROUP BY 1, 2
+                    ) d
+                    WHERE wa.user_id = d.user_id AND wa.week_start = d.week_start;
+                    DELETE FROM weekly_activity WHERE workout_count <= 0;"""
+            )
+            cur.execute(
+                f"""UPDATE user_stats s
+                    SET workout_count = s.workout_count - d.workout_count,
+                        total_minutes = s.total_minutes - d.total_minutes,
+                        exercise_count = s.exercise_count - d.exercise_count
+                    FROM (
+                        SELECT w.user_id, COUNT(*) AS workout_count, SUM(w.duration_minutes) AS total_minutes,
+                               COALESCE(SUM(e.exercise_count), 0) AS exercise_count
+                        FROM {workouts} w
+                        LEFT JOIN (
+                            SELECT workout_id, workout_date, COUNT(*) AS exercise_count
+                            FROM {exercises} GROUP BY workout_id, workout_date
+                        ) e ON e.workout_id = w.workout_id AND e.workout_date = w.workout_date
+                        GROUP BY w.user_id
+                    ) d
+                    WHERE s.user_id = d.user_id
+                    RETURNING s.user_id;"""
+            )
+            users.update(r[0] for r in cur.fetchall())
+            cur.execute(f"SELECT (SELECT COUNT(*) FROM {workouts}), (SELECT COUNT(*) FROM {exercises});")
+            archived.append((suffix, *cur.fetchone()))
+
+            for table in (exercises, workouts):
+                if drop:
+                    cur.execute(f"DROP TABLE {table};")
+                else:
+                    cur.execute(f"ALTER TABLE {table} SET SCHEMA {ARCHIVE_SCHEMA};")
+
+        # The archived rows may have held a user's shortest or longest workout.
+        cur.execute(
+            """UPDATE user_stats s
+               SET min_duration = (SELECT MIN(w.duration_minutes) FROM workouts w WHERE w.user_id = s.user_id),
+                   max_duration = (SELECT MAX(w.duration_minutes) FROM workouts w WHERE w.user_id = s.user_id)
+               WHERE s.user_id = ANY(%s);""",
+            (sorted(users),),
+        )
+        # ...and personal bests; detaching bypassed the exercises triggers.
+        cur.execute("SELECT DISTINCT user_id FROM exercise_records WHERE user_id = ANY(%s);", (sorted(users),))
+        _rebuild_exercise_records(cur, [r[0] for r in cur.fetchall()])
+    for uid in users:
+        db._invalidate(("workouts", uid), ("insights", uid))
+    return archived
+
+# ----------------- CLI -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fitness Tracker maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_weekly = sub.add_parser("rebuild-weekly-activity", help="recompute the weekly leaderboard rollup")
+    p_weekly.add_argument("--user-id", type=int, default=None)
+    p_stats = sub.add_parser("check-user-stats", help="verify (and optionally repair) the insights aggregates")
+    p_stats.add_argument("--user-id", type=int, default=None)
+    p_stats.add_argument("--repair", action="store_true")
+    p_records = sub.add_parser("rebuild-exercise-records", help="recompute the per-exercise personal records")
+    p_records.add_argument("--user-id", type=int, default=None)
+    p_goals = sub.add_parser("evaluate-goals", help="update progress and completion of structured goals (cron)")
+    p_goals.add_argument("--today", type=date.fromisoformat, default=None)
+    p_flush = sub.add_parser("flush-writes", help="commit the writes left in a write-behind journal")
+    p_flush.add_argument("--journal", default=db.WRITE_BEHIND_JOURNAL)
+    sub.add_parser("partitions", help="list the workouts/exercises partitions")
+    p_convert = sub.add_parser("partition-workouts",
+                               help="apply migration 0009 to a populated database without blocking writes")
+    p_convert.add_argument("--batch-rows", type=int, default=10000)
+    p_ensure = sub.add_parser("ensure-partitions", help="create upcoming monthly partitions (cron)")
+    p_ensure.add_argument("--months-ahead", type=int, default=3)
+    sub.add_parser("split-default-partition", help="move rows out of the default partitions into month partitions")
+    p_archive = sub.add_parser("archive-partitions", help="detach months of history into the archive schema")
+    p_archive.add_argument("--before", required=True, type=lambda v: date.fromisoformat(v + "-01"),
+                           help="YYYY-MM; months before this one are archived")
+    p_archive.add_argument("--drop", action="store_true", help="drop the detached partitions instead")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild-weekly-activity":
+        rows = rebuild_weekly_activity(args.user_id)
+        print(f"weekly_activity rebuilt: {rows} rows")
+    elif args.command == "check-user-stats":
+        mismatches = check_user_stats(args.user_id, args.repair)
+        for uid, stored, expected in mismatches:
+            print(f"user {uid}: stored {stored} expected {expected}")
+        if not mismatches:
+            print("user_stats is consistent.")
+        elif args.repair:
+            print(f"Repaired {len(mismatches)} user_stats rows.")
+        else:
+            return 1
+    elif args.command == "rebuild-exercise-records":
+        rows = rebuild_exercise_records(args.user_id)
+        print(f"exercise_records rebuilt: {rows} rows")
+    elif args.command == "evaluate-goals":
+        result = db.evaluate_goals(args.today)
+        print(f"Evaluated {result['evaluated']} goals; {result['completed']} completed "
+              f"({result['users_completed']} users).")
+    elif args.command == "flush-writes":
+        try:
+            db.configure_write_behind(journal_path=args.journal)
+        except JournalLocked as e:
+            print(e)
+            return 1
+        pending = db.write_behind_stats()["pending"]
+        if not db.flush_writes(timeout=60):
+            print(f"Gave up with {db.write_behind_stats()['pending']} writes still queued.")
+            return 1
+        stats = db.write_behind_stats()
+        db.configure_write_behind(enabled=False)
+        print(f"Flushed {pending} queued writes from {args.journal}.")
+        if stats["dead_letters"]:
+            print(f"{stats['dead_letters']} were rejected by the database; see {stats['dead_letter_file']}.")
+    elif args.command == "partitions":
+        for name, bounds, rows, size in list_partitions():
+            print(f"{name:<24} {bounds:<60} ~{max(rows, 0):>10} rows {size / 1048576:>9.1f} MB")
+    elif args.command == "partition-workouts":
+        copied = partition_workouts(
+            args.batch_rows, lambda table, rows, last_id: print(f"{table}: {rows} rows copied (ids up to {last_id})")
+        )
+        if copied is None:
+            print(f"Migration {PARTITION_MIGRATION:04d} is already applied.")
+        else:
+            print(f"Partitioned {copied[0]} workouts and {copied[1]} exercises. "
+                  "Apply the remaining migrations with: python migrate_fitness.py apply")
+    elif args.command == "ensure-partitions":
+        created = ensure_partitions(args.months_ahead)
+        print(f"Created {created} monthly partitions.")
+    elif args.command == "split-default-partition":
+        moved = split_default_partition()
+        for suffix, workouts, exercises in moved:
+            print(f"{suffix}: {workouts} workouts, {exercises} exercises moved out of the default partitions")
+        if not moved:
+            print("The default partitions are empty.")
+    elif args.command == "archive-partitions":
+        archived = archive_partitions(args.before, args.drop)
+        for suffix, workouts, exercises in archived:
+            print(f"{suffix}: {workouts} workouts, {exercises} exercises "
+                  f"{'dropped' if args.drop else 'moved to ' + ARCHIVE_SCHEMA}")
+        if not archived:
+            print("Nothing to archive.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
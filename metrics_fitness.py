@@ -0,0 +1,306 @@
+# metrics_fitness.py
+"""
+Low-overhead instrumentation for backend_fitness.
+
+- per-function counters and fixed-bucket latency histograms (wall time,
+  connection acquire time), rows returned, queries issued
+- a slow-query log: statements over SLOW_QUERY_MS are logged to the
+  "fitness.slow_queries" logger with their SQL and the *shape* of their
+  parameters (types only, never values) and kept in a small ring buffer
+- query scopes: a front-end rerun opens a scope, every statement executed
+  in that thread is counted against it, and finish_scope() checks the total
+  against a per-rerun budget
+- render_prometheus() exports everything in Prometheus text format
+
+Recording is a perf_counter() pair, a bisect and a few integer adds under a
+lock, so it is meant to stay on in production.
+"""
+import bisect
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import deque
+
+ENABLED = True
+SLOW_QUERY_MS = 200.0
+SLOW_QUERY_LOG_SIZE = 200
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is +Inf.
+BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+slow_query_logger = logging.getLogger("fitness.slow_queries")
+budget_logger = logging.getLogger("fitness.query_budget")
+
+_lock = threading.Lock()
+_whitespace = re.compile(r"\s+")
+
+# ----------------- HISTOGRAMS -----------------
+class Histogram:
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value_ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.total += value_ms
+        self.count += 1
+
+    def quantile(self, q: float):
+        """Estimate a quantile as the upper bound of the bucket that contains it."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        return {"buckets_ms": list(BUCKETS_MS), "counts": list(self.counts), "sum_ms": self.total, "count": self.count}
+
+
+class FunctionStats:
+    __slots__ = ("calls", "errors", "rows", "queries", "wall", "acquire")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.queries = 0
+        self.wall = Histogram()
+        self.acquire = Histogram()
+
+
+_functions = {}
+_slow_queries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_rerun_stats = {}  # page label -> {"reruns", "over_budget", "queries": Histogram-like counts}
+
+# ----------------- CALL CONTEXT -----------------
+class _Call:
+    __slots__ = ("name", "queries", "acquire_ms")
+
+    def __init__(self, name):
+        self.name = name
+        self.queries = 0
+        self.acquire_ms = 0.0
+
+
+class QueryScope:
+    """Counts the statements issued while it is active (e.g. one Streamlit rerun)."""
+
+    def __init__(self, label: str = "", keep_statements: bool = False):
+        self.label = label
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.calls = {}
+        self.statements = [] if keep_statements else None  # [(sql, params)] when kept
+
+    def summary(self):
+        return {
+            "label": self.label,
+            "queries": self.queries,
+            "db_ms": round(self.db_ms, 3),
+            "calls": dict(self.calls),
+        }
+
+
+_current_call = contextvars.ContextVar("fitness_current_call", default=None)
+_current_scope = contextvars.ContextVar("fitness_query_scope", default=None)
+
+
+def start_call(name: str):
+    if not ENABLED:
+        return None, None
+    call = _Call(name)
+    return call, _current_call.set(call)
+
+
+def _rows_in(result):
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[0], list):
+        return len(result[0])  # (rows, next_cursor) pages
+    return 1
+
+
+def finish_call(call, token, started: float, result=None, error: bool = False):
+    if call is None:
+        return
+    _current_call.reset(token)
+    wall_ms = (time.perf_counter() - started) * 1000
+    with _lock:
+        stats = _functions.get(call.name)
+        if stats is None:
+            stats = _functions[call.name] = FunctionStats()
+        stats.calls += 1
+        stats.errors += error
+        stats.rows += _rows_in(result)
+        stats.queries += call.queries
+        stats.wall.observe(wall_ms)
+        if call.queries or call.acquire_ms:
+            stats.acquire.observe(call.acquire_ms)
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.calls[call.name] = scope.calls.get(call.name, 0) + 1
+
+
+def record_acquire(seconds: float):
+    call = _current_call.get()
+    if call is not None:
+        call.acquire_ms += seconds * 1000
+
+
+def params_shape(params):
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    parts = []
+    for p in params:
+        if isinstance(p, (list, tuple)):
+            parts.append(f"{type(p).__name__}[{len(p)}]")
+        else:
+            parts.append(type(p).__name__)
+    return "(" + ", ".join(parts) + ")"
+
+
+def record_query(sql, params, seconds: float, rowcount: int):
+    if not ENABLED:
+        return
+    ms = seconds * 1000
+    call = _current_call.get()
+    if call is not None:
+        call.queries += 1
+    scope = _current_scope.get()
+    if scope is not None:
+        scope.queries += 1
+        scope.db_ms += ms
+        if scope.statements is not None:
+            scope.statements.append((sql, params))
+    if ms >= SLOW_QUERY_MS:
+        text = sql.decode() if isinstance(sql, bytes) else str(sql)
+        entry = {
+            "at": time.time(),
+            "function": call.name if call is not None else None,
+            "ms": round(ms, 3),
+            "rows": rowcount,
+            "sql": _whitespace.sub(" ", text).strip()[:2000],
+            "params": params_shape(params),
+        }
+        with _lock:
+            _slow_queries.append(entry)
+        slow_query_logger.warning(
+            "slow query %.1fms in %s rows=%s params=%s sql=%s",
+            ms, entry["function"], rowcount, entry["params"], entry["sql"],
+        )
+
+# ----------------- QUERY SCOPES / BUDGETS -----------------
+def start_scope(label: str = "", keep_statements: bool = False):
+    scope = QueryScope(label, keep_statements)
+    _current_scope.set(scope)
+    return scope
+
+
+def current_scope():
+    return _current_scope.get()
+
+
+def finish_scope(scope: QueryScope, budget: int | None = None):
+    """Record a finished scope's query count per label; returns True if it stayed within budget."""
+    within = budget is None or scope.queries <= budget
+    with _lock:
+        stats = _rerun_stats.get(scope.label)
+        if stats is None:
+            stats = _rerun_stats[scope.label] = {"reruns": 0, "over_budget": 0, "max_queries": 0, "queries": Histogram()}
+        stats["reruns"] += 1
+        stats["over_budget"] += not within
+        stats["max_queries"] = max(stats["max_queries"], scope.queries)
+        stats["queries"].observe(scope.queries)
+    if not within:
+        budget_logger.warning("rerun of %r issued %d queries (budget %d): %s",
+                              scope.label, scope.queries, budget, scope.calls)
+    if _current_scope.get() is scope:
+        _current_scope.set(None)
+    return within
+
+# ----------------- READING / EXPORT -----------------
+def function_stats():
+    """{function: {calls, errors, rows, queries, mean_ms, p50_ms, p95_ms, p99_ms, acquire_mean_ms, histogram}}"""
+    with _lock:
+        out = {}
+        for name, s in _functions.items():
+            out[name] = {
+                "calls": s.calls,
+                "errors": s.errors,
+                "rows": s.rows,
+                "queries": s.queries,
+                "mean_ms": round(s.wall.total / s.wall.count, 3) if s.wall.count else 0.0,
+                "p50_ms": s.wall.quantile(0.50),
+                "p95_ms": s.wall.quantile(0.95),
+                "p99_ms": s.wall.quantile(0.99),
+                "acquire_mean_ms": round(s.acquire.total / s.acquire.count, 3) if s.acquire.count else 0.0,
+                "histogram": s.wall.snapshot(),
+            }
+        return out
+
+
+def slow_queries():
+    with _lock:
+        return list(_slow_queries)
+
+
+def rerun_stats():
+    with _lock:
+        return {
+            label: {
+                "reruns": s["reruns"],
+                "over_budget": s["over_budget"],
+                "max_queries": s["max_queries"],
+                "mean_queries": round(s["queries"].total / s["queries"].count, 2) if s["queries"].count else 0.0,
+            }
+            for label, s in _rerun_stats.items()
+        }
+
+
+def reset():
+    with _lock:
+        _functions.clear()
+        _slow_queries.clear()
+        _rerun_stats.clear()
+
+
+def render_prometheus():
+    """All function metrics in Prometheus text exposition format."""
+    lines = [
+        "# TYPE fitness_backend_call_duration_ms histogram",
+    ]
+    with _lock:
+        items = sorted(_functions.items())
+        for name, s in items:
+            cumulative = 0
+            for bound, count in zip(list(BUCKETS_MS) + ["+Inf"], s.wall.counts):
+                cumulative += count
+                lines.append(f'fitness_backend_call_duration_ms_bucket{{function="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'fitness_backend_call_duration_ms_sum{{function="{name}"}} {s.wall.total:.3f}')
+            lines.append(f'fitness_backend_call_duration_ms_count{{function="{name}"}} {s.wall.count}')
+        for metric, attr in (("calls", "calls"), ("errors", "errors"), ("rows", "rows"), ("queries", "queries")):
+            lines.append(f"# TYPE fitness_backend_{metric}_total counter")
+            for name, s in items:
+                lines.append(f'fitness_backend_{metric}_total{{function="{name}"}} {getattr(s, attr)}')
+        lines.append("# TYPE fitness_backend_acquire_ms_sum counter")
+        for name, s in items:
+            lines.append(f'fitness_backend_acquire_ms_sum{{function="{name}"}} {s.acquire.total:.3f}')
+        lines.append("# TYPE fitness_rerun_over_budget_total counter")
+        for label, s in sorted(_rerun_stats.items()):
+            lines.append(f'fitness_rerun_over_budget_total{{page="{label}"}} {s["over_budget"]}')
+    return "\n".join(lines) + "\n"
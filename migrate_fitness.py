@@ -0,0 +1,363 @@
+# migrate_fitness.py
+"""
+Versioned schema migrations for the Fitness Tracker database.
+
+The base tables come from the `sql` file; everything after that lives in
+migrations/NNNN_<name>.up.sql (+ matching .down.sql) and is recorded in the
+schema_version table.
+
+    python migrate_fitness.py init
+    python migrate_fitness.py status
+    python migrate_fitness.py apply [--target N]
+    python migrate_fitness.py rollback [--steps N]
+    python migrate_fitness.py check-plans
+"""
+import argparse
+import re
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import analytics_fitness as analytics
+import backend_fitness as db
+
+MIGRATIONS_DIR = Path(__file__).with_name("migrations")
+BASE_SCHEMA_FILE = Path(__file__).with_name("sql")
+MIGRATION_FILE_RE = re.compile(r"^(\d{4})_([a-z0-9_]+)\.up\.sql$")
+# Arbitrary key for pg_advisory_xact_lock so two runners never migrate at once.
+MIGRATION_LOCK_KEY = 7_304_118
+
+# ----------------- DISCOVERY -----------------
+def discover():
+    """Return [(version, name, up_path, down_path)] sorted by version."""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.up.sql")):
+        m = MIGRATION_FILE_RE.match(path.name)
+        if not m:
+            raise ValueError(f"Badly named migration file: {path.name}")
+        version, name = int(m.group(1)), m.group(2)
+        down = path.with_name(f"{m.group(1)}_{name}.down.sql")
+        if not down.exists():
+            raise ValueError(f"Migration {path.name} has no matching .down.sql")
+        migrations.append((version, name, path, down))
+    versions = [m[0] for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration version numbers.")
+    return migrations
+
+# ----------------- SCHEMA VERSION TABLE -----------------
+def _ensure_version_table(cur):
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS schema_version (
+               version INT PRIMARY KEY,
+               name TEXT NOT NULL,
+               applied_at TIMESTAMP NOT NULL DEFAULT now()
+           );"""
+    )
+
+def _applied(cur):
+    cur.execute("SELECT version, name, applied_at FROM schema_version ORDER BY version;")
+    return {row[0]: row for row in cur.fetchall()}
+
+def status():
+    """Return [(version, name, applied_at or None)] for every known migration."""
+    with db.get_connection() as cur:
+        _ensure_version_table(cur)
+        applied = _applied(cur)
+    return [
+        (version, name, applied[version][2] if version in applied else None)
+        for version, name, _, _ in discover()
+    ]
+
+def current_version():
+    with db.get_connection() as cur:
+        _ensure_version_table(cur)
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version;")
+        return cur.fetchone()[0]
+
+# ----------------- APPLY / ROLLBACK -----------------
+def init():
+    """Create the base tables from the `sql` file if they don't exist yet, then apply all migrations."""
+    with db.get_connection() as cur:
+        cur.execute("SELECT to_regclass('users') IS NOT NULL;")
+        if not cur.fetchone()[0]:
+            cur.execute(BASE_SCHEMA_FILE.read_text())
+    return apply()
+
+def apply(target: int | None = None, settings: dict | None = None):
+    """
+    Apply pending migrations up to `target` (default: latest). Each runs in its
+    own transaction, with `settings` ({name: value}) set for that transaction.
+    """
+    done = []
+    for version, name, up_path, _ in discover():
+        if target is not None and version > target:
+            break
+        with db.get_connection() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_KEY,))
+            _ensure_version_table(cur)
+            if version in _applied(cur):
+                continue
+            for setting, value in (settings or {}).items():
+                cur.execute("SELECT set_config(%s, %s, true);", (setting, value))
+            cur.execute(up_path.read_text())
+            cur.execute(
+                "INSERT INTO schema_version (version, name) VALUES (%s, %s);",
+                (version, name),
+            )
+        done.append((version, name))
+    return done
+
+def rollback(steps: int = 1):
+    """Roll back the `steps` most recently applied migrations."""
+    by_version = {m[0]: m for m in discover()}
+    done = []
+    for _ in range(steps):
+        with db.get_connection() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s);", (MIGRATION_LOCK_KEY,))
+            _ensure_version_table(cur)
+            cur.execute("SELECT MAX(version) FROM schema_version;")
+            version = cur.fetchone()[0]
+            if version is None:
+                break
+            if version not in by_version:
+                raise ValueError(f"Applied migration {version} has no file in {MIGRATIONS_DIR}")
+            _, name, _, down_path = by_version[version]
+            cur.execute(down_path.read_text())
+            cur.execute("DELETE FROM schema_version WHERE version = %s;", (version,))
+        done.append((version, name))
+    return done
+
+# ----------------- PLAN CHECK -----------------
+PLAN_CHECK_TABLES = {"users", "workouts", "exercises", "friends", "friend_edges", "goals", "weekly_activity",
+                     "user_stats", "weekly_rank_buckets", "exercise_records"}
+# Queries that return every row of a table, with no filter and no limit: any
+# plan reads the whole table, and a seq scan plus sort beats walking an index
+# in order and visiting the heap at random. list_users is kept for scripts;
+# the pages use list_users_page / search_users. A filtered seq scan in one of
+# these still counts as a problem.
+PLAN_CHECK_FULL_SCANS = {"list_users"}
+# Date-bounded queries, the partitioned table they read and the positions of
+# their (first, last) date parameters: they must only visit the partitions of
+# the months in between. By-id lookups pass the workout's date as both.
+PLAN_CHECK_PRUNING = {"list_workouts(range)": ("workouts", 1, 2), "leaderboard_for_week(range)": ("workouts", 2, 3),
+                      "list_exercises": ("exercises", 1, 1)}
+# Partitions (migrations/0009) appear in plans under their own names.
+PARTITION_NAME_RE = re.compile(r"^(workouts|exercises)_(p\d{4}_\d{2}|default)$")
+
+def _seed_for_plans(cur, users: int, workouts_per_user: int, exercises_per_workout: int, friends_per_user: int):
+    cur.execute(
+        """WITH ins AS (
+               INSERT INTO users (name, email, weight)
+               SELECT substr(md5(g::text), 1, 6) || ' Plan User ' || g, 'plan-check-' || g || '@example.invalid',
+                      50 + g %% 50
+               FROM generate_series(1, %s) g
+               RETURNING user_id
+           )
+           SELECT MIN(user_id), MAX(user_id) FROM ins;""",
+        (users,),
+    )
+    lo, hi = cur.fetchone()
+    n = hi - lo + 1
+    cur.execute("SELECT create_month_partitions(DATE '2018-01-01', DATE '2025-01-01');")
+    cur.execute(
+        """INSERT INTO workouts (user_id, workout_date, duration_minutes)
+           SELECT u, DATE '2018-01-01' + ((u * 37 + k * 11) %% 2557), 15 + (u + k) %% 90
+           FROM generate_series(%s, %s) u, generate_series(1, %s) k;""",
+        (lo, hi, workouts_per_user),
+    )
+    cur.execute(
+        "SELECT exercise_type_ids(ARRAY(SELECT 'Exercise ' || g FROM generate_series(0, 39) g));"
+    )
+    cur.execute(
+        """INSERT INTO exercises (workout_id, workout_date, user_id, exercise_type_id, reps, sets, weight_lifted)
+           SELECT w.workout_id, w.workout_date, w.user_id, c.exercise_type_id, 8 + k, 3, 20 + k * 5
+           FROM workouts w
+           CROSS JOIN generate_series(1, %s) k
+           JOIN exercise_catalog c ON c.canonical_name = 'exercise ' || ((w.workout_id + k) %% 40)
+           WHERE w.user_id BETWEEN %s AND %s;""",
+        (exercises_per_workout, lo, hi),
+    )
+    cur.execute(
+        """INSERT INTO friends (user_id, friend_id)
+           SELECT LEAST(a, b), GREATEST(a, b)
+           FROM (
+               SELECT u AS a, %s + ((u - %s) * 7919 + k * 104729) %% %s AS b
+               FROM generate_series(%s, %s) u, generate_series(1, %s) k
+           ) pairs
+           WHERE a <> b
+           ON CONFLICT (user_id, friend_id) DO NOTHING;""",
+        (lo, lo, n, lo, hi, friends_per_user),
+    )
+    cur.execute(
+        """INSERT INTO goals (user_id, goal_description, start_date, end_date, is_completed,
+                              target_type, target_value, target_exercise)
+           SELECT u, 'Plan check goal ' || k, DATE '2024-01-01', DATE '2024-01-01' + k * 7, k %% 2 = 0,
+                  (ARRAY['workouts', 'minutes', 'exercise_weight'])[k], k * 10,
+                  CASE WHEN k = 3 THEN 'Exercise ' || (u %% 40) END
+           FROM generate_series(%s, %s) u, generate_series(1, 3) k;""",
+        (lo, hi),
+    )
+    # Rows inserted just now sit in the GIN indexes' pending lists, which the
+    # planner prices as a full read; flush them as (auto)vacuum would.
+    cur.execute(
+        "SELECT gin_clean_pending_list(i.indexrelid) FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "JOIN pg_am a ON a.oid = c.relam WHERE a.amname = 'gin';"
+    )
+    # ANALYZE inside the transaction sees our own rows, and its statistics roll back with it.
+    for table in sorted(PLAN_CHECK_TABLES):
+        cur.execute(f"ANALYZE {table};")
+    return lo
+
+def _plan_targets(cur, uid: int):
+    cur.execute("SELECT name, email FROM users WHERE user_id = %s;", (uid,))
+    name, email = cur.fetchone()
+    cur.execute("SELECT workout_id, workout_date FROM workouts WHERE user_id = %s LIMIT 1;", (uid,))
+    wid, wdate = cur.fetchone()
+    week_start, week_end = db.week_bounds(wdate)
+    return [
+        ("get_user_by_email", db.GET_USER_BY_EMAIL_SQL, (email,)),
+        ("get_user_by_id", db.GET_USER_BY_ID_SQL, (uid,)),
+        ("list_users", db.LIST_USERS_SQL, None),
+        ("list_friends", db.LIST_FRIENDS_SQL, (uid,)),
+        ("suggest_friends", db.SUGGEST_FRIENDS_SQL, (uid, uid, uid, 10)),
+        ("list_workouts", db.LIST_WORKOUTS_SQL, (uid,)),
+        ("list_workouts(range)", db.LIST_WORKOUTS_RANGE_SQL, (uid, date(2019, 1, 1), date(2019, 12, 31))),
+        ("list_workouts_page(first)", db.LIST_WORKOUTS_FIRST_PAGE_SQL, (uid, 51)),
+        ("list_workouts_page", db.LIST_WORKOUTS_PAGE_SQL, (uid, wdate, wid, 51)),
+        ("list_users_page(first)", db.LIST_USERS_FIRST_PAGE_SQL, (51,)),
+        ("list_users_page", db.LIST_USERS_PAGE_SQL, ("Plan User 2", uid, 51)),
+        ("search_users", db.search_users_sql(name[1:5]), db._search_params(name[1:5], 20)),
+        ("search_users(prefix)", db.search_users_sql(name[:2]), db._search_params(name[:2], 20)),
+        ("list_exercises", db.LIST_EXERCISES_SQL, (wid, wdate)),
+        ("list_goals", db.LIST_GOALS_SQL, {"user_id": uid}),
+        ("leaderboard_for_week(workouts)", db.leaderboard_sql("workouts"),
+         (uid, uid, week_start)),
+        ("leaderboard_for_week(minutes)", db.leaderboard_sql("minutes"),
+         (uid, uid, week_start)),
+        ("leaderboard_for_week(range)", db.leaderboard_sql("minutes", full_week=False),
+         (uid, uid, week_start, week_end + timedelta(days=3))),
+        ("global_leaderboard_page(first)", db.global_leaderboard_sql("minutes"),
+         db._global_params("minutes", week_start, limit=51)),
+        ("global_leaderboard_page", db.global_leaderboard_sql("workouts", after=True),
+         db._global_params("workouts", week_start, limit=51, after_value=1, after_user_id=uid)),
+        ("global_rank", db.global_leaderboard_sql("minutes", "rank"),
+         db._global_params("minutes", week_start, user_id=uid)),
+        ("global_leaderboard_neighbors", db.global_leaderboard_sql("minutes", "neighbors"),
+         db._global_params("minutes", week_start, user_id=uid, radius=5)),
+        ("overall_insights", db.INSIGHTS_SQL, (uid,)),
+        ("personal_records", db.PERSONAL_RECORDS_SQL, (uid,)),
+        ("exercise_history", db.EXERCISE_HISTORY_SQL, (uid, "Exercise 1", 50)),
+        ("training_summary(workouts)", analytics.ANALYTICS_WORKOUTS_SQL, (uid,)),
+        ("training_summary(exercises)", analytics.ANALYTICS_EXERCISES_SQL, (uid,)),
+    ]
+
+def _table_of(relation: str | None):
+    m = PARTITION_NAME_RE.match(relation or "")
+    return m.group(1) if m else relation
+
+def _seq_scans(node, empty=frozenset(), filtered_only: bool = False):
+    found = []
+    relation = node.get("Relation Name")
+    # an empty partition is read with a seq scan whatever the indexes
+    if (node.get("Node Type") == "Seq Scan" and relation not in empty and _table_of(relation) in PLAN_CHECK_TABLES
+            and (not filtered_only or "Filter" in node)):
+        found.append(_table_of(relation))
+    for child in node.get("Plans", []):
+        found.extend(_seq_scans(child, empty, filtered_only))
+    return found
+
+def _partitions(node, table: str = "workouts"):
+    found = set()
+    relation = node.get("Relation Name")
+    if relation != table and _table_of(relation) == table:
+        found.add(relation)
+    for child in node.get("Plans", []):
+        found |= _partitions(child, table)
+    return found
+
+def _months(first: date, last: date):
+    return (last.year - first.year) * 12 + last.month - first.month + 1
+
+def _empty_partitions(cur):
+    cur.execute("SELECT relname FROM pg_class WHERE relispartition AND reltuples <= 0;")
+    return frozenset(r[0] for r in cur.fetchall())
+
+def _explain(cur, sql, params):
+    cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+    return cur.fetchone()[0][0]["Plan"]
+
+def _plan_problems(name: str, plan, params, empty=frozenset()):
+    """What is wrong with the plan of query `name` (a list of descriptions, empty if nothing)."""
+    problems = []
+    scans = sorted(set(_seq_scans(plan, empty, filtered_only=name in PLAN_CHECK_FULL_SCANS)))
+    if scans:
+        problems.append(f"seq scan on {', '.join(scans)}")
+    if name in PLAN_CHECK_PRUNING:
+        table, *positions = PLAN_CHECK_PRUNING[name]
+        first, last = (params[i] for i in positions)
+        partitions = _partitions(plan, table)
+        if len(partitions) > _months(first, last):
+            problems.append(f"reads {len(partitions)} {table} partitions for {_months(first, last)} month(s)")
+    return problems
+
+def check_plans(users: int = 5000, workouts_per_user: int = 20, exercises_per_workout: int = 2,
+                friends_per_user: int = 5):
+    """
+    Seed a throwaway data set, EXPLAIN every backend read query against it and
+    return [(query_name, problem)] for each query that fell back to a sequential
+    scan, or that reads partitions outside its date range. Everything
+    (rows, partitions and statistics) is rolled back afterwards.
+    """
+    problems = []
+    with db.get_connection() as cur:
+        try:
+            uid = _seed_for_plans(cur, users, workouts_per_user, exercises_per_workout, friends_per_user)
+            empty = _empty_partitions(cur)
+            for name, sql, params in _plan_targets(cur, uid):
+                problems += [(name, problem) for problem in _plan_problems(name, _explain(cur, sql, params), params,
+                                                                          empty)]
+        finally:
+            cur.connection.rollback()
+    return problems
+
+# ----------------- CLI -----------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fitness Tracker schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init", help="create the base schema if missing and apply all migrations")
+    sub.add_parser("status", help="show applied and pending migrations")
+    p_apply = sub.add_parser("apply", help="apply pending migrations")
+    p_apply.add_argument("--target", type=int, default=None, help="stop after this version")
+    p_rollback = sub.add_parser("rollback", help="roll back applied migrations")
+    p_rollback.add_argument("--steps", type=int, default=1)
+    p_plans = sub.add_parser("check-plans",
+                             help="fail if any backend query uses a sequential scan or misses partition pruning")
+    p_plans.add_argument("--users", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    if args.command == "status":
+        for version, name, applied_at in status():
+            state = f"applied {applied_at:%Y-%m-%d %H:%M}" if applied_at else "pending"
+            print(f"{version:04d}  {name:<40} {state}")
+    elif args.command in ("apply", "init"):
+        done = apply(args.target) if args.command == "apply" else init()
+        for version, name in done:
+            print(f"applied  {version:04d} {name}")
+        if not done:
+            print("Nothing to apply.")
+    elif args.command == "rollback":
+        for version, name in rollback(args.steps):
+            print(f"rolled back  {version:04d} {name}")
+    elif args.command == "check-plans":
+        problems = check_plans(users=args.users)
+        for name, problem in problems:
+            print(f"PLAN  {name}: {problem}")
+        if problems:
+            return 1
+        print("All backend queries use index access paths and prune partitions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
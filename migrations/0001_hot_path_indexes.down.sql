@@ -0,0 +1,4 @@
+DROP INDEX IF EXISTS idx_goals_user_status_end;
+DROP INDEX IF EXISTS idx_friends_friend_user;
+DROP INDEX IF EXISTS idx_exercises_workout;
+DROP INDEX IF EXISTS idx_workouts_user_date;
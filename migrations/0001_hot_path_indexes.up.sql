@@ -0,0 +1,10 @@
+-- Indexes for the access paths used by backend_fitness:
+--   list_workouts / leaderboard_for_week / overall_insights: workouts by user (+ date range)
+--   list_exercises / overall_insights join: exercises by workout
+--   list_friends / leaderboard circle: the friend_id side of friends
+--     (user_id side is already covered by the unique_friendship index)
+--   list_goals: goals by user in display order
+CREATE INDEX IF NOT EXISTS idx_workouts_user_date ON workouts (user_id, workout_date);
+CREATE INDEX IF NOT EXISTS idx_exercises_workout ON exercises (workout_id);
+CREATE INDEX IF NOT EXISTS idx_friends_friend_user ON friends (friend_id, user_id);
+CREATE INDEX IF NOT EXISTS idx_goals_user_status_end ON goals (user_id, is_completed, end_date);
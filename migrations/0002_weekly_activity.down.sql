@@ -0,0 +1,5 @@
+DROP TRIGGER IF EXISTS workouts_weekly_activity_del ON workouts;
+DROP TRIGGER IF EXISTS workouts_weekly_activity_upd ON workouts;
+DROP TRIGGER IF EXISTS workouts_weekly_activity_ins ON workouts;
+DROP FUNCTION IF EXISTS weekly_activity_sync();
+DROP TABLE IF EXISTS weekly_activity;
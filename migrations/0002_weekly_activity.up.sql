@@ -0,0 +1,62 @@
+-- Per-user, per-ISO-week rollup of workouts for leaderboard_for_week.
+-- Statement-level triggers on workouts keep it current inside the writing
+-- transaction, so single inserts (log_workout), deletes (delete_workout,
+-- cascades from users) and set-based bulk loads all maintain it the same way.
+CREATE TABLE weekly_activity (
+    user_id INT NOT NULL,
+    week_start DATE NOT NULL,
+    workout_count INT NOT NULL DEFAULT 0,
+    total_minutes INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, week_start),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE
+);
+
+CREATE OR REPLACE FUNCTION weekly_activity_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE weekly_activity wa
+        SET workout_count = wa.workout_count - d.workout_count,
+            total_minutes = wa.total_minutes - d.total_minutes
+        FROM (
+            SELECT user_id, date_trunc('week', workout_date)::date AS week_start,
+                   COUNT(*) AS workout_count, SUM(duration_minutes) AS total_minutes
+            FROM old_rows
+            GROUP BY 1, 2
+        ) d
+        WHERE wa.user_id = d.user_id AND wa.week_start = d.week_start;
+
+        DELETE FROM weekly_activity wa
+        USING (SELECT DISTINCT user_id, date_trunc('week', workout_date)::date AS week_start FROM old_rows) d
+        WHERE wa.user_id = d.user_id AND wa.week_start = d.week_start AND wa.workout_count <= 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO weekly_activity AS wa (user_id, week_start, workout_count, total_minutes)
+        SELECT user_id, date_trunc('week', workout_date)::date, COUNT(*), SUM(duration_minutes)
+        FROM new_rows
+        GROUP BY 1, 2
+        ON CONFLICT (user_id, week_start) DO UPDATE
+        SET workout_count = wa.workout_count + EXCLUDED.workout_count,
+            total_minutes = wa.total_minutes + EXCLUDED.total_minutes;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER workouts_weekly_activity_ins
+    AFTER INSERT ON workouts REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+CREATE TRIGGER workouts_weekly_activity_upd
+    AFTER UPDATE ON workouts REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+CREATE TRIGGER workouts_weekly_activity_del
+    AFTER DELETE ON workouts REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+
+-- Backfill. CREATE TRIGGER already holds a lock that blocks concurrent writes
+-- to workouts, so nothing can slip in between the backfill and the triggers.
+INSERT INTO weekly_activity (user_id, week_start, workout_count, total_minutes)
+SELECT user_id, date_trunc('week', workout_date)::date, COUNT(*), SUM(duration_minutes)
+FROM workouts
+GROUP BY 1, 2;
@@ -0,0 +1,3 @@
+DROP INDEX IF EXISTS idx_users_name_id;
+CREATE INDEX IF NOT EXISTS idx_workouts_user_date ON workouts (user_id, workout_date);
+DROP INDEX IF EXISTS idx_workouts_user_date_id;
@@ -0,0 +1,6 @@
+-- Keyset pagination: list_workouts_page seeks on (workout_date, workout_id) per
+-- user and list_users_page on (name, user_id). The workouts index supersedes
+-- idx_workouts_user_date from 0001 (same leading columns).
+CREATE INDEX IF NOT EXISTS idx_workouts_user_date_id ON workouts (user_id, workout_date, workout_id);
+DROP INDEX IF EXISTS idx_workouts_user_date;
+CREATE INDEX IF NOT EXISTS idx_users_name_id ON users (name, user_id);
@@ -0,0 +1,11 @@
+DROP TRIGGER IF EXISTS exercises_user_stats_del ON exercises;
+DROP TRIGGER IF EXISTS exercises_user_stats_ins ON exercises;
+DROP TRIGGER IF EXISTS workouts_user_stats_exercises_del ON workouts;
+DROP TRIGGER IF EXISTS workouts_user_stats_del ON workouts;
+DROP TRIGGER IF EXISTS workouts_user_stats_upd ON workouts;
+DROP TRIGGER IF EXISTS workouts_user_stats_ins ON workouts;
+DROP FUNCTION IF EXISTS user_stats_exercises_sync();
+DROP FUNCTION IF EXISTS user_stats_workout_exercises_del();
+DROP FUNCTION IF EXISTS user_stats_workouts_sync();
+DROP INDEX IF EXISTS idx_workouts_user_duration;
+DROP TABLE IF EXISTS user_stats;
@@ -0,0 +1,128 @@
+-- Running per-user aggregates for overall_insights, maintained by triggers on
+-- workouts and exercises in the writing transaction.
+CREATE TABLE user_stats (
+    user_id INT PRIMARY KEY,
+    workout_count INT NOT NULL DEFAULT 0,
+    total_minutes BIGINT NOT NULL DEFAULT 0,
+    min_duration INT,
+    max_duration INT,
+    exercise_count INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE
+);
+
+-- Lets the triggers re-find MIN/MAX with one index probe when the extreme row is deleted.
+CREATE INDEX IF NOT EXISTS idx_workouts_user_duration ON workouts (user_id, duration_minutes);
+
+CREATE OR REPLACE FUNCTION user_stats_workouts_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE user_stats s
+        SET workout_count = s.workout_count - d.workout_count,
+            total_minutes = s.total_minutes - d.total_minutes,
+            min_duration = CASE WHEN d.min_duration <= s.min_duration
+                                THEN (SELECT MIN(w.duration_minutes) FROM workouts w WHERE w.user_id = s.user_id)
+                                ELSE s.min_duration END,
+            max_duration = CASE WHEN d.max_duration >= s.max_duration
+                                THEN (SELECT MAX(w.duration_minutes) FROM workouts w WHERE w.user_id = s.user_id)
+                                ELSE s.max_duration END
+        FROM (
+            SELECT user_id, COUNT(*) AS workout_count, SUM(duration_minutes) AS total_minutes,
+                   MIN(duration_minutes) AS min_duration, MAX(duration_minutes) AS max_duration
+            FROM old_rows
+            GROUP BY user_id
+        ) d
+        WHERE s.user_id = d.user_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO user_stats AS s (user_id, workout_count, total_minutes, min_duration, max_duration)
+        SELECT user_id, COUNT(*), SUM(duration_minutes), MIN(duration_minutes), MAX(duration_minutes)
+        FROM new_rows
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET workout_count = s.workout_count + EXCLUDED.workout_count,
+            total_minutes = s.total_minutes + EXCLUDED.total_minutes,
+            min_duration = LEAST(s.min_duration, EXCLUDED.min_duration),
+            max_duration = GREATEST(s.max_duration, EXCLUDED.max_duration);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Exercises reach their user through workouts. When a workout is deleted its
+-- exercises are removed by the FK cascade after the workout row is already
+-- gone, so the workout's exercises are subtracted here, before the delete,
+-- and the exercises trigger only sees deletes whose workout still exists.
+CREATE OR REPLACE FUNCTION user_stats_workout_exercises_del() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE user_stats
+    SET exercise_count = exercise_count - (SELECT COUNT(*) FROM exercises e WHERE e.workout_id = OLD.workout_id)
+    WHERE user_id = OLD.user_id;
+    RETURN OLD;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION user_stats_exercises_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE user_stats s
+        SET exercise_count = s.exercise_count - d.exercise_count
+        FROM (
+            SELECT w.user_id, COUNT(*) AS exercise_count
+            FROM old_rows e
+            JOIN workouts w ON w.workout_id = e.workout_id
+            GROUP BY w.user_id
+        ) d
+        WHERE s.user_id = d.user_id;
+    ELSE
+        INSERT INTO user_stats AS s (user_id, exercise_count)
+        SELECT w.user_id, COUNT(*)
+        FROM new_rows e
+        JOIN workouts w ON w.workout_id = e.workout_id
+        GROUP BY w.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET exercise_count = s.exercise_count + EXCLUDED.exercise_count;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER workouts_user_stats_ins
+    AFTER INSERT ON workouts REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+CREATE TRIGGER workouts_user_stats_upd
+    AFTER UPDATE ON workouts REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+CREATE TRIGGER workouts_user_stats_del
+    AFTER DELETE ON workouts REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+CREATE TRIGGER workouts_user_stats_exercises_del
+    BEFORE DELETE ON workouts
+    FOR EACH ROW EXECUTE FUNCTION user_stats_workout_exercises_del();
+CREATE TRIGGER exercises_user_stats_ins
+    AFTER INSERT ON exercises REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_exercises_sync();
+CREATE TRIGGER exercises_user_stats_del
+    AFTER DELETE ON exercises REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_exercises_sync();
+
+-- Backfill (CREATE TRIGGER's lock keeps concurrent writers out until commit).
+INSERT INTO user_stats (user_id, workout_count, total_minutes, min_duration, max_duration, exercise_count)
+SELECT u.user_id,
+       COALESCE(w.workout_count, 0), COALESCE(w.total_minutes, 0), w.min_duration, w.max_duration,
+       COALESCE(e.exercise_count, 0)
+FROM users u
+LEFT JOIN (
+    SELECT user_id, COUNT(*) AS workout_count, SUM(duration_minutes) AS total_minutes,
+           MIN(duration_minutes) AS min_duration, MAX(duration_minutes) AS max_duration
+    FROM workouts GROUP BY user_id
+) w ON w.user_id = u.user_id
+LEFT JOIN (
+    SELECT w.user_id, COUNT(*) AS exercise_count
+    FROM exercises e JOIN workouts w ON w.workout_id = e.workout_id
+    GROUP BY w.user_id
+) e ON e.user_id = u.user_id
+WHERE w.user_id IS NOT NULL OR e.user_id IS NOT NULL;
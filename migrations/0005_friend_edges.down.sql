@@ -0,0 +1,6 @@
+DROP TRIGGER IF EXISTS friends_edges_truncate ON friends;
+DROP TRIGGER IF EXISTS friends_edges_del ON friends;
+DROP TRIGGER IF EXISTS friends_edges_upd ON friends;
+DROP TRIGGER IF EXISTS friends_edges_ins ON friends;
+DROP FUNCTION IF EXISTS friend_edges_sync();
+DROP TABLE IF EXISTS friend_edges;
@@ -0,0 +1,62 @@
+-- Adjacency list for the friend graph: every friendship stored in both
+-- directions, so "friends of X" is one primary-key range scan on
+-- (user_id = X) instead of an OR over both columns of friends. friends stays
+-- the source of truth (one canonical row per pair); the rows here are kept in
+-- step by triggers in the writing transaction.
+--
+-- No foreign keys: deleting a user cascades to friends, whose delete trigger
+-- removes the edges, and an FK on friend_id would need a second index just
+-- to serve the cascade.
+CREATE TABLE friend_edges (
+    user_id INT NOT NULL,
+    friend_id INT NOT NULL,
+    PRIMARY KEY (user_id, friend_id)
+);
+
+CREATE OR REPLACE FUNCTION friend_edges_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE friend_edges;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM friend_edges e
+        USING (
+            SELECT user_id AS a, friend_id AS b FROM old_rows
+            UNION ALL
+            SELECT friend_id, user_id FROM old_rows
+        ) d
+        WHERE e.user_id = d.a AND e.friend_id = d.b;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO friend_edges (user_id, friend_id)
+        SELECT user_id, friend_id FROM new_rows
+        UNION ALL
+        SELECT friend_id, user_id FROM new_rows
+        ON CONFLICT (user_id, friend_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER friends_edges_ins
+    AFTER INSERT ON friends REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION friend_edges_sync();
+CREATE TRIGGER friends_edges_upd
+    AFTER UPDATE ON friends REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION friend_edges_sync();
+CREATE TRIGGER friends_edges_del
+    AFTER DELETE ON friends REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION friend_edges_sync();
+CREATE TRIGGER friends_edges_truncate
+    AFTER TRUNCATE ON friends
+    FOR EACH STATEMENT EXECUTE FUNCTION friend_edges_sync();
+
+-- Backfill (CREATE TRIGGER's lock keeps concurrent writers out until commit).
+INSERT INTO friend_edges (user_id, friend_id)
+SELECT user_id, friend_id FROM friends
+UNION
+SELECT friend_id, user_id FROM friends;
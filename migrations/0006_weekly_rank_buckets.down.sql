@@ -0,0 +1,8 @@
+DROP TRIGGER IF EXISTS weekly_activity_rank_buckets_truncate ON weekly_activity;
+DROP TRIGGER IF EXISTS weekly_activity_rank_buckets_del ON weekly_activity;
+DROP TRIGGER IF EXISTS weekly_activity_rank_buckets_upd ON weekly_activity;
+DROP TRIGGER IF EXISTS weekly_activity_rank_buckets_ins ON weekly_activity;
+DROP FUNCTION IF EXISTS weekly_rank_buckets_sync();
+DROP INDEX IF EXISTS idx_weekly_activity_week_minutes;
+DROP INDEX IF EXISTS idx_weekly_activity_week_workouts;
+DROP TABLE IF EXISTS weekly_rank_buckets;
@@ -0,0 +1,87 @@
+-- Global weekly leaderboards.
+--
+-- weekly_rank_buckets is a per-week histogram of every leaderboard metric:
+-- how many users scored exactly `value` in that week. A user's rank is
+-- 1 + the number of users in higher buckets, so rank and percentile lookups
+-- read one bucket row per distinct score above the user instead of sorting
+-- or counting the week's users. It is kept in step with weekly_activity by
+-- triggers (which themselves fire from the workouts triggers), in the writing
+-- transaction.
+CREATE TABLE weekly_rank_buckets (
+    week_start DATE NOT NULL,
+    metric VARCHAR(16) NOT NULL,
+    value BIGINT NOT NULL,
+    user_count INT NOT NULL,
+    PRIMARY KEY (week_start, metric, value)
+);
+
+-- Top-K pages and "neighbours around me" walk these in score order.
+CREATE INDEX IF NOT EXISTS idx_weekly_activity_week_workouts
+    ON weekly_activity (week_start, workout_count, user_id);
+CREATE INDEX IF NOT EXISTS idx_weekly_activity_week_minutes
+    ON weekly_activity (week_start, total_minutes, user_id);
+
+CREATE OR REPLACE FUNCTION weekly_rank_buckets_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        TRUNCATE weekly_rank_buckets;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE weekly_rank_buckets b
+        SET user_count = b.user_count - d.user_count
+        FROM (
+            SELECT o.week_start, m.metric, m.value, COUNT(*) AS user_count
+            FROM old_rows o,
+                 LATERAL (VALUES ('workouts', o.workout_count::bigint),
+                                 ('minutes', o.total_minutes::bigint)) m(metric, value)
+            GROUP BY 1, 2, 3
+        ) d
+        WHERE b.week_start = d.week_start AND b.metric = d.metric AND b.value = d.value;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO weekly_rank_buckets AS b (week_start, metric, value, user_count)
+        SELECT n.week_start, m.metric, m.value, COUNT(*)
+        FROM new_rows n,
+             LATERAL (VALUES ('workouts', n.workout_count::bigint),
+                             ('minutes', n.total_minutes::bigint)) m(metric, value)
+        GROUP BY 1, 2, 3
+        ON CONFLICT (week_start, metric, value) DO UPDATE
+        SET user_count = b.user_count + EXCLUDED.user_count;
+    END IF;
+
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        DELETE FROM weekly_rank_buckets b
+        USING old_rows o
+        WHERE b.week_start = o.week_start
+          AND ((b.metric = 'workouts' AND b.value = o.workout_count)
+               OR (b.metric = 'minutes' AND b.value = o.total_minutes))
+          AND b.user_count <= 0;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER weekly_activity_rank_buckets_ins
+    AFTER INSERT ON weekly_activity REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_rank_buckets_sync();
+CREATE TRIGGER weekly_activity_rank_buckets_upd
+    AFTER UPDATE ON weekly_activity REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_rank_buckets_sync();
+CREATE TRIGGER weekly_activity_rank_buckets_del
+    AFTER DELETE ON weekly_activity REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_rank_buckets_sync();
+CREATE TRIGGER weekly_activity_rank_buckets_truncate
+    AFTER TRUNCATE ON weekly_activity
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_rank_buckets_sync();
+
+-- Backfill (CREATE TRIGGER's lock keeps concurrent writers out until commit).
+INSERT INTO weekly_rank_buckets (week_start, metric, value, user_count)
+SELECT wa.week_start, m.metric, m.value, COUNT(*)
+FROM weekly_activity wa,
+     LATERAL (VALUES ('workouts', wa.workout_count::bigint),
+                     ('minutes', wa.total_minutes::bigint)) m(metric, value)
+GROUP BY 1, 2, 3;
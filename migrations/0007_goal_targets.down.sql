@@ -0,0 +1,9 @@
+DROP INDEX IF EXISTS idx_goals_open_targets;
+ALTER TABLE goals
+    DROP CONSTRAINT IF EXISTS goals_target_check,
+    DROP CONSTRAINT IF EXISTS goals_target_type_check,
+    DROP COLUMN IF EXISTS evaluated_at,
+    DROP COLUMN IF EXISTS progress,
+    DROP COLUMN IF EXISTS target_exercise,
+    DROP COLUMN IF EXISTS target_value,
+    DROP COLUMN IF EXISTS target_type;
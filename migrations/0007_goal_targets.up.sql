@@ -0,0 +1,23 @@
+-- Structured goal targets. A goal with a target_type is measured from the
+-- user's workouts between start_date and end_date:
+--   workouts         number of workouts       >= target_value
+--   minutes          total workout minutes    >= target_value
+--   exercise_weight  heaviest weight_lifted on target_exercise >= target_value
+-- Goals without a target_type stay free text with a manual completed toggle.
+-- progress/evaluated_at are written by the batch evaluator
+-- (backend_fitness.evaluate_goals, run by `manage_fitness.py evaluate-goals`).
+ALTER TABLE goals
+    ADD COLUMN target_type VARCHAR(20),
+    ADD COLUMN target_value NUMERIC(10, 2),
+    ADD COLUMN target_exercise VARCHAR(100),
+    ADD COLUMN progress NUMERIC(12, 2),
+    ADD COLUMN evaluated_at TIMESTAMP,
+    ADD CONSTRAINT goals_target_type_check
+        CHECK (target_type IN ('workouts', 'minutes', 'exercise_weight')),
+    ADD CONSTRAINT goals_target_check
+        CHECK (target_type IS NULL
+               OR (target_value > 0 AND (target_type <> 'exercise_weight' OR target_exercise IS NOT NULL)));
+
+-- The evaluator only visits open structured goals; keep that set in a small index.
+CREATE INDEX IF NOT EXISTS idx_goals_open_targets ON goals (start_date)
+    WHERE target_type IS NOT NULL AND is_completed IS NOT TRUE;
@@ -0,0 +1,10 @@
+DROP TRIGGER IF EXISTS goals_change_txid ON goals;
+DROP TRIGGER IF EXISTS exercises_change_txid ON exercises;
+DROP TRIGGER IF EXISTS workouts_change_txid ON workouts;
+DROP FUNCTION IF EXISTS stamp_change_txid();
+DROP INDEX IF EXISTS idx_goals_change_txid;
+DROP INDEX IF EXISTS idx_exercises_change_txid;
+DROP INDEX IF EXISTS idx_workouts_change_txid;
+ALTER TABLE goals DROP COLUMN IF EXISTS change_txid;
+ALTER TABLE exercises DROP COLUMN IF EXISTS change_txid;
+ALTER TABLE workouts DROP COLUMN IF EXISTS change_txid;
@@ -0,0 +1,39 @@
+-- Change tracking for incremental exports (export_fitness.py).
+--
+-- change_txid is the id of the transaction that last inserted or updated the
+-- row. An export records txid_snapshot_xmin() of its snapshot as its
+-- watermark: every transaction below it had finished before the export read
+-- anything, so the next incremental export (change_txid >= watermark) cannot
+-- miss a row committed late by a long transaction. Rows may be exported twice;
+-- consumers keep the latest per primary key. Deletes are not tracked.
+--
+-- Existing rows keep change_txid NULL (no table rewrite): they are only part
+-- of full exports, which is where an incremental chain starts.
+ALTER TABLE workouts ADD COLUMN change_txid BIGINT;
+ALTER TABLE workouts ALTER COLUMN change_txid SET DEFAULT txid_current();
+ALTER TABLE exercises ADD COLUMN change_txid BIGINT;
+ALTER TABLE exercises ALTER COLUMN change_txid SET DEFAULT txid_current();
+ALTER TABLE goals ADD COLUMN change_txid BIGINT;
+ALTER TABLE goals ALTER COLUMN change_txid SET DEFAULT txid_current();
+
+CREATE INDEX IF NOT EXISTS idx_workouts_change_txid ON workouts (change_txid);
+CREATE INDEX IF NOT EXISTS idx_exercises_change_txid ON exercises (change_txid);
+CREATE INDEX IF NOT EXISTS idx_goals_change_txid ON goals (change_txid);
+
+CREATE OR REPLACE FUNCTION stamp_change_txid() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.change_txid := txid_current();
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER workouts_change_txid
+    BEFORE UPDATE ON workouts
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_txid();
+CREATE TRIGGER exercises_change_txid
+    BEFORE UPDATE ON exercises
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_txid();
+CREATE TRIGGER goals_change_txid
+    BEFORE UPDATE ON goals
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_txid();
@@ -0,0 +1,126 @@
+-- Back to plain workouts/exercises tables. Tables already moved to the
+-- archive schema by archive-partitions are left where they are.
+LOCK TABLE workouts, exercises IN SHARE MODE;
+
+CREATE TABLE workouts_plain (
+    workout_id INT NOT NULL DEFAULT nextval('workouts_workout_id_seq'),
+    user_id INT NOT NULL,
+    workout_date DATE NOT NULL,
+    duration_minutes INT NOT NULL,
+    change_txid BIGINT DEFAULT txid_current()
+);
+CREATE TABLE exercises_plain (
+    exercise_id INT NOT NULL DEFAULT nextval('exercises_exercise_id_seq'),
+    workout_id INT NOT NULL,
+    exercise_name VARCHAR(255) NOT NULL,
+    reps INT,
+    sets INT,
+    weight_lifted DECIMAL,
+    change_txid BIGINT DEFAULT txid_current()
+);
+
+INSERT INTO workouts_plain (workout_id, user_id, workout_date, duration_minutes, change_txid)
+SELECT workout_id, user_id, workout_date, duration_minutes, change_txid FROM workouts;
+INSERT INTO exercises_plain (exercise_id, workout_id, exercise_name, reps, sets, weight_lifted, change_txid)
+SELECT exercise_id, workout_id, exercise_name, reps, sets, weight_lifted, change_txid FROM exercises;
+
+ALTER TABLE workouts_plain ADD CONSTRAINT workouts_plain_pkey PRIMARY KEY (workout_id);
+ALTER TABLE workouts_plain ADD CONSTRAINT workouts_user_id_fkey
+    FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE;
+CREATE INDEX idx_workouts_plain_user_date_id ON workouts_plain (user_id, workout_date, workout_id);
+CREATE INDEX idx_workouts_plain_user_duration ON workouts_plain (user_id, duration_minutes);
+CREATE INDEX idx_workouts_plain_change_txid ON workouts_plain (change_txid);
+
+ALTER TABLE exercises_plain ADD CONSTRAINT exercises_plain_pkey PRIMARY KEY (exercise_id);
+ALTER TABLE exercises_plain ADD CONSTRAINT exercises_workout_id_fkey
+    FOREIGN KEY (workout_id) REFERENCES workouts_plain (workout_id) ON DELETE CASCADE;
+CREATE INDEX idx_exercises_plain_workout ON exercises_plain (workout_id);
+CREATE INDEX idx_exercises_plain_change_txid ON exercises_plain (change_txid);
+
+CREATE OR REPLACE FUNCTION user_stats_workout_exercises_del() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE user_stats
+    SET exercise_count = exercise_count - (SELECT COUNT(*) FROM exercises e WHERE e.workout_id = OLD.workout_id)
+    WHERE user_id = OLD.user_id;
+    RETURN OLD;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION user_stats_exercises_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE user_stats s
+        SET exercise_count = s.exercise_count - d.exercise_count
+        FROM (
+            SELECT w.user_id, COUNT(*) AS exercise_count
+            FROM old_rows e
+            JOIN workouts w ON w.workout_id = e.workout_id
+            GROUP BY w.user_id
+        ) d
+        WHERE s.user_id = d.user_id;
+    ELSE
+        INSERT INTO user_stats AS s (user_id, exercise_count)
+        SELECT w.user_id, COUNT(*)
+        FROM new_rows e
+        JOIN workouts w ON w.workout_id = e.workout_id
+        GROUP BY w.user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET exercise_count = s.exercise_count + EXCLUDED.exercise_count;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER workouts_weekly_activity_ins
+    AFTER INSERT ON workouts_plain REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+CREATE TRIGGER workouts_weekly_activity_upd
+    AFTER UPDATE ON workouts_plain REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+CREATE TRIGGER workouts_weekly_activity_del
+    AFTER DELETE ON workouts_plain REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+CREATE TRIGGER workouts_user_stats_ins
+    AFTER INSERT ON workouts_plain REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+CREATE TRIGGER workouts_user_stats_upd
+    AFTER UPDATE ON workouts_plain REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+CREATE TRIGGER workouts_user_stats_del
+    AFTER DELETE ON workouts_plain REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+CREATE TRIGGER workouts_user_stats_exercises_del
+    BEFORE DELETE ON workouts_plain
+    FOR EACH ROW EXECUTE FUNCTION user_stats_workout_exercises_del();
+CREATE TRIGGER exercises_user_stats_ins
+    AFTER INSERT ON exercises_plain REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_exercises_sync();
+CREATE TRIGGER exercises_user_stats_del
+    AFTER DELETE ON exercises_plain REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_stats_exercises_sync();
+CREATE TRIGGER workouts_change_txid
+    BEFORE UPDATE ON workouts_plain
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_txid();
+CREATE TRIGGER exercises_change_txid
+    BEFORE UPDATE ON exercises_plain
+    FOR EACH ROW EXECUTE FUNCTION stamp_change_txid();
+
+ALTER SEQUENCE workouts_workout_id_seq OWNED BY NONE;
+ALTER SEQUENCE exercises_exercise_id_seq OWNED BY NONE;
+DROP TABLE exercises;
+DROP TABLE workouts;
+ALTER TABLE workouts_plain RENAME TO workouts;
+ALTER TABLE exercises_plain RENAME TO exercises;
+ALTER SEQUENCE workouts_workout_id_seq OWNED BY workouts.workout_id;
+ALTER SEQUENCE exercises_exercise_id_seq OWNED BY exercises.exercise_id;
+ALTER TABLE workouts RENAME CONSTRAINT workouts_plain_pkey TO workouts_pkey;
+ALTER TABLE exercises RENAME CONSTRAINT exercises_plain_pkey TO exercises_pkey;
+ALTER INDEX idx_workouts_plain_user_date_id RENAME TO idx_workouts_user_date_id;
+ALTER INDEX idx_workouts_plain_user_duration RENAME TO idx_workouts_user_duration;
+ALTER INDEX idx_workouts_plain_change_txid RENAME TO idx_workouts_change_txid;
+ALTER INDEX idx_exercises_plain_workout RENAME TO idx_exercises_workout;
+ALTER INDEX idx_exercises_plain_change_txid RENAME TO idx_exercises_change_txid;
+
+DROP FUNCTION IF EXISTS create_month_partitions(DATE, DATE, TEXT, TEXT);
@@ -0,0 +1,362 @@
+-- Monthly range partitioning of workouts on workout_date. Exercises carry
+-- their workout's date and are partitioned on the same boundaries, so a
+-- month of history is one workouts partition plus one exercises partition
+-- that can be detached and archived together (manage_fitness.py
+-- archive-partitions). Queries filtering on workout_date only visit the
+-- months they ask for. Requires PostgreSQL 13+ (foreign keys referencing a
+-- partitioned table, row triggers on partitioned tables).
+--
+-- The primary keys become (workout_id, workout_date) and (exercise_id,
+-- workout_date): ids still come from the original sequences, but a unique
+-- index on the id alone can't be declared on a table partitioned by date, so
+-- workout_id is unique by construction only. A lookup by id without the date
+-- probes every partition; the backend's by-id functions take both.
+-- exercises(workout_id, workout_date) references workouts with ON UPDATE
+-- CASCADE, so moving a workout to another date moves its exercises along.
+--
+-- Conversion, in three phases picked by the fitness.partition_phase setting:
+--   prepare  creates the empty partitioned tables (workouts_part,
+--            exercises_part) and triggers on the old tables that mirror
+--            every insert, update and delete into them;
+--   (copy)   workouts_part_copy_workouts/_exercises(first_id, last_id) copy
+--            the existing rows over one id range per transaction;
+--   swap     takes an exclusive lock, checks that nothing is missing, moves
+--            the derived-table triggers over and swaps the tables.
+-- manage_fitness.py partition-workouts runs the three of them; reads and
+-- writes carry on until the swap. Run without a phase (the migration runner),
+-- this file converts empty tables in one go and refuses tables with rows.
+
+-- Partitions are named workouts_pYYYY_MM / exercises_pYYYY_MM. Creates the
+-- missing months from first_month through last_month and returns how many it
+-- created. A month whose rows already sit in the default partition is skipped
+-- with a NOTICE: manage_fitness.py split-default-partition moves them out.
+-- The parent arguments only exist for this migration's staging tables.
+CREATE OR REPLACE FUNCTION create_month_partitions(first_month DATE, last_month DATE,
+                                                   workouts_parent TEXT DEFAULT 'workouts',
+                                                   exercises_parent TEXT DEFAULT 'exercises')
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    month_start DATE := date_trunc('month', first_month)::date;
+    next_month DATE;
+    suffix TEXT;
+    created INT := 0;
+    stranded BOOLEAN;
+BEGIN
+    WHILE month_start <= last_month LOOP
+        next_month := (month_start + INTERVAL '1 month')::date;
+        suffix := to_char(month_start, '"p"YYYY_MM');
+        IF to_regclass('workouts_' || suffix) IS NULL THEN
+            stranded := FALSE;
+            IF to_regclass('workouts_default') IS NOT NULL THEN
+                EXECUTE 'SELECT EXISTS (SELECT 1 FROM workouts_default WHERE workout_date >= $1 AND workout_date < $2)'
+                    INTO stranded USING month_start, next_month;
+            END IF;
+            IF stranded THEN
+                RAISE NOTICE 'workouts_default holds rows for %; split-default-partition creates %',
+                             month_start, suffix;
+            ELSE
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                               'workouts_' || suffix, workouts_parent, month_start, next_month);
+                EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                               'exercises_' || suffix, exercises_parent, month_start, next_month);
+                created := created + 1;
+            END IF;
+        END IF;
+        month_start := next_month;
+    END LOOP;
+    RETURN created;
+END;
+$$;
+
+-- Prepare: the new tables, and triggers that keep them in step with the old
+-- ones from here on. Only the triggers need a (brief) write lock on the old
+-- tables. The derived tables already count every old row, so nothing fires on
+-- the new tables until the swap.
+CREATE OR REPLACE FUNCTION workouts_part_prepare() RETURNS void
+LANGUAGE plpgsql AS $prepare$
+BEGIN
+    CREATE TABLE workouts_part (
+        workout_id INT NOT NULL DEFAULT nextval('workouts_workout_id_seq'),
+        user_id INT NOT NULL,
+        workout_date DATE NOT NULL,
+        duration_minutes INT NOT NULL,
+        change_txid BIGINT DEFAULT txid_current()
+    ) PARTITION BY RANGE (workout_date);
+
+    CREATE TABLE exercises_part (
+        exercise_id INT NOT NULL DEFAULT nextval('exercises_exercise_id_seq'),
+        workout_id INT NOT NULL,
+        workout_date DATE NOT NULL,
+        exercise_name VARCHAR(255) NOT NULL,
+        reps INT,
+        sets INT,
+        weight_lifted DECIMAL,
+        change_txid BIGINT DEFAULT txid_current()
+    ) PARTITION BY RANGE (workout_date);
+
+    CREATE TABLE workouts_default PARTITION OF workouts_part DEFAULT;
+    CREATE TABLE exercises_default PARTITION OF exercises_part DEFAULT;
+    PERFORM create_month_partitions(
+        COALESCE((SELECT MIN(workout_date) FROM workouts), current_date),
+        (current_date + INTERVAL '3 months')::date,
+        'workouts_part', 'exercises_part'
+    );
+
+    ALTER TABLE workouts_part ADD CONSTRAINT workouts_part_pkey PRIMARY KEY (workout_id, workout_date);
+    ALTER TABLE workouts_part ADD CONSTRAINT workouts_user_id_fkey
+        FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE;
+    CREATE INDEX idx_workouts_part_user_date_id ON workouts_part (user_id, workout_date, workout_id);
+    CREATE INDEX idx_workouts_part_user_duration ON workouts_part (user_id, duration_minutes);
+    CREATE INDEX idx_workouts_part_change_txid ON workouts_part (change_txid);
+
+    ALTER TABLE exercises_part ADD CONSTRAINT exercises_part_pkey PRIMARY KEY (exercise_id, workout_date);
+    ALTER TABLE exercises_part ADD CONSTRAINT exercises_workout_fkey
+        FOREIGN KEY (workout_id, workout_date) REFERENCES workouts_part (workout_id, workout_date)
+        ON DELETE CASCADE ON UPDATE CASCADE;
+    CREATE INDEX idx_exercises_part_workout ON exercises_part (workout_id);
+    CREATE INDEX idx_exercises_part_change_txid ON exercises_part (change_txid);
+
+    CREATE TRIGGER workouts_part_mirror
+        AFTER INSERT OR UPDATE OR DELETE ON workouts
+        FOR EACH ROW EXECUTE FUNCTION workouts_part_mirror_workouts();
+    CREATE TRIGGER exercises_part_mirror
+        AFTER INSERT OR UPDATE OR DELETE ON exercises
+        FOR EACH ROW EXECUTE FUNCTION workouts_part_mirror_exercises();
+END;
+$prepare$;
+
+-- Copy, one id range per call. Both copies lock the rows they read FOR SHARE,
+-- so a concurrent write to one of them waits until the copy commits and its
+-- mirror trigger then finds the copied row (or the copy waits for the write
+-- and copies the new version). Rows already mirrored are left alone.
+CREATE OR REPLACE FUNCTION workouts_part_copy_workouts(first_id INT, last_id INT) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    copied INT;
+BEGIN
+    INSERT INTO workouts_part (workout_id, user_id, workout_date, duration_minutes, change_txid)
+    SELECT workout_id, user_id, workout_date, duration_minutes, change_txid
+    FROM workouts
+    WHERE workout_id BETWEEN first_id AND last_id
+    FOR SHARE
+    ON CONFLICT (workout_id, workout_date) DO NOTHING;
+    GET DIAGNOSTICS copied = ROW_COUNT;
+    RETURN copied;
+END;
+$$;
+
+-- Run after every workout is copied: each exercise needs its workout's row.
+CREATE OR REPLACE FUNCTION workouts_part_copy_exercises(first_id INT, last_id INT) RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    copied INT;
+BEGIN
+    INSERT INTO exercises_part (exercise_id, workout_id, workout_date, exercise_name, reps, sets, weight_lifted,
+                                change_txid)
+    SELECT e.exercise_id, e.workout_id, w.workout_date, e.exercise_name, e.reps, e.sets, e.weight_lifted,
+           e.change_txid
+    FROM exercises e
+    JOIN workouts w ON w.workout_id = e.workout_id
+    WHERE e.exercise_id BETWEEN first_id AND last_id
+    FOR SHARE OF e, w
+    ON CONFLICT (exercise_id, workout_date) DO NOTHING;
+    GET DIAGNOSTICS copied = ROW_COUNT;
+    RETURN copied;
+END;
+$$;
+
+-- Mirror triggers on the old tables. An update of a row not copied yet is
+-- skipped: the copy picks up its new version later. A workout moving to
+-- another month is moved by hand (new row, exercises over, old row deleted)
+-- rather than by a cross-partition UPDATE, which cascades as a delete to the
+-- exercises before PostgreSQL 15.
+CREATE OR REPLACE FUNCTION workouts_part_mirror_workouts() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO workouts_part (workout_id, user_id, workout_date, duration_minutes, change_txid)
+        VALUES (NEW.workout_id, NEW.user_id, NEW.workout_date, NEW.duration_minutes, NEW.change_txid)
+        ON CONFLICT (workout_id, workout_date) DO UPDATE
+        SET user_id = EXCLUDED.user_id, duration_minutes = EXCLUDED.duration_minutes,
+            change_txid = EXCLUDED.change_txid;
+    ELSIF TG_OP = 'DELETE' THEN
+        DELETE FROM workouts_part WHERE workout_id = OLD.workout_id AND workout_date = OLD.workout_date;
+    ELSIF (NEW.workout_id, NEW.workout_date) = (OLD.workout_id, OLD.workout_date) THEN
+        UPDATE workouts_part
+        SET user_id = NEW.user_id, duration_minutes = NEW.duration_minutes, change_txid = NEW.change_txid
+        WHERE workout_id = OLD.workout_id AND workout_date = OLD.workout_date;
+    ELSIF EXISTS (SELECT 1 FROM workouts_part WHERE workout_id = OLD.workout_id AND workout_date = OLD.workout_date)
+    THEN
+        INSERT INTO workouts_part (workout_id, user_id, workout_date, duration_minutes, change_txid)
+        VALUES (NEW.workout_id, NEW.user_id, NEW.workout_date, NEW.duration_minutes, NEW.change_txid);
+        UPDATE exercises_part SET workout_id = NEW.workout_id, workout_date = NEW.workout_date
+        WHERE workout_id = OLD.workout_id AND workout_date = OLD.workout_date;
+        DELETE FROM workouts_part WHERE workout_id = OLD.workout_id AND workout_date = OLD.workout_date;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- A new exercise may belong to a workout the copy hasn't reached yet: that
+-- workout is copied first, as the foreign key needs it.
+CREATE OR REPLACE FUNCTION workouts_part_mirror_exercises() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        DELETE FROM exercises_part WHERE exercise_id = OLD.exercise_id;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM workouts_part_copy_workouts(NEW.workout_id, NEW.workout_id);
+        INSERT INTO exercises_part (exercise_id, workout_id, workout_date, exercise_name, reps, sets,
+                                    weight_lifted, change_txid)
+        SELECT NEW.exercise_id, NEW.workout_id, w.workout_date, NEW.exercise_name, NEW.reps, NEW.sets,
+               NEW.weight_lifted, NEW.change_txid
+        FROM workouts w
+        WHERE w.workout_id = NEW.workout_id
+        ON CONFLICT (exercise_id, workout_date) DO UPDATE
+        SET exercise_name = EXCLUDED.exercise_name, reps = EXCLUDED.reps, sets = EXCLUDED.sets,
+            weight_lifted = EXCLUDED.weight_lifted, change_txid = EXCLUDED.change_txid;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- Swap: the derived-table triggers move to the new tables, which take the old
+-- ones' names. The mirror triggers go with the old tables.
+CREATE OR REPLACE FUNCTION workouts_part_swap() RETURNS void
+LANGUAGE plpgsql AS $swap$
+BEGIN
+    IF to_regclass('workouts_part') IS NULL THEN
+        RAISE EXCEPTION 'workouts_part does not exist; run python manage_fitness.py partition-workouts';
+    END IF;
+    LOCK TABLE workouts, exercises IN ACCESS EXCLUSIVE MODE;
+    -- Counting is far cheaper than the copy, and catches a swap without one.
+    IF (SELECT COUNT(*) FROM workouts) <> (SELECT COUNT(*) FROM workouts_part)
+       OR (SELECT COUNT(*) FROM exercises) <> (SELECT COUNT(*) FROM exercises_part) THEN
+        RAISE EXCEPTION 'workouts_part/exercises_part are missing rows; run python manage_fitness.py partition-workouts';
+    END IF;
+
+    -- Exercises now carry workout_date, so the per-workout lookups below name the
+    -- partition instead of probing every month.
+    CREATE OR REPLACE FUNCTION user_stats_workout_exercises_del() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE user_stats
+        SET exercise_count = exercise_count - (
+            SELECT COUNT(*) FROM exercises e
+            WHERE e.workout_id = OLD.workout_id AND e.workout_date = OLD.workout_date
+        )
+        WHERE user_id = OLD.user_id;
+        RETURN OLD;
+    END;
+    $$;
+
+    CREATE OR REPLACE FUNCTION user_stats_exercises_sync() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            UPDATE user_stats s
+            SET exercise_count = s.exercise_count - d.exercise_count
+            FROM (
+                SELECT w.user_id, COUNT(*) AS exercise_count
+                FROM old_rows e
+                JOIN workouts w ON w.workout_id = e.workout_id AND w.workout_date = e.workout_date
+                GROUP BY w.user_id
+            ) d
+            WHERE s.user_id = d.user_id;
+        ELSE
+            INSERT INTO user_stats AS s (user_id, exercise_count)
+            SELECT w.user_id, COUNT(*)
+            FROM new_rows e
+            JOIN workouts w ON w.workout_id = e.workout_id AND w.workout_date = e.workout_date
+            GROUP BY w.user_id
+            ON CONFLICT (user_id) DO UPDATE
+            SET exercise_count = s.exercise_count + EXCLUDED.exercise_count;
+        END IF;
+        RETURN NULL;
+    END;
+    $$;
+
+    CREATE TRIGGER workouts_weekly_activity_ins
+        AFTER INSERT ON workouts_part REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+    CREATE TRIGGER workouts_weekly_activity_upd
+        AFTER UPDATE ON workouts_part REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+    CREATE TRIGGER workouts_weekly_activity_del
+        AFTER DELETE ON workouts_part REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_sync();
+    CREATE TRIGGER workouts_user_stats_ins
+        AFTER INSERT ON workouts_part REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+    CREATE TRIGGER workouts_user_stats_upd
+        AFTER UPDATE ON workouts_part REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+    CREATE TRIGGER workouts_user_stats_del
+        AFTER DELETE ON workouts_part REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION user_stats_workouts_sync();
+    CREATE TRIGGER workouts_user_stats_exercises_del
+        BEFORE DELETE ON workouts_part
+        FOR EACH ROW EXECUTE FUNCTION user_stats_workout_exercises_del();
+    CREATE TRIGGER exercises_user_stats_ins
+        AFTER INSERT ON exercises_part REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION user_stats_exercises_sync();
+    CREATE TRIGGER exercises_user_stats_del
+        AFTER DELETE ON exercises_part REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION user_stats_exercises_sync();
+    CREATE TRIGGER workouts_change_txid
+        BEFORE UPDATE ON workouts_part
+        FOR EACH ROW EXECUTE FUNCTION stamp_change_txid();
+    CREATE TRIGGER exercises_change_txid
+        BEFORE UPDATE ON exercises_part
+        FOR EACH ROW EXECUTE FUNCTION stamp_change_txid();
+
+    -- Swap. The sequences are detached first so dropping the old tables keeps them.
+    ALTER SEQUENCE workouts_workout_id_seq OWNED BY NONE;
+    ALTER SEQUENCE exercises_exercise_id_seq OWNED BY NONE;
+    DROP TABLE exercises;
+    DROP TABLE workouts;
+    ALTER TABLE workouts_part RENAME TO workouts;
+    ALTER TABLE exercises_part RENAME TO exercises;
+    ALTER SEQUENCE workouts_workout_id_seq OWNED BY workouts.workout_id;
+    ALTER SEQUENCE exercises_exercise_id_seq OWNED BY exercises.exercise_id;
+    ALTER TABLE workouts RENAME CONSTRAINT workouts_part_pkey TO workouts_pkey;
+    ALTER TABLE exercises RENAME CONSTRAINT exercises_part_pkey TO exercises_pkey;
+    ALTER INDEX idx_workouts_part_user_date_id RENAME TO idx_workouts_user_date_id;
+    ALTER INDEX idx_workouts_part_user_duration RENAME TO idx_workouts_user_duration;
+    ALTER INDEX idx_workouts_part_change_txid RENAME TO idx_workouts_change_txid;
+    ALTER INDEX idx_exercises_part_workout RENAME TO idx_exercises_workout;
+    ALTER INDEX idx_exercises_part_change_txid RENAME TO idx_exercises_change_txid;
+
+    DROP FUNCTION workouts_part_mirror_workouts();
+    DROP FUNCTION workouts_part_mirror_exercises();
+END;
+$swap$;
+
+-- The helpers are dropped once the swap is done.
+DO $$
+DECLARE
+    phase TEXT := COALESCE(current_setting('fitness.partition_phase', true), '');
+BEGIN
+    IF phase = 'prepare' THEN
+        IF to_regclass('workouts_part') IS NULL THEN
+            PERFORM workouts_part_prepare();
+        END IF;
+        RETURN;
+    ELSIF phase = 'swap' THEN
+        PERFORM workouts_part_swap();
+    ELSIF to_regclass('workouts_part') IS NOT NULL THEN
+        RAISE EXCEPTION 'workouts is being partitioned; finish with python manage_fitness.py partition-workouts';
+    ELSIF EXISTS (SELECT 1 FROM workouts) THEN
+        RAISE EXCEPTION 'workouts has rows; partition it with python manage_fitness.py partition-workouts';
+    ELSE
+        PERFORM workouts_part_prepare();
+        PERFORM workouts_part_swap();
+    END IF;
+    DROP FUNCTION workouts_part_prepare();
+    DROP FUNCTION workouts_part_copy_workouts(INT, INT);
+    DROP FUNCTION workouts_part_copy_exercises(INT, INT);
+    DROP FUNCTION workouts_part_swap();
+END;
+$$;
@@ -0,0 +1,5 @@
+-- pg_trgm stays installed; other objects may have come to depend on it.
+DROP INDEX IF EXISTS idx_users_email_prefix;
+DROP INDEX IF EXISTS idx_users_name_prefix;
+DROP INDEX IF EXISTS idx_users_email_trgm;
+DROP INDEX IF EXISTS idx_users_name_trgm;
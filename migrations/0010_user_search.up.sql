@@ -0,0 +1,12 @@
+-- Typeahead user search (backend_fitness.search_users) over name and email,
+-- case-insensitive:
+--   * queries of 3+ characters match anywhere in the name or email through
+--     trigram GIN indexes (a bitmap OR of the two)
+--   * 1-2 character queries, too short for trigrams, match prefixes through
+--     text_pattern_ops btrees, read in order and stopped at the limit
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_users_name_trgm ON users USING gin (lower(name) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users USING gin (lower(email) gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_users_name_prefix ON users (lower(name) text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_users_email_prefix ON users (lower(email) text_pattern_ops);
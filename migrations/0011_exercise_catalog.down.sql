@@ -0,0 +1,20 @@
+DROP TRIGGER IF EXISTS exercises_records_del ON exercises;
+DROP TRIGGER IF EXISTS exercises_records_upd ON exercises;
+DROP TRIGGER IF EXISTS exercises_records_ins ON exercises;
+DROP FUNCTION IF EXISTS exercise_records_sync();
+DROP TABLE IF EXISTS exercise_records;
+
+LOCK TABLE exercises IN SHARE MODE;
+ALTER TABLE exercises ADD COLUMN exercise_name VARCHAR(255);
+UPDATE exercises e
+SET exercise_name = c.display_name
+FROM exercise_catalog c
+WHERE c.exercise_type_id = e.exercise_type_id;
+ALTER TABLE exercises ALTER COLUMN exercise_name SET NOT NULL;
+DROP INDEX IF EXISTS idx_exercises_user_type_date;
+ALTER TABLE exercises DROP COLUMN exercise_type_id, DROP COLUMN user_id;
+
+DROP FUNCTION IF EXISTS exercise_type_id(TEXT);
+DROP FUNCTION IF EXISTS exercise_type_ids(TEXT[]);
+DROP TABLE IF EXISTS exercise_catalog;
+DROP FUNCTION IF EXISTS canonical_exercise_name(TEXT);
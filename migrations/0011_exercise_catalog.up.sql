@@ -0,0 +1,145 @@
+-- Exercise catalog and per-user personal records.
+--
+-- Exercise names are interned: exercise_catalog holds one row per canonical
+-- name (trimmed, inner whitespace collapsed, lower-cased), so "Bench Press",
+-- "bench press" and " Bench  Press" are the same exercise. display_name keeps
+-- the spelling the exercise was first logged with (for existing data, the
+-- most common one). exercises stores exercise_type_id instead of the name, and
+-- also the owning user_id (like workout_date, copied from the workout; a
+-- workout never changes owner), so one user's history of one exercise is a
+-- single range of idx_exercises_user_type_date.
+--
+-- exercise_type_ids(names) resolves names to ids in order, adding unknown ones
+-- to the catalog; writers call it inside their INSERT.
+--
+-- exercise_records keeps per user and exercise the best weight, the best
+-- single-entry volume (sets x reps x weight, missing values as zero) and the
+-- last date it was performed, maintained by triggers on exercises like
+-- user_stats. Inserts raise the bests in place; deletes and updates (the
+-- workout_date cascade) recompute the touched (user, exercise) pairs from that
+-- index.
+CREATE OR REPLACE FUNCTION canonical_exercise_name(name TEXT) RETURNS TEXT
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT lower(regexp_replace(btrim(name), '\s+', ' ', 'g'));
+$$;
+
+CREATE TABLE exercise_catalog (
+    exercise_type_id SERIAL PRIMARY KEY,
+    canonical_name VARCHAR(255) NOT NULL UNIQUE,
+    display_name VARCHAR(255) NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION exercise_type_ids(names TEXT[]) RETURNS INT[]
+LANGUAGE sql AS $$
+    INSERT INTO exercise_catalog (canonical_name, display_name)
+    SELECT DISTINCT ON (canonical_exercise_name(n)) canonical_exercise_name(n), regexp_replace(btrim(n), '\s+', ' ', 'g')
+    FROM unnest(names) n
+    WHERE canonical_exercise_name(n) <> ''
+    ORDER BY canonical_exercise_name(n)
+    ON CONFLICT (canonical_name) DO NOTHING;
+
+    -- blank or NULL names map to NULL, which exercises.exercise_type_id rejects
+    SELECT COALESCE(array_agg(c.exercise_type_id ORDER BY u.ord), '{}')
+    FROM unnest(names) WITH ORDINALITY u(n, ord)
+    LEFT JOIN exercise_catalog c ON c.canonical_name = NULLIF(canonical_exercise_name(u.n), '');
+$$;
+
+CREATE OR REPLACE FUNCTION exercise_type_id(name TEXT) RETURNS INT
+LANGUAGE sql AS $$
+    SELECT (exercise_type_ids(ARRAY[name]))[1];
+$$;
+
+-- Backfill. Writers wait for the commit; reads carry on.
+LOCK TABLE exercises IN SHARE MODE;
+
+INSERT INTO exercise_catalog (canonical_name, display_name)
+SELECT canonical_exercise_name(exercise_name),
+       mode() WITHIN GROUP (ORDER BY regexp_replace(btrim(exercise_name), '\s+', ' ', 'g'))
+FROM exercises
+WHERE canonical_exercise_name(exercise_name) <> ''
+GROUP BY 1;
+-- Existing blank names get a catalog entry of their own.
+INSERT INTO exercise_catalog (canonical_name, display_name)
+SELECT '', '(unnamed)'
+WHERE EXISTS (SELECT 1 FROM exercises WHERE canonical_exercise_name(exercise_name) = '');
+
+ALTER TABLE exercises ADD COLUMN exercise_type_id INT, ADD COLUMN user_id INT;
+UPDATE exercises e
+SET exercise_type_id = c.exercise_type_id, user_id = w.user_id
+FROM exercise_catalog c, workouts w
+WHERE c.canonical_name = canonical_exercise_name(e.exercise_name)
+  AND w.workout_id = e.workout_id AND w.workout_date = e.workout_date;
+ALTER TABLE exercises ALTER COLUMN exercise_type_id SET NOT NULL;
+ALTER TABLE exercises ALTER COLUMN user_id SET NOT NULL;
+ALTER TABLE exercises ADD CONSTRAINT exercises_exercise_type_fkey
+    FOREIGN KEY (exercise_type_id) REFERENCES exercise_catalog (exercise_type_id);
+ALTER TABLE exercises DROP COLUMN exercise_name;
+CREATE INDEX IF NOT EXISTS idx_exercises_user_type_date ON exercises (user_id, exercise_type_id, workout_date);
+
+CREATE TABLE exercise_records (
+    user_id INT NOT NULL,
+    exercise_type_id INT NOT NULL,
+    best_weight DECIMAL,
+    best_volume DECIMAL NOT NULL DEFAULT 0,
+    last_performed DATE NOT NULL,
+    PRIMARY KEY (user_id, exercise_type_id),
+    FOREIGN KEY (user_id) REFERENCES Users(user_id) ON DELETE CASCADE,
+    FOREIGN KEY (exercise_type_id) REFERENCES exercise_catalog (exercise_type_id)
+);
+
+-- The delete path only updates or deletes record rows, never inserts: when a
+-- user is deleted, the cascades run per workout and the user row is already
+-- gone while some of their exercises are still being removed.
+CREATE OR REPLACE FUNCTION exercise_records_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO exercise_records AS r (user_id, exercise_type_id, best_weight, best_volume, last_performed)
+        SELECT user_id, exercise_type_id, MAX(weight_lifted),
+               MAX(COALESCE(sets, 0) * COALESCE(reps, 0) * COALESCE(weight_lifted, 0)), MAX(workout_date)
+        FROM new_rows
+        GROUP BY user_id, exercise_type_id
+        ON CONFLICT (user_id, exercise_type_id) DO UPDATE
+        SET best_weight = GREATEST(r.best_weight, EXCLUDED.best_weight),
+            best_volume = GREATEST(r.best_volume, EXCLUDED.best_volume),
+            last_performed = GREATEST(r.last_performed, EXCLUDED.last_performed);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE exercise_records r
+        SET best_weight = x.best_weight, best_volume = x.best_volume, last_performed = x.last_performed
+        FROM (
+            SELECT e.user_id, e.exercise_type_id, MAX(e.weight_lifted) AS best_weight,
+                   MAX(COALESCE(e.sets, 0) * COALESCE(e.reps, 0) * COALESCE(e.weight_lifted, 0)) AS best_volume,
+                   MAX(e.workout_date) AS last_performed
+            FROM (SELECT DISTINCT user_id, exercise_type_id FROM old_rows) d
+            JOIN exercises e ON e.user_id = d.user_id AND e.exercise_type_id = d.exercise_type_id
+            GROUP BY e.user_id, e.exercise_type_id
+        ) x
+        WHERE r.user_id = x.user_id AND r.exercise_type_id = x.exercise_type_id;
+
+        DELETE FROM exercise_records r
+        USING (SELECT DISTINCT user_id, exercise_type_id FROM old_rows) d
+        WHERE r.user_id = d.user_id AND r.exercise_type_id = d.exercise_type_id
+          AND NOT EXISTS (
+              SELECT 1 FROM exercises e WHERE e.user_id = d.user_id AND e.exercise_type_id = d.exercise_type_id
+          );
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER exercises_records_ins
+    AFTER INSERT ON exercises REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION exercise_records_sync();
+CREATE TRIGGER exercises_records_upd
+    AFTER UPDATE ON exercises REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION exercise_records_sync();
+CREATE TRIGGER exercises_records_del
+    AFTER DELETE ON exercises REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION exercise_records_sync();
+
+INSERT INTO exercise_records (user_id, exercise_type_id, best_weight, best_volume, last_performed)
+SELECT user_id, exercise_type_id, MAX(weight_lifted),
+       MAX(COALESCE(sets, 0) * COALESCE(reps, 0) * COALESCE(weight_lifted, 0)), MAX(workout_date)
+FROM exercises
+GROUP BY user_id, exercise_type_id;
@@ -0,0 +1,5 @@
+DROP TRIGGER IF EXISTS weekly_activity_notify_truncate ON weekly_activity;
+DROP TRIGGER IF EXISTS weekly_activity_notify_del ON weekly_activity;
+DROP TRIGGER IF EXISTS weekly_activity_notify_upd ON weekly_activity;
+DROP TRIGGER IF EXISTS weekly_activity_notify_ins ON weekly_activity;
+DROP FUNCTION IF EXISTS weekly_activity_notify();
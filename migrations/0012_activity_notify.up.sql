@@ -0,0 +1,57 @@
+-- Live leaderboard updates. Every change to weekly_activity is published on
+-- the weekly_activity notification channel with the row's new totals:
+--     {"user_id": 7, "week_start": "2024-05-06", "workouts": 3, "minutes": 95}
+-- (zeros when the row is deleted). backend_fitness holds one LISTEN
+-- connection per process and hands the events to the sessions showing those
+-- users. Notifications go out when the writing transaction commits, in commit
+-- order. They carry totals, not deltas, so the latest event for a (user, week)
+-- is its current value and a duplicate does no harm.
+--
+-- A statement that changes more than 1000 rows (imports, rebuilds, archiving)
+-- or a TRUNCATE sends a single {"resync": true} instead, and listeners
+-- re-read whatever they show.
+CREATE OR REPLACE FUNCTION weekly_activity_notify() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changed BIGINT;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('weekly_activity', '{"resync": true}');
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'DELETE' THEN
+        SELECT COUNT(*) INTO changed FROM old_rows;
+    ELSE
+        SELECT COUNT(*) INTO changed FROM new_rows;
+    END IF;
+
+    IF changed > 1000 THEN
+        PERFORM pg_notify('weekly_activity', '{"resync": true}');
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('weekly_activity', json_build_object(
+            'user_id', user_id, 'week_start', week_start, 'workouts', 0, 'minutes', 0
+        )::text)
+        FROM old_rows;
+    ELSE
+        PERFORM pg_notify('weekly_activity', json_build_object(
+            'user_id', user_id, 'week_start', week_start, 'workouts', workout_count, 'minutes', total_minutes
+        )::text)
+        FROM new_rows;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE TRIGGER weekly_activity_notify_ins
+    AFTER INSERT ON weekly_activity REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_notify();
+CREATE TRIGGER weekly_activity_notify_upd
+    AFTER UPDATE ON weekly_activity REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_notify();
+CREATE TRIGGER weekly_activity_notify_del
+    AFTER DELETE ON weekly_activity REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_notify();
+CREATE TRIGGER weekly_activity_notify_truncate
+    AFTER TRUNCATE ON weekly_activity
+    FOR EACH STATEMENT EXECUTE FUNCTION weekly_activity_notify();
@@ -0,0 +1,100 @@
+# tests/conftest.py
+"""
+Shared fixtures.
+
+Tests that need PostgreSQL take the `database` fixture and are skipped unless
+FITNESS_TEST_DSN names a scratch database the tests may wipe, e.g.
+
+    FITNESS_TEST_DSN="host=localhost dbname=fitness_test user=postgres" python -m pytest
+
+Once per session its public schema is dropped and rebuilt from the base schema
+plus every migration (PostgreSQL 13+ with pg_trgm available).
+"""
+import os
+from datetime import date
+
+import pytest
+
+TEST_DSN_ENV = "FITNESS_TEST_DSN"
+
+
+def rebuild_schema(db):
+    """Drop everything in the test database and rebuild it from `sql` plus the migrations."""
+    import migrate_fitness
+
+    db.close_pool()
+    db.clear_cache()
+    with db.get_connection() as cur:
+        cur.execute("DROP SCHEMA IF EXISTS archive CASCADE; DROP SCHEMA public CASCADE; CREATE SCHEMA public;")
+    migrate_fitness.init()
+
+
+@pytest.fixture(scope="session")
+def database():
+    """backend_fitness, pointed at the freshly migrated test database."""
+    dsn = os.environ.get(TEST_DSN_ENV)
+    if not dsn:
+        pytest.skip(f"{TEST_DSN_ENV} is not set")
+    psycopg2 = pytest.importorskip("psycopg2")
+    import backend_fitness as db
+
+    params = psycopg2.extensions.parse_dsn(dsn)
+    saved = (db.DB_HOST, db.DB_NAME, db.DB_USER, db.DB_PASSWORD)
+    db.DB_HOST = params.get("host", db.DB_HOST)
+    db.DB_NAME = params.get("dbname", db.DB_NAME)
+    db.DB_USER = params.get("user", db.DB_USER)
+    db.DB_PASSWORD = params.get("password", "")
+    if "port" in params:
+        os.environ["PGPORT"] = params["port"]  # libpq default, so every module's connect() picks it up
+    rebuild_schema(db)
+    yield db
+    db.close_pool()
+    db.clear_cache()
+    db.DB_HOST, db.DB_NAME, db.DB_USER, db.DB_PASSWORD = saved
+
+
+@pytest.fixture
+def scratch_schema(database):
+    """The test database, rebuilt afterwards: for tests that roll migrations back."""
+    yield database
+    rebuild_schema(database)
+
+
+@pytest.fixture
+def clean_db(database):
+    """An empty test database (every table reachable from users, and the exercise catalog)."""
+    with database.get_connection() as cur:
+        cur.execute("TRUNCATE users, exercise_catalog RESTART IDENTITY CASCADE;")
+    database.clear_cache()
+    return database
+
+
+@pytest.fixture
+def sample_data(clean_db):
+    """
+    Four users (ann and bob are friends, bob and cat are friends, dan has no
+    friends and no history) with workouts over two weeks, exercises and goals.
+    Returns {"users": {name: user_id}, "workouts": [workout_id, ...], "week": Monday}.
+    """
+    db = clean_db
+    users = {name: db.create_user(name.title(), f"{name}@example.invalid", 60 + i)
+             for i, name in enumerate(("ann", "bob", "cat", "dan"))}
+    db.add_friendship(users["ann"], users["bob"])
+    db.add_friendship(users["bob"], users["cat"])
+    week = date(2024, 5, 6)
+    workouts = [
+        db.log_workout_with_exercises(users["ann"], date(2024, 5, 6), 30,
+                                      [("Bench Press", 5, 3, 60), ("Squat", 8, 3, 80)])[0],
+        db.log_workout_with_exercises(users["ann"], date(2024, 5, 8), 45, [("bench  press", 5, 3, 65)])[0],
+        db.log_workout(users["ann"], date(2024, 4, 29), 20),
+        db.log_workout_with_exercises(users["bob"], date(2024, 5, 7), 60, [("Deadlift", 5, 1, 120)])[0],
+        db.log_workout(users["bob"], date(2024, 5, 9), 25),
+        db.log_workout(users["cat"], date(2024, 5, 12), 90),
+    ]
+    db.create_goal(users["ann"], "Three workouts", date(2024, 5, 1), date(2024, 5, 31), "workouts", 3)
+    db.create_goal(users["ann"], "Bench 65", date(2024, 5, 1), date(2024, 5, 31), "exercise_weight", 65,
+                   "Bench Press")
+    db.create_goal(users["bob"], "Two hours", date(2024, 5, 1), date(2024, 5, 31), "minutes", 120)
+    db.create_goal(users["cat"], "Free text goal", date(2024, 5, 1), date(2024, 5, 31))
+    db.clear_cache()
+    return {"users": users, "workouts": workouts, "week": week}
@@ -0,0 +1,90 @@
+# tests/test_analytics.py
+from datetime import date
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+import analytics_fitness as analytics  # noqa: E402
+
+MON = analytics._day_number(date(2024, 5, 6))
+
+
+def _days(*offsets):
+    return np.array([MON + o for o in offsets], dtype=np.int64)
+
+
+def test_streaks():
+    days = _days(0, 1, 1, 2, 5, 7, 8)
+    assert analytics.streaks(days, MON + 9) == {"current": 2, "longest": 3, "active_days": 6}
+    assert analytics.streaks(days, MON + 8)["current"] == 2
+    assert analytics.streaks(days, MON + 10)["current"] == 0
+    assert analytics.streaks(_days(), MON) == {"current": 0, "longest": 0, "active_days": 0}
+
+
+def test_daily_load():
+    days = _days(0, 0, 3, 9)
+    minutes = np.array([30.0, 15.0, 60.0, 20.0])
+    daily = analytics.daily_load(days, minutes, MON, MON + 9)
+    assert list(daily.index[[0, -1]]) == [pd.Timestamp("2024-05-06"), pd.Timestamp("2024-05-15")]
+    assert list(daily["minutes"]) == [45, 0, 0, 60, 0, 0, 0, 0, 0, 20]
+    assert daily["acute_7d"].iloc[6] == 105 and daily["acute_7d"].iloc[7] == 60
+    assert daily["acute_7d"].iloc[9] == 80  # days 3..9
+    assert daily["chronic_28d"].iloc[9] == 125
+    # acute / (chronic per week): 80 / (125 / 4)
+    assert daily["acute_chronic_ratio"].iloc[9] == pytest.approx(2.56)
+    assert np.isnan(analytics.daily_load(_days(), np.array([]), MON, MON + 1)["acute_chronic_ratio"]).all()
+
+
+def test_weekly_summary():
+    workout_days = _days(0, 2, 14)
+    minutes = np.array([30.0, 30.0, 90.0])
+    exercise_days = _days(0, 14)
+    volume = np.array([1000.0, 1500.0])
+    weekly = analytics.weekly_summary(workout_days, minutes, exercise_days, volume, MON + 20)
+    assert list(weekly.index) == list(pd.to_datetime(["2024-05-06", "2024-05-13", "2024-05-20"]))
+    assert list(weekly["workouts"]) == [2, 0, 1]
+    assert list(weekly["minutes"]) == [60, 0, 90]
+    assert list(weekly["volume"]) == [1000, 0, 1500]
+    assert weekly["minutes_change_pct"].iloc[1] == -100
+    assert np.isnan(weekly["minutes_change_pct"].iloc[[0, 2]]).all()  # no previous week / previous week empty
+    assert analytics.weekly_summary(_days(), np.array([]), _days(), np.array([]), MON).empty
+
+
+def test_personal_records():
+    exercises = {
+        "day": _days(0, 0, 2, 4, 4),
+        "name": np.array(["Squat", "Bench Press", "Squat", "Squat", "Plank"], dtype=object),
+        "reps": np.array([5.0, 5.0, 3.0, 10.0, np.nan]),
+        "sets": np.array([3.0, 3.0, 3.0, 1.0, 3.0]),
+        "weight": np.array([80.0, 60.0, 90.0, 90.0, np.nan]),
+    }
+    volume = analytics.volume(exercises["reps"], exercises["sets"], exercises["weight"])
+    assert list(volume) == [1200, 900, 810, 900, 0]
+    records = analytics.personal_records(exercises, volume).set_index("exercise")
+    assert list(records.index) == ["Bench Press", "Plank", "Squat"]
+    squat = records.loc["Squat"]
+    # the earliest of the tied 90 kg sessions is the record
+    assert (squat["best_weight"], squat["best_weight_date"]) == (90, pd.Timestamp("2024-05-08"))
+    assert (squat["best_volume"], squat["best_volume_date"]) == (1200, pd.Timestamp("2024-05-06"))
+    assert (squat["total_volume"], squat["entries"]) == (2910, 3)
+    assert np.isnan(records.loc["Plank", "best_weight"]) and records.loc["Plank", "entries"] == 1
+    empty = {key: np.array([], dtype=value.dtype) for key, value in exercises.items()}
+    assert analytics.personal_records(empty, np.array([])).empty
+
+
+def test_summary_follows_the_date(sample_data, monkeypatch):
+    ann = sample_data["users"]["ann"]
+    today = date(2024, 5, 9)
+
+    class Clock(date):
+        @classmethod
+        def today(cls):
+            return today
+
+    monkeypatch.setattr(analytics, "date", Clock)
+    assert analytics.training_summary(ann)["streaks"]["current"] == 1  # trained on the 8th
+    assert analytics.training_summary(ann)["streaks"] == analytics.training_summary(ann, date(2024, 5, 9))["streaks"]
+    today = date(2024, 5, 12)  # no writes in between, only midnight
+    assert analytics.training_summary(ann)["streaks"]["current"] == 0
+    assert analytics.training_summary(ann, date(2024, 5, 9))["streaks"]["current"] == 1
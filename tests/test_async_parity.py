@@ -0,0 +1,77 @@
+# tests/test_async_parity.py
+"""
+async_backend_fitness must return exactly what backend_fitness returns for the
+same call on the same data. Every test runs its own asyncio.run(), i.e. its
+own event loop, like separate CLI calls or Streamlit reruns.
+"""
+import asyncio
+import inspect
+from datetime import date
+
+import pytest
+
+pytest.importorskip("psycopg_pool")
+import async_backend_fitness as adb  # noqa: E402
+import backend_fitness as db  # noqa: E402
+
+# functions both modules have that change data or manage connections
+NOT_READS = {"add_exercise", "add_friendship", "create_goal", "create_user", "delete_exercise", "delete_goal",
+             "delete_workout", "log_workout", "log_workout_with_exercises", "remove_friendship",
+             "set_goal_completed", "update_user", "get_connection", "close_pool"}
+
+
+def _reads():
+    return {name for name, fn in vars(adb).items()
+            if inspect.iscoroutinefunction(fn) and not name.startswith("_") and callable(getattr(db, name, None))
+            } - NOT_READS
+
+
+def test_parity_calls_cover_every_read(sample_data):
+    assert {name for name, _ in adb._parity_calls(sample_data["users"]["ann"])} == _reads()
+
+
+@pytest.mark.parametrize("who", ["ann", "bob", "cat", "dan"])
+def test_sync_and_async_agree(sample_data, who):
+    assert asyncio.run(adb.check_parity(sample_data["users"][who])) == []
+
+
+def test_pool_per_event_loop(sample_data):
+    uid = sample_data["users"]["ann"]
+
+    async def read():
+        row = await adb.get_user_by_id(uid)
+        await adb.close_pool()
+        return row
+
+    async def read_without_close():
+        return await adb.get_user_by_id(uid)
+
+    assert asyncio.run(read()) == asyncio.run(read()) == db.get_user_by_id(uid)
+    # a loop that ends without close_pool() doesn't break the next one
+    assert asyncio.run(read_without_close()) == asyncio.run(read())
+
+
+def test_async_reads_merge_queued_writes(sample_data, tmp_path, monkeypatch):
+    uid = sample_data["users"]["bob"]
+    goal_id = db.list_goals(uid)[0][0]
+    monkeypatch.setattr(db, "WRITE_BEHIND_LINGER_SECONDS", 30)
+    db.configure_write_behind(True, journal_path=str(tmp_path / "writes.journal"), batch_size=1000)
+    try:
+        workout_id, _ = db.log_workout_with_exercises(uid, date(2024, 5, 10), 40, [("Row", 10, 3, 50)])
+        db.set_goal_completed(goal_id, uid, True)
+        assert db.write_behind_stats()["pending"] == 3
+
+        async def reads():
+            try:
+                return (await adb.list_workouts(uid), await adb.list_workouts_page(uid, limit=2),
+                        await adb.list_exercises(workout_id, date(2024, 5, 10)), await adb.list_goals(uid))
+            finally:
+                await adb.close_pool()
+
+        db.clear_cache()
+        expected = (db.list_workouts(uid), db.list_workouts_page(uid, limit=2), db.list_exercises(workout_id, date(2024, 5, 10)),
+                    db.list_goals(uid))
+        assert workout_id in [w[0] for w in expected[0]]
+        assert asyncio.run(reads()) == expected
+    finally:
+        db.configure_write_behind(False)
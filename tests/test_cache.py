@@ -0,0 +1,103 @@
+# tests/test_cache.py
+import pytest
+
+from cache_fitness import QueryCache
+
+
+def _load(cache, key, value, tags, during=None):
+    """cache.get_or_load with a loader that counts calls and can run `during` mid-load."""
+    calls = []
+
+    def loader():
+        calls.append(key)
+        if during is not None:
+            during()
+        return value
+
+    return cache.get_or_load(key, loader, lambda _: tags), len(calls)
+
+
+def test_hit_returns_a_copy():
+    cache = QueryCache()
+    assert _load(cache, "a", [1, 2], [("workouts", 1)]) == ([1, 2], 1)
+    value, calls = _load(cache, "a", [9], [("workouts", 1)])
+    assert (value, calls) == ([1, 2], 0)
+    value.append(3)
+    assert _load(cache, "a", [9], [])[0] == [1, 2]
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_cached_values_are_not_shared():
+    cache = QueryCache()
+    page = ([(1, "Ann"), (2, "Bob")], ("Bob", 2))
+    first, _ = _load(cache, "page", page, [("users",)])
+    first[0].append((3, "Cat"))  # the loaded value goes back to the caller; the cache holds a copy
+    hit, calls = _load(cache, "page", None, [("users",)])
+    assert (hit, calls) == (([(1, "Ann"), (2, "Bob")], ("Bob", 2)), 0)
+    hit[0].clear()
+    assert _load(cache, "page", None, [("users",)])[0] == ([(1, "Ann"), (2, "Bob")], ("Bob", 2))
+
+    summary = {"streaks": (3, 5), "weeks": [{"minutes": 90}]}
+    _load(cache, "summary", summary, [("workouts", 1)])
+    _load(cache, "summary", None, [])[0]["weeks"][0]["minutes"] = 0
+    assert _load(cache, "summary", None, [])[0] == {"streaks": (3, 5), "weeks": [{"minutes": 90}]}
+
+
+def test_cached_dataframes_are_not_shared():
+    pd = pytest.importorskip("pandas")
+    cache = QueryCache()
+    _load(cache, "summary", {"daily": pd.DataFrame({"minutes": [30, 45]})}, [("workouts", 1)])
+    hit, _ = _load(cache, "summary", None, [])
+    hit["daily"].loc[0, "minutes"] = 0
+    hit["daily"]["extra"] = 1
+    assert _load(cache, "summary", None, [])[0]["daily"].to_dict("list") == {"minutes": [30, 45]}
+
+
+def test_invalidate_drops_only_tagged_entries():
+    cache = QueryCache()
+    _load(cache, "ann", "w1", [("workouts", 1), ("goals", 1)])
+    _load(cache, "bob", "w2", [("workouts", 2)])
+    cache.invalidate(("goals", 1))
+    assert _load(cache, "ann", "w1'", [("workouts", 1)]) == ("w1'", 1)
+    assert _load(cache, "bob", "x", [])[1] == 0
+    cache.invalidate(("workouts", 1), ("workouts", 2))
+    assert cache.stats()["entries"] == 0 and cache.stats()["invalidations"] == 3
+
+
+def test_load_overlapping_an_invalidation_is_not_cached():
+    cache = QueryCache()
+    value, _ = _load(cache, "ann", "stale", [("workouts", 1)], during=lambda: cache.invalidate(("workouts", 1)))
+    assert value == "stale"
+    assert _load(cache, "ann", "fresh", [("workouts", 1)]) == ("fresh", 1)
+    assert _load(cache, "ann", "again", [("workouts", 1)]) == ("fresh", 0)
+
+    # an invalidation of some other tag doesn't spoil the load
+    _load(cache, "bob", "w2", [("workouts", 2)], during=lambda: cache.invalidate(("workouts", 3)))
+    assert _load(cache, "bob", "x", [("workouts", 2)]) == ("w2", 0)
+
+
+def test_load_older_than_forgotten_invalidations_is_not_cached():
+    cache = QueryCache()
+    cache.TAG_HISTORY = 2
+
+    def many():
+        for user_id in range(5):
+            cache.invalidate(("workouts", user_id))
+
+    _load(cache, "ann", "stale", [("workouts", 0)], during=many)
+    assert _load(cache, "ann", "fresh", [("workouts", 0)])[1] == 1
+    _load(cache, "bob", "stale", [("workouts", 9)], during=cache.clear)
+    assert _load(cache, "bob", "fresh", [("workouts", 9)])[1] == 1
+
+
+def test_lru_eviction_and_expiry():
+    cache = QueryCache(max_entries=2)
+    for key in "abc":
+        _load(cache, key, key, [])
+    assert _load(cache, "a", "a", [])[1] == 1
+    assert cache.stats()["evictions"] == 2
+
+    cache = QueryCache(ttl_seconds=-1)
+    _load(cache, "a", 1, [("t", 1)])
+    assert _load(cache, "a", 2, [("t", 1)]) == (2, 1)
+    assert cache.stats()["expirations"] == 1
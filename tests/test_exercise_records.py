@@ -0,0 +1,78 @@
+# tests/test_exercise_records.py
+"""
+The exercise catalog's name canonicalization and the exercise_records triggers
+(migrations/0011) behind personal_records.
+"""
+from datetime import date
+from decimal import Decimal
+
+import manage_fitness as manage
+
+
+def _records(db, user_id):
+    """{display_name: (best_weight, best_volume, last_performed)} straight from exercise_records."""
+    with db.get_connection() as cur:
+        cur.execute("""SELECT c.display_name, r.best_weight, r.best_volume, r.last_performed
+                       FROM exercise_records r JOIN exercise_catalog c USING (exercise_type_id)
+                       WHERE r.user_id = %s;""", (user_id,))
+        return {name: tuple(rest) for name, *rest in cur.fetchall()}
+
+
+def _expected(db, user_id):
+    with db.get_connection() as cur:
+        cur.execute(manage.EXPECTED_EXERCISE_RECORDS_SQL, {"user_ids": [user_id]})
+        return sorted(cur.fetchall())
+
+
+def _actual(db, user_id):
+    with db.get_connection() as cur:
+        cur.execute("SELECT user_id, exercise_type_id, best_weight, best_volume, last_performed "
+                    "FROM exercise_records WHERE user_id = %s;", (user_id,))
+        return sorted(cur.fetchall())
+
+
+def test_names_are_canonicalized(clean_db):
+    db = clean_db
+    uid = db.create_user("Ann", "ann@example.invalid", None)
+    workout_id, _ = db.log_workout_with_exercises(uid, date(2024, 5, 6), 30, [
+        ("Bench Press", 5, 3, 60), (" bench  press", 5, 3, 62), ("BENCH PRESS", 5, 3, 64), ("Squat", 5, 3, 80)])
+    with db.get_connection() as cur:
+        cur.execute("SELECT exercise_type_id(%s), exercise_type_id(%s), exercise_type_id(%s);",
+                    ("Bench Press", " bench  press", "BENCH PRESS"))
+        ids = set(cur.fetchone())
+        cur.execute("SELECT DISTINCT exercise_type_id FROM exercises WHERE workout_id = %s;", (workout_id,))
+        used = {r[0] for r in cur.fetchall()}
+        cur.execute("SELECT display_name FROM exercise_catalog ORDER BY display_name;")
+        names = [r[0] for r in cur.fetchall()]
+    assert len(ids) == 1 and ids < used and len(used) == 2
+    assert names == ["Bench Press", "Squat"]  # the first spelling logged
+    assert [r[1] for r in db.list_exercises(workout_id, date(2024, 5, 6))] == ["Bench Press"] * 3 + ["Squat"]
+    assert [r[5] for r in db.exercise_history(uid, "bench PRESS ")] == [64, 62, 60]
+
+
+def test_records_follow_inserts_and_deletes(clean_db):
+    db = clean_db
+    uid = db.create_user("Ann", "ann@example.invalid", None)
+    first, _ = db.log_workout_with_exercises(uid, date(2024, 5, 6), 30, [("Bench Press", 5, 3, 60)])
+    assert _records(db, uid) == {"Bench Press": (Decimal(60), Decimal(900), date(2024, 5, 6))}
+
+    # a heavier set raises best_weight, a longer one best_volume, a later one last_performed
+    heavy_date, light_date = date(2024, 5, 8), date(2024, 5, 10)
+    heavy, (heavy_id,) = db.log_workout_with_exercises(uid, heavy_date, 30, [("bench press", 1, 1, 100)])
+    light, (light_id,) = db.log_workout_with_exercises(uid, light_date, 30, [("BENCH PRESS", 10, 5, 40)])
+    assert _records(db, uid) == {"Bench Press": (Decimal(100), Decimal(2000), light_date)}
+    assert _actual(db, uid) == _expected(db, uid)
+
+    # deleting the record holders recomputes from what is left
+    db.delete_exercise(heavy_id, heavy, heavy_date)
+    assert _records(db, uid) == {"Bench Press": (Decimal(60), Decimal(2000), light_date)}
+    db.delete_workout(light, light_date, uid)
+    assert _records(db, uid) == {"Bench Press": (Decimal(60), Decimal(900), date(2024, 5, 6))}
+    assert _actual(db, uid) == _expected(db, uid)
+    assert db.personal_records(uid) == [("Bench Press", Decimal(60), Decimal(900), date(2024, 5, 6))]
+
+    # the last entry of the exercise takes its records row with it
+    (exercise_id, *_), = db.list_exercises(first, date(2024, 5, 6))
+    db.delete_exercise(exercise_id, first, date(2024, 5, 6))
+    assert _records(db, uid) == {}
+    assert db.personal_records(uid) == []
@@ -0,0 +1,69 @@
+# tests/test_export.py
+import io
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.ipc as ipc  # noqa: E402
+
+import export_fitness as export  # noqa: E402
+
+GOALS = export.EXPORT_TABLES["goals"][4]
+
+
+class FakeCursor:
+    """Stands in for a psycopg2 cursor: copy_expert writes canned COPY ... (FORMAT csv) output."""
+
+    def __init__(self, data=b"", error=None):
+        self.data = data
+        self.error = error
+        self.sql = None
+
+    def copy_expert(self, sql, file, size=8192):
+        self.sql = sql
+        file.write(self.data)
+        if self.error is not None:
+            raise self.error
+
+
+def _copy(cur, schema, chunk_bytes=1 << 20):
+    sink = io.BytesIO()
+    writer = export._open_writer(sink, schema, "arrow")
+    try:
+        rows = export._copy_table(cur, "SELECT 1", schema, writer, chunk_bytes)
+    finally:
+        writer.close()
+    return rows, ipc.open_file(pa.BufferReader(sink.getvalue())).read_all()
+
+
+def test_csv_to_arrow():
+    data = (b'1,7,"Run ""5k""",2024-05-01,2024-05-31,t,workouts,3,,0.5\n'
+            b'2,7,"",2024-05-01,2024-05-31,f,exercise_weight,65.5,"",\n'
+            b'3,8,"two\nlines",2024-06-01,2024-06-30,,,,Squat,\n')
+    cur = FakeCursor(data)
+    rows, table = _copy(cur, GOALS)
+    assert cur.sql == "COPY (SELECT 1) TO STDOUT WITH (FORMAT csv)"
+    assert rows == 3 and table.schema == GOALS
+    goals = table.to_pydict()
+    assert goals["goal_description"] == ['Run "5k"', "", "two\nlines"]
+    assert goals["is_completed"] == [True, False, None]
+    assert goals["target_type"] == ["workouts", "exercise_weight", None]
+    assert goals["target_value"] == [3.0, 65.5, None]
+    assert goals["target_exercise"] == [None, "", "Squat"]  # unquoted empty = NULL, "" = empty string
+    assert goals["progress"] == [0.5, None, None]
+    assert str(goals["start_date"][2]) == "2024-06-01"
+
+
+def test_small_chunks_and_empty_output():
+    schema = export.EXPORT_TABLES["workouts"][4]
+    data = b"".join(b"%d,1,2024-05-01,30\n" % i for i in range(1, 2001))
+    rows, table = _copy(FakeCursor(data), schema, chunk_bytes=1024)
+    assert rows == table.num_rows == 2000
+    assert table.column("workout_id").to_pylist() == list(range(1, 2001))
+    assert _copy(FakeCursor(), schema)[0] == 0
+
+
+def test_copy_failure_is_raised():
+    schema = export.EXPORT_TABLES["workouts"][4]
+    with pytest.raises(RuntimeError, match="connection lost"):
+        _copy(FakeCursor(b"1,1,2024-05-01,30\n", RuntimeError("connection lost")), schema)
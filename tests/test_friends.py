@@ -0,0 +1,34 @@
+# tests/test_friends.py
+"""Friendships, the friend_edges mirror kept by triggers, and "people you may know"."""
+
+
+def _edges(db, *user_ids):
+    with db.get_connection() as cur:
+        cur.execute("SELECT user_id, friend_id FROM friend_edges WHERE user_id = ANY(%s) ORDER BY 1, 2;",
+                    (list(user_ids),))
+        return cur.fetchall()
+
+
+def test_suggestions(clean_db):
+    db = clean_db
+    u = {name: db.create_user(name.title(), f"{name}@example.invalid", None)
+         for name in ("ann", "bob", "cat", "dan", "eve", "fay", "gus")}
+    for a, b in [("ann", "bob"), ("ann", "cat"), ("ann", "dan"), ("bob", "cat"),
+                 ("bob", "eve"), ("bob", "fay"), ("cat", "eve"), ("cat", "fay"), ("dan", "eve"), ("dan", "gus")]:
+        db.add_friendship(u[b], u[a])  # either order
+    db.add_friendship(u["ann"], u["bob"])  # already friends: no second row
+
+    # cat is a friend of a friend but already ann's friend; ann is her friends' friend
+    assert db.suggest_friends(u["ann"]) == [
+        (u["eve"], "Eve", "eve@example.invalid", 3), (u["fay"], "Fay", "fay@example.invalid", 2),
+        (u["gus"], "Gus", "gus@example.invalid", 1)]
+    assert [r[0] for r in db.suggest_friends(u["ann"], limit=2)] == [u["eve"], u["fay"]]
+    assert [r[0] for r in db.suggest_friends(u["gus"])] == [u["ann"], u["eve"]]
+
+    assert _edges(db, u["ann"]) == [(u["ann"], u["bob"]), (u["ann"], u["cat"]), (u["ann"], u["dan"])]
+    assert (u["dan"], u["ann"]) in _edges(db, u["dan"])
+    db.remove_friendship(u["ann"], u["dan"])
+    assert _edges(db, u["ann"]) == [(u["ann"], u["bob"]), (u["ann"], u["cat"])]
+    assert _edges(db, u["dan"]) == [(u["dan"], u["eve"]), (u["dan"], u["gus"])]
+    assert [(r[0], r[3]) for r in db.suggest_friends(u["ann"])] == [(u["eve"], 2), (u["fay"], 2)]
+    assert [f[1] for f in db.list_friends(u["dan"])] == ["Eve", "Gus"]
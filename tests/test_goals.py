@@ -0,0 +1,69 @@
+# tests/test_goals.py
+"""
+Structured goals (migrations/0007): live progress in list_goals and the
+evaluate_goals batch job. sample_data gives ann "Three workouts" and
+"Bench 65", bob "Two hours" and cat a free-text goal, all for May 2024.
+"""
+from datetime import date
+
+import pytest
+
+
+def _goals(db, user_id):
+    return {g[1]: (g[4], g[8]) for g in db.list_goals(user_id)}  # description: (is_completed, progress)
+
+
+def test_create_goal_validates_targets(clean_db):
+    db = clean_db
+    uid = db.create_user("Ann", "ann@example.invalid", 60)
+    may = (date(2024, 5, 1), date(2024, 5, 31))
+    for target, reason in [(("laps", 3, None), "Unknown goal target type"),
+                           (("workouts", 0, None), "greater than zero"),
+                           (("minutes", None, None), "greater than zero"),
+                           (("minutes", float("nan"), None), "finite number"),
+                           (("minutes", float("inf"), None), "finite number"),
+                           (("minutes", 10**8, None), "at most"),
+                           (("exercise_weight", 100, ""), "exercise name")]:
+        with pytest.raises(ValueError, match=reason):
+            db.create_goal(uid, "Goal", *may, *target)
+    goal_id = db.create_goal(uid, "Ten workouts", *may, "workouts", 10, "Squat")
+    assert [(g[0], g[5], g[6], g[7], g[8]) for g in db.list_goals(uid)] == [(goal_id, "workouts", 10, None, 0)]
+
+
+def test_live_progress(sample_data):
+    import backend_fitness as db
+
+    users = sample_data["users"]
+    # ann's April workout is outside the goal; "bench  press" counts as Bench Press
+    assert _goals(db, users["ann"]) == {"Three workouts": (False, 2), "Bench 65": (False, 65)}
+    assert _goals(db, users["bob"]) == {"Two hours": (False, 85)}
+    assert _goals(db, users["cat"]) == {"Free text goal": (False, None)}
+    db.log_workout(users["bob"], date(2024, 5, 30), 40)
+    assert _goals(db, users["bob"]) == {"Two hours": (False, 125)}
+
+
+def test_evaluate_goals(sample_data):
+    import backend_fitness as db
+
+    users = sample_data["users"]
+    db.create_goal(users["dan"], "June", date(2024, 6, 1), date(2024, 6, 30), "workouts", 1)
+
+    assert db.evaluate_goals(date(2024, 5, 10)) == {"evaluated": 3, "completed": 1, "users_completed": 1}
+    assert _goals(db, users["ann"])["Bench 65"] == (True, 65)
+    db.log_workout(users["ann"], date(2024, 5, 20), 30)
+    assert db.evaluate_goals(date(2024, 5, 21)) == {"evaluated": 2, "completed": 1, "users_completed": 1}
+    assert _goals(db, users["ann"])["Three workouts"] == (True, 3)
+
+    # bob's goal gets one last look after it ends, then is left alone
+    db.log_workout(users["bob"], date(2024, 5, 31), 20)
+    assert db.evaluate_goals(date(2024, 6, 2)) == {"evaluated": 2, "completed": 0, "users_completed": 0}
+    db.log_workout(users["bob"], date(2024, 5, 30), 60)
+    db.log_workout(users["dan"], date(2024, 6, 3), 30)
+    assert db.evaluate_goals(date(2024, 6, 4)) == {"evaluated": 1, "completed": 1, "users_completed": 1}
+    with db.get_connection() as cur:
+        cur.execute("SELECT goal_id, is_completed, progress, evaluated_at::date FROM goals "
+                    "WHERE target_type IS NOT NULL ORDER BY goal_id;")
+        assert [row[1:] for row in cur.fetchall()] == [
+            (True, 3, date(2024, 5, 21)), (True, 65, date(2024, 5, 10)), (False, 105, date(2024, 6, 2)),
+            (True, 1, date(2024, 6, 4))]
+    assert _goals(db, users["dan"]) == {"June": (True, 1)}
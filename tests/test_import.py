@@ -0,0 +1,56 @@
+# tests/test_import.py
+import io
+import json
+from datetime import date
+
+import pytest
+
+import import_fitness as imp
+
+ROW = {"user_id": "1", "workout_ref": "a", "workout_date": "2024-05-06", "duration_minutes": "30",
+       "exercise_name": " Squat ", "reps": "5", "sets": "3", "weight_lifted": "80.5"}
+
+
+def test_validate():
+    assert imp.validate(ROW) == (1, "a", date(2024, 5, 6), 30, "Squat", 5, 3, 80.5)
+    assert imp.validate({**ROW, "workout_ref": "", "reps": "", "weight_lifted": None}, user_id=7) == (
+        7, "2024-05-06/30", date(2024, 5, 6), 30, "Squat", None, 3, None)
+    assert imp.validate({**ROW, "exercise_name": " " + "x" * 255 + " "})[4] == "x" * 255
+
+
+@pytest.mark.parametrize("field, value, reason", [
+    ("user_id", "", "user_id is required"),
+    ("user_id", "2147483648", "user_id is out of range"),
+    ("duration_minutes", "0", "duration_minutes must be positive"),
+    ("duration_minutes", "99999999999", "duration_minutes is out of range"),
+    ("duration_minutes", 1.5, "duration_minutes must be a whole number"),
+    ("reps", "-1", "reps must not be negative"),
+    ("reps", "2147483648", "reps is out of range"),
+    ("sets", float("inf"), "sets must be a whole number"),
+    ("sets", True, "sets must be a whole number"),
+    ("weight_lifted", "nan", "weight_lifted must be a finite number"),
+    ("weight_lifted", "1e400", "weight_lifted must be a finite number"),
+    ("weight_lifted", "-2", "weight_lifted must not be negative"),
+    ("exercise_name", "x" * 256, "exercise_name is too long"),
+])
+def test_validate_rejects(field, value, reason):
+    with pytest.raises(ValueError, match=reason):
+        imp.validate({**ROW, field: value})
+
+
+def test_bad_rows_are_rejected_one_by_one(sample_data):
+    ann = sample_data["users"]["ann"]
+    lines = [
+        {"workout_ref": "x", "workout_date": "2024-05-20", "duration_minutes": 30, "exercise_name": "Squat",
+         "reps": 5, "sets": 3, "weight_lifted": 80},
+        {"workout_ref": "x", "workout_date": "2024-05-20", "duration_minutes": 30, "exercise_name": "Row",
+         "reps": 2**31, "sets": 3, "weight_lifted": 50},
+        {"workout_ref": "x", "workout_date": "2024-05-20", "duration_minutes": 30, "exercise_name": "Curl",
+         "reps": 10, "sets": 3, "weight_lifted": float("nan")},
+        {"workout_ref": "y", "workout_date": "2024-05-21", "duration_minutes": 2**40},
+    ]
+    stream = io.StringIO("".join(json.dumps(line) + "\n" for line in lines))
+    report = imp.import_history(stream, "jsonl", user_id=ann)
+    assert report["rejected"] == [(2, "reps is out of range"), (3, "weight_lifted must be a finite number"),
+                                  (4, "duration_minutes is out of range")]
+    assert (report["workouts"], report["exercises"]) == (1, 1)
@@ -0,0 +1,128 @@
+# tests/test_journal.py
+import json
+import multiprocessing
+
+import pytest
+
+from journal_fitness import JournalLocked, WriteJournal
+
+
+def _lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "writes.journal"
+
+
+def test_replays_unacked_entries(path):
+    journal = WriteJournal(str(path))
+    first = journal.append("workout", {"workout_id": 1})
+    second = journal.append("exercise", {"exercise_id": 7})
+    journal.close()
+
+    journal = WriteJournal(str(path))
+    assert [(e["seq"], e["op"], e["args"]) for e in journal.pending()] == [
+        (first, "workout", {"workout_id": 1}), (second, "exercise", {"exercise_id": 7})]
+    # sequence numbers carry on after a replay
+    assert journal.append("workout", {"workout_id": 2}) == second + 1
+    journal.close()
+
+
+def test_ack_hides_committed_entries(path):
+    journal = WriteJournal(str(path))
+    first = journal.append("workout", {"workout_id": 1})
+    journal.append("workout", {"workout_id": 2})
+    journal.ack(first)
+    journal.close()
+
+    journal = WriteJournal(str(path))
+    assert [e["args"] for e in journal.pending()] == [{"workout_id": 2}]
+    journal.close()
+    # reopening rewrote the file without the acked entry and the ack record
+    assert [r.get("seq") for r in _lines(path)] == [first + 1]
+
+
+def test_torn_tail_is_ignored(path):
+    journal = WriteJournal(str(path))
+    journal.append("workout", {"workout_id": 1})
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 2, "op": "workout", "ar')
+
+    journal = WriteJournal(str(path))
+    assert [e["seq"] for e in journal.pending()] == [1]
+    assert journal.append("workout", {"workout_id": 3}) == 2
+    journal.close()
+    assert [r["seq"] for r in _lines(path)] == [1, 2]
+
+
+def test_drained_ack_truncates(path):
+    journal = WriteJournal(str(path))
+    journal.append("workout", {"workout_id": 1})
+    last = journal.append("workout", {"workout_id": 2})
+    journal.ack(last, drained=True)
+    assert path.read_text() == ""
+    assert journal.append("workout", {"workout_id": 3}) == last + 1
+    journal.close()
+
+    journal = WriteJournal(str(path))
+    assert [e["seq"] for e in journal.pending()] == [last + 1]
+    journal.close()
+
+
+def test_drained_ack_of_an_older_entry_keeps_newer_ones(path):
+    journal = WriteJournal(str(path))
+    first = journal.append("workout", {"workout_id": 1})
+    journal.append("workout", {"workout_id": 2})
+    journal.ack(first, drained=True)
+    journal.close()
+
+    journal = WriteJournal(str(path))
+    assert [e["args"] for e in journal.pending()] == [{"workout_id": 2}]
+    journal.close()
+
+
+def test_unsynced_append_then_sync(path):
+    journal = WriteJournal(str(path))
+    seq = journal.append("workout", {"workout_id": 1}, sync=False)
+    journal.sync(seq)
+    journal.sync(seq)  # already synced: no-op
+    journal.close()
+    journal.sync(seq)  # after close: close() synced
+    assert [r["seq"] for r in _lines(path)] == [seq]
+
+
+def test_dead_letter(path):
+    journal = WriteJournal(str(path))
+    seq = journal.append("workout", {"workout_id": 1, "user_id": 99})
+    journal.dead_letter({"seq": seq, "op": "workout", "args": {"workout_id": 1, "user_id": 99}}, "fk violation")
+    journal.close()
+    (record,) = _lines(path.with_name(path.name + ".dead"))
+    assert record["seq"] == seq and record["args"]["user_id"] == 99 and record["error"] == "fk violation"
+    assert "rejected_at" in record
+
+
+def _open_journal(path, result):
+    try:
+        WriteJournal(path).close()
+        result.put("opened")
+    except JournalLocked:
+        result.put("locked")
+
+
+def test_second_process_is_refused(path):
+    journal = WriteJournal(str(path))
+    ctx = multiprocessing.get_context("spawn")
+    result = ctx.Queue()
+    child = ctx.Process(target=_open_journal, args=(str(path), result))
+    child.start()
+    child.join(30)
+    assert result.get(timeout=5) == "locked"
+    journal.close()
+
+    child = ctx.Process(target=_open_journal, args=(str(path), result))
+    child.start()
+    child.join(30)
+    assert result.get(timeout=5) == "opened"
@@ -0,0 +1,107 @@
+# tests/test_leaderboard.py
+"""
+Global weekly leaderboards: pages, ranks and neighbours read their ranks from
+weekly_rank_buckets (migrations/0006), which triggers keep in step with
+weekly_activity.
+"""
+from datetime import date
+
+import pytest
+
+BUCKETS_MISMATCH_SQL = """
+    (SELECT week_start, metric, value, user_count FROM weekly_rank_buckets
+     EXCEPT
+     SELECT wa.week_start, m.metric, m.value, COUNT(*)
+     FROM weekly_activity wa,
+          LATERAL (VALUES ('workouts', wa.workout_count::bigint),
+                          ('minutes', wa.total_minutes::bigint)) m(metric, value)
+     GROUP BY 1, 2, 3)
+    UNION ALL
+    (SELECT wa.week_start, m.metric, m.value, COUNT(*)
+     FROM weekly_activity wa,
+          LATERAL (VALUES ('workouts', wa.workout_count::bigint),
+                          ('minutes', wa.total_minutes::bigint)) m(metric, value)
+     GROUP BY 1, 2, 3
+     EXCEPT
+     SELECT week_start, metric, value, user_count FROM weekly_rank_buckets);
+"""
+WEEK = date(2024, 5, 8)  # any day of the week 2024-05-06 .. 05-12
+
+
+@pytest.fixture
+def board(sample_data):
+    """
+    Minutes that week: cat 90, bob 85, eve 85, ann 75, fay 75; workouts:
+    fay 3, ann 2, bob 2, cat 1, eve 1; dan did nothing.
+    """
+    import backend_fitness as db
+
+    users = dict(sample_data["users"])
+    users["eve"] = db.create_user("Eve", "eve@example.invalid", 70)
+    users["fay"] = db.create_user("Fay", "fay@example.invalid", 71)
+    db.log_workout(users["eve"], date(2024, 5, 10), 85)
+    for day in (6, 7, 11):
+        db.log_workout(users["fay"], date(2024, 5, day), 25)
+    return db, users
+
+
+def _mismatches(db):
+    with db.get_connection() as cur:
+        cur.execute(BUCKETS_MISMATCH_SQL)
+        return cur.fetchall()
+
+
+def test_pages(board):
+    db, u = board
+    rows, after = db.global_leaderboard_page("minutes", WEEK, limit=2)
+    assert rows == [(1, u["cat"], "Cat", 90), (2, u["eve"], "Eve", 85)] and after == (85, u["eve"])
+    rows, after = db.global_leaderboard_page("minutes", WEEK, after=after, limit=2)
+    assert rows == [(2, u["bob"], "Bob", 85), (4, u["fay"], "Fay", 75)] and after == (75, u["fay"])
+    rows, after = db.global_leaderboard_page("minutes", WEEK, after=after, limit=2)
+    assert rows == [(4, u["ann"], "Ann", 75)] and after is None
+
+    rows, after = db.global_leaderboard_page("workouts", WEEK)
+    assert [(rank, user_id) for rank, user_id, _, _ in rows] == [
+        (1, u["fay"]), (2, u["bob"]), (2, u["ann"]), (4, u["eve"]), (4, u["cat"])]
+    assert after is None
+    assert db.global_leaderboard_page("minutes", date(2024, 6, 3)) == ([], None)
+
+
+def test_rank_and_neighbors(board):
+    db, u = board
+    assert db.global_rank(u["ann"], "minutes", WEEK) == {
+        "value": 75, "rank": 4, "ranked_users": 5, "percentile": 40.0}
+    assert db.global_rank(u["fay"], "workouts", WEEK) == {
+        "value": 3, "rank": 1, "ranked_users": 5, "percentile": 100.0}
+    assert db.global_rank(u["dan"], "minutes", WEEK) == {
+        "value": 0, "rank": 6, "ranked_users": 5, "percentile": 0.0}
+
+    assert db.global_leaderboard_neighbors(u["bob"], "minutes", WEEK, radius=1) == [
+        (2, u["eve"], "Eve", 85), (2, u["bob"], "Bob", 85), (4, u["fay"], "Fay", 75)]
+    assert [r[1] for r in db.global_leaderboard_neighbors(u["cat"], "minutes", WEEK, radius=2)] == [
+        u["cat"], u["eve"], u["bob"]]
+    assert db.global_leaderboard_neighbors(u["dan"], "minutes", WEEK) == []
+
+
+def test_buckets_follow_writes(board):
+    db, u = board
+    assert _mismatches(db) == []
+    with db.get_connection() as cur:
+        cur.execute("SELECT workout_id, workout_date FROM workouts WHERE user_id = %s ORDER BY workout_date;",
+                    (u["fay"],))
+        (first, first_date), (second, _), _ = cur.fetchall()
+        cur.execute("UPDATE workouts SET duration_minutes = 90 WHERE workout_id = %s;", (second,))
+        cur.execute("UPDATE workouts SET workout_date = '2024-05-14' WHERE workout_id = %s;", (first,))
+    assert _mismatches(db) == []
+    # fay: 2 workouts, 115 minutes this week; 1 workout, 25 minutes the next
+    assert db.global_rank(u["fay"], "minutes", WEEK)["rank"] == 1
+    assert db.global_rank(u["fay"], "workouts", WEEK) == {
+        "value": 2, "rank": 1, "ranked_users": 5, "percentile": 100.0}
+    assert db.global_rank(u["fay"], "minutes", date(2024, 5, 13))["ranked_users"] == 1
+
+    (eve_workout, eve_date, *_), = db.list_workouts(u["eve"])
+    db.delete_workout(eve_workout, eve_date, u["eve"])
+    assert _mismatches(db) == []
+    assert db.global_rank(u["eve"], "minutes", WEEK)["rank"] == 5
+    assert db.global_rank(u["bob"], "minutes", WEEK) == {
+        "value": 85, "rank": 3, "ranked_users": 4, "percentile": 50.0}
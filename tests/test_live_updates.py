@@ -0,0 +1,121 @@
+# tests/test_live_updates.py
+"""
+Live leaderboard updates: the weekly_activity NOTIFY triggers (migrations/0012),
+the listener thread and the subscriptions it fans events out to.
+"""
+import gc
+import time
+from datetime import date
+
+import pytest
+
+WEEK = date(2024, 5, 6)
+
+
+@pytest.fixture
+def live(sample_data):
+    import backend_fitness as db
+
+    yield db
+    db._live_shutdown()
+
+
+def _next_poll(sub, timeout=5.0):
+    """The first non-empty poll() result (a list of events, or None for a resync)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        events = sub.poll()
+        if events != []:
+            return events
+        assert time.monotonic() < deadline, "no event arrived"
+        time.sleep(0.02)
+
+
+def _drain(sub, until):
+    """Poll until the event `until` arrives (skipping a resync left over from the fixture's TRUNCATE)."""
+    events = []
+    while until not in events:
+        events += _next_poll(sub) or []
+    return events
+
+
+def test_events_for_watched_users_and_week(live, sample_data):
+    db = live
+    users = sample_data["users"]
+    sub = db.subscribe_activity([users["ann"], users["bob"]], week_start=WEEK)
+    assert db.live_updates_stats()["listening"]
+
+    other_week = db.log_workout(users["bob"], date(2024, 5, 20), 10)   # watched user, other week
+    db.log_workout(users["cat"], date(2024, 5, 9), 10)                  # not watched
+    wid = db.log_workout(users["bob"], date(2024, 5, 10), 15)
+    assert _drain(sub, (users["bob"], WEEK, 3, 100)) == [(users["bob"], WEEK, 3, 100)]
+    assert not sub.has_pending()
+
+    db.delete_workout(other_week, date(2024, 5, 20), users["bob"])
+    db.delete_workout(wid, date(2024, 5, 10), users["bob"])
+    assert _next_poll(sub) == [(users["bob"], WEEK, 2, 85)]
+    db.delete_workout(sample_data["workouts"][2], date(2024, 4, 29), users["ann"])  # ann's only workout that week
+    db.delete_workout(sample_data["workouts"][1], date(2024, 5, 8), users["ann"])
+    assert _next_poll(sub) == [(users["ann"], WEEK, 1, 30)]
+
+    # every week once the filter is lifted; a deleted weekly row reads as zeros
+    sub.watch([users["ann"]])
+    db.delete_workout(sample_data["workouts"][0], date(2024, 5, 6), users["ann"])
+    assert _next_poll(sub) == [(users["ann"], WEEK, 0, 0)]
+
+
+def test_bulk_change_resyncs(live, sample_data):
+    db = live
+    dan = sample_data["users"]["dan"]
+    sub = db.subscribe_activity([dan])
+    resyncs = db.live_updates_stats()["resyncs"]
+    with db.get_connection() as cur:  # 1001 weekly rows in one statement
+        cur.execute("INSERT INTO workouts (user_id, workout_date, duration_minutes) "
+                    "SELECT %s, DATE '2001-01-01' + 7 * i, 30 FROM generate_series(0, 1000) i;", (dan,))
+    while db.live_updates_stats()["resyncs"] == resyncs:
+        _next_poll(sub)
+    assert sub.poll() is None
+    assert sub.poll() == []
+
+
+def test_dispatch(live, sample_data):
+    db = live
+    bob = sample_data["users"]["bob"]
+    sub = db.subscribe_activity([bob])
+    sub.poll()
+
+    with pytest.raises(ValueError):
+        db._live_dispatch("not json")
+    with pytest.raises(KeyError):
+        db._live_dispatch('{"user_id": %d, "week_start": "2024-05-06", "workouts": 1}' % bob)
+    with pytest.raises(ValueError):
+        db._live_dispatch('{"user_id": %d, "week_start": "May 6", "workouts": 1, "minutes": 5}' % bob)
+    assert sub.poll() == []
+
+    db._live_dispatch('{"user_id": %d, "week_start": "2024-05-06", "workouts": 1, "minutes": 5}' % bob)
+    db._live_dispatch('{"user_id": %d, "week_start": "2024-05-06", "workouts": 2, "minutes": 9}' % bob)
+    assert sub.poll() == [(bob, WEEK, 2, 9)]  # latest totals only
+    db._live_dispatch('{"user_id": %d, "week_start": "2024-05-06", "workouts": 2, "minutes": 9}' % bob)
+    db._live_dispatch('{"resync": true}')
+    assert sub.has_pending() and sub.poll() is None
+
+
+def test_unsubscribe_and_dropped_subscriptions(live, sample_data):
+    db = live
+    ann, bob = sample_data["users"]["ann"], sample_data["users"]["bob"]
+    kept = db.subscribe_activity([ann])
+    closed = db.subscribe_activity([ann, bob])
+    dropped = db.subscribe_activity([bob])
+    closed.close()
+    del dropped
+    gc.collect()
+    assert not db._live_watchers.get(bob)
+    assert db.live_updates_stats()["watched_users"] == 1
+
+    event = '{"user_id": %d, "week_start": "2024-05-06", "workouts": 1, "minutes": 5}'
+    delivered = db.live_updates_stats()["delivered"]
+    db._live_dispatch(event % ann)
+    db._live_dispatch(event % bob)
+    assert kept.poll() == [(ann, WEEK, 1, 5)] and closed.poll() == []
+    assert db.live_updates_stats()["delivered"] == delivered + 1
+    assert bob not in db._live_watchers
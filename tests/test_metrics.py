@@ -0,0 +1,131 @@
+# tests/test_metrics.py
+"""metrics_fitness: histograms, the slow-query log, query scopes and budgets, Prometheus output."""
+import logging
+import time
+from datetime import date
+
+import pytest
+
+import metrics_fitness as metrics
+
+
+@pytest.fixture(autouse=True)
+def fresh_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _call(name, queries=(), took_ms=0.0, result=None, error=False):
+    """One instrumented call of `name` issuing `queries` [(sql, params, ms)], as if it took `took_ms`."""
+    call, token = metrics.start_call(name)
+    for sql, params, ms in queries:
+        metrics.record_query(sql, params, ms / 1000, 1)
+    metrics.finish_call(call, token, time.perf_counter() - took_ms / 1000, result, error=error)
+
+
+def test_histogram_quantiles():
+    h = metrics.Histogram()
+    assert h.quantile(0.5) == 0.0
+    for value in (0.3, 1, 3, 3, 30, 10000):
+        h.observe(value)
+    # bucket upper bounds are inclusive, like Prometheus' le
+    assert h.snapshot()["counts"] == [1, 1, 0, 2, 0, 0, 1, 0, 0, 0, 0, 0, 0, 1]
+    assert (h.count, h.total) == (6, 10037.3)
+    assert [h.quantile(q) for q in (0.0, 0.3, 0.5, 0.8, 0.99)] == [0.5, 1, 5, 50, float("inf")]
+
+
+@pytest.mark.parametrize("params, shape", [
+    (None, "()"),
+    ((), "()"),
+    ((1, "ann", None, 2.5), "(int, str, NoneType, float)"),
+    ([[1, 2, 3], ("a",)], "(list[3], tuple[1])"),
+    ({"user_id": 7, "query": "ann"}, "{user_id: int, query: str}"),
+])
+def test_params_shape(params, shape):
+    assert metrics.params_shape(params) == shape
+
+
+def test_slow_query_log(monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 50)
+    with caplog.at_level(logging.WARNING, logger="fitness.slow_queries"):
+        _call("list_goals", [("SELECT 1;", (1,), 5),
+                             ("SELECT *\n    FROM  goals\n WHERE email = %s;", ("secret@example.invalid",), 80)])
+        _call("other", [(b"SELECT 2;", None, 50)])
+    slow = metrics.slow_queries()
+    assert [(q["function"], q["ms"], q["rows"], q["sql"], q["params"]) for q in slow] == [
+        ("list_goals", 80.0, 1, "SELECT * FROM goals WHERE email = %s;", "(str)"),
+        ("other", 50.0, 1, "SELECT 2;", "()"),
+    ]
+    assert len(caplog.records) == 2 and "secret" not in caplog.text
+    assert metrics.function_stats()["list_goals"]["queries"] == 2
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", False)
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+    assert metrics.start_call("f") == (None, None)
+    _call("f", [("SELECT 1;", None, 1)])
+    assert metrics.function_stats() == {} and metrics.slow_queries() == []
+
+
+def test_scope_budget(caplog):
+    scope = metrics.start_scope("Friends", keep_statements=True)
+    assert metrics.current_scope() is scope
+    _call("list_friends", [("SELECT 1;", (1,), 1), ("SELECT 2;", None, 1)])
+    _call("list_goals", [("SELECT 3;", (3,), 1)])
+    assert (scope.queries, scope.calls) == (3, {"list_friends": 1, "list_goals": 1})
+    assert scope.statements == [("SELECT 1;", (1,)), ("SELECT 2;", None), ("SELECT 3;", (3,))]
+    with caplog.at_level(logging.WARNING, logger="fitness.query_budget"):
+        assert metrics.finish_scope(scope, budget=2) is False
+    assert "issued 3 queries (budget 2)" in caplog.text
+    assert metrics.current_scope() is None
+
+    scope = metrics.start_scope("Friends")
+    _call("list_friends", [("SELECT 1;", (1,), 1)])
+    assert scope.statements is None
+    assert metrics.finish_scope(scope, budget=2) is True
+    assert metrics.finish_scope(metrics.start_scope("Goals")) is True  # no budget
+    assert metrics.rerun_stats() == {
+        "Friends": {"reruns": 2, "over_budget": 1, "max_queries": 3, "mean_queries": 2.0},
+        "Goals": {"reruns": 1, "over_budget": 0, "max_queries": 0, "mean_queries": 0.0},
+    }
+
+
+def test_render_prometheus():
+    _call("list_goals", [("SELECT 1;", None, 1)], took_ms=3, result=[1, 2, 3])
+    _call("list_goals", [("SELECT 1;", None, 1)], took_ms=3000, result=([1, 2], (1, 2)))
+    _call("log_workout", took_ms=3, error=True)
+    scope = metrics.start_scope("Friends")
+    _call("list_friends", [("SELECT 1;", None, 1)] * 2)
+    metrics.finish_scope(scope, budget=1)
+
+    lines = metrics.render_prometheus().splitlines()
+    bucket = 'fitness_backend_call_duration_ms_bucket{function="list_goals",le="%s"} %d'
+    for line in (bucket % ("2", 0), bucket % ("5", 1), bucket % ("2500", 1), bucket % ("5000", 2),
+                 bucket % ("+Inf", 2),
+                 'fitness_backend_call_duration_ms_count{function="list_goals"} 2',
+                 'fitness_backend_calls_total{function="list_goals"} 2',
+                 'fitness_backend_rows_total{function="list_goals"} 5',
+                 'fitness_backend_queries_total{function="list_goals"} 2',
+                 'fitness_backend_errors_total{function="log_workout"} 1',
+                 'fitness_backend_queries_total{function="list_friends"} 2',
+                 'fitness_rerun_over_budget_total{page="Friends"} 1'):
+        assert line in lines
+    assert lines.count("# TYPE fitness_backend_calls_total counter") == 1
+
+
+def test_iterators_record_each_batch(clean_db):
+    db = clean_db
+    for i in range(5):
+        uid = db.create_user(f"User {i}", f"user{i}@example.invalid", None)
+        db.log_workout(uid, date(2024, 5, 1 + i), 30)
+    metrics.reset()
+    assert len(list(db.iter_users(batch_size=2))) == 5
+    stats = metrics.function_stats()["iter_users"]
+    assert (stats["calls"], stats["rows"], stats["queries"], stats["errors"]) == (3, 5, 3, 0)
+    assert len(list(db.iter_workouts(uid, batch_size=1))) == 1  # a full last batch: one more fetch finds the end
+    assert len(list(db.iter_workouts(batch_size=4))) == 5
+    stats = metrics.function_stats()["iter_workouts"]
+    assert (stats["calls"], stats["rows"], stats["queries"]) == (4, 6, 4)
@@ -0,0 +1,68 @@
+# tests/test_pagination.py
+"""Keyset pages (list_workouts_page, list_users_page) and the server-side cursor iterators."""
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def history(clean_db):
+    """Two users; ann has seven workouts, several on the same day, logged out of date order."""
+    db = clean_db
+    ann = db.create_user("Ann", "ann@example.invalid", None)
+    bob = db.create_user("Bob", "bob@example.invalid", None)
+    for day, minutes in [(8, 30), (6, 20), (8, 45), (10, 50), (6, 25), (8, 60), (1, 15)]:
+        db.log_workout(ann, date(2024, 5, day), minutes)
+    db.log_workout(bob, date(2024, 5, 7), 40)
+    return db, ann, bob
+
+
+def _all_pages(page, limit):
+    rows, after, pages = [], None, 0
+    while True:
+        chunk, after = page(after, limit)
+        rows.extend(chunk)
+        pages += 1
+        if after is None:
+            return rows, pages
+        assert len(chunk) == limit
+
+
+@pytest.mark.parametrize("limit, pages", [(1, 7), (2, 4), (3, 3), (7, 1), (50, 1)])
+def test_workout_pages_match_list_workouts(history, limit, pages):
+    db, ann, _ = history
+    expected = db.list_workouts(ann)
+    # newest first; same-day workouts newest id first
+    assert [(w[1].day, w[2]) for w in expected] == [(10, 50), (8, 60), (8, 45), (8, 30), (6, 25), (6, 20), (1, 15)]
+    assert _all_pages(lambda after, n: db.list_workouts_page(ann, after, n), limit) == (expected, pages)
+
+
+def test_last_page(history):
+    db, ann, bob = history
+    rows, after = db.list_workouts_page(bob)
+    assert len(rows) == 1 and after is None
+    rows, after = db.list_workouts_page(ann, limit=6)
+    assert after == (rows[-1][1], rows[-1][0])
+    assert db.list_workouts_page(ann, after, limit=6)[1] is None
+    assert db.list_workouts_page(ann, (date(2024, 5, 1), 0)) == ([], None)
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 10])
+def test_user_pages_match_list_users(clean_db, limit):
+    db = clean_db
+    for i, name in enumerate(("Sam", "Ann", "Sam", "Zoe", "Sam", "Ann")):
+        db.create_user(name, f"{name.lower()}{i}@example.invalid", None)
+    expected = db.list_users()
+    assert [u[1] for u in expected] == ["Ann", "Ann", "Sam", "Sam", "Sam", "Zoe"]
+    rows, _ = _all_pages(lambda after, n: db.list_users_page(after, n), limit)
+    assert rows == expected
+
+
+def test_iterators_return_every_row_once(history):
+    db, ann, bob = history
+    workouts = list(db.iter_workouts(ann, batch_size=2))
+    assert [(w[2], w[0]) for w in workouts] == sorted((w[1], w[0]) for w in db.list_workouts(ann))
+    assert {w[1] for w in workouts} == {ann}
+    everyone = list(db.iter_workouts(batch_size=3))
+    assert [w[0] for w in everyone] == sorted(w[0] for w in everyone) and len(everyone) == 8
+    assert list(db.iter_users(batch_size=1)) == db.list_users()
@@ -0,0 +1,145 @@
+# tests/test_partitions.py
+"""
+Partition maintenance in manage_fitness. The test database is migrated with
+partitions from the current month on, so the 2024 sample data sits in the
+default partitions.
+"""
+from datetime import date
+
+import psycopg2
+import pytest
+
+import manage_fitness as manage
+
+
+def _snapshot(db):
+    with db.get_connection() as cur:
+        cur.execute("SELECT * FROM weekly_activity ORDER BY user_id, week_start;")
+        weekly = cur.fetchall()
+        cur.execute("SELECT * FROM user_stats ORDER BY user_id;")
+        stats = cur.fetchall()
+        cur.execute("SELECT * FROM exercise_records ORDER BY user_id, exercise_type_id;")
+        records = cur.fetchall()
+        cur.execute("SELECT tableoid::regclass::text, * FROM workouts ORDER BY workout_id;")
+        workouts = cur.fetchall()
+        cur.execute("SELECT tableoid::regclass::text, * FROM exercises ORDER BY exercise_id;")
+        exercises = cur.fetchall()
+    return weekly, stats, records, workouts, exercises
+
+
+def test_split_default_partition(sample_data):
+    db = manage.db
+    before = _snapshot(db)
+    assert {row[0] for row in before[3] + before[4]} == {"workouts_default", "exercises_default"}
+
+    assert manage.split_default_partition() == [("p2024_04", 1, 0), ("p2024_05", 5, 4)]
+    after = _snapshot(db)
+    assert after[:3] == before[:3]  # derived tables untouched
+    assert [row[1:] for row in after[3]] == [row[1:] for row in before[3]]
+    assert [row[1:] for row in after[4]] == [row[1:] for row in before[4]]
+    assert {row[0] for row in after[3]} == {"workouts_p2024_04", "workouts_p2024_05"}
+    assert {row[0] for row in after[4]} == {"exercises_p2024_05"}
+    assert {name for name, *_ in manage.list_partitions()} >= {
+        "workouts_default", "exercises_default", "workouts_p2024_04", "exercises_p2024_05"}
+    assert manage.check_user_stats() == []
+    assert manage.split_default_partition() == []
+
+    # the reattached partitions keep their keys and triggers
+    ann, wid = sample_data["users"]["ann"], sample_data["workouts"][0]
+    with pytest.raises(psycopg2.errors.ForeignKeyViolation):
+        with db.get_connection() as cur:
+            cur.execute("INSERT INTO exercises (workout_id, workout_date, user_id, exercise_type_id) "
+                        "VALUES (%s, %s, %s, 1);", (wid, date(2024, 5, 7), ann))
+    db.delete_workout(wid, date(2024, 5, 6), ann)
+    assert db.list_exercises(wid, date(2024, 5, 6)) == []
+    assert manage.check_user_stats() == []
+    assert _snapshot(db)[1] != after[1]
+
+
+def test_archive_partitions(sample_data):
+    db = manage.db
+    manage.split_default_partition()
+    ann = sample_data["users"]["ann"]
+    assert manage.archive_partitions(date(2024, 5, 1)) == [("p2024_04", 1, 0)]
+    assert [w[1] for w in db.list_workouts(ann)] == [date(2024, 5, 8), date(2024, 5, 6)]
+    assert manage.check_user_stats() == []
+    with db.get_connection() as cur:
+        cur.execute("SELECT COUNT(*) FROM archive.workouts_p2024_04;")
+        assert cur.fetchone()[0] == 1
+        cur.execute("SELECT COUNT(*) FROM weekly_activity WHERE week_start = '2024-04-29';")
+        assert cur.fetchone()[0] == 0
+
+
+def _old_rows(cur):
+    cur.execute("SELECT workout_id, user_id, workout_date, duration_minutes, change_txid FROM workouts ORDER BY 1;")
+    workouts = cur.fetchall()
+    cur.execute(
+        """SELECT e.exercise_id, e.workout_id, w.workout_date, e.exercise_name, e.reps, e.sets, e.weight_lifted,
+                  e.change_txid
+           FROM exercises e JOIN workouts w ON w.workout_id = e.workout_id ORDER BY 1;"""
+    )
+    return workouts, cur.fetchall()
+
+
+def test_partition_workouts_online(scratch_schema):
+    db = scratch_schema
+    migrate = manage.migrate_fitness
+    with db.get_connection() as cur:
+        cur.execute("TRUNCATE users, exercise_catalog RESTART IDENTITY CASCADE;")
+    migrate.rollback(migrate.current_version() - 8)
+    with db.get_connection() as cur:
+        cur.execute("INSERT INTO users (name, email) SELECT 'User ' || i, 'user' || i || '@example.invalid' "
+                    "FROM generate_series(1, 3) i;")
+        cur.execute("INSERT INTO workouts (user_id, workout_date, duration_minutes) "
+                    "SELECT 1 + i % 3, DATE '2024-01-01' + i * 3, 20 + i FROM generate_series(1, 30) i;")
+        cur.execute("INSERT INTO exercises (workout_id, exercise_name, reps, sets, weight_lifted) "
+                    "SELECT w.workout_id, 'Lift ' || n, n * 5, 3, 40 + n FROM workouts w, generate_series(1, 2) n;")
+    with pytest.raises(psycopg2.Error, match="partition-workouts"):
+        migrate.apply()
+
+    expected = []
+
+    def writes(table, copied, last_id):
+        """Writers carry on while the copy runs; every write lands in the new tables."""
+        with db.get_connection() as cur:
+            if table == "workouts" and last_id == 7:
+                cur.execute("INSERT INTO workouts (user_id, workout_date, duration_minutes) "
+                            "VALUES (1, '2024-02-10', 33) RETURNING workout_id;")
+                cur.execute("INSERT INTO exercises (workout_id, exercise_name, reps) VALUES (%s, 'New', 1);",
+                            (cur.fetchone()[0],))
+                cur.execute("UPDATE workouts SET duration_minutes = 99 WHERE workout_id IN (3, 20);")
+                cur.execute("UPDATE workouts SET workout_date = '2024-03-30' WHERE workout_id IN (2, 25);")
+                cur.execute("DELETE FROM workouts WHERE workout_id = 4;")
+                cur.execute("INSERT INTO exercises (workout_id, exercise_name, reps) VALUES (28, 'Early', 2);")
+                cur.execute("DELETE FROM exercises WHERE exercise_id = 1;")
+            elif table == "exercises" and last_id == 7:
+                cur.execute("UPDATE exercises SET reps = 77 WHERE exercise_id IN (3, 50);")
+                cur.execute("DELETE FROM exercises WHERE exercise_id IN (5, 52);")
+                cur.execute("INSERT INTO exercises (workout_id, exercise_name, reps) VALUES (2, 'Moved', 3);")
+                # workout 3 keeps exercise 6 (copied) and moves to another month with it
+                cur.execute("UPDATE workouts SET workout_date = '2024-02-20' WHERE workout_id = 3;")
+            expected[:] = [_old_rows(cur)]
+
+    # workout 28 was copied along with its new exercise; workout 4 and exercise 1 were gone before their batch
+    assert manage.partition_workouts(batch_rows=7, progress=writes) == (29, 57)
+    assert manage.partition_workouts() is None
+    with db.get_connection() as cur:
+        cur.execute("SELECT MAX(version) FROM schema_version;")
+        assert cur.fetchone()[0] == 9
+        assert _old_rows(cur) == expected[0]
+        cur.execute("SELECT COUNT(*) FROM workouts_default;")
+        assert cur.fetchone()[0] == 0
+        cur.execute("SELECT proname FROM pg_proc WHERE proname LIKE 'workouts\\_part\\_%';")
+        assert cur.fetchall() == []
+        cur.execute(
+            """SELECT user_id, date_trunc('week', workout_date)::date, COUNT(*), SUM(duration_minutes)
+               FROM workouts GROUP BY 1, 2
+               EXCEPT SELECT user_id, week_start, workout_count, total_minutes FROM weekly_activity;"""
+        )
+        assert cur.fetchall() == []
+    assert manage.check_user_stats() == []
+
+    migrate.apply()
+    workout_id, _, workout_date, *_ = expected[0][0][1]
+    assert [r[0] for r in db.list_exercises(workout_id, workout_date)] == [
+        r[0] for r in expected[0][1] if r[1] == workout_id]
@@ -0,0 +1,135 @@
+# tests/test_pool.py
+"""ConnectionPool: sizing, checkout timeouts and waits, liveness pings, idle recycling."""
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def make_pool(database):
+    """ConnectionPool(database._connect, **options), closed after the test."""
+    pools = []
+
+    def make(**options):
+        pools.append(database.ConnectionPool(database._connect, **options))
+        return pools[-1]
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def _backend_pid(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_backend_pid();")
+        pid = cur.fetchone()[0]
+    conn.rollback()
+    return pid
+
+
+@pytest.mark.parametrize("min_size, max_size", [(-1, 2), (0, 0), (3, 2)])
+def test_rejects_bad_sizes(database, min_size, max_size):
+    with pytest.raises(ValueError, match="Pool sizes"):
+        database.ConnectionPool(database._connect, min_size=min_size, max_size=max_size)
+
+
+def test_sizes(make_pool):
+    pool = make_pool(min_size=2, max_size=3, timeout=0.1)
+    assert pool.stats()["size"] == pool.stats()["idle"] == 2
+    conns = [pool.getconn() for _ in range(3)]
+    assert len({id(c) for c in conns}) == 3
+    assert pool.stats()["in_use"] == 3 and pool.stats()["connections_opened"] == 3
+    for conn in conns:
+        pool.putconn(conn)
+    assert pool.stats()["idle"] == 3
+    # the most recently returned connection goes out first
+    assert pool.getconn() is conns[-1]
+
+
+def test_checkout_times_out_when_exhausted(database, make_pool):
+    pool = make_pool(min_size=0, max_size=1, timeout=0.1)
+    conn = pool.getconn()
+    started = time.monotonic()
+    with pytest.raises(database.PoolTimeout):
+        pool.getconn()
+    assert time.monotonic() - started >= 0.1
+    assert pool.stats()["timeouts"] == 1
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+
+
+def test_waiting_checkout_gets_the_returned_connection(make_pool):
+    pool = make_pool(min_size=0, max_size=1, timeout=5)
+    conn = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    time.sleep(0.2)
+    pool.putconn(conn)
+    waiter.join(5)
+    assert got == [conn]
+    stats = pool.stats()
+    assert (stats["checkouts"], stats["waits"], stats["timeouts"]) == (2, 1, 0)
+    assert 0.15 <= stats["wait_time"] < 5
+
+
+def test_dead_connection_is_replaced(database, make_pool):
+    pool = make_pool(min_size=1, max_size=1, ping_after=0)
+    conn = pool.getconn()
+    pid = _backend_pid(conn)
+    pool.putconn(conn)
+    with database.get_connection() as cur:
+        cur.execute("SELECT pg_terminate_backend(%s);", (pid,))
+        assert cur.fetchone()[0]
+    time.sleep(0.1)
+
+    replacement = pool.getconn()
+    assert _backend_pid(replacement) != pid
+    stats = pool.stats()
+    assert (stats["failed_pings"], stats["connections_opened"], stats["connections_closed"]) == (1, 2, 1)
+    assert stats["size"] == 1
+
+
+def test_broken_connection_is_discarded(make_pool):
+    pool = make_pool(min_size=0, max_size=2)
+    conn = pool.getconn()
+    conn.close()
+    pool.putconn(conn)
+    assert (pool.stats()["size"], pool.stats()["connections_closed"]) == (0, 1)
+
+
+def test_idle_connections_are_recycled(make_pool):
+    pool = make_pool(min_size=1, max_size=3, max_idle=0.05)
+    conns = [pool.getconn() for _ in range(3)]
+    for conn in conns:
+        pool.putconn(conn)
+    time.sleep(0.1)
+    # the checkout closes the two connections above min_size and takes the last one
+    conn = pool.getconn()
+    stats = pool.stats()
+    assert (stats["size"], stats["idle"], stats["connections_closed"]) == (1, 0, 2)
+    assert conn in conns and not conn.closed
+
+
+def test_closed_pool(database, make_pool):
+    pool = make_pool(min_size=2, max_size=2)
+    pool.close()
+    assert pool.stats()["size"] == 0
+    with pytest.raises(database.PoolTimeout, match="closed"):
+        pool.getconn()
+
+
+def test_get_connection_uses_the_pool(database, monkeypatch):
+    for name in ("POOL_ENABLED", "POOL_MIN_SIZE", "POOL_MAX_SIZE"):
+        monkeypatch.setattr(database, name, getattr(database, name))
+    database.configure_pool(True, min_size=1, max_size=2)
+    try:
+        for _ in range(3):
+            with database.get_connection() as cur:
+                cur.execute("SELECT 1;")
+        stats = database.pool_stats()
+        assert (stats["checkouts"], stats["connections_opened"], stats["in_use"]) == (3, 1, 0)
+    finally:
+        database.configure_pool(False)
+    assert database.pool_stats() is None
@@ -0,0 +1,78 @@
+# tests/test_prepared.py
+import psycopg2
+import pytest
+
+import backend_fitness as db
+
+
+def test_to_prepared():
+    assert db._to_prepared("SELECT * FROM t WHERE a = %s AND b = %s;") == (
+        "SELECT * FROM t WHERE a = $1 AND b = $2", None)
+    assert db._to_prepared("SELECT %(b)s, %(a)s, %(b)s;\n") == ("SELECT $1, $2, $1", ["b", "a"])
+    assert db._to_prepared("SELECT name FROM t WHERE name LIKE 'x%%' AND id = %s") == (
+        "SELECT name FROM t WHERE name LIKE 'x%' AND id = $1", None)
+    assert db._to_prepared("SELECT 1;") == ("SELECT 1", None)
+
+
+@pytest.fixture
+def pooled(database):
+    database.configure_pool(True, min_size=1, max_size=1)
+    yield database
+    database.configure_pool(False)
+
+
+def _run(sql, vars=None):
+    with db.get_connection() as cur:
+        cur.execute(sql, vars)
+        return cur.fetchone(), cur.connection
+
+
+def _server_statements():
+    with db.get_connection() as cur:
+        cur.execute("SELECT name FROM pg_prepared_statements;")
+        return {name for (name,) in cur.fetchall()}
+
+
+def test_unpreparable_query_runs_plain(pooled):
+    sql = "SELECT %s IS NULL AS test_unpreparable;"
+    db.register_statements(sql)
+    name = db._statements[sql][0]
+    assert _run(sql, (None,))[0] == (True,)
+    row, conn = _run(sql, (1,))
+    assert row == (False,)
+    assert sql in conn.unpreparable and name not in conn.prepared
+    assert sql in db._statements  # another connection tries again
+    assert name not in _server_statements()
+
+
+def test_other_prepare_errors_are_raised(pooled):
+    sql = "SELECT * FROM test_prepared_missing WHERE id = %s;"
+    db.register_statements(sql)
+    for _ in range(2):
+        with pytest.raises(psycopg2.errors.UndefinedTable):
+            _run(sql, (1,))
+    with db.get_connection() as cur:
+        assert sql not in cur.connection.unpreparable
+        cur.execute("CREATE TABLE test_prepared_missing (id int);")
+    try:
+        assert _run(sql, (1,))[0] is None
+    finally:
+        with db.get_connection() as cur:
+            cur.execute("DROP TABLE test_prepared_missing;")
+
+
+def test_statement_dropped_or_prepared_behind_our_back(pooled):
+    sql = "SELECT %s::int + 1 AS test_reprepare;"
+    db.register_statements(sql)
+    name = db._statements[sql][0]
+    row, conn = _run(sql, (1,))
+    assert row == (2,) and name in conn.prepared
+
+    with db.get_connection() as cur:
+        cur.execute("DEALLOCATE ALL;")
+    assert _run(sql, (2,))[0] == (3,)
+    assert name in _server_statements()
+
+    conn.prepared.discard(name)  # the server still has it
+    assert _run(sql, (3,))[0] == (4,)
+    assert name in conn.prepared and name in _server_statements()
@@ -0,0 +1,82 @@
+# tests/test_query_plans.py
+"""
+The plans PostgreSQL picks for the backend's fixed queries, on the same seeded
+data `python migrate_fitness.py check-plans` uses (rolled back afterwards).
+"""
+import pytest
+
+import migrate_fitness as m
+
+
+@pytest.fixture(scope="module")
+def planned(database):
+    """(cursor, empty partitions, [(name, plan, params), ...]) inside the seeding transaction."""
+    with database.get_connection() as cur:
+        try:
+            uid = m._seed_for_plans(cur, users=5000, workouts_per_user=20, exercises_per_workout=2,
+                                    friends_per_user=5)
+            empty = m._empty_partitions(cur)
+            plans = [(name, m._explain(cur, sql, params), params) for name, sql, params in m._plan_targets(cur, uid)]
+            yield cur, empty, plans
+        finally:
+            cur.connection.rollback()
+
+
+def test_no_seq_scans(planned):
+    _, empty, plans = planned
+    scans = {name: m._seq_scans(plan, empty) for name, plan, _ in plans if name not in m.PLAN_CHECK_FULL_SCANS}
+    assert {name: tables for name, tables in scans.items() if tables} == {}
+
+
+def test_full_scans_are_unfiltered(planned):
+    _, empty, plans = planned
+    for name, plan, _ in plans:
+        if name in m.PLAN_CHECK_FULL_SCANS:
+            assert m._seq_scans(plan, empty, filtered_only=True) == [], name
+
+
+def test_date_bounded_queries_prune_partitions(planned):
+    _, _, plans = planned
+    checked = 0
+    for name, plan, params in plans:
+        if name in m.PLAN_CHECK_PRUNING:
+            table, *positions = m.PLAN_CHECK_PRUNING[name]
+            first, last = (params[i] for i in positions)
+            partitions = m._partitions(plan, table)
+            assert 0 < len(partitions) <= m._months(first, last), (name, partitions)
+            checked += 1
+    assert checked == len(m.PLAN_CHECK_PRUNING)
+
+
+@pytest.mark.parametrize("name, indexes", [
+    ("search_users", {"idx_users_name_trgm", "idx_users_email_trgm"}),
+    ("search_users(prefix)", {"idx_users_name_prefix", "idx_users_email_prefix"}),
+])
+def test_search_uses_its_indexes(planned, name, indexes):
+    _, _, plans = planned
+    plan = next(plan for target, plan, _ in plans if target == name)
+    assert indexes <= _index_names(plan)
+
+
+def test_missing_index_is_reported(planned):
+    cur, empty, plans = planned
+    name, sql, params = next(t for t in m._plan_targets(cur, _user_with_goals(cur)) if t[0] == "list_goals")
+    cur.execute("SAVEPOINT drop_index;")
+    try:
+        cur.execute("DROP INDEX idx_goals_user_status_end;")
+        assert any("seq scan on goals" in p for p in m._plan_problems(name, m._explain(cur, sql, params), params,
+                                                                       empty))
+    finally:
+        cur.execute("ROLLBACK TO SAVEPOINT drop_index;")
+
+
+def _user_with_goals(cur):
+    cur.execute("SELECT user_id FROM goals LIMIT 1;")
+    return cur.fetchone()[0]
+
+
+def _index_names(node):
+    names = {node["Index Name"]} if "Index Name" in node else set()
+    for child in node.get("Plans", []):
+        names |= _index_names(child)
+    return names
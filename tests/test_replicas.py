@@ -0,0 +1,272 @@
+# tests/test_replicas.py
+"""
+Replica routing, failover and read-your-own-writes in backend_fitness, against
+fake servers. Only the write detection is checked on PostgreSQL.
+"""
+import io
+import time
+
+import psycopg2
+import pytest
+
+import backend_fitness as db
+
+
+def _lsn_text(lsn: int):
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+
+class FakeServer:
+    def __init__(self, name, lsn=0, lag=0.0):
+        self.name = name
+        self.lsn = lsn
+        self.lag = lag
+        self.refuse = False           # connect() fails
+        self.fail_reads = False       # "SELECT who" fails mid-read
+        self.fail_lsn = False         # PRIMARY_LSN_SQL fails
+        self.writes = 0
+        self.reads = 0                # "SELECT who" served
+        self.lsn_reads = 0            # PRIMARY_LSN_SQL served
+        self.open = 0
+
+    def connect(self):
+        if self.refuse:
+            raise psycopg2.OperationalError(f"{self.name} refused")
+        self.open += 1
+        return FakeConnection(self)
+
+
+class FakeConnection:
+    def __init__(self, server):
+        self.server = server
+        self.closed = 0
+        self.wrote = False
+
+    def cursor(self, cursor_factory=None):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def get_transaction_status(self):
+        return psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        if not self.closed:
+            self.server.open -= 1
+        self.closed = 1
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.server = connection.server
+        self.row = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute(self, sql, params=None):
+        server = self.server
+        if sql == db.REPLICA_STATUS_SQL:
+            self.row = (_lsn_text(server.lsn), server.lag)
+        elif sql == db.REPLICA_REPLAY_LSN_SQL:
+            self.row = (_lsn_text(server.lsn),)
+        elif sql == db.PRIMARY_LSN_SQL:
+            if server.fail_lsn:
+                raise psycopg2.OperationalError("server closed the connection unexpectedly")
+            server.lsn_reads += 1
+            self.row = (_lsn_text(server.lsn),)
+        elif sql == "SELECT who":
+            if server.fail_reads:
+                raise psycopg2.OperationalError(f"{server.name} went away")
+            server.reads += 1
+            self.row = (server.name,)
+        elif sql == "INSERT":
+            self.connection.wrote = True  # what _InstrumentedCursor does for a writing command tag
+            server.writes += 1
+            server.lsn += 100
+        else:
+            raise AssertionError(sql)
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    servers = {"primary": FakeServer("primary", lsn=1000), "r1": FakeServer("r1", lsn=1000),
+               "r2": FakeServer("r2", lsn=1000)}
+    monkeypatch.setattr(db, "POOL_ENABLED", False)
+    monkeypatch.setattr(db, "_connect", servers["primary"].connect)
+    monkeypatch.setattr(db.Replica, "connect", lambda self: servers[self.address].connect())
+    monkeypatch.setattr(db, "_last_write_lsn", None)
+    monkeypatch.setattr(db, "_write_lsn_unknown", False)
+    monkeypatch.setattr(db, "_write_failures", 0)
+    monkeypatch.setattr(db, "_write_recovered", (0, None))
+    monkeypatch.setattr(db, "_default_write_session", db.WriteSession())
+    monkeypatch.setattr(db, "_wb_write_session", db.WriteSession())
+    saved = (db.REPLICA_MAX_LAG_SECONDS, db.REPLICA_CHECK_INTERVAL_SECONDS, db.REPLICA_RETRY_AFTER_SECONDS)
+    db.configure_replicas(["r1", "r2"], max_lag_seconds=5, check_interval_seconds=0, retry_after_seconds=60)
+    db.clear_cache()
+    yield servers
+    db.bind_write_session(None)
+    db.clear_cache()
+    db.configure_replicas([], *saved)
+
+
+@db._replica_read
+def who():
+    with db.get_connection() as cur:
+        cur.execute("SELECT who")
+        return cur.fetchone()[0]
+
+
+@db._cached(lambda result: [("who",)])
+@db._replica_read
+def cached_who():
+    with db.get_connection() as cur:
+        cur.execute("SELECT who")
+        return cur.fetchone()[0]
+
+
+def write():
+    with db.get_connection() as cur:
+        cur.execute("INSERT")
+
+
+def _replica(address):
+    return next(r for r in db._current_replicas() if r.address == address)
+
+
+def test_reads_spread_over_replicas(servers):
+    assert sorted(who() for _ in range(4)) == ["r1", "r1", "r2", "r2"]
+    assert [(s["replica"], s["reads"], s["in_flight"]) for s in db.replica_status()] == [("r1", 2, 0), ("r2", 2, 0)]
+    assert all(s.open == 0 for s in servers.values())
+
+
+def test_busiest_replica_is_avoided(servers):
+    _replica("r1").in_flight = 3
+    assert {who() for _ in range(3)} == {"r2"}
+
+
+def test_refused_connection_fails_over(servers):
+    servers["r1"].refuse = True
+    assert {who() for _ in range(3)} == {"r2"}
+    status = {s["replica"]: s for s in db.replica_status()}
+    assert not status["r1"]["up"] and status["r1"]["failures"] == 1 and "refused" in status["r1"]["last_error"]
+
+
+def test_error_mid_read_retries_elsewhere(servers):
+    servers["r1"].fail_reads = True
+    servers["r2"].fail_reads = True
+    assert who() == "primary"
+    assert [s["up"] for s in db.replica_status()] == [False, False]
+    assert [s["in_flight"] for s in db.replica_status()] == [0, 0]
+    assert who() == "primary"
+
+
+def test_lagging_replica_is_skipped(servers):
+    servers["r2"].lag = 60.0
+    assert {who() for _ in range(3)} == {"r1"}
+
+
+def test_reads_wait_for_own_writes(servers):
+    write()
+    assert db._last_write_lsn == db._default_write_session.lsn == servers["primary"].lsn == 1100
+    assert who() == "primary"
+    servers["r2"].lsn = 1100
+    assert {who() for _ in range(3)} == {"r2"}
+    servers["r1"].lsn = 1200
+    assert {who() for _ in range(4)} == {"r1", "r2"}
+
+
+def test_other_connections_use_primary(servers):
+    with db.get_connection() as cur:
+        cur.execute("SELECT who")
+        assert cur.fetchone() == ("primary",)
+    # a transaction that wrote nothing doesn't ask for the WAL position
+    assert servers["primary"].lsn_reads == 0 and db._last_write_lsn is None
+    write()
+    assert servers["primary"].lsn_reads == 1
+
+
+def test_sessions_wait_only_for_their_own_writes(servers):
+    writer, reader = db.WriteSession(), db.WriteSession()
+    db.bind_write_session(writer)
+    write()
+    assert writer.lsn == 1100 and reader.lsn is None
+    assert who() == "primary"
+    db.bind_write_session(reader)
+    assert who() in {"r1", "r2"}
+    db.bind_write_session(None)
+    assert who() in {"r1", "r2"}  # the default session hasn't written either
+
+
+def test_read_behind_another_sessions_write_is_not_cached(servers):
+    db.bind_write_session(db.WriteSession())
+    write()
+    db.bind_write_session(db.WriteSession())
+    assert cached_who() in {"r1", "r2"}
+    assert cached_who() in {"r1", "r2"}
+    assert servers["r1"].reads + servers["r2"].reads == 2
+    servers["r1"].lsn = servers["r2"].lsn = 1100
+    cached_who()
+    cached_who()
+    assert servers["r1"].reads + servers["r2"].reads == 3
+
+
+def test_unknown_write_position_falls_back_to_primary(servers, monkeypatch):
+    servers["primary"].fail_lsn = True
+    write()  # committed: must not raise
+    assert servers["primary"].writes == 1 and db._write_lsn_unknown
+    monkeypatch.setattr(db, "REPLICA_CHECK_INTERVAL_SECONDS", 3600)
+    assert who() == "primary"
+
+    # the next status check reads the primary's position instead
+    servers["primary"].fail_lsn = False
+    monkeypatch.setattr(db, "REPLICA_CHECK_INTERVAL_SECONDS", 0)
+    assert who() == "primary"  # replicas are behind the primary's position
+    assert not db._write_lsn_unknown and db._last_write_lsn == 1100
+    servers["r1"].lsn = servers["r2"].lsn = 1100
+    assert who() in {"r1", "r2"}
+
+
+def test_next_write_clears_unknown_position(servers, monkeypatch):
+    monkeypatch.setattr(db, "REPLICA_CHECK_INTERVAL_SECONDS", 3600)
+    monkeypatch.setattr(db, "_replica_checked_at", time.monotonic())  # no status check during the test
+    servers["primary"].fail_lsn = True
+    write()
+    servers["primary"].fail_lsn = False
+    write()
+    assert db._default_write_session.lsn == 1200 and db._default_write_session.unknown_since is None
+    servers["r1"].lsn = 1200
+    assert who() == "r1"
+    # another session's write may be behind the lost position: nothing is cached until a status check
+    assert db._write_lsn_unknown
+    cached_who()
+    cached_who()
+    assert servers["r1"].reads == 3
+
+
+def test_write_detection(sample_data):
+    ann = sample_data["users"]["ann"]
+    with db.get_connection() as cur:
+        cur.execute(db.GET_USER_BY_ID_SQL, (ann,))
+        cur.execute("SET LOCAL statement_timeout = 0; SELECT 1;")
+        assert not cur.connection.wrote
+        cur.execute("UPDATE users SET weight = weight WHERE FALSE;")
+        assert cur.connection.wrote
+    with db.get_connection() as cur:
+        assert not cur.connection.wrote
+        cur.copy_expert("COPY (SELECT 1) TO STDOUT", io.StringIO())
+        assert not cur.connection.wrote
@@ -0,0 +1,56 @@
+# tests/test_search.py
+"""search_users: trigram ranking, the prefix-only path for short queries, LIKE metacharacters."""
+import pytest
+
+
+@pytest.fixture
+def people(clean_db):
+    db = clean_db
+    people = {}
+    for name, email in [("Anna Smith", "smith@example.invalid"), ("Zed Jones", "annabel@example.invalid"),
+                        ("Hannah Banana", "hb@example.invalid"), ("Joanna", "jo@example.invalid"),
+                        ("Bob", "bob@example.invalid"), ("100% Pure", "pure@example.invalid"),
+                        ("1000 Club", "club@example.invalid"), ("a_b", "ab@example.invalid"),
+                        ("axb", "axb@example.invalid"), ("back\\slash", "slash@example.invalid"),
+                        ("backxslash", "xslash@example.invalid")]:
+        people[name] = db.create_user(name, email, None)
+    return db, people
+
+
+def _names(db, query, limit=20):
+    return [row[1] for row in db.search_users(query, limit)]
+
+
+def test_ranking(people):
+    db, _ = people
+    assert db.search_users_sql("anna") is db.SEARCH_USERS_SQL
+    # name prefix, then email prefix, then substrings by similarity (the shorter name is closer)
+    assert _names(db, "Anna") == ["Anna Smith", "Zed Jones", "Joanna", "Hannah Banana"]
+    assert _names(db, "anna", limit=2) == ["Anna Smith", "Zed Jones"]
+    assert _names(db, "  ANNA ") == _names(db, "anna")
+    assert [row[1] for row in db.search_users("bob")] == ["Bob"]
+    assert db.search_users("") == [] and db.search_users("   ") == []
+
+
+def test_short_queries_match_prefixes_only(people):
+    db, _ = people
+    assert db.search_users_sql("an") is db.SEARCH_USERS_PREFIX_SQL
+    # Hannah Banana and Joanna contain "an" but do not start with it
+    assert _names(db, "an") == ["Anna Smith", "Zed Jones"]
+    *by_name, by_email = _names(db, "A")
+    assert set(by_name) == {"Anna Smith", "a_b", "axb"} and by_email == "Zed Jones"
+    assert len(_names(db, "a", limit=2)) == 2
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("100%", ["100% Pure"]),
+    ("%", []),  # short: prefix only, and no name starts with "%"
+    ("a_b", ["a_b"]),
+    ("a_", ["a_b"]),
+    ("k\\s", ["back\\slash"]),
+    ("_", []),
+    ("a\\", []),
+])
+def test_like_metacharacters_are_literal(people, query, expected):
+    db, _ = people
+    assert _names(db, query) == expected
@@ -0,0 +1,44 @@
+# tests/test_user_stats.py
+"""
+user_stats (migrations/0004, min/max recomputation in 0005) behind
+overall_insights, and manage_fitness.check_user_stats.
+"""
+from datetime import date
+
+import manage_fitness as manage
+
+
+def test_extremes_follow_deletes(sample_data):
+    db = manage.db
+    ann = sample_data["users"]["ann"]
+    first, longest, shortest = sample_data["workouts"][:3]
+    assert db.overall_insights(ann) == {"total_workouts": 3, "total_minutes": 95, "avg_duration": 31.67,
+                                        "min_duration": 20, "max_duration": 45, "total_exercises": 3}
+    db.delete_workout(longest, date(2024, 5, 8), ann)
+    insights = db.overall_insights(ann)
+    assert (insights["min_duration"], insights["max_duration"], insights["total_exercises"]) == (20, 30, 2)
+    db.delete_workout(shortest, date(2024, 4, 29), ann)
+    insights = db.overall_insights(ann)
+    assert (insights["total_workouts"], insights["min_duration"], insights["max_duration"]) == (1, 30, 30)
+
+    for exercise_id, *_ in db.list_exercises(first, date(2024, 5, 6)):
+        db.delete_exercise(exercise_id, first, date(2024, 5, 6))
+    assert db.overall_insights(ann)["total_exercises"] == 0
+    db.delete_workout(first, date(2024, 5, 6), ann)
+    assert db.overall_insights(ann) == {"total_workouts": 0, "total_minutes": 0, "avg_duration": 0.0,
+                                        "min_duration": 0, "max_duration": 0, "total_exercises": 0}
+    assert manage.check_user_stats() == []
+
+
+def test_check_and_repair(sample_data):
+    db = manage.db
+    bob = sample_data["users"]["bob"]
+    assert manage.check_user_stats() == []
+    with db.get_connection() as cur:
+        cur.execute("UPDATE user_stats SET max_duration = 999 WHERE user_id = %s;", (bob,))
+    mismatch = [(bob, [2, 85, 25, 999, 1], [2, 85, 25, 60, 1])]
+    assert manage.check_user_stats() == mismatch
+    assert manage.check_user_stats(sample_data["users"]["ann"]) == []
+    assert manage.check_user_stats(repair=True) == mismatch
+    assert manage.check_user_stats() == []
+    assert db.overall_insights(bob)["max_duration"] == 60
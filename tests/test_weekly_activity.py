@@ -0,0 +1,74 @@
+# tests/test_weekly_activity.py
+"""
+The weekly_activity rollup (migrations/0002) kept by triggers on workouts,
+against a from-scratch aggregate and manage_fitness.rebuild_weekly_activity.
+"""
+from datetime import date
+
+import manage_fitness as manage
+
+AGGREGATE_SQL = """
+    SELECT user_id, date_trunc('week', workout_date)::date, COUNT(*)::int, SUM(duration_minutes)::int
+    FROM workouts GROUP BY 1, 2 ORDER BY 1, 2;
+"""
+
+
+def _rollup(db):
+    with db.get_connection() as cur:
+        cur.execute("SELECT user_id, week_start, workout_count, total_minutes FROM weekly_activity ORDER BY 1, 2;")
+        return cur.fetchall()
+
+
+def _aggregate(db):
+    with db.get_connection() as cur:
+        cur.execute(AGGREGATE_SQL)
+        return cur.fetchall()
+
+
+def test_triggers_match_aggregate(sample_data):
+    db = manage.db
+    ann, bob = sample_data["users"]["ann"], sample_data["users"]["bob"]
+    first, second, earlier = sample_data["workouts"][:3]
+    assert _rollup(db) == _aggregate(db)
+    assert (ann, date(2024, 5, 6), 2, 75) in _rollup(db)
+
+    db.log_workout(ann, date(2024, 5, 7), 15)
+    db.log_workout_with_exercises(bob, date(2024, 5, 20), 50, [("Row", 10, 3, 40)])
+    assert (ann, date(2024, 5, 6), 3, 90) in _rollup(db)
+    assert (bob, date(2024, 5, 20), 1, 50) in _rollup(db)
+    assert _rollup(db) == _aggregate(db)
+
+    db.delete_workout(second, date(2024, 5, 8), ann)
+    assert (ann, date(2024, 5, 6), 2, 45) in _rollup(db)
+    assert _rollup(db) == _aggregate(db)
+
+    with db.get_connection() as cur:
+        # across weeks and months (so into another partition)
+        cur.execute("UPDATE workouts SET workout_date = %s WHERE workout_id = %s AND workout_date = %s;",
+                    (date(2024, 4, 30), first, date(2024, 5, 6)))
+        # the week's only workout moves out: its row goes
+        cur.execute("UPDATE workouts SET workout_date = %s, duration_minutes = 35 WHERE workout_id = %s;",
+                    (date(2024, 5, 14), earlier))
+        cur.execute("UPDATE workouts SET duration_minutes = duration_minutes + 1 WHERE user_id = %s;", (bob,))
+    rollup = _rollup(db)
+    assert rollup == _aggregate(db)
+    assert (ann, date(2024, 4, 29), 1, 30) in rollup and (ann, date(2024, 5, 13), 1, 35) in rollup
+    assert (ann, date(2024, 5, 6), 1, 15) in rollup
+    assert (bob, date(2024, 5, 6), 2, 87) in rollup
+
+    assert manage.rebuild_weekly_activity() == len(rollup)
+    assert _rollup(db) == rollup
+
+
+def test_rebuild_repairs_one_user(sample_data):
+    db = manage.db
+    ann, bob = sample_data["users"]["ann"], sample_data["users"]["bob"]
+    expected = _rollup(db)
+    with db.get_connection() as cur:
+        cur.execute("UPDATE weekly_activity SET total_minutes = 0;")
+        cur.execute("DELETE FROM weekly_activity WHERE user_id = %s AND week_start = %s;", (ann, date(2024, 4, 29)))
+    assert manage.rebuild_weekly_activity(ann) == 2
+    assert [r for r in _rollup(db) if r[0] == ann] == [r for r in expected if r[0] == ann]
+    assert all(r[3] == 0 for r in _rollup(db) if r[0] == bob)
+    manage.rebuild_weekly_activity()
+    assert _rollup(db) == expected == _aggregate(db)
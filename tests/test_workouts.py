@@ -0,0 +1,37 @@
+# tests/test_workouts.py
+"""log_workout_with_exercises: one statement for the workout and all of its exercises."""
+from datetime import date
+
+import metrics_fitness as metrics
+
+
+def _logged(db, *args):
+    scope = metrics.start_scope("test", keep_statements=True)
+    try:
+        result = db.log_workout_with_exercises(*args)
+    finally:
+        metrics.finish_scope(scope)
+    return result, scope.statements
+
+
+def test_single_statement_in_input_order(clean_db):
+    db = clean_db
+    uid = db.create_user("Ann", "ann@example.invalid", None)
+    exercises = [("Squat", 8, 3, 80), ("Bench Press", 5, 3, 60), ("Deadlift", 5, 1, 120), ("squat", 10, 2, 60)]
+    (workout_id, exercise_ids), statements = _logged(db, uid, date(2024, 5, 6), 30, iter(exercises))
+    assert [sql for sql, _ in statements] == [db.LOG_WORKOUT_WITH_EXERCISES_SQL]
+    assert len(exercise_ids) == 4
+    listed = db.list_exercises(workout_id, date(2024, 5, 6))
+    assert [(r[0], r[1], r[2], r[3], r[4]) for r in listed] == [
+        (exercise_id, name.title(), reps, sets, weight)
+        for exercise_id, (name, reps, sets, weight) in zip(exercise_ids, exercises)]
+    assert db.list_workouts(uid) == [(workout_id, date(2024, 5, 6), 30)]
+
+
+def test_without_exercises(clean_db):
+    db = clean_db
+    uid = db.create_user("Ann", "ann@example.invalid", None)
+    (workout_id, exercise_ids), statements = _logged(db, uid, date(2024, 5, 6), 30, [])
+    assert exercise_ids == [] and len(statements) == 1
+    assert db.list_exercises(workout_id, date(2024, 5, 6)) == []
+    assert db.overall_insights(uid)["total_workouts"] == 1
@@ -0,0 +1,99 @@
+# tests/test_write_behind.py
+import json
+import time
+from datetime import date
+
+import psycopg2
+import pytest
+
+
+@pytest.fixture
+def wb(sample_data, tmp_path, monkeypatch):
+    """backend_fitness with write-behind on; the flusher lingers until flush_writes() is called."""
+    import backend_fitness as db
+    monkeypatch.setattr(db, "WRITE_BEHIND_LINGER_SECONDS", 30)
+    db.configure_write_behind(True, journal_path=str(tmp_path / "writes.journal"), batch_size=1000)
+    yield db
+    db.configure_write_behind(False)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_rejects_bad_writes_before_queueing(wb, sample_data):
+    ann = sample_data["users"]["ann"]
+    wid = sample_data["workouts"][0]
+    wdate = date(2024, 5, 6)
+    with pytest.raises(ValueError, match="does not exist"):
+        wb.log_workout(999_999, date(2024, 5, 1), 30)
+    with pytest.raises(ValueError, match="duration_minutes"):
+        wb.log_workout(ann, date(2024, 5, 1), 2**31)
+    with pytest.raises(ValueError, match="reps"):
+        wb.log_workout_with_exercises(ann, date(2024, 5, 1), 30, [("Squat", -2**31 - 1, 3, 80)])
+    with pytest.raises(ValueError, match="weight_lifted"):
+        wb.add_exercise(wid, wdate, "Squat", 5, 3, float("nan"))
+    with pytest.raises(ValueError, match="exercise_name"):
+        wb.add_exercise(wid, wdate, "   ", 5, 3, 80)
+    with pytest.raises(ValueError, match="does not exist"):
+        wb.add_exercise(999_999, wdate, "Squat", 5, 3, 80)
+    with pytest.raises(ValueError, match="does not exist"):
+        wb.add_exercise(wid, date(2024, 6, 1), "Squat", 5, 3, 80)
+    assert wb.write_behind_stats()["pending"] == 0
+
+
+def test_exercise_for_queued_workout(wb, sample_data):
+    ann = sample_data["users"]["ann"]
+    wid = wb.log_workout(ann, date(2024, 5, 20), 30)
+    with pytest.raises(ValueError, match="does not exist"):
+        wb.add_exercise(wid, date(2024, 5, 21), "Squat", 5, 3, 80)
+    eid = wb.add_exercise(wid, date(2024, 5, 20), "Squat", 5, 3, 80)
+    assert wb.flush_writes(10)
+    assert [r[0] for r in wb.list_exercises(wid, date(2024, 5, 20))] == [eid]
+
+
+def test_rejected_writes_go_to_dead_letter_file(wb, sample_data):
+    dan = sample_data["users"]["dan"]
+    ann = sample_data["users"]["ann"]
+    kept = wb.log_workout(ann, date(2024, 5, 21), 25)
+    wid, _ = wb.log_workout_with_exercises(dan, date(2024, 5, 21), 30, [("Squat", 5, 3, 80)])
+    with wb.get_connection() as cur:  # dan disappears behind the queue's back
+        cur.execute("DELETE FROM users WHERE user_id = %s;", (dan,))
+    assert wb.flush_writes(10)
+
+    stats = wb.write_behind_stats()
+    assert stats["dead_letters"] == 2 and stats["pending"] == 0
+    with open(stats["dead_letter_file"], encoding="utf-8") as f:
+        dead = [json.loads(line) for line in f]
+    assert [(d["op"], d["args"]["workout_id"]) for d in dead] == [("workout", wid), ("exercise", wid)]
+    assert "foreign key" in dead[0]["error"]
+    wb.clear_cache()
+    assert kept in [w[0] for w in wb.list_workouts(ann)]
+
+
+def test_id_blocks_are_refilled_in_the_background(wb, sample_data, monkeypatch):
+    _wait_for(lambda: len(wb._wb_ids["workouts"]) >= wb.WRITE_BEHIND_ID_BLOCK)
+    taken = len(wb._wb_ids["workouts"]) - wb.WRITE_BEHIND_ID_LOW_WATER + 1
+    wb._wb_take_ids("workouts", taken)
+    _wait_for(lambda: len(wb._wb_ids["workouts"]) >= wb.WRITE_BEHIND_ID_LOW_WATER)
+
+
+def test_queues_while_database_is_down(wb, sample_data, monkeypatch):
+    ann = sample_data["users"]["ann"]
+    wb.log_workout(ann, date(2024, 5, 22), 20)  # ann is now known to exist
+    _wait_for(lambda: len(wb._wb_ids["exercises"]) >= wb.WRITE_BEHIND_ID_BLOCK)
+    connect = wb.get_connection
+
+    def unreachable():
+        raise psycopg2.OperationalError("connection refused")
+
+    monkeypatch.setattr(wb, "get_connection", unreachable)
+    wid, eids = wb.log_workout_with_exercises(ann, date(2024, 5, 22), 40, [("Squat", 5, 3, 80)])
+    eid = wb.add_exercise(wid, date(2024, 5, 22), "Row", 10, 3, 50)
+    monkeypatch.setattr(wb, "get_connection", connect)
+    assert wb.flush_writes(10)
+    wb.clear_cache()
+    assert [r[0] for r in wb.list_exercises(wid, date(2024, 5, 22))] == eids + [eid]